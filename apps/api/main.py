@@ -16,9 +16,11 @@ from apps.api.routes import (
     secrets,
     skills,
 )
+from core.maintenance import start_maintenance_scheduler
 from core.reminders.scheduler import start_reminder_scheduler
 from core.run_engine import RunEngine
 from memory import store
+from memory.db import last_migration_report
 
 
 def create_app() -> FastAPI:
@@ -38,12 +40,15 @@ def create_app() -> FastAPI:
     )
 
     store.init(settings.data_dir, settings.base_dir / "memory" / "migrations")
+    app.state.migration_report = last_migration_report()
+    app.add_event_handler("shutdown", store.flush_events)
     ensure_session_token(settings.data_dir)
 
     app.state.engine = RunEngine(settings.base_dir)
     app.state.base_dir = settings.base_dir
     app.state.data_dir = settings.data_dir
     app.state.reminder_scheduler = start_reminder_scheduler()
+    app.state.maintenance_scheduler = start_maintenance_scheduler(settings.base_dir)
 
     app.include_router(projects.router)
     app.include_router(runs.router)
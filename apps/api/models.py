@@ -22,6 +22,8 @@ class RunCreate(BaseModel):
     mode: str = "research"
     parent_run_id: Optional[str] = None
     purpose: Optional[str] = None
+    # UUID, выданный клиентом: позволяет подписаться на события до ответа POST /runs
+    run_id: Optional[str] = Field(default=None, pattern=r"^[0-9a-fA-F-]{32,36}$")
 
 
 class BootstrapRequest(BaseModel):
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import os
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 
 from apps.api.auth import require_auth
 from apps.api.models import ProjectCreate, ProjectUpdate
@@ -48,16 +48,28 @@ def update_project(project_id: str, payload: ProjectUpdate):
 
 
 @router.get("/{project_id}/memory/search")
-def search_memory(project_id: str, q: str = "", type: str | None = None, from_ts: str | None = None, to_ts: str | None = None, tags: str | None = None):
+def search_memory(
+    project_id: str,
+    q: str = "",
+    type: str | None = None,
+    from_ts: str | None = None,
+    to_ts: str | None = None,
+    tags: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    after: str | None = None,
+):
     project = store.get_project(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Проект не найден")
-    return store.search_memory(project_id, q, type, from_ts, to_ts, tags)
+    try:
+        return store.search_memory(project_id, q, type, from_ts, to_ts, tags, limit=limit, after=after)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.get("/{project_id}/runs")
-def list_runs(project_id: str, limit: int = 50):
+def list_runs(project_id: str, limit: int = 50, intent: str | None = None):
     project = store.get_project(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Проект не найден")
-    return store.list_runs(project_id, limit=limit)
+    return store.list_runs(project_id, limit=limit, intent=intent)
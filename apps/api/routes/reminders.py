@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import os
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 
 from apps.api.auth import require_auth
 from apps.api.models import ReminderCreateRequest
@@ -33,6 +33,14 @@ def list_reminders(status: str | None = None, limit: int = 200):
     return store.list_reminders(status=status, limit=limit)
 
 
+@router.get("/metrics")
+def reminder_metrics(request: Request):
+    scheduler = getattr(request.app.state, "reminder_scheduler", None)
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Планировщик напоминаний не запущен")
+    return scheduler.metrics()
+
+
 @router.post("/create")
 def create_reminder(payload: ReminderCreateRequest):
     delivery = payload.delivery or _default_delivery()
@@ -1,22 +1,50 @@
 from __future__ import annotations
 
-import asyncio
 import json
+import zlib
+from typing import Iterable, Iterator
 
-from fastapi import APIRouter, HTTPException, Request
-from starlette.responses import Response, StreamingResponse
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.responses import StreamingResponse
 
 from apps.api.auth import require_auth
+from core.event_hub import get_event_hub
 from memory import store
+from memory.records import EventRecord
 
 router = APIRouter(prefix="/api/v1", tags=["events"])
 
+# EN kept: период проверки отключения клиента и keep-alive комментариев SSE
+_DISCONNECT_CHECK_S = 1.0
+_KEEPALIVE_S = 15.0
+# Сколько поток с pending=1 ждёт появления запуска, созданного клиентом (RunCreate.run_id)
+_PENDING_RUN_WAIT_S = 30.0
+# Размер порции потокового экспорта NDJSON до сжатия
+_EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def _event_json(event: dict | EventRecord) -> str:
+    # Записи из БД отдают сохранённый payload как есть, без json.loads/json.dumps
+    if isinstance(event, EventRecord):
+        return event.to_json()
+    return json.dumps(event, ensure_ascii=False)
+
+
+def _sse_frame(event: dict | EventRecord) -> str:
+    # Живые события (seq=None) идут без id, чтобы не сбивать Last-Event-ID
+    if event["seq"] is None:
+        return f"event: {event['type']}\ndata: {_event_json(event)}\n\n"
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {_event_json(event)}\n\n"
+
 
 @router.get("/runs/{run_id}/events")
 async def stream_events(run_id: str, request: Request):
     require_auth(request)
-    run = store.get_run(run_id)
-    if not run and not store.list_events(run_id, limit=1):
+    # EN kept: pending=1 — клиент сам выдал run_id и подписывается до POST /runs,
+    # чтобы не пропустить живые chat_response_delta
+    pending = request.query_params.get("pending") in ("1", "true", "yes")
+    run_known = bool(store.get_run(run_id) or store.list_events(run_id, limit=1))
+    if not run_known and not pending:
         raise HTTPException(status_code=404, detail="Запуск не найден")
 
     last_event_id = request.headers.get("Last-Event-ID") or request.query_params.get("last_event_id")
@@ -28,20 +56,50 @@ async def stream_events(run_id: str, request: Request):
         last_seq = 0
 
     async def event_generator():
-        nonlocal last_seq
-        while True:
-            if await request.is_disconnected():
-                break
-            events = store.list_events_since(run_id, last_seq)
-            for event in events:
+        nonlocal last_seq, run_known
+        if once:
+            for event in store.list_events_since(run_id, last_seq):
                 last_seq = event["seq"]
-                data = json.dumps(event, ensure_ascii=False)
-                yield f"id: {event['seq']}\n"
-                yield f"event: {event['type']}\n"
-                yield f"data: {data}\n\n"
-            if once:
-                break
-            await asyncio.sleep(0.5)
+                yield _sse_frame(event)
+            return
+
+        # Подписываемся до догона из БД, чтобы не потерять события между ними
+        subscription = get_event_hub().subscribe(run_id, last_seq=last_seq)
+        try:
+            catch_up = True
+            idle_s = 0.0
+            waited_s = 0.0
+            while True:
+                if await request.is_disconnected():
+                    break
+                if not run_known:
+                    run_known = store.get_run(run_id) is not None
+                    if not run_known and waited_s >= _PENDING_RUN_WAIT_S:
+                        break
+                if catch_up:
+                    for event in store.list_events_since(run_id, subscription.last_seq):
+                        subscription.mark_delivered(event["seq"])
+                        yield _sse_frame(event)
+                    catch_up = False
+                if not await subscription.wait(_DISCONNECT_CHECK_S):
+                    idle_s += _DISCONNECT_CHECK_S
+                    waited_s += _DISCONNECT_CHECK_S
+                    if idle_s >= _KEEPALIVE_S:
+                        idle_s = 0.0
+                        yield ": keep-alive\n\n"
+                    continue
+                idle_s = 0.0
+                events, overflowed = subscription.drain()
+                if overflowed:
+                    # подписчик отстал — буфер сброшен, догоняем из БД
+                    catch_up = True
+                    continue
+                for event in events:
+                    if event["seq"] is not None:
+                        subscription.mark_delivered(event["seq"])
+                    yield _sse_frame(event)
+        finally:
+            subscription.close()
 
     return StreamingResponse(
         event_generator(),
@@ -50,12 +108,72 @@ async def stream_events(run_id: str, request: Request):
     )
 
 
+@router.get("/events/metrics")
+def event_hub_metrics(request: Request):
+    require_auth(request)
+    return {**get_event_hub().metrics(), "writer": store.event_writer_stats()}
+
+
 @router.get("/runs/{run_id}/events/download")
-def download_events(run_id: str, request: Request):
+def download_events(
+    run_id: str,
+    request: Request,
+    from_seq: int = Query(0, ge=0),
+    to_seq: int | None = Query(None, ge=0),
+    event_type: list[str] | None = Query(None, alias="type"),
+    step_id: str | None = None,
+):
     require_auth(request)
     run = store.get_run(run_id)
     if not run and not store.list_events(run_id, limit=1):
         raise HTTPException(status_code=404, detail="Запуск не найден")
-    events = store.list_events(run_id, limit=5000)
-    lines = "\n".join([json.dumps(e, ensure_ascii=False) for e in events])
-    return Response(lines, media_type="application/x-ndjson")
+    events = store.iter_events(run_id, from_seq=from_seq, to_seq=to_seq, types=event_type, step_id=step_id)
+    body = _ndjson_chunks(events)
+    headers = {
+        "Content-Disposition": f'attachment; filename="events_{run_id}.ndjson"',
+        "Vary": "Accept-Encoding",
+    }
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        body = _gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
+
+
+def _ndjson_chunks(events: Iterable[dict | EventRecord]) -> Iterator[bytes]:
+    # Строки склеиваются в порции ~_EXPORT_CHUNK_BYTES: одна строка на write слишком дорога
+    buffer: list[str] = []
+    size = 0
+    for event in events:
+        line = _event_json(event) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= _EXPORT_CHUNK_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def _gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
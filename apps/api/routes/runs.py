@@ -6,12 +6,13 @@ import re
 import threading
 import time
 import uuid
-from dataclasses import replace
+from dataclasses import dataclass, replace
 from pathlib import Path
 from types import SimpleNamespace
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import Response
 
 from apps.api.auth import require_auth
@@ -37,6 +38,7 @@ from core.semantic.decision import SemanticDecisionError
 from core.skills.result_types import ArtifactCandidate, SkillResult, SourceCandidate
 from memory.db import now_iso
 from memory import store
+from memory.records import json_default
 from skills.memory_save import skill as memory_save_skill
 from skills.web_research import skill as web_research_skill
 
@@ -336,6 +338,8 @@ def _semantic_resilience_decision(error_code: str) -> IntentDecision:
 def _chat_resilience_text(error_type: str | None) -> str:
     if error_type == "budget_exceeded":
         return "Лимит обращений к модели исчерпан для этого запуска. Попробуй ещё раз чуть позже."
+    if error_type == "queue_timeout":
+        return "Модель сейчас занята другими запросами. Повтори запрос через минуту."
     if error_type and "llm_call_failed" in error_type:
         return "Локальная модель сейчас недоступна. Проверь Ollama и выбранную модель, затем повтори запрос."
     if error_type in {"model_not_found", "http_error", "connection_error", "invalid_json", "chat_empty_response"}:
@@ -669,11 +673,19 @@ def _last_user_message(messages: list[dict[str, Any]] | None) -> str:
     return ""
 
 
-def _call_chat_base_fallback(brain, request: LLMRequest, ctx) -> Any:
+async def _brain_acall(brain, request: LLMRequest, ctx) -> Any:
+    acall = getattr(brain, "acall", None)
+    if acall is not None:
+        return await acall(request, ctx)
+    # Мозг без acall (заглушки, сторонние реализации) вызывается в пуле потоков
+    return await run_in_threadpool(brain.call, request, ctx)
+
+
+async def _call_chat_base_fallback(brain, request: LLMRequest, ctx) -> Any:
     # Switch purpose so router picks base chat model instead of tiered fast/complex model.
     fallback_request = replace(request, purpose="chat_response_base_fallback")
     try:
-        fallback_response = brain.call(fallback_request, ctx)
+        fallback_response = await _brain_acall(brain, fallback_request, ctx)
     except Exception:  # noqa: BLE001
         return None
     if fallback_response.status == "ok" and (fallback_response.text or "").strip():
@@ -681,7 +693,7 @@ def _call_chat_base_fallback(brain, request: LLMRequest, ctx) -> Any:
     return None
 
 
-def _retry_off_topic_with_min_prompt(brain, request: LLMRequest, ctx, *, user_text: str) -> Any:
+async def _retry_off_topic_with_min_prompt(brain, request: LLMRequest, ctx, *, user_text: str) -> Any:
     if not user_text.strip():
         return None
     focused_messages = [
@@ -700,7 +712,7 @@ def _retry_off_topic_with_min_prompt(brain, request: LLMRequest, ctx, *, user_te
         messages=focused_messages,
     )
     try:
-        focused_response = brain.call(focused_request, ctx)
+        focused_response = await _brain_acall(brain, focused_request, ctx)
     except Exception:  # noqa: BLE001
         return None
     text = focused_response.text or ""
@@ -719,7 +731,7 @@ def _off_topic_guard_text(user_text: str) -> str:
     )
 
 
-def _rewrite_response_in_russian(brain, request: LLMRequest, ctx, *, user_text: str, draft_text: str) -> Any:
+async def _rewrite_response_in_russian(brain, request: LLMRequest, ctx, *, user_text: str, draft_text: str) -> Any:
     rewrite_messages = [
         {
             "role": "system",
@@ -744,7 +756,7 @@ def _rewrite_response_in_russian(brain, request: LLMRequest, ctx, *, user_text:
         messages=rewrite_messages,
     )
     try:
-        rewrite_response = brain.call(rewrite_request, ctx)
+        rewrite_response = await _brain_acall(brain, rewrite_request, ctx)
     except Exception:  # noqa: BLE001
         return None
     text = rewrite_response.text or ""
@@ -753,13 +765,13 @@ def _rewrite_response_in_russian(brain, request: LLMRequest, ctx, *, user_text:
     return None
 
 
-def _call_chat_with_soft_retry(brain, request: LLMRequest, ctx) -> Any:
-    response = brain.call(request, ctx)
+async def _acall_chat_with_soft_retry(brain, request: LLMRequest, ctx) -> Any:
+    response = await _brain_acall(brain, request, ctx)
     if response.status != "ok":
         return response
 
     if not (response.text or "").strip():
-        fallback = _call_chat_base_fallback(brain, request, ctx)
+        fallback = await _call_chat_base_fallback(brain, request, ctx)
         return fallback or response
 
     user_text = _last_user_message(request.messages)
@@ -768,12 +780,12 @@ def _call_chat_with_soft_retry(brain, request: LLMRequest, ctx) -> Any:
         return response
 
     if reason == "off_topic":
-        focused = _retry_off_topic_with_min_prompt(brain, request, ctx, user_text=user_text)
+        focused = await _retry_off_topic_with_min_prompt(brain, request, ctx, user_text=user_text)
         if focused is not None:
             return focused
 
     if reason == "ru_language_mismatch":
-        rewritten = _rewrite_response_in_russian(
+        rewritten = await _rewrite_response_in_russian(
             brain,
             request,
             ctx,
@@ -788,19 +800,19 @@ def _call_chat_with_soft_retry(brain, request: LLMRequest, ctx) -> Any:
     retry_messages.append({"role": "user", "content": _soft_retry_prompt(reason)})
     retry_request = replace(request, messages=retry_messages)
     try:
-        retry_response = brain.call(retry_request, ctx)
+        retry_response = await _brain_acall(brain, retry_request, ctx)
     except Exception:  # noqa: BLE001
         retry_response = response
 
     if retry_response.status == "ok" and (retry_response.text or "").strip():
         if reason == "off_topic" and _soft_retry_reason(user_text, retry_response.text or "") == "off_topic":
-            fallback = _call_chat_base_fallback(brain, request, ctx)
+            fallback = await _call_chat_base_fallback(brain, request, ctx)
             if fallback is not None and _soft_retry_reason(user_text, fallback.text or "") != "off_topic":
                 return fallback
             return replace(retry_response, text=_off_topic_guard_text(user_text))
         return retry_response
 
-    fallback = _call_chat_base_fallback(brain, request, ctx)
+    fallback = await _call_chat_base_fallback(brain, request, ctx)
     if reason == "off_topic" and fallback is None:
         return replace(response, text=_off_topic_guard_text(user_text))
     return fallback or response
@@ -932,10 +944,8 @@ def _persist_web_research_result(run_id: str, result: SkillResult) -> None:
                     "pinned": bool(_source_value(source, "pinned")),
                 }
             )
-        if sources_payload:
-            store.insert_sources(run_id, sources_payload)
     except Exception:  # noqa: BLE001
-        pass
+        sources_payload = []
 
     try:
         existing_artifact_uris = {
@@ -959,8 +969,13 @@ def _persist_web_research_result(run_id: str, result: SkillResult) -> None:
                     "meta": _artifact_value(artifact, "meta") if isinstance(_artifact_value(artifact, "meta"), dict) else {},
                 }
             )
-        if artifacts_payload:
-            store.insert_artifacts(run_id, artifacts_payload)
+    except Exception:  # noqa: BLE001
+        artifacts_payload = []
+
+    if not sources_payload and not artifacts_payload:
+        return
+    try:
+        store.ingest_run_items(run_id, sources=sources_payload, artifacts=artifacts_payload)
     except Exception:  # noqa: BLE001
         pass
 
@@ -1081,8 +1096,33 @@ def _run_auto_web_research(
     }
 
 
+@dataclass
+class _ChatTurn:
+    """Ход чата, подготовленный в пуле потоков: остаётся получить ответ LLM."""
+
+    run: dict
+    decision: IntentDecision
+    query_text: str
+    settings: dict[str, Any]
+    memory_payload: dict[str, Any] | None
+    response_style_hint: str | None
+    brain: Any
+    llm_request: LLMRequest
+    ctx: SimpleNamespace
+
+
 @router.post("/projects/{project_id}/runs")
-def create_run(project_id: str, payload: RunCreate, request: Request):
+async def create_run(project_id: str, payload: RunCreate, request: Request):
+    # Маршрутизация намерения, память и контекст — синхронный код (SQLite, вызовы
+    # помощников LLM) в пуле потоков; ответ чата ждётся в event loop через
+    # brain.acall и не держит поток пула всё время генерации.
+    result = await run_in_threadpool(_prepare_run, project_id, payload, request)
+    if isinstance(result, _ChatTurn):
+        return await _answer_chat(result)
+    return result
+
+
+def _prepare_run(project_id: str, payload: RunCreate, request: Request) -> dict | _ChatTurn:
     project = store.get_project(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Проект не найден")
@@ -1092,6 +1132,9 @@ def create_run(project_id: str, payload: RunCreate, request: Request):
     if payload.mode not in allowed_modes:
         raise HTTPException(status_code=400, detail="Недопустимый режим запуска")
 
+    if payload.run_id and store.get_run(payload.run_id):
+        raise HTTPException(status_code=409, detail="Запуск с таким run_id уже существует")
+
     qa_mode = _is_qa_request(request)
     run = store.create_run(
         project_id,
@@ -1100,6 +1143,7 @@ def create_run(project_id: str, payload: RunCreate, request: Request):
         payload.parent_run_id,
         payload.purpose,
         meta={"intent": INTENT_ASK, "qa_mode": qa_mode, "intent_path": "pending"},
+        run_id=payload.run_id,
     )
     emit(
         run["id"],
@@ -1331,98 +1375,85 @@ def create_run(project_id: str, payload: RunCreate, request: Request):
             top_p=_chat_top_p_default(),
             repeat_penalty=_chat_repeat_penalty_default(),
             run_id=run["id"],
+            stream=True,
         )
-        fallback_text: str | None = None
-        fallback_provider = "local"
-        fallback_model_id = None
-        fallback_latency_ms = None
-        fallback_error_type: str | None = None
-        fallback_http_status: int | None = None
-        try:
-            response = _call_chat_with_soft_retry(brain, llm_request, ctx)
-        except Exception as exc:  # noqa: BLE001
-            fallback_error_type = str(getattr(exc, "error_type", "chat_llm_unhandled_error"))
-            fallback_http_status = getattr(exc, "status_code", None)
-            fallback_provider = str(getattr(exc, "provider", "local") or "local")
-            fallback_model_id = getattr(exc, "model_id", None)
-            fallback_text = _chat_resilience_text(fallback_error_type)
-            if fallback_error_type == "chat_llm_unhandled_error":
-                emit(
-                    run["id"],
-                    "llm_request_failed",
-                    "Chat LLM failed",
-                    {
-                        "provider": fallback_provider,
-                        "model_id": fallback_model_id,
-                        "error_type": fallback_error_type,
-                        "http_status_if_any": fallback_http_status,
-                        "retry_count": 0,
-                    },
-                )
-        else:
-            if response.status != "ok" or not (response.text or "").strip():
-                fallback_error_type = response.error_type or "chat_empty_response"
-                fallback_provider = response.provider or "local"
-                fallback_model_id = response.model_id
-                fallback_latency_ms = response.latency_ms
-                fallback_text = _chat_resilience_text(fallback_error_type)
-
-        if fallback_text is not None:
-            if _should_auto_web_research(payload.query_text, fallback_text, error_type=fallback_error_type):
-                researched = _run_auto_web_research(
-                    run,
-                    settings,
-                    query_text=payload.query_text,
-                    response_style_hint=effective_response_style_hint,
-                )
-                if researched is not None:
-                    emit(
-                        run["id"],
-                        "chat_response_generated",
-                        "Ответ сформирован (web research)",
-                        {
-                            "provider": "web_research",
-                            "model_id": "web_research",
-                            "latency_ms": researched.get("latency_ms"),
-                            "text": researched.get("text"),
-                            "degraded": False,
-                            "sources_count": researched.get("sources_count"),
-                            "confidence": researched.get("confidence"),
-                        },
-                    )
-                    _save_memory_payload_async(run, memory_payload, settings)
-                    return {
-                        "kind": "chat",
-                        "intent": decision.to_dict(),
-                        "run": run,
-                        "chat_response": researched.get("text"),
-                    }
-            emit(
+        return _ChatTurn(
+            run=run,
+            decision=decision,
+            query_text=payload.query_text,
+            settings=settings,
+            memory_payload=memory_payload,
+            response_style_hint=effective_response_style_hint,
+            brain=brain,
+            llm_request=llm_request,
+            ctx=ctx,
+        )
+
+    if decision.intent == INTENT_ASK:
+        emit(
+            run["id"],
+            "clarify_requested",
+            "Запрошено уточнение",
+            {"questions": decision.questions},
+        )
+        _save_memory_payload_async(run, memory_payload, settings)
+        return {"kind": "clarify", "intent": decision.to_dict(), "run": run, "questions": decision.questions}
+
+    raise HTTPException(status_code=500, detail="Intent routing failed")
+
+
+async def _answer_chat(turn: _ChatTurn) -> dict:
+    # emit пишет событие и chat_turns в SQLite — в пуле потоков, не в event loop
+    run, decision, settings, memory_payload = turn.run, turn.decision, turn.settings, turn.memory_payload
+    query_text = turn.query_text
+    fallback_text: str | None = None
+    fallback_provider = "local"
+    fallback_model_id = None
+    fallback_latency_ms = None
+    fallback_error_type: str | None = None
+    fallback_http_status: int | None = None
+    try:
+        response = await _acall_chat_with_soft_retry(turn.brain, turn.llm_request, turn.ctx)
+    except Exception as exc:  # noqa: BLE001
+        fallback_error_type = str(getattr(exc, "error_type", "chat_llm_unhandled_error"))
+        fallback_http_status = getattr(exc, "status_code", None)
+        fallback_provider = str(getattr(exc, "provider", "local") or "local")
+        fallback_model_id = getattr(exc, "model_id", None)
+        fallback_text = _chat_resilience_text(fallback_error_type)
+        if fallback_error_type == "chat_llm_unhandled_error":
+            await run_in_threadpool(
+                emit,
                 run["id"],
-                "chat_response_generated",
-                "Ответ сформирован (degraded)",
+                "llm_request_failed",
+                "Chat LLM failed",
                 {
                     "provider": fallback_provider,
                     "model_id": fallback_model_id,
-                    "latency_ms": fallback_latency_ms,
-                    "text": fallback_text,
-                    "degraded": True,
                     "error_type": fallback_error_type,
                     "http_status_if_any": fallback_http_status,
+                    "retry_count": 0,
                 },
             )
-            _save_memory_payload_async(run, memory_payload, settings)
-            return {"kind": "chat", "intent": decision.to_dict(), "run": run, "chat_response": fallback_text}
+    else:
+        if response.status != "ok" or not (response.text or "").strip():
+            fallback_error_type = response.error_type or "chat_empty_response"
+            fallback_provider = response.provider or "local"
+            fallback_model_id = response.model_id
+            fallback_latency_ms = response.latency_ms
+            fallback_text = _chat_resilience_text(fallback_error_type)
 
-        if _should_auto_web_research(payload.query_text, response.text or "", error_type=None):
-            researched = _run_auto_web_research(
+    if fallback_text is not None:
+        if _should_auto_web_research(query_text, fallback_text, error_type=fallback_error_type):
+            researched = await run_in_threadpool(
+                _run_auto_web_research,
                 run,
                 settings,
-                query_text=payload.query_text,
-                response_style_hint=effective_response_style_hint,
+                query_text=query_text,
+                response_style_hint=turn.response_style_hint,
             )
             if researched is not None:
-                emit(
+                await run_in_threadpool(
+                    emit,
                     run["id"],
                     "chat_response_generated",
                     "Ответ сформирован (web research)",
@@ -1443,32 +1474,71 @@ def create_run(project_id: str, payload: RunCreate, request: Request):
                     "run": run,
                     "chat_response": researched.get("text"),
                 }
-
-        emit(
+        await run_in_threadpool(
+            emit,
             run["id"],
             "chat_response_generated",
-            "Ответ сформирован",
+            "Ответ сформирован (degraded)",
             {
-                "provider": response.provider,
-                "model_id": response.model_id,
-                "latency_ms": response.latency_ms,
-                "text": response.text,
+                "provider": fallback_provider,
+                "model_id": fallback_model_id,
+                "latency_ms": fallback_latency_ms,
+                "text": fallback_text,
+                "degraded": True,
+                "error_type": fallback_error_type,
+                "http_status_if_any": fallback_http_status,
             },
         )
         _save_memory_payload_async(run, memory_payload, settings)
-        return {"kind": "chat", "intent": decision.to_dict(), "run": run, "chat_response": response.text}
-
-    if decision.intent == INTENT_ASK:
-        emit(
-            run["id"],
-            "clarify_requested",
-            "Запрошено уточнение",
-            {"questions": decision.questions},
+        return {"kind": "chat", "intent": decision.to_dict(), "run": run, "chat_response": fallback_text}
+
+    if _should_auto_web_research(query_text, response.text or "", error_type=None):
+        researched = await run_in_threadpool(
+            _run_auto_web_research,
+            run,
+            settings,
+            query_text=query_text,
+            response_style_hint=turn.response_style_hint,
         )
-        _save_memory_payload_async(run, memory_payload, settings)
-        return {"kind": "clarify", "intent": decision.to_dict(), "run": run, "questions": decision.questions}
+        if researched is not None:
+            await run_in_threadpool(
+                emit,
+                run["id"],
+                "chat_response_generated",
+                "Ответ сформирован (web research)",
+                {
+                    "provider": "web_research",
+                    "model_id": "web_research",
+                    "latency_ms": researched.get("latency_ms"),
+                    "text": researched.get("text"),
+                    "degraded": False,
+                    "sources_count": researched.get("sources_count"),
+                    "confidence": researched.get("confidence"),
+                },
+            )
+            _save_memory_payload_async(run, memory_payload, settings)
+            return {
+                "kind": "chat",
+                "intent": decision.to_dict(),
+                "run": run,
+                "chat_response": researched.get("text"),
+            }
 
-    raise HTTPException(status_code=500, detail="Intent routing failed")
+    await run_in_threadpool(
+        emit,
+        run["id"],
+        "chat_response_generated",
+        "Ответ сформирован",
+        {
+            "provider": response.provider,
+            "model_id": response.model_id,
+            "latency_ms": response.latency_ms,
+            "ttft_ms": response.ttft_ms,
+            "text": response.text,
+        },
+    )
+    _save_memory_payload_async(run, memory_payload, settings)
+    return {"kind": "chat", "intent": decision.to_dict(), "run": run, "chat_response": response.text}
 
 
 @router.post("/runs/{run_id}/plan")
@@ -1611,6 +1681,14 @@ def get_artifacts(run_id: str):
     return store.list_artifacts(run_id)
 
 
+@router.get("/runs/{run_id}/chat_turns")
+def get_chat_turns(run_id: str, before: int | None = None, limit: int = Query(50, ge=1, le=200)):
+    page = store.list_chat_turns(run_id, before_turn=before, limit=limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Запуск не найден")
+    return page
+
+
 @router.get("/runs/{run_id}/snapshot")
 def get_snapshot(run_id: str):
     return _build_snapshot(run_id)
@@ -1619,7 +1697,7 @@ def get_snapshot(run_id: str):
 @router.get("/runs/{run_id}/snapshot/download")
 def download_snapshot(run_id: str):
     snapshot = _build_snapshot(run_id)
-    payload = json.dumps(snapshot, ensure_ascii=False)
+    payload = json.dumps(snapshot, ensure_ascii=False, default=json_default)
     headers = {"Content-Disposition": f"attachment; filename=снимок_{run_id}.json"}
     return Response(payload, media_type="application/json", headers=headers)
 
@@ -58,6 +58,7 @@ const EVENT_TYPES = [
   "conflict_detected",
   "fact_extracted",
   "intent_decided",
+  "items_ingested",
   "llm_provider_used",
   "llm_budget_exceeded",
   "llm_request_failed",
@@ -169,6 +169,7 @@ export default function ChatPage() {
   const connectionHint = useAppStore((state) => state.connectionHint);
   const sendError = useAppStore((state) => state.sendError);
   const sending = useAppStore((state) => state.sending);
+  const streamingReplies = useAppStore((state) => state.streamingReplies);
   const bootstrap = useAppStore((state) => state.bootstrap);
   const connectAuth = useAppStore((state) => state.connectAuth);
   const resetAuth = useAppStore((state) => state.resetAuth);
@@ -241,6 +242,7 @@ export default function ChatPage() {
     (lastMessage.delivery_state === "queued" || lastMessage.delivery_state === "sending") &&
     !hasAssistantTyping;
   const pendingAssistantText = derivePendingAssistantText(lastMessage?.delivery_state, activeStatus);
+  const pendingAssistantDraft = (conversationId && streamingReplies[conversationId]) || "";
 
   useEffect(() => {
     setRatings(loadRatings(conversationId));
@@ -265,7 +267,7 @@ export default function ChatPage() {
     if (isAtBottomRef.current) {
       requestAnimationFrame(() => scrollToBottom("auto"));
     }
-  }, [messages]);
+  }, [messages, pendingAssistantDraft]);
 
   useEffect(() => {
     requestAnimationFrame(() => scrollToBottom("auto"));
@@ -527,6 +529,7 @@ export default function ChatPage() {
               onTypingDone={handleTypingDone}
               showPendingAssistant={showPendingAssistant}
               pendingAssistantText={pendingAssistantText}
+              pendingAssistantDraft={pendingAssistantDraft}
               onScroll={handleScroll}
               scrollRef={threadRef}
             />
@@ -85,7 +85,7 @@ export function listRuns(projectId: string, limit = 50): Promise<Run[]> {
 
 export function createRun(
   projectId: string,
-  payload: { query_text: string; mode: string; parent_run_id?: string | null; purpose?: string | null }
+  payload: { query_text: string; mode: string; parent_run_id?: string | null; purpose?: string | null; run_id?: string }
 ): Promise<RunIntentResponse> {
   return api<RunIntentResponse>(`/projects/${projectId}/runs`, { method: "POST", body: JSON.stringify(payload) });
 }
@@ -14,6 +14,8 @@ export type StreamOptions = {
   runId: string;
   token?: string | null;
   lastEventId?: number | null;
+  // Запуск ещё не создан (run_id выдал клиент): сервер ждёт его вместо 404
+  pending?: boolean;
 };
 
 const HEARTBEAT_TIMEOUT = 25000;
@@ -146,6 +148,9 @@ export function createEventStreamManager(baseUrl: string, eventTypes: string[],
     if (options.token) {
       url.searchParams.set("token", options.token);
     }
+    if (options.pending) {
+      url.searchParams.set("pending", "1");
+    }
     const lastEventId = callbacks.getLastEventId?.() ?? options.lastEventId;
     if (lastEventId) {
       url.searchParams.set("last_event_id", String(lastEventId));
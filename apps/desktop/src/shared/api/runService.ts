@@ -4,7 +4,10 @@ import { getApiBaseUrl } from "./config";
 import { createEventStreamManager, type StreamCallbacks, type StreamState } from "./eventStream";
 
 export type RunService = {
-  createRun: (projectId: string, payload: { query_text: string; mode: string; parent_run_id?: string | null }) => Promise<RunIntentResponse>;
+  createRun: (
+    projectId: string,
+    payload: { query_text: string; mode: string; parent_run_id?: string | null; run_id?: string }
+  ) => Promise<RunIntentResponse>;
   startRun: (runId: string) => Promise<void>;
   fetchSnapshot: (runId: string) => Promise<Snapshot>;
   openEventStream: (
@@ -12,6 +15,7 @@ export type RunService = {
     options: {
       token?: string | null;
       lastEventId?: number | null;
+      pending?: boolean;
       eventTypes: string[];
       onEvent: (event: EventItem) => void;
       onStateChange: (state: StreamState) => void;
@@ -40,7 +44,8 @@ export function createRunService(callbacks?: Partial<StreamCallbacks>): RunServi
       manager.connect({
         runId,
         token: options.token,
-        lastEventId: options.lastEventId
+        lastEventId: options.lastEventId,
+        pending: options.pending
       });
       return {
         disconnect: manager.disconnect
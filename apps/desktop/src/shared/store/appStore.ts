@@ -70,6 +70,8 @@ const POLL_INTERVAL_MS = 5000;
 const MESSAGE_LIMIT = 240;
 const CONVERSATION_LIMIT = 200;
 const NOTIFICATION_TTL_MS = 6000;
+// Сколько ждать подписку на живые дельты ответа, прежде чем отправить запрос без неё
+const REPLY_DRAFT_WAIT_MS = 1500;
 const NOTIFICATION_TTL_WARNING_MS = 10000;
 const NOTIFICATION_TTL_ERROR_MS = 18000;
 
@@ -95,6 +97,7 @@ const EVENT_TYPES = [
   "conflict_detected",
   "fact_extracted",
   "intent_decided",
+  "items_ingested",
   "llm_provider_used",
   "llm_budget_exceeded",
   "llm_request_failed",
@@ -196,6 +199,16 @@ function createId(prefix: string) {
   return `${prefix}-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 8)}`;
 }
 
+function createRunId() {
+  if (hasWindow && "crypto" in window && typeof window.crypto.randomUUID === "function") {
+    return window.crypto.randomUUID();
+  }
+  return "xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx".replace(/[xy]/g, (char) => {
+    const value = Math.floor(Math.random() * 16);
+    return (char === "x" ? value : (value & 0x3) | 0x8).toString(16);
+  });
+}
+
 function truncate(text: string, max = 48) {
   if (text.length <= max) return text;
   return `${text.slice(0, max - 1)}…`;
@@ -479,6 +492,7 @@ export type AppStore = {
   connectionHint: string | null;
   sendError: string | null;
   sending: boolean;
+  streamingReplies: Record<string, string>;
   lastFailedMessage: string | null;
   lastFailedMessageId: string | null;
   lastFailedRunId: string | null;
@@ -878,6 +892,68 @@ export const useAppStore = create<AppStore>((set, get) => {
     sendQueue.push(job);
   };
 
+  const setStreamingReply = (conversationId: string, text: string | null) => {
+    const next = { ...get().streamingReplies };
+    if (text === null) {
+      delete next[conversationId];
+    } else {
+      next[conversationId] = text;
+    }
+    set({ streamingReplies: next });
+  };
+
+  // Живые chat_response_delta не сохраняются на сервере, поэтому подписываемся до POST /runs
+  const openReplyDraft = (conversationId: string, runId: string) => {
+    const token = getToken();
+    let streamId: string | null = null;
+    let received = 0;
+    let text = "";
+    let markReady = () => {};
+    const ready = new Promise<void>((resolve) => {
+      markReady = () => resolve();
+      window.setTimeout(resolve, REPLY_DRAFT_WAIT_MS);
+    });
+    const handle = token
+      ? runService.openEventStream(runId, {
+          token,
+          pending: true,
+          eventTypes: ["chat_response_delta"],
+          onEvent: (event) => {
+            const payload = event.payload || {};
+            const delta = typeof payload.delta === "string" ? payload.delta : "";
+            const offset = typeof payload.offset === "number" ? payload.offset : -1;
+            const id = typeof payload.stream_id === "string" ? payload.stream_id : null;
+            // offset считается в символах Python (кодовых точках), а не в UTF-16
+            if (offset === 0) {
+              streamId = id;
+              received = 0;
+              text = "";
+            } else if (id !== streamId || offset !== received) {
+              return;
+            }
+            received += Array.from(delta).length;
+            text += delta;
+            setStreamingReply(conversationId, text);
+          },
+          onStateChange: (state) => {
+            if (state !== "connecting") markReady();
+          },
+          // Ошибки черновика не показываем: итоговый ответ всё равно придёт в ответе POST /runs
+          onError: () => undefined
+        })
+      : null;
+    if (!handle) markReady();
+    return {
+      ready,
+      // Возвращает true, если пользователь уже видел ответ по дельтам
+      close: () => {
+        handle?.disconnect();
+        setStreamingReply(conversationId, null);
+        return text.length > 0;
+      }
+    };
+  };
+
   const processSendQueue = async () => {
     if (sendQueueProcessing) return;
     sendQueueProcessing = true;
@@ -918,14 +994,22 @@ export const useAppStore = create<AppStore>((set, get) => {
         const latestRunId = currentConversation?.run_ids.slice(-1)[0] || null;
         const parentRunId = job.parentRunId || latestRunId;
 
+        const runId = createRunId();
+        const replyDraft = openReplyDraft(job.conversationId, runId);
+        await replyDraft.ready;
+
         let response: RunIntentResponse;
+        let replyStreamed = false;
         try {
           response = await runService.createRun(projectId, {
             query_text: job.queryText,
             mode: getRunMode(),
-            parent_run_id: parentRunId || undefined
+            parent_run_id: parentRunId || undefined,
+            run_id: runId
           });
+          replyStreamed = replyDraft.close();
         } catch (err) {
+          replyDraft.close();
           sendQueue.shift();
           const message = err instanceof Error ? err.message : "Не удалось отправить запрос";
           updateMessage(job.conversationId, job.messageId, { delivery_state: "failed", error_detail: message });
@@ -1002,7 +1086,8 @@ export const useAppStore = create<AppStore>((set, get) => {
           appendAssistantReply(questions.join("\n") || PHRASES.clarifyFallback);
         }
         if (response.kind === "chat") {
-          appendAssistantReply(response.chat_response || PHRASES.chatFallback);
+          // Текст уже показан по дельтам — без повторной анимации печати
+          appendAssistantReply(response.chat_response || PHRASES.chatFallback, !replyStreamed);
         }
         if (response.kind === "act") {
           appendAssistantReply(PHRASES.actStart, false);
@@ -1076,6 +1161,7 @@ export const useAppStore = create<AppStore>((set, get) => {
     connectionHint: null,
     sendError: null,
     sending: false,
+    streamingReplies: {},
     lastFailedMessage: null,
     lastFailedMessageId: null,
     lastFailedRunId: null,
@@ -33,6 +33,7 @@ export type Run = {
   started_at?: string | null;
   finished_at?: string | null;
   parent_run_id?: string | null;
+  root_run_id?: string | null;
   purpose?: string | null;
   meta?: Record<string, unknown>;
 };
@@ -111,7 +112,8 @@ export type Task = {
 export type EventItem = {
   id: string;
   run_id?: string;
-  seq?: number;
+  // null у живых событий (chat_response_delta): они не сохраняются на сервере
+  seq?: number | null;
   ts?: number;
   type: string;
   message: string;
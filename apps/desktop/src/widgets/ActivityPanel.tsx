@@ -227,6 +227,24 @@ function thoughtFromEvent(event: EventItem): ThoughtLine | null {
     };
   }
 
+  if (type === "items_ingested") {
+    const counts: Array<[string, number | null]> = [
+      ["источников", payloadNumber(payload, "sources")],
+      ["фактов", payloadNumber(payload, "facts")],
+      ["конфликтов", payloadNumber(payload, "conflicts")],
+      ["артефактов", payloadNumber(payload, "artifacts")]
+    ];
+    const parts = counts.filter(([, count]) => count != null && count > 0).map(([label, count]) => `${label}: ${count}`);
+    return {
+      id: `thought-${seq}`,
+      title: "Результаты сохранены",
+      detail: parts.join(" • ") || undefined,
+      tone: "neutral",
+      icon: <Globe size={15} />,
+      ts: event.ts
+    };
+  }
+
   if (type === "chat_response_generated") {
     const provider = payloadString(payload, "provider") || "local";
     const sources = payloadNumber(payload, "sources_count");
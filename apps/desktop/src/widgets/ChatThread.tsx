@@ -19,6 +19,7 @@ export type ChatThreadProps = {
   onTypingDone: (messageId: string) => void;
   showPendingAssistant?: boolean;
   pendingAssistantText?: string;
+  pendingAssistantDraft?: string;
   onScroll?: () => void;
   scrollRef?: RefObject<HTMLDivElement | null>;
 };
@@ -55,6 +56,7 @@ export default function ChatThread({
   onTypingDone,
   showPendingAssistant = false,
   pendingAssistantText = "Astra готовит ответ…",
+  pendingAssistantDraft = "",
   onScroll,
   scrollRef
 }: ChatThreadProps) {
@@ -215,14 +217,18 @@ export default function ChatThread({
             className="chat-message is-assistant is-pending"
           >
             <div className="chat-bubble">
-              <div className="chat-pending">
-                <span className="chat-pending-label">{pendingAssistantText}</span>
-                <span className="chat-pending-dots" aria-hidden="true">
-                  <span />
-                  <span />
-                  <span />
-                </span>
-              </div>
+              {pendingAssistantDraft ? (
+                <MarkdownMessage text={pendingAssistantDraft} preview />
+              ) : (
+                <div className="chat-pending">
+                  <span className="chat-pending-label">{pendingAssistantText}</span>
+                  <span className="chat-pending-dots" aria-hidden="true">
+                    <span />
+                    <span />
+                    <span />
+                  </span>
+                </div>
+              )}
             </div>
             <div className="chat-meta">
               <span>Astra · сейчас</span>
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from core.brain.providers import compact_raw
+from core.brain.types import LLMRequest, LLMResponse
+from memory import store
+
+_LOG = logging.getLogger(__name__)
+
+_DAY_S = 86400.0
+
+# TTL по purpose, секунды; 0 — не кэшировать. Переопределяется
+# ASTRA_LLM_CACHE_TTL_<PURPOSE>_S, для остальных purpose — ASTRA_LLM_CACHE_TTL_S.
+_PURPOSE_TTL_DEFAULTS: dict[str, float] = {
+    "semantic_decision": 7 * _DAY_S,
+    "memory_interpreter": 7 * _DAY_S,
+    "memory_normalize": 7 * _DAY_S,
+    "intent_actions": _DAY_S,
+    "planner_v1": _DAY_S,
+    "conflict_resolution": _DAY_S,
+    # План действий зависит от состояния экрана, которое попадает в промпт не целиком
+    "computer_micro_plan": 0,
+}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class LLMResponseCache:
+    """Кэш ответов LLM поверх таблицы llm_cache: общий для всех запусков,
+    с TTL по purpose и LRU-вытеснением сверх max_entries.
+
+    Ответы чата с temperature > 0 не кэшируются: повтор того же вопроса должен
+    давать новую выборку. Ошибки БД (в том числе не инициализированная БД)
+    не ломают вызов LLM — кэш просто пропускается.
+    """
+
+    def __init__(self, *, enabled: bool = True, default_ttl_s: float = _DAY_S, max_entries: int = 5000) -> None:
+        self.enabled = enabled
+        self.default_ttl_s = max(0.0, default_ttl_s)
+        self.max_entries = max(0, int(max_entries))
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        return cls(
+            enabled=os.getenv("ASTRA_LLM_CACHE_ENABLED", "true").strip().lower() not in ("0", "false", "no", "off"),
+            default_ttl_s=_env_float("ASTRA_LLM_CACHE_TTL_S", _DAY_S),
+            max_entries=int(_env_float("ASTRA_LLM_CACHE_MAX_ENTRIES", 5000)),
+        )
+
+    def ttl_for(self, purpose: str) -> float:
+        default = _PURPOSE_TTL_DEFAULTS.get(purpose, self.default_ttl_s)
+        return max(0.0, _env_float(f"ASTRA_LLM_CACHE_TTL_{purpose.upper()}_S", default))
+
+    def cacheable(self, request: LLMRequest) -> bool:
+        if not self.enabled:
+            return False
+        if request.purpose.startswith("chat_response") and (request.temperature or 0) > 0:
+            return False
+        return self.ttl_for(request.purpose) > 0
+
+    def get(self, key: str, request: LLMRequest) -> LLMResponse | None:
+        if not self.cacheable(request):
+            return None
+        try:
+            data = store.get_llm_cache_entry(key, time.time())
+        except (RuntimeError, sqlite3.Error) as exc:
+            _LOG.debug("LLM cache read skipped: %s", exc)
+            return None
+        with self._lock:
+            if data is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        if not isinstance(data, dict):
+            return None
+        return LLMResponse(
+            text=data.get("text") or "",
+            usage=data.get("usage"),
+            provider=data.get("provider") or "local",
+            model_id=data.get("model_id"),
+            latency_ms=0,
+            cache_hit=True,
+            route_reason=data.get("route_reason") or "local",
+            raw=data.get("raw"),
+        )
+
+    def put(self, key: str, request: LLMRequest, response: LLMResponse) -> None:
+        if response.status != "ok" or not self.cacheable(request):
+            return
+        data = {
+            "text": response.text,
+            "usage": response.usage,
+            "provider": response.provider,
+            "model_id": response.model_id,
+            "route_reason": response.route_reason,
+            "raw": compact_raw(response.raw),
+        }
+        try:
+            evicted = store.put_llm_cache_entry(
+                key,
+                data,
+                purpose=request.purpose,
+                model_id=response.model_id,
+                ttl_s=self.ttl_for(request.purpose),
+                max_entries=self.max_entries,
+                now_ts=time.time(),
+            )
+        except (RuntimeError, sqlite3.Error) as exc:
+            _LOG.debug("LLM cache write skipped: %s", exc)
+            return
+        if evicted:
+            with self._lock:
+                self._evicted += evicted
+
+    def stats(self) -> dict:
+        """Счётчики процесса: попадания, промахи, доля попаданий, вытесненные записи."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evicted": self._evicted,
+            }
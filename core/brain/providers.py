@@ -1,18 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import threading
+import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Generator
 
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from core.llm_routing import _redact_secrets
 
 _ROOT_DIR = Path(__file__).resolve().parents[2]
 _ARTIFACT_DIR = _ROOT_DIR / "artifacts" / "local_llm_failures"
 _MAX_PAYLOAD_CHARS = 5000
+# Массив токенов контекста в ответе /api/generate: тысячи чисел, после ответа не нужны
+_RAW_TOKEN_KEYS = ("context",)
 
 
 def _truncate(text: str, max_chars: int) -> str:
@@ -21,6 +29,17 @@ def _truncate(text: str, max_chars: int) -> str:
     return text[:max_chars]
 
 
+def compact_raw(raw: dict | None) -> dict | None:
+    """Копия ответа Ollama без массивов токенов — для LLMResponse.raw и кэша."""
+    if not isinstance(raw, dict):
+        return raw
+    return {
+        key: value
+        for key, value in raw.items()
+        if key not in _RAW_TOKEN_KEYS and not (isinstance(value, list) and len(value) > 16 and all(type(item) is int for item in value))
+    }
+
+
 def _sanitize_value(value: Any, max_chars: int) -> Any:
     if isinstance(value, str):
         redacted, _ = _redact_secrets(value)
@@ -120,7 +139,7 @@ def _write_failure_artifact(
         return str(path)
 
 
-def _extract_error_text(resp: requests.Response) -> str | None:
+def _extract_error_text(resp: _HTTPReply) -> str | None:
     try:
         data = resp.json()
         if isinstance(data, dict) and data.get("error"):
@@ -147,6 +166,18 @@ class ProviderResult:
     model_id: str | None = None
 
 
+class _DeltaSink:
+    """Обёртка над on_delta: помнит, был ли уже отдан хотя бы один фрагмент."""
+
+    def __init__(self, callback: Callable[[str], None]) -> None:
+        self._callback = callback
+        self.called = False
+
+    def __call__(self, piece: str) -> None:
+        self.called = True
+        self._callback(piece)
+
+
 class ProviderError(RuntimeError):
     def __init__(
         self,
@@ -164,7 +195,131 @@ class ProviderError(RuntimeError):
         self.artifact_path = artifact_path
 
 
+def build_local_session(pool_size: int = 4, connect_retries: int = 2) -> requests.Session:
+    """Сессия к Ollama: keep-alive пул на pool_size соединений.
+
+    Повторяются только ошибки установки соединения (Ollama перезапускается);
+    запрос, дошедший до сервера, не повторяется — генерация не должна
+    выполняться дважды.
+    """
+    retry = Retry(total=connect_retries, connect=connect_retries, read=0, status=0, other=0, backoff_factor=0.2)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, int(pool_size)), max_retries=retry, pool_block=False)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def build_local_async_client(pool_size: int = 4, connect_retries: int = 2) -> httpx.AsyncClient:
+    """Асинхронный клиент к Ollama с теми же правилами, что и build_local_session:
+    keep-alive пул на pool_size соединений, повтор только ошибок соединения."""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=max(1, int(pool_size)))
+    transport = httpx.AsyncHTTPTransport(retries=max(0, int(connect_retries)), limits=limits)
+    return httpx.AsyncClient(transport=transport)
+
+
+class _TransportError(Exception):
+    """Запрос не дошёл до Ollama (соединение, таймаут) — без ответа сервера."""
+
+
+@dataclass
+class _HTTPCall:
+    path: str
+    payload: dict[str, Any]
+    timeout_s: int
+    stream: _StreamReader | None = None
+
+
+class _HTTPReply:
+    """Ответ Ollama, прочитанный драйвером (requests или httpx)."""
+
+    def __init__(self, status_code: int, content: bytes = b"", result: ProviderResult | None = None) -> None:
+        self.status_code = status_code
+        self.content = content
+        self.result = result
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class _StreamReader:
+    """Разбор NDJSON-потока /api/chat до строки с done=true.
+
+    Таймаут HTTP-клиента ограничивает только паузу между чанками, поэтому общий
+    срок ответа (как у непотокового запроса) проверяется здесь.
+    """
+
+    def __init__(self, model: str, sink: _DeltaSink, deadline: float) -> None:
+        self.model = model
+        self.status_code = 200
+        self._sink = sink
+        self._deadline = deadline
+        self._parts: list[str] = []
+        self._final: dict[str, Any] | None = None
+
+    @property
+    def done(self) -> bool:
+        return self._final is not None
+
+    def feed(self, line: bytes | str) -> None:
+        if not line:
+            return
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ProviderError(
+                "Local LLM stream returned invalid JSON",
+                provider="local",
+                status_code=self.status_code,
+                error_type="invalid_json",
+            ) from exc
+        if data.get("error"):
+            raise ProviderError(
+                f"Local LLM stream error: {data['error']}",
+                provider="local",
+                status_code=self.status_code,
+                error_type="http_error",
+            )
+        piece = (data.get("message") or {}).get("content") or ""
+        if piece:
+            self._parts.append(piece)
+            self._sink(piece)
+        if data.get("done"):
+            self._final = data
+            return
+        if time.monotonic() > self._deadline:
+            raise ProviderError("Local LLM stream timed out", provider="local", error_type="connection_error")
+
+    def result(self) -> ProviderResult:
+        final = self._final
+        if final is None:
+            raise ProviderError("Local LLM stream ended before done", provider="local", error_type="connection_error")
+        text = "".join(self._parts)
+        raw = dict(final)
+        raw["message"] = {"role": (final.get("message") or {}).get("role") or "assistant", "content": text}
+        usage = {
+            "prompt_eval_count": final.get("prompt_eval_count"),
+            "eval_count": final.get("eval_count"),
+            "total_duration": final.get("total_duration"),
+        }
+        return ProviderResult(text=text, usage=usage, raw=raw, model_id=self.model)
+
+
+_Flow = Generator[_HTTPCall, _HTTPReply, ProviderResult]
+
+
 class LocalLLMProvider:
+    """Клиент Ollama.
+
+    Цепочка запросов (/api/chat → упрощённый повтор → /api/generate) описана
+    один раз генератором _chat_flow: он отдаёт запросы и получает ответы, а
+    выполняет их синхронный драйвер (requests, chat) или асинхронный (httpx, achat).
+    """
+
     def __init__(
         self,
         base_url: str,
@@ -173,6 +328,10 @@ class LocalLLMProvider:
         timeout_s: int = 30,
         default_num_ctx: int = 4096,
         default_num_predict: int = 256,
+        session: requests.Session | None = None,
+        *,
+        pool_size: int = 4,
+        connect_retries: int = 2,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.chat_model = chat_model
@@ -180,6 +339,29 @@ class LocalLLMProvider:
         self.timeout_s = timeout_s
         self.default_num_ctx = max(1024, int(default_num_ctx))
         self.default_num_predict = max(64, int(default_num_predict))
+        self._pool_size = pool_size
+        self._connect_retries = connect_retries
+        # Все запросы цепочки /api/chat → упрощённый повтор → /api/generate идут по одному пулу
+        self._session = session or build_local_session(pool_size, connect_retries)
+        # Соединения httpx привязаны к event loop: клиент создаётся заново в другом loop
+        self._async_lock = threading.Lock()
+        self._async_client: httpx.AsyncClient | None = None
+        self._async_loop: asyncio.AbstractEventLoop | None = None
+
+    def close(self) -> None:
+        self._session.close()
+        with self._async_lock:
+            self._async_client = None
+            self._async_loop = None
+
+    async def aclose(self) -> None:
+        with self._async_lock:
+            client, loop = self._async_client, self._async_loop
+            self._async_client = None
+            self._async_loop = None
+        if client is not None and loop is asyncio.get_running_loop():
+            await client.aclose()
+        self._session.close()
 
     def chat(
         self,
@@ -197,7 +379,182 @@ class LocalLLMProvider:
         step_id: str | None = None,
         purpose: str | None = None,
         timeout_s: int | None = None,
+        on_delta: Callable[[str], None] | None = None,
     ) -> ProviderResult:
+        """Запрос к /api/chat.
+
+        С on_delta ответ читается потоком NDJSON: каждый фрагмент текста
+        передаётся в on_delta по мере генерации, итоговый ProviderResult тот же,
+        что и без потока. Если ответ пришёл целиком (упрощённый повтор,
+        /api/generate), on_delta получает его одним куском.
+        """
+        sink = _DeltaSink(on_delta) if on_delta is not None else None
+        result = self._run(
+            self._chat_flow(
+                messages,
+                model=model,
+                model_kind=model_kind,
+                temperature=temperature,
+                top_p=top_p,
+                repeat_penalty=repeat_penalty,
+                max_tokens=max_tokens,
+                json_schema=json_schema,
+                tools=tools,
+                run_id=run_id,
+                step_id=step_id,
+                purpose=purpose,
+                timeout_s=timeout_s,
+                sink=sink,
+            )
+        )
+        if sink is not None and not sink.called and result.text:
+            sink(result.text)
+        return result
+
+    async def achat(
+        self,
+        messages: list[dict[str, Any]],
+        *,
+        model: str | None = None,
+        model_kind: str = "chat",
+        temperature: float = 0.2,
+        top_p: float | None = None,
+        repeat_penalty: float | None = None,
+        max_tokens: int | None = None,
+        json_schema: dict | None = None,
+        tools: list[dict] | None = None,
+        run_id: str | None = None,
+        step_id: str | None = None,
+        purpose: str | None = None,
+        timeout_s: int | None = None,
+        on_delta: Callable[[str], None] | None = None,
+    ) -> ProviderResult:
+        """То же, что chat(), но через httpx.AsyncClient, не занимая поток на время генерации."""
+        sink = _DeltaSink(on_delta) if on_delta is not None else None
+        result = await self._arun(
+            self._chat_flow(
+                messages,
+                model=model,
+                model_kind=model_kind,
+                temperature=temperature,
+                top_p=top_p,
+                repeat_penalty=repeat_penalty,
+                max_tokens=max_tokens,
+                json_schema=json_schema,
+                tools=tools,
+                run_id=run_id,
+                step_id=step_id,
+                purpose=purpose,
+                timeout_s=timeout_s,
+                sink=sink,
+            )
+        )
+        if sink is not None and not sink.called and result.text:
+            sink(result.text)
+        return result
+
+    def _run(self, flow: _Flow) -> ProviderResult:
+        try:
+            call = next(flow)
+            while True:
+                try:
+                    reply = self._send(call)
+                except _TransportError as exc:
+                    call = flow.throw(exc)
+                else:
+                    call = flow.send(reply)
+        except StopIteration as stop:
+            return stop.value
+
+    async def _arun(self, flow: _Flow) -> ProviderResult:
+        try:
+            call = next(flow)
+            while True:
+                try:
+                    reply = await self._asend(call)
+                except _TransportError as exc:
+                    call = flow.throw(exc)
+                else:
+                    call = flow.send(reply)
+        except StopIteration as stop:
+            return stop.value
+
+    def _send(self, call: _HTTPCall) -> _HTTPReply:
+        try:
+            resp = self._session.post(
+                f"{self.base_url}{call.path}",
+                json=call.payload,
+                timeout=call.timeout_s,
+                stream=call.stream is not None,
+            )
+        except requests.RequestException as exc:
+            raise _TransportError(str(exc)) from exc
+        stream = call.stream
+        if stream is None or resp.status_code >= 400:
+            return _HTTPReply(resp.status_code, resp.content)
+        stream.status_code = resp.status_code
+        try:
+            for line in resp.iter_lines(chunk_size=None):
+                stream.feed(line)
+                if stream.done:
+                    break
+        except requests.RequestException as exc:
+            raise ProviderError(f"Local LLM stream interrupted: {exc}", provider="local", error_type="connection_error") from exc
+        finally:
+            resp.close()
+        return _HTTPReply(resp.status_code, result=stream.result())
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            if self._async_client is None or self._async_loop is not loop:
+                self._async_client = build_local_async_client(self._pool_size, self._connect_retries)
+                self._async_loop = loop
+            return self._async_client
+
+    async def _asend(self, call: _HTTPCall) -> _HTTPReply:
+        client = self._client()
+        stream = call.stream
+        try:
+            request = client.build_request("POST", f"{self.base_url}{call.path}", json=call.payload, timeout=call.timeout_s)
+            resp = await client.send(request, stream=stream is not None)
+        except httpx.HTTPError as exc:
+            raise _TransportError(str(exc) or type(exc).__name__) from exc
+        if stream is None:
+            return _HTTPReply(resp.status_code, resp.content)
+        try:
+            if resp.status_code >= 400:
+                return _HTTPReply(resp.status_code, await resp.aread())
+            stream.status_code = resp.status_code
+            async for line in resp.aiter_lines():
+                stream.feed(line)
+                if stream.done:
+                    break
+        except httpx.HTTPError as exc:
+            message = str(exc) or type(exc).__name__
+            raise ProviderError(f"Local LLM stream interrupted: {message}", provider="local", error_type="connection_error") from exc
+        finally:
+            await resp.aclose()
+        return _HTTPReply(resp.status_code, result=stream.result())
+
+    def _chat_flow(
+        self,
+        messages: list[dict[str, Any]],
+        *,
+        model: str | None,
+        model_kind: str,
+        temperature: float,
+        top_p: float | None,
+        repeat_penalty: float | None,
+        max_tokens: int | None,
+        json_schema: dict | None,
+        tools: list[dict] | None,
+        run_id: str | None,
+        step_id: str | None,
+        purpose: str | None,
+        timeout_s: int | None,
+        sink: _DeltaSink | None,
+    ) -> _Flow:
         model = model or (self.code_model if model_kind == "code" else self.chat_model)
         normalized_messages = _normalize_messages(messages)
         schema = _normalize_json_schema(json_schema)
@@ -206,7 +563,7 @@ class LocalLLMProvider:
         payload: dict[str, Any] = {
             "model": model,
             "messages": normalized_messages,
-            "stream": False,
+            "stream": sink is not None,
             "options": {
                 "temperature": temperature,
                 "num_ctx": self.default_num_ctx,
@@ -222,24 +579,24 @@ class LocalLLMProvider:
         if tools:
             payload["tools"] = tools
 
-        try:
-            resp = requests.post(
-                f"{self.base_url}/api/chat",
-                json=payload,
-                timeout=effective_timeout,
+        def generate() -> _Flow:
+            return self._generate_flow(
+                model=model,
+                normalized_messages=normalized_messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                run_id=run_id,
+                step_id=step_id,
+                purpose=purpose,
+                timeout_s=effective_timeout,
             )
-        except requests.RequestException as exc:
+
+        stream = _StreamReader(model, sink, time.monotonic() + effective_timeout) if sink is not None else None
+        try:
+            resp = yield _HTTPCall("/api/chat", payload, effective_timeout, stream)
+        except _TransportError as exc:
             if allow_generate_fallback:
-                return self._generate(
-                    model=model,
-                    normalized_messages=normalized_messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    run_id=run_id,
-                    step_id=step_id,
-                    purpose=purpose,
-                    timeout_s=effective_timeout,
-                )
+                return (yield from generate())
             raise ProviderError(f"Local LLM request failed: {exc}", provider="local", error_type="connection_error") from exc
 
         if resp.status_code >= 500:
@@ -271,23 +628,10 @@ class LocalLLMProvider:
                 "stream": False,
             }
             try:
-                retry_resp = requests.post(
-                    f"{self.base_url}/api/chat",
-                    json=simplified_payload,
-                    timeout=effective_timeout,
-                )
-            except requests.RequestException as exc:
+                retry_resp = yield _HTTPCall("/api/chat", simplified_payload, effective_timeout)
+            except _TransportError as exc:
                 if allow_generate_fallback:
-                    return self._generate(
-                        model=model,
-                        normalized_messages=normalized_messages,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        run_id=run_id,
-                        step_id=step_id,
-                        purpose=purpose,
-                        timeout_s=effective_timeout,
-                    )
+                    return (yield from generate())
                 raise ProviderError(
                     f"Local LLM request failed: {exc}",
                     provider="local",
@@ -296,16 +640,7 @@ class LocalLLMProvider:
                 ) from exc
             if retry_resp.status_code >= 400:
                 if retry_resp.status_code >= 500 and allow_generate_fallback:
-                    return self._generate(
-                        model=model,
-                        normalized_messages=normalized_messages,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        run_id=run_id,
-                        step_id=step_id,
-                        purpose=purpose,
-                        timeout_s=effective_timeout,
-                    )
+                    return (yield from generate())
                 error_text = _extract_error_text(retry_resp)
                 hint = _missing_model_hint(error_text)
                 retry_artifact = _write_failure_artifact(
@@ -334,16 +669,7 @@ class LocalLLMProvider:
                 data = retry_resp.json()
             except json.JSONDecodeError as exc:
                 if allow_generate_fallback:
-                    return self._generate(
-                        model=model,
-                        normalized_messages=normalized_messages,
-                        temperature=temperature,
-                        max_tokens=max_tokens,
-                        run_id=run_id,
-                        step_id=step_id,
-                        purpose=purpose,
-                        timeout_s=effective_timeout,
-                    )
+                    return (yield from generate())
                 raise ProviderError(
                     "Local LLM returned invalid JSON",
                     provider="local",
@@ -387,20 +713,14 @@ class LocalLLMProvider:
                 artifact_path=artifact_path,
             )
 
+        if resp.result is not None:
+            return resp.result
+
         try:
             data = resp.json()
         except json.JSONDecodeError as exc:
             if allow_generate_fallback:
-                return self._generate(
-                    model=model,
-                    normalized_messages=normalized_messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    run_id=run_id,
-                    step_id=step_id,
-                    purpose=purpose,
-                    timeout_s=effective_timeout,
-                )
+                return (yield from generate())
             raise ProviderError("Local LLM returned invalid JSON", provider="local", status_code=resp.status_code, error_type="invalid_json") from exc
 
         message = data.get("message") or {}
@@ -412,7 +732,7 @@ class LocalLLMProvider:
         }
         return ProviderResult(text=text, usage=usage, raw=data, model_id=model)
 
-    def _generate(
+    def _generate_flow(
         self,
         *,
         model: str,
@@ -423,7 +743,7 @@ class LocalLLMProvider:
         step_id: str | None,
         purpose: str | None,
         timeout_s: int,
-    ) -> ProviderResult:
+    ) -> _Flow:
         prompt = _messages_to_prompt(normalized_messages)
         payload: dict[str, Any] = {
             "model": model,
@@ -436,12 +756,8 @@ class LocalLLMProvider:
             },
         }
         try:
-            resp = requests.post(
-                f"{self.base_url}/api/generate",
-                json=payload,
-                timeout=timeout_s,
-            )
-        except requests.RequestException as exc:
+            resp = yield _HTTPCall("/api/generate", payload, timeout_s)
+        except _TransportError as exc:
             raise ProviderError(f"Local LLM request failed: {exc}", provider="local", error_type="connection_error") from exc
 
         if resp.status_code >= 400:
@@ -480,4 +796,3 @@ class LocalLLMProvider:
             "total_duration": data.get("total_duration"),
         }
         return ProviderResult(text=text, usage=usage, raw=data, model_id=model)
-
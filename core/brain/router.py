@@ -1,18 +1,22 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
+import itertools
 import json
 import os
 import re
 import threading
 import time
-from collections import deque
-from dataclasses import dataclass
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from typing import Any, Iterable
 
-from core.brain.providers import LocalLLMProvider, ProviderError
+from core.brain.cache import LLMResponseCache
+from core.brain.providers import LocalLLMProvider, ProviderError, compact_raw
 from core.brain.types import LLMRequest, LLMResponse
-from core.event_bus import emit
+from core.event_bus import add_run_finished_listener, emit, publish_live
 from core.llm_routing import (
     ROUTE_LOCAL,
     ContextItem,
@@ -20,6 +24,9 @@ from core.llm_routing import (
     decide_route,
 )
 
+# Сколько запусков помнит справедливая очередь BrainQueue
+_FAIR_TAGS_LIMIT = 1024
+
 
 @dataclass
 class BrainConfig:
@@ -31,13 +38,22 @@ class BrainConfig:
     local_timeout_s: int
     local_ollama_num_ctx: int
     local_ollama_num_predict: int
+    local_pool_size: int
+    local_http_retries: int
     local_fast_query_max_chars: int
     local_fast_query_max_words: int
     local_complex_query_min_chars: int
     local_complex_query_min_words: int
     max_concurrency: int
     chat_priority_extra_slots: int
+    model_slots: dict[str, int]
+    total_slots: int
+    queue_timeout_s: int
+    chat_queue_timeout_s: int
     chat_tier_timeout_s: int
+    stream_enabled: bool
+    stream_flush_ms: int
+    tracked_runs: int
     budget_per_run: int | None
     budget_per_step: int | None
 
@@ -59,6 +75,29 @@ class BrainConfig:
             value = raw.strip()
             return value or default
 
+        def _env_slots(name: str) -> dict[str, int]:
+            # "model=slots,model=slots"; имена моделей Ollama содержат ":", поэтому разделитель "="
+            slots: dict[str, int] = {}
+            for item in (os.getenv(name) or "").split(","):
+                model, sep, value = item.strip().rpartition("=")
+                if not sep or not model.strip():
+                    continue
+                try:
+                    slots[model.strip()] = max(1, int(value))
+                except ValueError:
+                    continue
+            return slots
+
+        max_concurrency = _env_int("ASTRA_LLM_MAX_CONCURRENCY", 1) or 1
+        # Пока пулы моделей не настроены явно, общий лимит равен max_concurrency —
+        # как у прежней единой очереди: разные модели не грузятся в Ollama параллельно
+        if os.getenv("ASTRA_LLM_TOTAL_SLOTS") is not None:
+            total_slots = max(0, _env_int("ASTRA_LLM_TOTAL_SLOTS", 0) or 0)
+        elif (os.getenv("ASTRA_LLM_MODEL_SLOTS") or "").strip():
+            total_slots = 0
+        else:
+            total_slots = max_concurrency
+
         return cls(
             local_base_url=os.getenv("ASTRA_LLM_LOCAL_BASE_URL", "http://127.0.0.1:11434"),
             local_chat_model=os.getenv("ASTRA_LLM_LOCAL_CHAT_MODEL", "llama2-uncensored:7b"),
@@ -71,80 +110,488 @@ class BrainConfig:
             local_timeout_s=max(1, _env_int("ASTRA_LLM_LOCAL_TIMEOUT_S", 30) or 30),
             local_ollama_num_ctx=max(1024, _env_int("ASTRA_LLM_OLLAMA_NUM_CTX", 4096) or 4096),
             local_ollama_num_predict=max(64, _env_int("ASTRA_LLM_OLLAMA_NUM_PREDICT", 256) or 256),
+            # 0 — по числу одновременных запросов очереди (max_concurrency + слоты чата) + 1
+            local_pool_size=max(0, _env_int("ASTRA_LLM_LOCAL_POOL_SIZE", 0) or 0),
+            local_http_retries=max(0, _env_int("ASTRA_LLM_LOCAL_HTTP_RETRIES", 2) or 0),
             local_fast_query_max_chars=max(20, _env_int("ASTRA_LLM_FAST_QUERY_MAX_CHARS", 120) or 120),
             local_fast_query_max_words=max(3, _env_int("ASTRA_LLM_FAST_QUERY_MAX_WORDS", 18) or 18),
             local_complex_query_min_chars=max(40, _env_int("ASTRA_LLM_COMPLEX_QUERY_MIN_CHARS", 260) or 260),
             local_complex_query_min_words=max(8, _env_int("ASTRA_LLM_COMPLEX_QUERY_MIN_WORDS", 45) or 45),
-            max_concurrency=_env_int("ASTRA_LLM_MAX_CONCURRENCY", 1) or 1,
+            max_concurrency=max_concurrency,
             chat_priority_extra_slots=max(0, _env_int("ASTRA_LLM_CHAT_PRIORITY_EXTRA_SLOTS", 1) or 0),
+            model_slots=_env_slots("ASTRA_LLM_MODEL_SLOTS"),
+            total_slots=total_slots,
+            # 0 — ждать слот без ограничения
+            queue_timeout_s=max(0, _env_int("ASTRA_LLM_QUEUE_TIMEOUT_S", 300) or 0),
+            chat_queue_timeout_s=max(0, _env_int("ASTRA_LLM_CHAT_QUEUE_TIMEOUT_S", 60) or 0),
             chat_tier_timeout_s=max(5, _env_int("ASTRA_LLM_CHAT_TIER_TIMEOUT_S", 20) or 20),
+            stream_enabled=(os.getenv("ASTRA_LLM_STREAM_ENABLED", "true").strip().lower() in {"1", "true", "yes", "on"}),
+            stream_flush_ms=max(0, _env_int("ASTRA_LLM_STREAM_FLUSH_MS", 50) or 0),
+            tracked_runs=max(1, _env_int("ASTRA_LLM_TRACKED_RUNS", 256) or 256),
             budget_per_run=_env_int("ASTRA_LLM_BUDGET_PER_RUN", None),
             budget_per_step=_env_int("ASTRA_LLM_BUDGET_PER_STEP", None),
         )
 
 
+class BrainQueueTimeout(RuntimeError):
+    """Слот модели не освободился до дедлайна запроса."""
+
+
+@dataclass(eq=False)
+class _QueueTicket:
+    """Место запроса в BrainQueue; после выдачи слота — токен для release()."""
+
+    model: str
+    is_chat: bool
+    run_key: str
+    tag: float
+    seq: int
+    depth: int
+    enqueued_at: float
+    loop: asyncio.AbstractEventLoop | None = None
+    future: asyncio.Future | None = None
+    granted_at: float | None = None
+
+    @property
+    def wait_ms(self) -> int:
+        end = self.granted_at if self.granted_at is not None else time.monotonic()
+        return int((end - self.enqueued_at) * 1000)
+
+
 class BrainQueue:
-    def __init__(self, max_concurrency: int, *, chat_priority_extra_slots: int = 0) -> None:
+    """Планировщик запросов к локальной LLM.
+
+    У каждой модели свой пул слотов (model_slots, по умолчанию max_concurrency),
+    поэтому долгий запрос к модели кода не держит быструю модель чата.
+    total_slots, если задан, ограничивает все модели вместе. Чат обслуживается
+    раньше фоновых запросов той же модели и может занять
+    chat_priority_extra_slots сверх пула. Фоновые запросы разных запусков
+    делят пул по весам (start-time fair queuing): запуск с десятком запросов
+    в очереди не задерживает запуск с одним.
+
+    Потоки ждут в acquire(), корутины — в acquire_async(); очередь общая.
+    Ожидание ограничено timeout_s — по истечении BrainQueueTimeout.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        *,
+        chat_priority_extra_slots: int = 0,
+        model_slots: dict[str, int] | None = None,
+        total_slots: int = 0,
+    ) -> None:
         self.max_concurrency = max(1, int(max_concurrency))
         self.chat_priority_extra_slots = max(0, int(chat_priority_extra_slots))
+        self.model_slots = {model: max(1, int(slots)) for model, slots in (model_slots or {}).items()}
+        self.total_slots = max(0, int(total_slots))
         self._lock = threading.Lock()
         self._condition = threading.Condition(self._lock)
-        self._chat_queue: deque[object] = deque()
-        self._default_queue: deque[object] = deque()
-        self._token_is_chat: dict[object, bool] = {}
-        self._inflight = 0
-
-    def _can_acquire(self, token: object) -> bool:
-        is_chat = self._token_is_chat.get(token, False)
-        if is_chat:
-            if not self._chat_queue or self._chat_queue[0] is not token:
-                return False
-            max_for_chat = self.max_concurrency + self.chat_priority_extra_slots
-            return self._inflight < max_for_chat
-
-        if self._chat_queue:
-            return False
-        if not self._default_queue or self._default_queue[0] is not token:
-            return False
-        return self._inflight < self.max_concurrency
+        self._waiting: list[_QueueTicket] = []
+        self._inflight: dict[str, int] = {}
+        self._total_inflight = 0
+        self._seq = itertools.count()
+        # Виртуальное время справедливой очереди и тег окончания последнего запроса каждого запуска
+        self._virtual_time = 0.0
+        self._finish_tags: dict[str, float] = {}
+        self._granted = 0
+        self._timed_out = 0
+        self._wait_ms_total = 0
+        self._wait_ms_max = 0
+
+    def slots_for(self, model: str) -> int:
+        return self.model_slots.get(model, self.max_concurrency)
 
-    def acquire(self, *, prioritize_chat: bool = False):
-        token = object()
+    def acquire(
+        self,
+        *,
+        prioritize_chat: bool = False,
+        model: str = "",
+        run_id: str | None = None,
+        weight: float = 1.0,
+        timeout_s: float | None = None,
+    ) -> _QueueTicket:
+        deadline = time.monotonic() + timeout_s if timeout_s else None
         with self._condition:
-            self._token_is_chat[token] = prioritize_chat
-            if prioritize_chat:
-                self._chat_queue.append(token)
-            else:
-                self._default_queue.append(token)
-            while not self._can_acquire(token):
-                self._condition.wait()
-            if prioritize_chat:
-                self._chat_queue.popleft()
-            else:
-                self._default_queue.popleft()
-            self._token_is_chat.pop(token, None)
-            self._inflight += 1
-        return token
+            ticket = self._enqueue(model, prioritize_chat, run_id, weight)
+            while ticket.granted_at is None:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self._drop(ticket, timed_out=True)
+                    raise BrainQueueTimeout(f"Очередь LLM: модель {model or '-'} занята дольше {timeout_s:g} с")
+                self._condition.wait(remaining)
+        return ticket
+
+    async def acquire_async(
+        self,
+        *,
+        prioritize_chat: bool = False,
+        model: str = "",
+        run_id: str | None = None,
+        weight: float = 1.0,
+        timeout_s: float | None = None,
+    ) -> _QueueTicket:
+        """acquire() для event loop: ожидание не занимает поток.
 
-    def release(self, token: object) -> None:
+        При отмене или таймауте место в очереди освобождается; слот, выданный
+        в момент отмены, возвращается.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            ticket = self._enqueue(model, prioritize_chat, run_id, weight, loop=loop, future=future)
+        try:
+            await asyncio.wait_for(future, timeout_s or None)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as exc:
+            timed_out = isinstance(exc, asyncio.TimeoutError)
+            with self._lock:
+                granted = ticket.granted_at is not None
+                if not granted:
+                    self._drop(ticket, timed_out=timed_out)
+            if granted and timed_out:
+                # Слот выдан одновременно с дедлайном — пользуемся им
+                return ticket
+            if granted:
+                self.release(ticket)
+            if timed_out:
+                raise BrainQueueTimeout(f"Очередь LLM: модель {model or '-'} занята дольше {timeout_s:g} с") from None
+            raise
+        return ticket
+
+    def release(self, token: _QueueTicket) -> None:
         with self._condition:
-            self._inflight = max(0, self._inflight - 1)
+            left = self._inflight.get(token.model, 0) - 1
+            if left > 0:
+                self._inflight[token.model] = left
+            else:
+                self._inflight.pop(token.model, None)
+            self._total_inflight = max(0, self._total_inflight - 1)
+            self._dispatch()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "waiting": len(self._waiting),
+                "inflight": dict(self._inflight),
+                "granted": self._granted,
+                "timed_out": self._timed_out,
+                "wait_ms_avg": self._wait_ms_total // self._granted if self._granted else 0,
+                "wait_ms_max": self._wait_ms_max,
+            }
+
+    def _enqueue(
+        self,
+        model: str,
+        is_chat: bool,
+        run_id: str | None,
+        weight: float,
+        *,
+        loop: asyncio.AbstractEventLoop | None = None,
+        future: asyncio.Future | None = None,
+    ) -> _QueueTicket:
+        # Вызывается под _lock
+        run_key = run_id or ""
+        tag = max(self._finish_tags.get(run_key, 0.0), self._virtual_time)
+        if not is_chat:
+            self._finish_tags[run_key] = tag + 1.0 / max(0.01, float(weight))
+            if len(self._finish_tags) > _FAIR_TAGS_LIMIT:
+                # Тег не старше виртуального времени ничего не меняет — такие запуски забываются
+                self._finish_tags = {key: value for key, value in self._finish_tags.items() if value > self._virtual_time}
+        ticket = _QueueTicket(
+            model=model,
+            is_chat=is_chat,
+            run_key=run_key,
+            tag=tag,
+            seq=next(self._seq),
+            depth=sum(1 for waiting in self._waiting if waiting.model == model),
+            enqueued_at=time.monotonic(),
+            loop=loop,
+            future=future,
+        )
+        self._waiting.append(ticket)
+        self._dispatch()
+        return ticket
+
+    def _drop(self, ticket: _QueueTicket, *, timed_out: bool) -> None:
+        # Вызывается под _lock: ожидающий ушёл, не получив слот
+        self._waiting.remove(ticket)
+        if timed_out:
+            self._timed_out += 1
+        # Ушедший чат мог блокировать фоновые запросы своей модели
+        self._dispatch()
+
+    def _has_slot(self, ticket: _QueueTicket) -> bool:
+        extra = self.chat_priority_extra_slots if ticket.is_chat else 0
+        if self._inflight.get(ticket.model, 0) >= self.slots_for(ticket.model) + extra:
+            return False
+        return not self.total_slots or self._total_inflight < self.total_slots + extra
+
+    def _next(self) -> _QueueTicket | None:
+        chat_models: set[str] = set()
+        for ticket in self._waiting:
+            if ticket.is_chat:
+                # Чат — в порядке поступления
+                if self._has_slot(ticket):
+                    return ticket
+                chat_models.add(ticket.model)
+        best: _QueueTicket | None = None
+        for ticket in self._waiting:
+            if ticket.is_chat or not self._has_slot(ticket):
+                continue
+            # Ждущий чат придерживает свою модель (а при общем лимите — все)
+            if ticket.model in chat_models or (self.total_slots and chat_models):
+                continue
+            if best is None or (ticket.tag, ticket.seq) < (best.tag, best.seq):
+                best = ticket
+        return best
+
+    def _dispatch(self) -> None:
+        """Выдаёт свободные слоты ожидающим. Вызывается под _lock после каждого
+        изменения очереди или числа занятых слотов."""
+        granted = False
+        while True:
+            ticket = self._next()
+            if ticket is None:
+                break
+            self._waiting.remove(ticket)
+            self._inflight[ticket.model] = self._inflight.get(ticket.model, 0) + 1
+            self._total_inflight += 1
+            ticket.granted_at = time.monotonic()
+            if ticket.future is not None:
+                try:
+                    ticket.loop.call_soon_threadsafe(_resolve_waiter, ticket.future)
+                except RuntimeError:
+                    # Event loop ожидающего уже закрыт — слот не занят
+                    self._inflight[ticket.model] -= 1
+                    if not self._inflight[ticket.model]:
+                        del self._inflight[ticket.model]
+                    self._total_inflight -= 1
+                    continue
+            if not ticket.is_chat:
+                self._virtual_time = max(self._virtual_time, ticket.tag)
+            wait_ms = ticket.wait_ms
+            self._granted += 1
+            self._wait_ms_total += wait_ms
+            self._wait_ms_max = max(self._wait_ms_max, wait_ms)
+            granted = True
+        if granted:
             self._condition.notify_all()
 
 
+def _resolve_waiter(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+@dataclass
+class _RunState:
+    """Счётчики роутера для одного запуска: бюджет вызовов и неудачи локальной модели."""
+
+    calls: int = 0
+    step_calls: dict[str, int] = field(default_factory=dict)
+    local_failures: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class _PreparedCall:
+    """Вызов LLM после маршрутизации, кэша и бюджета — общий для call() и acall()."""
+
+    request: LLMRequest
+    run_id: str | None
+    task_id: str | None
+    step_id: str | None
+    route: str
+    route_reason: str
+    provider_name: str
+    model_id: str
+    messages: list[dict[str, Any]]
+    cache_key: str
+
+    @property
+    def prioritize_chat(self) -> bool:
+        return self.request.purpose == "chat_response" and self.request.preferred_model_kind == "chat"
+
+
+class _DeltaEmitter:
+    """Склеивает токены потока в живые события chat_response_delta.
+
+    Первый токен уходит сразу (это и есть TTFT для клиента), дальше — не чаще
+    раза в flush_s. Клиент дописывает delta к тексту потока stream_id;
+    offset=0 означает начало ответа (в том числе заново после фолбэка модели).
+    Дельты идут только в хаб SSE, в БД остаётся итоговый chat_response_generated.
+    """
+
+    def __init__(self, run_id: str, *, model_id: str, flush_s: float, task_id: str | None, step_id: str | None) -> None:
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.model_id = model_id
+        self.first_token_at: float | None = None
+        self.events = 0
+        self._run_id = run_id
+        self._flush_s = flush_s
+        self._task_id = task_id
+        self._step_id = step_id
+        self._buffer: list[str] = []
+        self._offset = 0
+        self._last_flush = 0.0
+
+    def __call__(self, piece: str) -> None:
+        if not piece:
+            return
+        self._buffer.append(piece)
+        now = time.time()
+        if self.first_token_at is None:
+            self.first_token_at = now
+            self.flush()
+        elif now - self._last_flush >= self._flush_s:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        delta = "".join(self._buffer)
+        self._buffer.clear()
+        publish_live(
+            self._run_id,
+            "chat_response_delta",
+            "LLM response delta",
+            {"stream_id": self.stream_id, "model_id": self.model_id, "offset": self._offset, "delta": delta},
+            task_id=self._task_id,
+            step_id=self._step_id,
+        )
+        self._offset += len(delta)
+        self._last_flush = time.time()
+        self.events += 1
+
+    def restart(self, model_id: str) -> None:
+        """Ответ генерируется заново другой моделью: недоставленный хвост отбрасывается."""
+        self._buffer.clear()
+        self._offset = 0
+        self.model_id = model_id
+
+
 class BrainRouter:
     def __init__(self, config: BrainConfig | None = None) -> None:
         self.config = config or BrainConfig.from_env()
         self.queue = BrainQueue(
             self.config.max_concurrency,
             chat_priority_extra_slots=self.config.chat_priority_extra_slots,
+            model_slots=self.config.model_slots,
+            total_slots=self.config.total_slots,
         )
-        self._cache: dict[str, dict[str, LLMResponse]] = {}
-        self._run_counts: dict[str, int] = {}
-        self._step_counts: dict[tuple[str, str], int] = {}
-        self._local_failures: dict[tuple[str, str], int] = {}
+        self._cache = LLMResponseCache.from_env()
+        # Состояние запусков: освобождается по run_done/run_failed/run_canceled,
+        # а сверх tracked_runs вытесняется давно не обращавшийся запуск
+        self._runs: OrderedDict[str, _RunState] = OrderedDict()
+        self._state_lock = threading.Lock()
+        self._evicted_runs = 0
+        self._local_provider: LocalLLMProvider | None = None
+        self._provider_lock = threading.Lock()
+
+    def local_provider(self) -> LocalLLMProvider:
+        """Долгоживущий провайдер Ollama с пулом keep-alive соединений (создаётся при первом вызове)."""
+        with self._provider_lock:
+            if self._local_provider is None:
+                pool_size = self.config.local_pool_size or (
+                    self.queue.max_concurrency + self.queue.chat_priority_extra_slots + 1
+                )
+                self._local_provider = LocalLLMProvider(
+                    self.config.local_base_url,
+                    self.config.local_chat_model,
+                    self.config.local_code_model,
+                    timeout_s=self.config.local_timeout_s,
+                    default_num_ctx=self.config.local_ollama_num_ctx,
+                    default_num_predict=self.config.local_ollama_num_predict,
+                    pool_size=pool_size,
+                    connect_retries=self.config.local_http_retries,
+                )
+            return self._local_provider
+
+    def release_run(self, run_id: str) -> None:
+        """Забывает счётчики завершённого запуска."""
+        with self._state_lock:
+            self._runs.pop(run_id, None)
+
+    def state_stats(self) -> dict:
+        with self._state_lock:
+            return {"tracked_runs": len(self._runs), "evicted_runs": self._evicted_runs}
+
+    def _run_state(self, run_id: str) -> _RunState:
+        # Вызывается под _state_lock
+        state = self._runs.get(run_id)
+        if state is not None:
+            self._runs.move_to_end(run_id)
+            return state
+        state = self._runs[run_id] = _RunState()
+        while len(self._runs) > self.config.tracked_runs:
+            self._runs.popitem(last=False)
+            self._evicted_runs += 1
+        return state
+
+    def close(self) -> None:
+        with self._provider_lock:
+            provider, self._local_provider = self._local_provider, None
+        if provider is not None and hasattr(provider, "close"):
+            provider.close()
+
+    async def aclose(self) -> None:
+        with self._provider_lock:
+            provider, self._local_provider = self._local_provider, None
+        if provider is not None and hasattr(provider, "aclose"):
+            await provider.aclose()
 
     def call(self, request: LLMRequest, ctx=None) -> LLMResponse:
+        prepared = self._prepare(request, ctx)
+        if isinstance(prepared, LLMResponse):
+            return prepared
+        try:
+            token = self.queue.acquire(**self._queue_kwargs(prepared))
+        except BrainQueueTimeout as exc:
+            return self._queue_timeout_response(prepared, exc)
+        start = time.time()
+        try:
+            emitter = self._start(prepared, token)
+            if emitter is None:
+                result = self._call_local(prepared.messages, request, prepared.model_id)
+            else:
+                result = self._call_local(prepared.messages, request, prepared.model_id, on_delta=emitter)
+            return self._finish(prepared, result, start, emitter)
+        except ProviderError as exc:
+            self._fail(prepared, exc)
+            raise
+        finally:
+            self.queue.release(token)
+
+    async def acall(self, request: LLMRequest, ctx=None) -> LLMResponse:
+        """call() для async-маршрутов: ожидание очереди и ответа Ollama не занимает поток.
+
+        Очередь, кэш, бюджет и события те же, что у call(); потоки RunEngine
+        продолжают вызывать call(). Шаги с SQLite (кэш, бюджет, emit и запись
+        chat_turns) идут в пуле потоков, чтобы не блокировать event loop;
+        живые дельты публикуются только в хаб и остаются в loop.
+        """
+        prepared = await asyncio.to_thread(self._prepare, request, ctx)
+        if isinstance(prepared, LLMResponse):
+            return prepared
+        try:
+            token = await self.queue.acquire_async(**self._queue_kwargs(prepared))
+        except BrainQueueTimeout as exc:
+            return await asyncio.to_thread(self._queue_timeout_response, prepared, exc)
+        start = time.time()
+        try:
+            emitter = await asyncio.to_thread(self._start, prepared, token)
+            if emitter is None:
+                result = await self._acall_local(prepared.messages, request, prepared.model_id)
+            else:
+                result = await self._acall_local(prepared.messages, request, prepared.model_id, on_delta=emitter)
+            return await asyncio.to_thread(self._finish, prepared, result, start, emitter)
+        except ProviderError as exc:
+            await asyncio.to_thread(self._fail, prepared, exc)
+            raise
+        finally:
+            self.queue.release(token)
+
+    def _prepare(self, request: LLMRequest, ctx) -> _PreparedCall | LLMResponse:
+        """Маршрут, кэш и бюджет до постановки в очередь; LLMResponse — если модель не нужна."""
         run_id = request.run_id or (ctx.run.get("id") if ctx else None)
         task_id = request.task_id or (ctx.task.get("id") if ctx else None)
         step_id = request.step_id or (ctx.plan_step.get("id") if ctx else None)
@@ -233,7 +680,7 @@ class BrainRouter:
 
         messages = self._build_messages(request, final_items)
         cache_key = self._cache_key(route, model_id, request, messages)
-        cached = self._cache_get(run_id, cache_key)
+        cached = self._cache.get(cache_key, request)
         if cached:
             self._emit(
                 run_id,
@@ -253,6 +700,7 @@ class BrainRouter:
                     "latency_ms": 0,
                     "usage_if_available": cached.usage,
                     "cache_hit": True,
+                    "cache_stats": self._cache.stats(),
                 },
                 task_id=task_id,
                 step_id=step_id,
@@ -287,140 +735,232 @@ class BrainRouter:
                     error_type="budget_exceeded",
                 )
 
-        prioritize_chat = request.purpose == "chat_response" and request.preferred_model_kind == "chat"
-        token = self.queue.acquire(prioritize_chat=prioritize_chat)
-        start = time.time()
-        try:
-            self._emit(
-                run_id,
-                "llm_request_started",
-                "LLM request started",
-                {"provider": provider_name, "model_id": model_id},
-                task_id=task_id,
-                step_id=step_id,
-            )
+        return _PreparedCall(
+            request=request,
+            run_id=run_id,
+            task_id=task_id,
+            step_id=step_id,
+            route=route,
+            route_reason=route_reason,
+            provider_name=provider_name,
+            model_id=model_id,
+            messages=messages,
+            cache_key=cache_key,
+        )
 
-            result = self._call_local(messages, request, model_id)
-            response = LLMResponse(
-                text=result.text,
-                usage=result.usage,
-                provider="local",
-                model_id=result.model_id or model_id,
-                latency_ms=int((time.time() - start) * 1000),
-                cache_hit=False,
-                route_reason=route_reason,
-                raw=result.raw,
-            )
-            self._note_local_result(run_id, request.preferred_model_kind, response)
+    def _queue_kwargs(self, prepared: _PreparedCall) -> dict[str, Any]:
+        request = prepared.request
+        timeout_s = request.queue_timeout_s
+        if timeout_s is None:
+            timeout_s = self.config.chat_queue_timeout_s if prepared.prioritize_chat else self.config.queue_timeout_s
+        return {
+            "prioritize_chat": prepared.prioritize_chat,
+            "model": prepared.model_id,
+            "run_id": prepared.run_id,
+            "weight": request.queue_weight,
+            "timeout_s": timeout_s or None,
+        }
 
-            self._emit(
-                run_id,
-                "llm_request_succeeded",
-                "LLM request succeeded",
-                {
-                    "provider": response.provider,
-                    "model_id": response.model_id,
-                    "latency_ms": response.latency_ms,
-                    "usage_if_available": response.usage,
-                    "cache_hit": response.cache_hit,
-                },
-                task_id=task_id,
-                step_id=step_id,
-            )
+    def _queue_timeout_response(self, prepared: _PreparedCall, exc: BrainQueueTimeout) -> LLMResponse:
+        """Дедлайн очереди истёк: как и при исчерпании бюджета, вызывающий получает
+        ответ со статусом ошибки и деградирует сам, а не ждёт слот бесконечно."""
+        self._emit(
+            prepared.run_id,
+            "llm_request_failed",
+            "LLM request failed",
+            {
+                "provider": prepared.provider_name,
+                "model_id": prepared.model_id,
+                "error_type": "queue_timeout",
+                "http_status_if_any": None,
+                "retry_count": 0,
+            },
+            task_id=prepared.task_id,
+            step_id=prepared.step_id,
+        )
+        return LLMResponse(
+            text="",
+            usage=None,
+            provider=prepared.provider_name,
+            model_id=prepared.model_id,
+            latency_ms=0,
+            cache_hit=False,
+            route_reason=prepared.route_reason,
+            status="queue_timeout",
+            error_type="queue_timeout",
+        )
 
-            self._cache_set(run_id, cache_key, response)
-            self._increment_budget(run_id, step_id)
-            return response
-        except ProviderError as exc:
+    def _start(self, prepared: _PreparedCall, token: _QueueTicket) -> _DeltaEmitter | None:
+        """Слот очереди получен: событие старта и, для потокового чата, эмиттер дельт."""
+        self._emit(
+            prepared.run_id,
+            "llm_request_started",
+            "LLM request started",
+            {
+                "provider": prepared.provider_name,
+                "model_id": prepared.model_id,
+                "queue_wait_ms": token.wait_ms,
+                "queue_depth": token.depth,
+            },
+            task_id=prepared.task_id,
+            step_id=prepared.step_id,
+        )
+        if not (prepared.request.stream and prepared.run_id and self.config.stream_enabled):
+            return None
+        return _DeltaEmitter(
+            prepared.run_id,
+            model_id=prepared.model_id,
+            flush_s=self.config.stream_flush_ms / 1000,
+            task_id=prepared.task_id,
+            step_id=prepared.step_id,
+        )
+
+    def _finish(self, prepared: _PreparedCall, result: Any, start: float, emitter: _DeltaEmitter | None) -> LLMResponse:
+        request, run_id, step_id = prepared.request, prepared.run_id, prepared.step_id
+        ttft_ms = None
+        if emitter is not None:
+            emitter.flush()
+            if emitter.first_token_at is not None:
+                ttft_ms = int((emitter.first_token_at - start) * 1000)
+        response = LLMResponse(
+            text=result.text,
+            usage=result.usage,
+            provider="local",
+            model_id=result.model_id or prepared.model_id,
+            latency_ms=int((time.time() - start) * 1000),
+            cache_hit=False,
+            route_reason=prepared.route_reason,
+            raw=compact_raw(result.raw),
+            ttft_ms=ttft_ms,
+        )
+        self._note_local_result(run_id, request.preferred_model_kind, response)
+
+        self._cache.put(prepared.cache_key, request, response)
+        self._emit(
+            run_id,
+            "llm_request_succeeded",
+            "LLM request succeeded",
+            {
+                "provider": response.provider,
+                "model_id": response.model_id,
+                "latency_ms": response.latency_ms,
+                "ttft_ms": response.ttft_ms,
+                "usage_if_available": response.usage,
+                "cache_hit": response.cache_hit,
+                "cache_stats": self._cache.stats(),
+            },
+            task_id=prepared.task_id,
+            step_id=step_id,
+        )
+
+        self._increment_budget(run_id, step_id)
+        return response
+
+    def _fail(self, prepared: _PreparedCall, exc: ProviderError) -> None:
+        run_id, model_id = prepared.run_id, prepared.model_id
+        self._emit(
+            run_id,
+            "llm_request_failed",
+            "LLM request failed",
+            {
+                "provider": exc.provider,
+                "model_id": model_id,
+                "error_type": exc.error_type,
+                "http_status_if_any": exc.status_code,
+                "retry_count": getattr(exc, "retry_count", 0),
+            },
+            task_id=prepared.task_id,
+            step_id=prepared.step_id,
+        )
+        if exc.provider == "local" and exc.artifact_path:
             self._emit(
                 run_id,
-                "llm_request_failed",
-                "LLM request failed",
+                "local_llm_http_error",
+                "Local LLM HTTP error",
                 {
-                    "provider": exc.provider,
+                    "status": exc.status_code,
                     "model_id": model_id,
-                    "error_type": exc.error_type,
-                    "http_status_if_any": exc.status_code,
-                    "retry_count": getattr(exc, "retry_count", 0),
+                    "artifact_path": exc.artifact_path,
                 },
-                task_id=task_id,
-                step_id=step_id,
+                task_id=prepared.task_id,
+                step_id=prepared.step_id,
             )
-            if exc.provider == "local" and exc.artifact_path:
-                self._emit(
-                    run_id,
-                    "local_llm_http_error",
-                    "Local LLM HTTP error",
-                    {
-                        "status": exc.status_code,
-                        "model_id": model_id,
-                        "artifact_path": exc.artifact_path,
-                    },
-                    task_id=task_id,
-                    step_id=step_id,
-                )
-            if route == ROUTE_LOCAL:
-                self._note_local_failure(run_id, request.preferred_model_kind)
-            raise
-        finally:
-            self.queue.release(token)
+        if prepared.route == ROUTE_LOCAL:
+            self._note_local_failure(run_id, prepared.request.preferred_model_kind)
 
-    def _call_local(self, messages: list[dict[str, Any]], request: LLMRequest, model_id: str) -> Any:
-        provider = LocalLLMProvider(
-            self.config.local_base_url,
-            self.config.local_chat_model,
-            self.config.local_code_model,
-            timeout_s=self.config.local_timeout_s,
-            default_num_ctx=self.config.local_ollama_num_ctx,
-            default_num_predict=self.config.local_ollama_num_predict,
-        )
-        timeout_override: int | None = None
+    def _call_local(
+        self,
+        messages: list[dict[str, Any]],
+        request: LLMRequest,
+        model_id: str,
+        *,
+        on_delta: _DeltaEmitter | None = None,
+    ) -> Any:
+        provider = self.local_provider()
+        try:
+            return provider.chat(messages, **self._chat_kwargs(request, model_id, self._tier_timeout(request, model_id), on_delta))
+        except ProviderError as exc:
+            fallback_timeout_s = self._tier_fallback_timeout(request, model_id, exc)
+            if fallback_timeout_s is None:
+                raise
+            if on_delta is not None:
+                on_delta.restart(self.config.local_chat_model)
+            return provider.chat(messages, **self._chat_kwargs(request, self.config.local_chat_model, fallback_timeout_s, on_delta))
+
+    async def _acall_local(
+        self,
+        messages: list[dict[str, Any]],
+        request: LLMRequest,
+        model_id: str,
+        *,
+        on_delta: _DeltaEmitter | None = None,
+    ) -> Any:
+        provider = self.local_provider()
+        try:
+            return await provider.achat(messages, **self._chat_kwargs(request, model_id, self._tier_timeout(request, model_id), on_delta))
+        except ProviderError as exc:
+            fallback_timeout_s = self._tier_fallback_timeout(request, model_id, exc)
+            if fallback_timeout_s is None:
+                raise
+            if on_delta is not None:
+                on_delta.restart(self.config.local_chat_model)
+            return await provider.achat(messages, **self._chat_kwargs(request, self.config.local_chat_model, fallback_timeout_s, on_delta))
+
+    def _chat_kwargs(self, request: LLMRequest, model_id: str, timeout_s: int | None, on_delta: _DeltaEmitter | None) -> dict[str, Any]:
+        return {
+            "model": model_id,
+            "model_kind": request.preferred_model_kind,
+            "temperature": request.temperature,
+            "top_p": request.top_p,
+            "repeat_penalty": request.repeat_penalty,
+            "max_tokens": request.max_tokens,
+            "json_schema": request.json_schema,
+            "tools": request.tools,
+            "run_id": request.run_id,
+            "step_id": request.step_id,
+            "purpose": request.purpose,
+            "timeout_s": timeout_s,
+            "on_delta": on_delta,
+        }
+
+    def _tier_timeout(self, request: LLMRequest, model_id: str) -> int | None:
         if (
             request.preferred_model_kind == "chat"
             and request.purpose == "chat_response"
             and model_id != self.config.local_chat_model
         ):
-            timeout_override = max(5, min(self.config.local_timeout_s, self.config.chat_tier_timeout_s))
-        try:
-            return provider.chat(
-                messages,
-                model=model_id,
-                model_kind=request.preferred_model_kind,
-                temperature=request.temperature,
-                top_p=request.top_p,
-                repeat_penalty=request.repeat_penalty,
-                max_tokens=request.max_tokens,
-                json_schema=request.json_schema,
-                tools=request.tools,
-                run_id=request.run_id,
-                step_id=request.step_id,
-                purpose=request.purpose,
-                timeout_s=timeout_override,
-            )
-        except ProviderError as exc:
-            # Tiered chat model can be absent/unstable locally; fall back to base chat model.
-            if (
-                request.preferred_model_kind == "chat"
-                and model_id != self.config.local_chat_model
-                and exc.error_type in {"model_not_found", "connection_error", "http_error", "invalid_json"}
-            ):
-                fallback_timeout_s = max(5, min(self.config.local_timeout_s, max(self.config.chat_tier_timeout_s, 35)))
-                return provider.chat(
-                    messages,
-                    model=self.config.local_chat_model,
-                    model_kind=request.preferred_model_kind,
-                    temperature=request.temperature,
-                    top_p=request.top_p,
-                    repeat_penalty=request.repeat_penalty,
-                    max_tokens=request.max_tokens,
-                    json_schema=request.json_schema,
-                    tools=request.tools,
-                    run_id=request.run_id,
-                    step_id=request.step_id,
-                    purpose=request.purpose,
-                    timeout_s=fallback_timeout_s,
-                )
-            raise
+            return max(5, min(self.config.local_timeout_s, self.config.chat_tier_timeout_s))
+        return None
+
+    def _tier_fallback_timeout(self, request: LLMRequest, model_id: str, exc: ProviderError) -> int | None:
+        # Tiered chat model can be absent/unstable locally; fall back to base chat model.
+        if (
+            request.preferred_model_kind == "chat"
+            and model_id != self.config.local_chat_model
+            and exc.error_type in {"model_not_found", "connection_error", "http_error", "invalid_json"}
+        ):
+            return max(5, min(self.config.local_timeout_s, max(self.config.chat_tier_timeout_s, 35)))
+        return None
 
     def _make_response(
         self,
@@ -555,39 +1095,15 @@ class BrainRouter:
         raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
         return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-    def _cache_get(self, run_id: str | None, key: str) -> LLMResponse | None:
-        if not run_id:
-            return None
-        cached = self._cache.get(run_id, {}).get(key)
-        if not cached:
-            return None
-        return LLMResponse(
-            text=cached.text,
-            usage=cached.usage,
-            provider=cached.provider,
-            model_id=cached.model_id,
-            latency_ms=0,
-            cache_hit=True,
-            route_reason=cached.route_reason,
-            status=cached.status,
-            error_type=cached.error_type,
-            http_status=cached.http_status,
-            retry_count=cached.retry_count,
-            raw=cached.raw,
-        )
-
-    def _cache_set(self, run_id: str | None, key: str, response: LLMResponse) -> None:
-        if not run_id:
-            return
-        self._cache.setdefault(run_id, {})[key] = response
-
     def _check_budget(self, run_id: str, step_id: str | None) -> tuple[str, int, int] | None:
+        with self._state_lock:
+            state = self._runs.get(run_id)
+            current_run = state.calls if state else 0
+            current_step = state.step_calls.get(step_id, 0) if state and step_id else 0
         if self.config.budget_per_run is not None:
-            current_run = self._run_counts.get(run_id, 0)
             if current_run >= self.config.budget_per_run:
                 return ("per_run", self.config.budget_per_run, current_run)
         if step_id and self.config.budget_per_step is not None:
-            current_step = self._step_counts.get((run_id, step_id), 0)
             if current_step >= self.config.budget_per_step:
                 return ("per_step", self.config.budget_per_step, current_step)
         return None
@@ -595,21 +1111,21 @@ class BrainRouter:
     def _increment_budget(self, run_id: str | None, step_id: str | None) -> None:
         if not run_id:
             return
-        self._run_counts[run_id] = self._run_counts.get(run_id, 0) + 1
-        if step_id:
-            key = (run_id, step_id)
-            self._step_counts[key] = self._step_counts.get(key, 0) + 1
+        with self._state_lock:
+            state = self._run_state(run_id)
+            state.calls += 1
+            if step_id:
+                state.step_calls[step_id] = state.step_calls.get(step_id, 0) + 1
 
     def _note_local_failure(self, run_id: str | None, kind: str) -> None:
-        key = (run_id or "", kind)
-        self._local_failures[key] = self._local_failures.get(key, 0) + 1
+        with self._state_lock:
+            failures = self._run_state(run_id or "").local_failures
+            failures[kind] = failures.get(kind, 0) + 1
 
     def _note_local_result(self, run_id: str | None, kind: str, response: LLMResponse) -> None:
-        key = (run_id or "", kind)
-        if not response.text.strip():
-            self._local_failures[key] = self._local_failures.get(key, 0) + 1
-        else:
-            self._local_failures[key] = 0
+        with self._state_lock:
+            failures = self._run_state(run_id or "").local_failures
+            failures[kind] = 0 if response.text.strip() else failures.get(kind, 0) + 1
 
     def _emit(self, run_id: str | None, event_type: str, message: str, payload: dict[str, Any], *, task_id: str | None, step_id: str | None) -> None:
         if not run_id:
@@ -640,4 +1156,5 @@ def get_brain() -> BrainRouter:
     global _BRAIN_SINGLETON
     if _BRAIN_SINGLETON is None:
         _BRAIN_SINGLETON = BrainRouter()
+        add_run_finished_listener(_BRAIN_SINGLETON.release_run)
     return _BRAIN_SINGLETON
@@ -24,6 +24,12 @@ class LLMRequest:
     task_id: str | None = None
     step_id: str | None = None
     metadata: dict[str, Any] = field(default_factory=dict)
+    # Транслировать токены ответа событиями chat_response_delta (нужен run_id)
+    stream: bool = False
+    # Доля запуска в справедливой очереди BrainQueue относительно других запусков
+    queue_weight: float = 1.0
+    # Сколько ждать слот модели; None — по настройкам роутера, 0 — без ограничения
+    queue_timeout_s: float | None = None
 
 
 @dataclass
@@ -40,3 +46,5 @@ class LLMResponse:
     http_status: int | None = None
     retry_count: int = 0
     raw: dict | None = None
+    # Время до первого токена потокового ответа, мс
+    ttft_ms: int | None = None
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import logging
+import threading
+import time
+import uuid
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
+from core.event_hub import get_event_hub
 from memory import store
 
+_LOG = logging.getLogger(__name__)
+
 _DEFAULT_EVENT_TYPES = {
     "run_created",
     "plan_created",
@@ -41,6 +48,7 @@ _DEFAULT_EVENT_TYPES = {
     "autopilot_action",
     "intent_decided",
     "clarify_requested",
+    "chat_response_delta",
     "chat_response_generated",
 }
 
@@ -65,10 +73,60 @@ def get_allowed_event_types() -> set[str]:
     return set(ALLOWED_EVENT_TYPES)
 
 
-def emit(run_id: str, event_type: str, message: str, payload: dict | None = None, level: str = "info", task_id: Optional[str] = None, step_id: Optional[str] = None) -> dict:
+RUN_FINISHED_EVENT_TYPES = frozenset({"run_done", "run_failed", "run_canceled"})
+
+# Живые события: только in-process хаб (SSE), без записи в events.
+# Итог хранится отдельным событием (chat_response_delta -> chat_response_generated).
+LIVE_EVENT_TYPES = frozenset({"chat_response_delta"})
+
+_run_finished_listeners: list[Callable[[str], None]] = []
+_listeners_lock = threading.Lock()
+
+
+def add_run_finished_listener(callback: Callable[[str], None]) -> None:
+    """callback(run_id) после события завершения запуска (RUN_FINISHED_EVENT_TYPES)."""
+    with _listeners_lock:
+        if callback not in _run_finished_listeners:
+            _run_finished_listeners.append(callback)
+
+
+def remove_run_finished_listener(callback: Callable[[str], None]) -> None:
+    with _listeners_lock:
+        if callback in _run_finished_listeners:
+            _run_finished_listeners.remove(callback)
+
+
+def _notify_run_finished(run_id: str) -> None:
+    with _listeners_lock:
+        listeners = list(_run_finished_listeners)
+    for callback in listeners:
+        try:
+            callback(run_id)
+        except Exception:  # noqa: BLE001
+            _LOG.exception("run finished listener failed for %s", run_id)
+
+
+def emit(
+    run_id: str,
+    event_type: str,
+    message: str,
+    payload: dict | None = None,
+    level: str = "info",
+    task_id: Optional[str] = None,
+    step_id: Optional[str] = None,
+    *,
+    durable: bool | None = None,
+) -> dict:
+    """Сохраняет событие и раздаёт его подписчикам SSE.
+
+    durable=True ждёт коммита события; по умолчанию синхронно пишутся только
+    store.DURABLE_EVENT_TYPES, остальные уходят в group commit. Внутри
+    store.transaction() запись, публикация и слушатели завершения запуска
+    откладываются до коммита (event["seq"] появится тогда же).
+    """
     if event_type not in ALLOWED_EVENT_TYPES:
         raise ValueError(f"Неподдерживаемый тип события: {event_type}")
-    return store.add_event(
+    event = store.add_event(
         run_id=run_id,
         event_type=event_type,
         level=level,
@@ -76,4 +134,41 @@ def emit(run_id: str, event_type: str, message: str, payload: dict | None = None
         payload=payload or {},
         task_id=task_id,
         step_id=step_id,
+        durable=durable,
+        publish=get_event_hub().publish,
     )
+    if event_type in RUN_FINISHED_EVENT_TYPES:
+        store.after_commit(lambda: _notify_run_finished(run_id))
+    return event
+
+
+def publish_live(
+    run_id: str,
+    event_type: str,
+    message: str,
+    payload: dict | None = None,
+    level: str = "info",
+    task_id: Optional[str] = None,
+    step_id: Optional[str] = None,
+) -> dict:
+    """Раздаёт событие подписчикам SSE, не сохраняя его (seq=None).
+
+    Такие события не попадают ни в БД, ни в догон по Last-Event-ID: клиент,
+    подключившийся позже, увидит только итоговое сохранённое событие.
+    """
+    if event_type not in LIVE_EVENT_TYPES:
+        raise ValueError(f"Событие не может быть живым: {event_type}")
+    event = {
+        "id": str(uuid.uuid4()),
+        "seq": None,
+        "run_id": run_id,
+        "ts": int(time.time() * 1000),
+        "type": event_type,
+        "level": level,
+        "message": message,
+        "payload": payload or {},
+        "task_id": task_id,
+        "step_id": step_id,
+    }
+    get_event_hub().publish(event)
+    return event
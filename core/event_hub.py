@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import deque
+from typing import Optional
+
+# EN kept: размер буфера подписчика; при переполнении подписчик догоняет из БД
+DEFAULT_MAX_PENDING = 1000
+
+
+class EventSubscription:
+    """Подписка SSE-клиента на события одного запуска.
+
+    Публикация идёт из любых потоков (RunEngine, планировщик напоминаний),
+    ожидание — в event loop клиента через asyncio.Event.
+    """
+
+    def __init__(self, hub: "EventHub", run_id: str, loop: asyncio.AbstractEventLoop, last_seq: int, max_pending: int) -> None:
+        self.hub = hub
+        self.run_id = run_id
+        self.last_seq = last_seq
+        self.max_pending = max(1, int(max_pending))
+        self.overflows = 0
+        self.delivered = 0
+        self._loop = loop
+        self._ready = asyncio.Event()
+        self._pending: deque[dict] = deque()
+        self._overflowed = False
+        self._closed = False
+
+    def _push(self, event: dict) -> bool:
+        # Вызывается под замком хаба
+        if self._closed:
+            return False
+        if len(self._pending) >= self.max_pending:
+            self._pending.clear()
+            self._overflowed = True
+            self.overflows += 1
+        else:
+            self._pending.append(event)
+        try:
+            self._loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # event loop клиента уже закрыт
+            self._closed = True
+            return False
+        return True
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def wait(self, timeout: float | None = None) -> bool:
+        """Ждёт новых событий; возвращает False по таймауту."""
+        if self._pending or self._overflowed:
+            return True
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def drain(self) -> tuple[list[dict], bool]:
+        """Забирает накопленные события и флаг переполнения (нужен догон из БД)."""
+        self._ready.clear()
+        with self.hub._lock:
+            # seq=None у живых событий (не сохраняются): их отдаём всегда
+            events = [event for event in self._pending if event.get("seq") is None or int(event["seq"]) > self.last_seq]
+            self._pending.clear()
+            overflowed = self._overflowed
+            self._overflowed = False
+        return events, overflowed
+
+    def mark_delivered(self, seq: int) -> None:
+        if seq > self.last_seq:
+            self.last_seq = seq
+        self.delivered += 1
+
+    def close(self) -> None:
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """In-process pub/sub для событий запусков (питается из core.event_bus.emit)."""
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set[EventSubscription]] = {}
+        self._latest_seq: dict[str, int] = {}
+        self._published = 0
+
+    def subscribe(self, run_id: str, *, last_seq: int = 0, loop: asyncio.AbstractEventLoop | None = None) -> EventSubscription:
+        loop = loop or asyncio.get_running_loop()
+        subscription = EventSubscription(self, run_id, loop, last_seq, self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(run_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription) -> None:
+        with self._lock:
+            subscription._closed = True
+            subs = self._subscribers.get(subscription.run_id)
+            if not subs:
+                return
+            subs.discard(subscription)
+            if not subs:
+                self._subscribers.pop(subscription.run_id, None)
+                self._latest_seq.pop(subscription.run_id, None)
+
+    def publish(self, event: dict) -> int:
+        """Раздаёт событие подписчикам запуска; возвращает число получателей."""
+        run_id = event.get("run_id")
+        if not run_id:
+            return 0
+        delivered = 0
+        with self._lock:
+            self._published += 1
+            subs = self._subscribers.get(run_id)
+            if not subs:
+                return 0
+            seq = int(event.get("seq") or 0)
+            if seq > self._latest_seq.get(run_id, 0):
+                self._latest_seq[run_id] = seq
+            dead: list[EventSubscription] = []
+            for subscription in subs:
+                if subscription._push(event):
+                    delivered += 1
+                else:
+                    dead.append(subscription)
+            for subscription in dead:
+                subs.discard(subscription)
+            if not subs:
+                self._subscribers.pop(run_id, None)
+                self._latest_seq.pop(run_id, None)
+        return delivered
+
+    def subscriber_count(self, run_id: str | None = None) -> int:
+        with self._lock:
+            if run_id is not None:
+                return len(self._subscribers.get(run_id, ()))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def metrics(self) -> dict:
+        with self._lock:
+            runs: dict[str, int] = {}
+            subscriptions: list[dict] = []
+            for run_id, subs in self._subscribers.items():
+                runs[run_id] = len(subs)
+                latest = self._latest_seq.get(run_id, 0)
+                for subscription in subs:
+                    subscriptions.append(
+                        {
+                            "run_id": run_id,
+                            "last_seq": subscription.last_seq,
+                            "lag": max(0, latest - subscription.last_seq),
+                            "pending": subscription.pending_count(),
+                            "delivered": subscription.delivered,
+                            "overflows": subscription.overflows,
+                        }
+                    )
+            return {
+                "subscribers": len(subscriptions),
+                "runs": runs,
+                "published": self._published,
+                "subscriptions": subscriptions,
+            }
+
+
+_HUB_SINGLETON: Optional[EventHub] = None
+_HUB_LOCK = threading.Lock()
+
+
+def get_event_hub() -> EventHub:
+    global _HUB_SINGLETON
+    if _HUB_SINGLETON is None:
+        with _HUB_LOCK:
+            if _HUB_SINGLETON is None:
+                _HUB_SINGLETON = EventHub()
+    return _HUB_SINGLETON
@@ -724,46 +724,47 @@ class ComputerExecutor:
 
         approval_type = approval_type_from_flags(step.get("danger_flags") or [])
         preview = build_preview_for_step(run, step, approval_type)
-        if existing is None:
-            approval = store.create_approval(
-                run_id=run_id,
+        with store.transaction():
+            if existing is None:
+                approval = store.create_approval(
+                    run_id=run_id,
+                    task_id=task_id,
+                    step_id=step_id,
+                    scope="dangerous_step",
+                    approval_type=approval_type,
+                    title=preview.get("summary") or "Подтверждение действия",
+                    description=preview.get("risk") or "Требуется подтверждение",
+                    proposed_actions=proposed_actions_from_preview(approval_type, preview),
+                    preview=preview,
+                )
+            else:
+                approval = existing
+            emit(
+                run_id,
+                "approval_requested",
+                "Запрошено подтверждение",
+                {
+                    "approval_id": approval["id"],
+                    "approval_type": approval.get("approval_type"),
+                    "step_id": step_id,
+                    "preview_summary": preview_summary(preview),
+                    "scope": approval.get("scope"),
+                    "title": approval.get("title"),
+                    "description": approval.get("description"),
+                },
+                task_id=task_id,
+                step_id=step_id,
+            )
+            emit(
+                run_id,
+                "step_paused_for_approval",
+                "Шаг ожидает подтверждение",
+                {"approval_id": approval["id"], "preview": preview},
                 task_id=task_id,
                 step_id=step_id,
-                scope="dangerous_step",
-                approval_type=approval_type,
-                title=preview.get("summary") or "Подтверждение действия",
-                description=preview.get("risk") or "Требуется подтверждение",
-                proposed_actions=proposed_actions_from_preview(approval_type, preview),
-                preview=preview,
             )
-        else:
-            approval = existing
-        emit(
-            run_id,
-            "approval_requested",
-            "Запрошено подтверждение",
-            {
-                "approval_id": approval["id"],
-                "approval_type": approval.get("approval_type"),
-                "step_id": step_id,
-                "preview_summary": preview_summary(preview),
-                "scope": approval.get("scope"),
-                "title": approval.get("title"),
-                "description": approval.get("description"),
-            },
-            task_id=task_id,
-            step_id=step_id,
-        )
-        emit(
-            run_id,
-            "step_paused_for_approval",
-            "Шаг ожидает подтверждение",
-            {"approval_id": approval["id"], "preview": preview},
-            task_id=task_id,
-            step_id=step_id,
-        )
 
-        store.update_task_status(task_id, "waiting_approval")
+            store.update_task_status(task_id, "waiting_approval")
         approval = self._wait_for_approval(run_id, approval["id"])
         emit(
             run_id,
@@ -798,15 +799,16 @@ class ComputerExecutor:
             )
             return False
 
-        emit(
-            run_id,
-            "approval_approved",
-            "Подтверждение принято",
-            {"approval_id": approval["id"]},
-            task_id=task_id,
-            step_id=step_id,
-        )
-        store.update_task_status(task_id, "running")
+        with store.transaction():
+            emit(
+                run_id,
+                "approval_approved",
+                "Подтверждение принято",
+                {"approval_id": approval["id"]},
+                task_id=task_id,
+                step_id=step_id,
+            )
+            store.update_task_status(task_id, "running")
         return True
 
     def _request_user_help(self, run: dict, step: dict, task: dict, reason: str) -> bool:
@@ -816,43 +818,44 @@ class ComputerExecutor:
         approval_type = approval_type_from_flags(step.get("danger_flags") or [])
         preview = build_preview_for_step(run, step, approval_type)
         preview["details"] = {**(preview.get("details") or {}), "reason": reason}
-        approval = store.create_approval(
-            run_id=run_id,
-            task_id=task_id,
-            step_id=step_id,
-            scope="executor_help",
-            approval_type=approval_type,
-            title=preview.get("summary") or "Нужно вмешательство",
-            description=preview.get("risk") or "Executor не может продолжить без подтверждения пользователя.",
-            proposed_actions=proposed_actions_from_preview(approval_type, preview),
-            preview=preview,
-        )
-        emit(
-            run_id,
-            "approval_requested",
-            "Запрошено подтверждение",
-            {
-                "approval_id": approval["id"],
-                "approval_type": approval.get("approval_type"),
-                "step_id": step_id,
-                "preview_summary": preview_summary(preview),
-                "scope": approval.get("scope"),
-                "title": approval.get("title"),
-                "description": approval.get("description"),
-            },
-            task_id=task_id,
-            step_id=step_id,
-        )
-        emit(
-            run_id,
-            "step_paused_for_approval",
-            "Ожидание решения пользователя",
-            {"approval_id": approval["id"], "preview": preview},
-            task_id=task_id,
-            step_id=step_id,
-        )
+        with store.transaction():
+            approval = store.create_approval(
+                run_id=run_id,
+                task_id=task_id,
+                step_id=step_id,
+                scope="executor_help",
+                approval_type=approval_type,
+                title=preview.get("summary") or "Нужно вмешательство",
+                description=preview.get("risk") or "Executor не может продолжить без подтверждения пользователя.",
+                proposed_actions=proposed_actions_from_preview(approval_type, preview),
+                preview=preview,
+            )
+            emit(
+                run_id,
+                "approval_requested",
+                "Запрошено подтверждение",
+                {
+                    "approval_id": approval["id"],
+                    "approval_type": approval.get("approval_type"),
+                    "step_id": step_id,
+                    "preview_summary": preview_summary(preview),
+                    "scope": approval.get("scope"),
+                    "title": approval.get("title"),
+                    "description": approval.get("description"),
+                },
+                task_id=task_id,
+                step_id=step_id,
+            )
+            emit(
+                run_id,
+                "step_paused_for_approval",
+                "Ожидание решения пользователя",
+                {"approval_id": approval["id"], "preview": preview},
+                task_id=task_id,
+                step_id=step_id,
+            )
 
-        store.update_task_status(task_id, "waiting_approval")
+            store.update_task_status(task_id, "waiting_approval")
         approval = self._wait_for_approval(run_id, approval["id"])
         emit(
             run_id,
@@ -887,15 +890,16 @@ class ComputerExecutor:
             )
             return False
 
-        emit(
-            run_id,
-            "approval_approved",
-            "Подтверждение принято",
-            {"approval_id": approval["id"]},
-            task_id=task_id,
-            step_id=step_id,
-        )
-        store.update_task_status(task_id, "running")
+        with store.transaction():
+            emit(
+                run_id,
+                "approval_approved",
+                "Подтверждение принято",
+                {"approval_id": approval["id"]},
+                task_id=task_id,
+                step_id=step_id,
+            )
+            store.update_task_status(task_id, "running")
         return True
 
     def _handle_password_entry(self, run: dict, step: dict, task: dict) -> StepResult:
@@ -916,44 +920,45 @@ class ComputerExecutor:
         preview = build_preview_for_step(run, step, approval_type)
         preview["details"] = {**(preview.get("details") or {}), "action": "enter_password_manual"}
 
-        approval = store.create_approval(
-            run_id=run_id,
-            task_id=task_id,
-            step_id=step_id,
-            scope="password_entry",
-            approval_type=approval_type,
-            title=preview.get("summary") or "Введите пароль вручную",
-            description=preview.get("risk") or "Astra не вводит пароли автоматически.",
-            proposed_actions=proposed_actions_from_preview(approval_type, preview),
-            preview=preview,
-        )
+        with store.transaction():
+            approval = store.create_approval(
+                run_id=run_id,
+                task_id=task_id,
+                step_id=step_id,
+                scope="password_entry",
+                approval_type=approval_type,
+                title=preview.get("summary") or "Введите пароль вручную",
+                description=preview.get("risk") or "Astra не вводит пароли автоматически.",
+                proposed_actions=proposed_actions_from_preview(approval_type, preview),
+                preview=preview,
+            )
 
-        emit(
-            run_id,
-            "approval_requested",
-            "Запрошено подтверждение",
-            {
-                "approval_id": approval["id"],
-                "approval_type": approval.get("approval_type"),
-                "step_id": step_id,
-                "preview_summary": preview_summary(preview),
-                "scope": approval.get("scope"),
-                "title": approval.get("title"),
-                "description": approval.get("description"),
-            },
-            task_id=task_id,
-            step_id=step_id,
-        )
-        emit(
-            run_id,
-            "step_paused_for_approval",
-            "Ожидание ввода пароля",
-            {"approval_id": approval["id"], "preview": preview},
-            task_id=task_id,
-            step_id=step_id,
-        )
+            emit(
+                run_id,
+                "approval_requested",
+                "Запрошено подтверждение",
+                {
+                    "approval_id": approval["id"],
+                    "approval_type": approval.get("approval_type"),
+                    "step_id": step_id,
+                    "preview_summary": preview_summary(preview),
+                    "scope": approval.get("scope"),
+                    "title": approval.get("title"),
+                    "description": approval.get("description"),
+                },
+                task_id=task_id,
+                step_id=step_id,
+            )
+            emit(
+                run_id,
+                "step_paused_for_approval",
+                "Ожидание ввода пароля",
+                {"approval_id": approval["id"], "preview": preview},
+                task_id=task_id,
+                step_id=step_id,
+            )
 
-        store.update_task_status(task_id, "waiting_approval")
+            store.update_task_status(task_id, "waiting_approval")
         approval = self._wait_for_approval(run_id, approval["id"])
         emit(
             run_id,
@@ -989,15 +994,16 @@ class ComputerExecutor:
             )
             return StepResult("failed", "password_rejected", 0, 1, None)
 
-        emit(
-            run_id,
-            "approval_approved",
-            "Подтверждение принято",
-            {"approval_id": approval["id"]},
-            task_id=task_id,
-            step_id=step_id,
-        )
-        store.update_task_status(task_id, "running")
+        with store.transaction():
+            emit(
+                run_id,
+                "approval_approved",
+                "Подтверждение принято",
+                {"approval_id": approval["id"]},
+                task_id=task_id,
+                step_id=step_id,
+            )
+            store.update_task_status(task_id, "running")
         emit(
             run_id,
             "step_execution_finished",
@@ -1015,7 +1021,7 @@ class ComputerExecutor:
                 raise RuntimeError("Подтверждение не найдено")
             if approval["status"] in ("approved", "rejected", "expired"):
                 return approval
-            run = store.get_run(run_id)
+            run = store.get_run_snapshot(run_id)
             if run and run.get("status") == "canceled":
                 return store.update_approval_status(approval_id, "expired", "system") or approval
             time.sleep(0.5)
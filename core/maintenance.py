@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+from memory import store
+
+_LOG = logging.getLogger(__name__)
+
+_DAY_S = 86400.0
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() not in ("0", "false", "no", "off")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+@dataclass(frozen=True)
+class TableRetention:
+    table: str
+    days: float
+    max_rows: int
+
+
+@dataclass(frozen=True)
+class FileRetention:
+    name: str
+    patterns: tuple[str, ...]
+    days: float
+    max_mb: float
+
+
+# Значения по умолчанию; 0 — без ограничения. Результаты исследований
+# (sources, facts, artifacts, memory_fts) по умолчанию хранятся бессрочно.
+# events по умолчанию не чистятся: их снимает с горячей таблицы архив, а чаты
+# не доходят до конечного статуса и не архивируются — TTL стёр бы их историю.
+_TABLE_DEFAULTS: dict[str, tuple[float, int]] = {
+    "events": (0, 0),
+    "tasks": (90, 0),
+    "sources": (0, 0),
+    "facts": (0, 0),
+    "artifacts": (0, 0),
+    "memory_fts": (0, 0),
+}
+# Файловые кэши относительно base_dir: дампы неудачных ответов локальной LLM
+# и кэш загруженных страниц web_research (artifacts/<run_id>/sources/*.json)
+_FILE_DEFAULTS: dict[str, tuple[tuple[str, ...], float, float]] = {
+    "llm_failures": (("artifacts/local_llm_failures/*",), 14, 200),
+    "source_cache": (("artifacts/*/sources/*.json",), 30, 500),
+}
+# Сегменты архива событий (<data_dir>/archive/events) удаляются вместе со
+# строками event_archives через store, поэтому это не файловый кэш: (days, max_mb)
+_ARCHIVE_DEFAULTS: tuple[float, float] = (180, 1024)
+
+
+def table_policies() -> list[TableRetention]:
+    """Политики таблиц из ASTRA_RETENTION_<TABLE>_DAYS / _MAX_ROWS."""
+    policies = []
+    for table, (days, max_rows) in _TABLE_DEFAULTS.items():
+        prefix = f"ASTRA_RETENTION_{table.upper()}"
+        policies.append(
+            TableRetention(table, _env_float(f"{prefix}_DAYS", days), int(_env_float(f"{prefix}_MAX_ROWS", max_rows)))
+        )
+    return policies
+
+
+def file_policies() -> list[FileRetention]:
+    """Политики файловых кэшей из ASTRA_RETENTION_<NAME>_DAYS / _MAX_MB."""
+    policies = []
+    for name, (patterns, days, max_mb) in _FILE_DEFAULTS.items():
+        prefix = f"ASTRA_RETENTION_{name.upper()}"
+        policies.append(FileRetention(name, patterns, _env_float(f"{prefix}_DAYS", days), _env_float(f"{prefix}_MAX_MB", max_mb)))
+    return policies
+
+
+def archive_policy() -> FileRetention:
+    """Политика архива событий из ASTRA_RETENTION_EVENT_ARCHIVES_DAYS / _MAX_MB."""
+    days, max_mb = _ARCHIVE_DEFAULTS
+    prefix = "ASTRA_RETENTION_EVENT_ARCHIVES"
+    return FileRetention(
+        "event_archives",
+        ("archive/events/*.ndjson.gz",),
+        _env_float(f"{prefix}_DAYS", days),
+        _env_float(f"{prefix}_MAX_MB", max_mb),
+    )
+
+
+def prune_files(paths: Iterable[Path], *, older_than_s: float | None, max_bytes: int | None, limit: int = 1000) -> dict:
+    """Удаляет файлы старше older_than_s, затем самые старые сверх max_bytes (не больше limit за вызов)."""
+    entries = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if path.is_file():
+            entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort(key=lambda entry: entry[0])
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - older_than_s if older_than_s is not None else None
+    removed_files = 0
+    removed_bytes = 0
+    for mtime, size, path in entries:
+        if removed_files >= limit:
+            break
+        expired = cutoff is not None and mtime < cutoff
+        over_cap = max_bytes is not None and total > max_bytes
+        if not expired and not over_cap:
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        removed_files += 1
+        removed_bytes += size
+        total -= size
+        _remove_empty_parents(path.parent)
+    return {"files": removed_files, "bytes": removed_bytes}
+
+
+def _remove_empty_parents(directory: Path) -> None:
+    # artifacts/<run_id>/sources и опустевший artifacts/<run_id>; сам artifacts/ не трогаем
+    for candidate in (directory, directory.parent):
+        if candidate.name in ("artifacts", "local_llm_failures"):
+            return
+        try:
+            candidate.rmdir()
+        except OSError:
+            return
+
+
+class MaintenanceScheduler:
+    """Фоновое обслуживание хранилища: отложенный VACUUM миграций, архив событий, политика хранения, incremental vacuum."""
+
+    def __init__(self, base_dir: Path | None = None, poll_interval: float | None = None, batch_size: int = 50) -> None:
+        self.base_dir = base_dir
+        self.poll_interval = poll_interval if poll_interval is not None else _env_float("ASTRA_MAINTENANCE_INTERVAL_S", 600)
+        self.batch_size = batch_size
+        self.last_report: dict = {}
+        self.last_error: str | None = None
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="store-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run_once(self) -> dict:
+        result: dict = {}
+        migrations = store.finish_deferred_migrations()
+        if migrations is not None:
+            result["migrations"] = migrations
+        if _env_flag("ASTRA_EVENT_ARCHIVE_ENABLED", True):
+            older_than_s = _env_float("ASTRA_EVENT_ARCHIVE_AFTER_HOURS", 24) * 3600
+            result["archive"] = store.archive_finished_runs(older_than_s, limit=self.batch_size)
+        if _env_flag("ASTRA_RETENTION_ENABLED", True):
+            result["retention"] = self._apply_retention()
+        if self._changed(result):
+            # Один checkpoint на проход и вне _lock store — писатели не ждут архивации
+            result["checkpoint"] = store.checkpoint_wal()
+        self.last_report = result
+        return result
+
+    @staticmethod
+    def _changed(result: dict) -> bool:
+        archive = result.get("archive") or {}
+        retention = result.get("retention") or {}
+        migrations = result.get("migrations") or {}
+        return bool(migrations.get("done") or archive.get("runs") or retention.get("freed_bytes") or any((retention.get("tables") or {}).values()))
+
+    def _apply_retention(self) -> dict:
+        tables = {}
+        for policy in table_policies():
+            if policy.days <= 0 and policy.max_rows <= 0:
+                continue
+            tables[policy.table] = store.purge_table(
+                policy.table,
+                older_than_s=policy.days * _DAY_S if policy.days > 0 else None,
+                max_rows=policy.max_rows if policy.max_rows > 0 else None,
+            )
+        files = {}
+        if self.base_dir is not None:
+            for policy in file_policies():
+                if policy.days <= 0 and policy.max_mb <= 0:
+                    continue
+                paths = [path for pattern in policy.patterns for path in self.base_dir.glob(pattern)]
+                files[policy.name] = prune_files(
+                    paths,
+                    older_than_s=policy.days * _DAY_S if policy.days > 0 else None,
+                    max_bytes=int(policy.max_mb * 2**20) if policy.max_mb > 0 else None,
+                )
+        archives = {"segments": 0, "events": 0, "bytes": 0}
+        policy = archive_policy()
+        if policy.days > 0 or policy.max_mb > 0:
+            archives = store.purge_event_archives(
+                older_than_s=policy.days * _DAY_S if policy.days > 0 else None,
+                max_bytes=int(policy.max_mb * 2**20) if policy.max_mb > 0 else None,
+            )
+        vacuum = store.incremental_vacuum(max_pages=int(_env_float("ASTRA_VACUUM_MAX_PAGES", 4096)))
+        freed = vacuum["bytes"] + archives["bytes"] + sum(entry["bytes"] for entry in files.values())
+        if freed or any(tables.values()):
+            _LOG.info(
+                "retention rows=%s files=%s archive_segments=%s vacuum_pages=%s freed_bytes=%s",
+                tables,
+                {name: entry["files"] for name, entry in files.items()},
+                archives["segments"],
+                vacuum["pages"],
+                freed,
+            )
+        return {"tables": tables, "files": files, "archives": archives, "vacuum": vacuum, "freed_bytes": freed}
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as exc:  # noqa: BLE001
+                # Цикл продолжает работу, но сбой виден в логе и в last_error/failures
+                self.failures += 1
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                _LOG.exception("maintenance pass failed (failures=%s)", self.failures)
+            self._stop.wait(self.poll_interval)
+
+
+_scheduler: Optional[MaintenanceScheduler] = None
+
+
+def start_maintenance_scheduler(base_dir: Path | None = None) -> MaintenanceScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = MaintenanceScheduler(base_dir)
+        _scheduler.start()
+    return _scheduler
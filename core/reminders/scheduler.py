@@ -1,15 +1,19 @@
 from __future__ import annotations
 
-import json
+import heapq
 import os
 import threading
 import time
-import urllib.request
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Optional
 from zoneinfo import ZoneInfo
 
+import requests
+from requests.adapters import HTTPAdapter
+
 from core.event_bus import emit
 from memory import store
 
@@ -19,10 +23,16 @@ class DeliveryResult:
     ok: bool
     delivery: str
     error: str | None = None
+    retry_after: float | None = None
+
+
+# Попытки доставки в канал: после неудачи напоминание откладывается через аренду
+# на 1, 2, 4... с (или на retry_after из ответа 429), последняя неудача — failed.
+MAX_DELIVERY_ATTEMPTS = 3
 
 
-def _now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+def _iso(moment: datetime) -> str:
+    return moment.isoformat().replace("+00:00", "Z")
 
 
 def _get_telegram_config() -> tuple[str | None, str | None]:
@@ -31,19 +41,50 @@ def _get_telegram_config() -> tuple[str | None, str | None]:
     return token.strip() or None, chat_id.strip() or None
 
 
+_telegram_lock = threading.Lock()
+_telegram_http: requests.Session | None = None
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _telegram_session() -> requests.Session:
+    """Общая сессия с пулом keep-alive соединений: без нового TLS-рукопожатия на каждое сообщение."""
+    global _telegram_http
+    with _telegram_lock:
+        if _telegram_http is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, int(_env_float("ASTRA_REMINDER_WORKERS", 4))))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _telegram_http = session
+        return _telegram_http
+
+
 def _send_telegram_message(token: str, chat_id: str, text: str) -> DeliveryResult:
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = json.dumps({"chat_id": chat_id, "text": text}).encode("utf-8")
-    req = urllib.request.Request(url, data=payload, headers={"Content-Type": "application/json"})
+    base = (os.getenv("ASTRA_TELEGRAM_API_BASE") or "https://api.telegram.org").rstrip("/")
     try:
-        with urllib.request.urlopen(req, timeout=8) as resp:
-            body = resp.read().decode("utf-8")
-            data = json.loads(body)
-            if resp.status >= 200 and resp.status < 300 and data.get("ok") is True:
-                return DeliveryResult(ok=True, delivery="telegram")
-            return DeliveryResult(ok=False, delivery="telegram", error=f"telegram_http_{resp.status}")
-    except Exception as exc:
+        resp = _telegram_session().post(f"{base}/bot{token}/sendMessage", json={"chat_id": chat_id, "text": text}, timeout=8)
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {}
+    except requests.RequestException as exc:
         return DeliveryResult(ok=False, delivery="telegram", error=str(exc))
+    if 200 <= resp.status_code < 300 and data.get("ok") is True:
+        return DeliveryResult(ok=True, delivery="telegram")
+    retry_after = None
+    parameters = data.get("parameters") if isinstance(data, dict) else None
+    if resp.status_code == 429 and isinstance(parameters, dict):
+        try:
+            retry_after = float(parameters.get("retry_after"))
+        except (TypeError, ValueError):
+            retry_after = None
+    return DeliveryResult(ok=False, delivery="telegram", error=f"telegram_http_{resp.status_code}", retry_after=retry_after)
 
 
 def _local_delivery(text: str) -> DeliveryResult:
@@ -98,55 +139,300 @@ def _format_reminder_message(reminder: dict) -> str:
     return f"Напоминание: {text}. Время: {due_text}."
 
 
+def _wake_epoch(value: str | None) -> float:
+    """due_at/lease_until → unix-время; непарсируемое значение считается наступившим."""
+    raw = (value or "").strip()
+    try:
+        parsed = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except ValueError:
+        return time.time()
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class _TokenBucket:
+    """Ограничение частоты отправки в канал (rate сообщений в секунду, burst подряд)."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """0 — токен взят; иначе через сколько секунд он появится (ничего не резервируется)."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+
+class _LatencyWindow:
+    """Последние N замеров в мс и перцентили по ним."""
+
+    def __init__(self, size: int = 1000) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, value_ms: float) -> None:
+        self._samples.append(value_ms)
+
+    def summary(self) -> dict:
+        ordered = sorted(self._samples)
+        if not ordered:
+            return {"count": 0}
+
+        def rank(q: float) -> float:
+            return round(ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))], 3)
+
+        return {"count": len(ordered), "p50_ms": rank(0.5), "p95_ms": rank(0.95), "p99_ms": rank(0.99), "max_ms": round(ordered[-1], 3)}
+
+
+class _ChannelStats:
+    def __init__(self) -> None:
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.throttled = 0
+        self.lag = _LatencyWindow()
+        self.send = _LatencyWindow()
+
+    def to_dict(self) -> dict:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "throttled": self.throttled,
+            "due_to_sent": self.lag.summary(),
+            "send": self.send.summary(),
+        }
+
+
 class ReminderScheduler:
-    def __init__(self, poll_interval: int = 5, batch_size: int = 20) -> None:
+    """Планировщик напоминаний на таймере.
+
+    В памяти — min-куча ближайших моментов (due_at ожидающих и lease_until
+    доставляемых), перечитываемая из БД после каждого захвата. Поток спит
+    ровно до вершины кучи; create_reminder/cancel_reminder будят его через
+    подписку store. poll_interval — страховочный предел сна: за это время
+    подхватываются записи, сделанные мимо store (другой процесс), и
+    переоценивается ожидание после скачка системных часов.
+
+    Доставка идёт в пуле из workers потоков: медленный канал не задерживает
+    остальные напоминания. Поток планировщика захватывает не больше, чем есть
+    свободных воркеров. Повтор после неудачи и превышение частоты канала не
+    спят в воркере — напоминание откладывается продлением аренды в БД и
+    возвращается через кучу.
+    """
+
+    HEAP_LIMIT = 256
+
+    def __init__(self, poll_interval: float = 60, batch_size: int = 20, workers: int | None = None) -> None:
         self.poll_interval = poll_interval
         self.batch_size = batch_size
+        self.workers = max(1, int(workers if workers is not None else _env_float("ASTRA_REMINDER_WORKERS", 4)))
+        self.wakeups = 0
+        self.passes = 0
         self._stop = threading.Event()
+        self._cond = threading.Condition()
+        self._heap: list[tuple[float, str]] = []
+        self._dirty = True
+        self._settled_at = 0.0
+        self._in_flight = 0
+        self._pool: ThreadPoolExecutor | None = None
+        self._buckets = {
+            "telegram": _TokenBucket(
+                _env_float("ASTRA_TELEGRAM_RATE_PER_S", 1.0), _env_float("ASTRA_TELEGRAM_RATE_BURST", 3.0)
+            ),
+        }
+        self._stats: dict[str, _ChannelStats] = {}
         self._thread: Optional[threading.Thread] = None
 
     def start(self) -> None:
         if self._thread and self._thread.is_alive():
             return
+        self._stop.clear()
+        store.add_reminder_listener(self._on_reminder_changed)
         self._thread = threading.Thread(target=self._loop, name="reminder-scheduler", daemon=True)
         self._thread.start()
 
     def stop(self) -> None:
         self._stop.set()
-
-    def run_once(self) -> None:
+        store.remove_reminder_listener(self._on_reminder_changed)
+        with self._cond:
+            self._cond.notify_all()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def run_once(self) -> int:
+        """Синхронный проход: захватить созревшие и дождаться их доставки."""
+        futures = self._dispatch(self.batch_size)
+        wait(futures)
+        return len(futures)
+
+    def metrics(self) -> dict:
+        with self._cond:
+            channels = {name: stats.to_dict() for name, stats in self._stats.items()}
+            return {
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "heap": len(self._heap),
+                "wakeups": self.wakeups,
+                "passes": self.passes,
+                "channels": channels,
+            }
+
+    def _dispatch(self, limit: int) -> list[Future]:
         if not self._enabled():
-            return
-        now_iso = _now_iso()
-        reminders = store.claim_due_reminders(now_iso, limit=self.batch_size)
-        for reminder in reminders:
+            return []
+        with self._cond:
+            limit = min(limit, self.workers - self._in_flight)
+        if limit <= 0:
+            return []
+        now = datetime.now(timezone.utc)
+        self.passes += 1
+        reminders = store.claim_due_reminders(_iso(now), limit=limit, lease_s=self._lease_s())
+        with self._cond:
+            # Захват сдвинул due/lease — вершина кучи устарела
+            self._dirty = True
+            # Неполный захват взял всё, что SQL считает наступившим к now; полный
+            # (упёрся в limit или число свободных воркеров) — нет, остаток ещё в очереди
+            self._settled_at = now.timestamp() if len(reminders) < limit else 0.0
+            self._in_flight += len(reminders)
+            if reminders and self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reminder-delivery")
+            pool = self._pool
+        return [pool.submit(self._deliver_in_worker, reminder) for reminder in reminders]
+
+    def _deliver_in_worker(self, reminder: dict) -> None:
+        try:
             self._deliver(reminder)
+        except Exception:
+            # Аренда истечёт, и напоминание будет захвачено снова
+            pass
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _count(self, channel: str, field: str, *, send_ms: float | None = None, lag_ms: float | None = None) -> None:
+        with self._cond:
+            stats = self._stats.setdefault(channel, _ChannelStats())
+            if field:
+                setattr(stats, field, getattr(stats, field) + 1)
+            if send_ms is not None:
+                stats.send.add(send_ms)
+            if lag_ms is not None:
+                stats.lag.add(lag_ms)
+
+    def next_wakeup(self) -> float | None:
+        """Unix-время ближайшего пробуждения по куче (None — куча пуста)."""
+        with self._cond:
+            if self._dirty:
+                self._reload()
+            return self._heap[0][0] if self._heap else None
+
+    def _on_reminder_changed(self, reminder: dict) -> None:
+        with self._cond:
+            if reminder.get("status") == "pending" and reminder.get("id"):
+                heapq.heappush(self._heap, (_wake_epoch(reminder.get("due_at")), str(reminder["id"])))
+            elif reminder.get("status") == "sending" and reminder.get("lease_until"):
+                # Отложенная доставка: вернуться к ней, когда истечёт аренда
+                heapq.heappush(self._heap, (_wake_epoch(reminder.get("lease_until")), str(reminder["id"])))
+            else:
+                # Отменённое напоминание остаётся в куче — перечитать её из БД
+                self._dirty = True
+            self._cond.notify_all()
+
+    def _reload(self) -> None:
+        # Наступившие до последнего неполного захвата, но не захваченные моменты
+        # (due_at в формате, который SQL-сравнение не считает наступившим) не должны
+        # будить поток в цикле — их подберёт страховочный опрос.
+        heap = [
+            (wake_at, reminder_id)
+            for wake_at, reminder_id in (
+                (_wake_epoch(value), reminder_id) for value, reminder_id in store.list_reminder_wakeups(self.HEAP_LIMIT)
+            )
+            if wake_at > self._settled_at
+        ]
+        heapq.heapify(heap)
+        self._heap = heap
+        self._dirty = False
+
+    def _sleep_until_due(self) -> None:
+        """Спит до вершины кучи, но не дольше poll_interval; возвращается, когда пора захватывать."""
+        deadline = time.monotonic() + self.poll_interval
+        with self._cond:
+            while not self._stop.is_set():
+                if self._dirty:
+                    self._reload()
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now and self._in_flight < self.workers:
+                    return
+                # Ожидание в монотонном времени, срок — по настенным часам: после
+                # скачка часов срок пересчитывается не позже чем через poll_interval
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    return
+                if self._heap and self._in_flight < self.workers:
+                    timeout = min(timeout, self._heap[0][0] - now)
+                # Все воркеры заняты — ждём освобождения (воркер будит через notify)
+                self._cond.wait(timeout)
+                self.wakeups += 1
 
     def _loop(self) -> None:
         while not self._stop.is_set():
+            if not self._enabled():
+                self._stop.wait(self.poll_interval)
+                continue
             try:
-                self.run_once()
+                # Полный батч — вероятно, есть ещё созревшие: забираем без сна
+                if len(self._dispatch(self.batch_size)) < self.batch_size:
+                    self._sleep_until_due()
             except Exception:
                 # Keep loop alive
-                pass
-            self._stop.wait(self.poll_interval)
+                self._stop.wait(self.poll_interval)
 
     def _enabled(self) -> bool:
         raw = os.getenv("ASTRA_REMINDERS_ENABLED", "true")
         return raw.lower() not in ("0", "false", "no", "off")
 
+    def _lease_s(self) -> float:
+        # Аренда покрывает одну попытку доставки (таймаут запроса в Telegram — 8 с)
+        return max(30.0, _env_float("ASTRA_REMINDER_LEASE_S", store.REMINDER_LEASE_S))
+
     def _deliver(self, reminder: dict) -> None:
         run_id = reminder.get("run_id")
         event_run_id = _event_run_id(reminder)
         reminder_id = reminder.get("id")
         message_text = _format_reminder_message(reminder)
-        emit(event_run_id, "reminder_due", "Напоминание подошло", {"id": reminder_id, "run_id": run_id})
-
         delivery_pref = reminder.get("delivery") or "local"
+
+        bucket = self._buckets.get(delivery_pref)
+        throttle_s = bucket.try_acquire() if bucket is not None else 0.0
+        if throttle_s > 0:
+            # Канал исчерпал частоту: вернуть в очередь без траты попытки
+            self._count(delivery_pref, "throttled")
+            store.defer_reminder(reminder_id, throttle_s, count_attempt=False)
+            return
+
+        attempts = int(reminder.get("attempts") or 1)
+        if attempts <= 1:
+            emit(event_run_id, "reminder_due", "Напоминание подошло", {"id": reminder_id, "run_id": run_id})
+
         if delivery_pref == "telegram":
             token, chat_id = _get_telegram_config()
             if not token or not chat_id:
                 store.mark_reminder_failed(reminder_id, "telegram_not_configured", "local")
+                self._count("telegram", "failed")
                 emit(
                     event_run_id,
                     "reminder_failed",
@@ -156,22 +442,27 @@ class ReminderScheduler:
                 _local_delivery(message_text)
                 return
 
-            attempt_error: str | None = None
-            for attempt in range(3):
-                result = _send_telegram_message(token, chat_id, message_text)
-                if result.ok:
-                    store.mark_reminder_sent(reminder_id, result.delivery)
-                    emit(
-                        event_run_id,
-                        "reminder_sent",
-                        "Напоминание отправлено",
-                        {"id": reminder_id, "delivery": result.delivery, "run_id": run_id},
-                    )
-                    return
-                attempt_error = result.error or "telegram_send_failed"
-                time.sleep(1.0 * (2**attempt))
+            start = time.perf_counter()
+            result = _send_telegram_message(token, chat_id, message_text)
+            self._count("telegram", "", send_ms=(time.perf_counter() - start) * 1000)
+            if result.ok:
+                self._record_sent(reminder, result.delivery)
+                emit(
+                    event_run_id,
+                    "reminder_sent",
+                    "Напоминание отправлено",
+                    {"id": reminder_id, "delivery": result.delivery, "run_id": run_id},
+                )
+                return
+            attempt_error = result.error or "telegram_send_failed"
+            if attempts < MAX_DELIVERY_ATTEMPTS:
+                self._count("telegram", "retried")
+                delay = getattr(result, "retry_after", None) or 1.0 * (2 ** (attempts - 1))
+                store.defer_reminder(reminder_id, delay, error=attempt_error)
+                return
 
-            store.mark_reminder_failed(reminder_id, attempt_error or "telegram_send_failed", "telegram")
+            store.mark_reminder_failed(reminder_id, attempt_error, "telegram")
+            self._count("telegram", "failed")
             emit(
                 event_run_id,
                 "reminder_failed",
@@ -181,8 +472,10 @@ class ReminderScheduler:
             return
 
         # Local delivery
+        start = time.perf_counter()
         result = _local_delivery(message_text)
-        store.mark_reminder_sent(reminder_id, result.delivery)
+        self._count(result.delivery, "", send_ms=(time.perf_counter() - start) * 1000)
+        self._record_sent(reminder, result.delivery)
         emit(
             event_run_id,
             "reminder_sent",
@@ -190,10 +483,18 @@ class ReminderScheduler:
             {"id": reminder_id, "delivery": result.delivery, "run_id": run_id},
         )
 
+    def _record_sent(self, reminder: dict, delivery: str) -> None:
+        store.mark_reminder_sent(reminder["id"], delivery)
+        self._count(delivery, "sent", lag_ms=max(0.0, (time.time() - _wake_epoch(reminder.get("due_at"))) * 1000))
+
 
 _scheduler: Optional[ReminderScheduler] = None
 
 
+def get_reminder_scheduler() -> ReminderScheduler | None:
+    return _scheduler
+
+
 def start_reminder_scheduler() -> ReminderScheduler:
     global _scheduler
     if _scheduler is None:
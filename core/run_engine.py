@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 import uuid
 from pathlib import Path
 
@@ -13,6 +14,11 @@ from memory import store
 from memory.db import now_iso
 
 
+def _per_item_events_enabled() -> bool:
+    # Поэлементные source_found/fact_extracted/... поверх агрегированного items_ingested
+    return os.getenv("ASTRA_EVENTS_PER_ITEM", "true").strip().lower() not in {"0", "false", "no", "off"}
+
+
 class RunEngine:
     def __init__(self, base_dir: Path):
         self.base_dir = base_dir
@@ -60,27 +66,31 @@ class RunEngine:
         if project:
             run["settings"] = project.get("settings") or {}
 
-        store.update_run_status(run_id, "running", started_at=now_iso())
-        emit(run_id, "run_started", "Запуск начат", {"mode": run["mode"]})
+        with store.transaction():
+            store.update_run_status(run_id, "running", started_at=now_iso())
+            emit(run_id, "run_started", "Запуск начат", {"mode": run["mode"]})
 
         if run["mode"] == "plan_only":
-            store.update_run_status(run_id, "done", finished_at=now_iso())
-            emit(run_id, "run_done", "Запуск завершён (только план)", {"status": "done"})
+            with store.transaction():
+                store.update_run_status(run_id, "done", finished_at=now_iso())
+                emit(run_id, "run_done", "Запуск завершён (только план)", {"status": "done"})
             return
 
         steps = store.list_plan_steps(run_id)
         try:
             for step in steps:
-                if store.get_run(run_id)["status"] == "canceled":
+                if store.get_run_snapshot(run_id)["status"] == "canceled":
                     emit(run_id, "run_canceled", "Запуск отменён", {})
                     return
                 self._execute_step(run, step)
 
-            store.update_run_status(run_id, "done", finished_at=now_iso())
-            emit(run_id, "run_done", "Запуск завершён", {"status": "done"})
+            with store.transaction():
+                store.update_run_status(run_id, "done", finished_at=now_iso())
+                emit(run_id, "run_done", "Запуск завершён", {"status": "done"})
         except Exception as exc:
-            store.update_run_status(run_id, "failed", finished_at=now_iso())
-            emit(run_id, "run_failed", "Запуск завершён с ошибкой", {"error": str(exc)}, level="error")
+            with store.transaction():
+                store.update_run_status(run_id, "failed", finished_at=now_iso())
+                emit(run_id, "run_failed", "Запуск завершён с ошибкой", {"error": str(exc)}, level="error")
 
     def cancel_run(self, run_id: str) -> None:
         store.update_run_status(run_id, "canceled", finished_at=now_iso())
@@ -150,67 +160,70 @@ class RunEngine:
         else:
             new_status = "running"
 
-        current = store.get_run(run_id)
+        current = store.get_run_snapshot(run_id)
         current_status = current["status"] if current else None
         if new_status == current_status:
             return
         finished_at = now_iso() if new_status in ("done", "failed") else None
-        store.update_run_status(run_id, new_status, finished_at=finished_at)
-        if new_status == "done":
-            emit(run_id, "run_done", "Запуск завершён", {"status": "done"})
-        elif new_status == "failed":
-            emit(run_id, "run_failed", "Запуск завершён с ошибкой", {"status": "failed"}, level="error")
+        with store.transaction():
+            store.update_run_status(run_id, new_status, finished_at=finished_at)
+            if new_status == "done":
+                emit(run_id, "run_done", "Запуск завершён", {"status": "done"})
+            elif new_status == "failed":
+                emit(run_id, "run_failed", "Запуск завершён с ошибкой", {"status": "failed"}, level="error")
 
     def _execute_step(self, run: dict, step: dict, retry_from_task_id: str | None = None) -> dict:
         run_id = run["id"]
-        store.update_plan_step_status(step["id"], "running")
+        # Переход шага в running, новая попытка и её события — одна транзакция
+        with store.transaction():
+            store.update_plan_step_status(step["id"], "running")
 
-        attempt = store.next_task_attempt(run_id, step["id"])
-        task = store.create_task(run_id, step["id"], attempt=attempt)
+            attempt = store.next_task_attempt(run_id, step["id"])
+            task = store.create_task(run_id, step["id"], attempt=attempt)
+
+            if retry_from_task_id:
+                emit(
+                    run_id,
+                    "task_retried",
+                    "Повтор задачи",
+                    {
+                        "task_id": task["id"],
+                        "step_id": step["id"],
+                        "previous_task_id": retry_from_task_id,
+                        "attempt": attempt,
+                    },
+                    task_id=task["id"],
+                    step_id=step["id"],
+                )
 
-        if retry_from_task_id:
             emit(
                 run_id,
-                "task_retried",
-                "Повтор задачи",
+                "task_queued",
+                "Задача поставлена в очередь",
                 {
                     "task_id": task["id"],
                     "step_id": step["id"],
-                    "previous_task_id": retry_from_task_id,
-                    "attempt": attempt,
+                    "step_index": step["step_index"],
+                    "skill_name": step["skill_name"],
                 },
                 task_id=task["id"],
                 step_id=step["id"],
             )
 
-        emit(
-            run_id,
-            "task_queued",
-            "Задача поставлена в очередь",
-            {
-                "task_id": task["id"],
-                "step_id": step["id"],
-                "step_index": step["step_index"],
-                "skill_name": step["skill_name"],
-            },
-            task_id=task["id"],
-            step_id=step["id"],
-        )
-
-        store.update_task_status(task["id"], "running", started_at=now_iso())
-        emit(
-            run_id,
-            "task_started",
-            "Задача начата",
-            {
-                "task_id": task["id"],
-                "step_id": step["id"],
-                "skill_name": step["skill_name"],
-                "started_at": now_iso(),
-            },
-            task_id=task["id"],
-            step_id=step["id"],
-        )
+            store.update_task_status(task["id"], "running", started_at=now_iso())
+            emit(
+                run_id,
+                "task_started",
+                "Задача начата",
+                {
+                    "task_id": task["id"],
+                    "step_id": step["id"],
+                    "skill_name": step["skill_name"],
+                    "started_at": now_iso(),
+                },
+                task_id=task["id"],
+                step_id=step["id"],
+            )
 
         manifest = self.registry.get_manifest(step["skill_name"])
         if not manifest:
@@ -219,92 +232,98 @@ class RunEngine:
         if self._should_use_computer_executor(step):
             result = self.computer_executor.execute_step(run, step, task)
             if result.status == "done":
-                store.update_task_status(task["id"], "done", finished_at=now_iso())
-                store.update_plan_step_status(step["id"], "done")
+                with store.transaction():
+                    store.update_task_status(task["id"], "done", finished_at=now_iso())
+                    store.update_plan_step_status(step["id"], "done")
+                    emit(
+                        run_id,
+                        "task_done",
+                        "Задача завершена",
+                        {
+                            "task_id": task["id"],
+                            "step_id": step["id"],
+                            "finished_at": now_iso(),
+                        },
+                        task_id=task["id"],
+                        step_id=step["id"],
+                    )
+                return task
+
+            with store.transaction():
+                store.update_task_status(task["id"], "failed", finished_at=now_iso(), error=result.reason)
+                store.update_plan_step_status(step["id"], "failed")
                 emit(
                     run_id,
-                    "task_done",
-                    "Задача завершена",
+                    "task_failed",
+                    "Задача завершилась с ошибкой",
                     {
                         "task_id": task["id"],
                         "step_id": step["id"],
-                        "finished_at": now_iso(),
+                        "error": result.reason,
                     },
                     task_id=task["id"],
                     step_id=step["id"],
                 )
-                return task
-
-            store.update_task_status(task["id"], "failed", finished_at=now_iso(), error=result.reason)
-            store.update_plan_step_status(step["id"], "failed")
-            emit(
-                run_id,
-                "task_failed",
-                "Задача завершилась с ошибкой",
-                {
-                    "task_id": task["id"],
-                    "step_id": step["id"],
-                    "error": result.reason,
-                },
-                task_id=task["id"],
-                step_id=step["id"],
-            )
             if result.reason in ("approval_rejected", "password_rejected"):
                 raise RuntimeError(result.reason)
             return task
 
         if manifest.scopes in ("confirm_required", "dangerous") and run["mode"] != "execute_confirm":
-            store.update_task_status(task["id"], "failed", finished_at=now_iso(), error="требуется_подтверждение")
-            store.update_plan_step_status(step["id"], "failed")
-            emit(
-                run_id,
-                "task_failed",
-                "Требуется подтверждение",
-                {
-                    "task_id": task["id"],
-                    "step_id": step["id"],
-                    "error": "требуется_подтверждение",
-                },
-                task_id=task["id"],
-                step_id=step["id"],
-            )
+            with store.transaction():
+                store.update_task_status(task["id"], "failed", finished_at=now_iso(), error="требуется_подтверждение")
+                store.update_plan_step_status(step["id"], "failed")
+                emit(
+                    run_id,
+                    "task_failed",
+                    "Требуется подтверждение",
+                    {
+                        "task_id": task["id"],
+                        "step_id": step["id"],
+                        "error": "требуется_подтверждение",
+                    },
+                    task_id=task["id"],
+                    step_id=step["id"],
+                )
             raise RuntimeError("Требуется режим выполнения с подтверждением")
 
         try:
             result = self.runner.run_skill(run, step, task)
         except Exception as exc:
-            store.update_task_status(task["id"], "failed", finished_at=now_iso(), error=str(exc))
-            store.update_plan_step_status(step["id"], "failed")
+            with store.transaction():
+                store.update_task_status(task["id"], "failed", finished_at=now_iso(), error=str(exc))
+                store.update_plan_step_status(step["id"], "failed")
+                emit(
+                    run_id,
+                    "task_failed",
+                    "Задача завершилась с ошибкой",
+                    {
+                        "task_id": task["id"],
+                        "step_id": step["id"],
+                        "error": str(exc),
+                    },
+                    task_id=task["id"],
+                    step_id=step["id"],
+                )
+            raise
+
+        # Результат навыка и завершение задачи фиксируются вместе
+        with store.transaction():
+            self._persist_skill_result(run_id, step, task, result)
+
+            store.update_task_status(task["id"], "done", finished_at=now_iso())
+            store.update_plan_step_status(step["id"], "done")
             emit(
                 run_id,
-                "task_failed",
-                "Задача завершилась с ошибкой",
+                "task_done",
+                "Задача завершена",
                 {
                     "task_id": task["id"],
                     "step_id": step["id"],
-                    "error": str(exc),
+                    "finished_at": now_iso(),
                 },
                 task_id=task["id"],
                 step_id=step["id"],
             )
-            raise
-
-        self._persist_skill_result(run_id, step, task, result)
-
-        store.update_task_status(task["id"], "done", finished_at=now_iso())
-        store.update_plan_step_status(step["id"], "done")
-        emit(
-            run_id,
-            "task_done",
-            "Задача завершена",
-            {
-                "task_id": task["id"],
-                "step_id": step["id"],
-                "finished_at": now_iso(),
-            },
-            task_id=task["id"],
-            step_id=step["id"],
-        )
 
         return task
 
@@ -314,11 +333,9 @@ class RunEngine:
         return step.get("kind") in COMPUTER_STEP_KINDS
 
     def _persist_skill_result(self, run_id: str, step: dict, task: dict, result: SkillResult) -> None:
-        sources_payload = []
-        for s in result.sources:
-            sid = str(uuid.uuid4())
-            payload = {
-                "id": sid,
+        sources_payload = [
+            {
+                "id": str(uuid.uuid4()),
                 "url": s.url,
                 "title": s.title,
                 "domain": s.domain,
@@ -327,97 +344,61 @@ class RunEngine:
                 "snippet": s.snippet,
                 "pinned": s.pinned,
             }
-            sources_payload.append(payload)
-            emit(
-                run_id,
-                "source_found",
-                "Источник найден",
-                {"source_id": sid, "url": s.url, "title": s.title},
-                task_id=task["id"],
-                step_id=step["id"],
-            )
-
-        if sources_payload:
-            store.insert_sources(run_id, sources_payload)
-            emit(
-                run_id,
-                "source_fetched",
-                "Источники сохранены",
-                {"count": len(sources_payload)},
-                task_id=task["id"],
-                step_id=step["id"],
-            )
-
-        facts_payload = []
-        for f in result.facts:
-            fid = str(uuid.uuid4())
-            payload = {
-                "id": fid,
+            for s in result.sources
+        ]
+        facts_payload = [
+            {
+                "id": str(uuid.uuid4()),
                 "key": f.key,
                 "value": f.value,
                 "confidence": f.confidence,
                 "source_ids": f.source_ids,
                 "created_at": f.created_at or now_iso(),
             }
-            facts_payload.append(payload)
-            emit(
-                run_id,
-                "fact_extracted",
-                "Факт извлечён",
-                {"fact_id": fid, "key": f.key},
-                task_id=task["id"],
-                step_id=step["id"],
-            )
-
-        if facts_payload:
-            store.insert_facts(run_id, facts_payload)
-
-        conflicts = [e for e in result.events if e.get("type") == "conflict"]
-        if conflicts:
-            conflict_payload = []
-            for c in conflicts:
-                cid = str(uuid.uuid4())
-                payload = {
-                    "id": cid,
-                    "fact_key": c.get("fact_key"),
-                    "group": c.get("group"),
-                    "status": "open",
-                }
-                conflict_payload.append(payload)
-                emit(
-                    run_id,
-                    "conflict_detected",
-                    "Обнаружен конфликт",
-                    {"conflict_id": cid, "fact_key": c.get("fact_key")},
-                    task_id=task["id"],
-                    step_id=step["id"],
-                )
-            store.insert_conflicts(run_id, conflict_payload)
-
-        artifacts_payload = []
-        for a in result.artifacts:
-            aid = str(uuid.uuid4())
-            payload = {
-                "id": aid,
+            for f in result.facts
+        ]
+        conflict_payload = [
+            {
+                "id": str(uuid.uuid4()),
+                "fact_key": c.get("fact_key"),
+                "group": c.get("group"),
+                "status": "open",
+            }
+            for c in result.events
+            if c.get("type") == "conflict"
+        ]
+        artifacts_payload = [
+            {
+                "id": str(uuid.uuid4()),
                 "type": a.type,
                 "title": a.title,
                 "content_uri": a.content_uri,
                 "created_at": a.created_at or now_iso(),
                 "meta": a.meta,
             }
-            artifacts_payload.append(payload)
+            for a in result.artifacts
+        ]
+
+        if sources_payload or facts_payload or conflict_payload or artifacts_payload:
+            # Одна транзакция на весь результат навыка вместо коммита на каждую строку
+            counts = store.ingest_run_items(
+                run_id,
+                sources=sources_payload,
+                facts=facts_payload,
+                conflicts=conflict_payload,
+                artifacts=artifacts_payload,
+            )
+            if _per_item_events_enabled():
+                self._emit_item_events(run_id, step, task, sources_payload, facts_payload, conflict_payload, artifacts_payload)
             emit(
                 run_id,
-                "artifact_created",
-                "Артефакт создан",
-                {"artifact_id": aid, "type": a.type, "title": a.title},
+                "items_ingested",
+                "Результаты сохранены",
+                counts,
                 task_id=task["id"],
                 step_id=step["id"],
             )
 
-        if artifacts_payload:
-            store.insert_artifacts(run_id, artifacts_payload)
-
         for evt in result.events:
             if evt.get("type") == "conflict":
                 continue
@@ -435,3 +416,31 @@ class RunEngine:
                 task_id=task["id"],
                 step_id=step["id"],
             )
+
+    def _emit_item_events(
+        self,
+        run_id: str,
+        step: dict,
+        task: dict,
+        sources: list[dict],
+        facts: list[dict],
+        conflicts: list[dict],
+        artifacts: list[dict],
+    ) -> None:
+        ids = {"task_id": task["id"], "step_id": step["id"]}
+        for s in sources:
+            emit(run_id, "source_found", "Источник найден", {"source_id": s["id"], "url": s["url"], "title": s["title"]}, **ids)
+        if sources:
+            emit(run_id, "source_fetched", "Источники сохранены", {"count": len(sources)}, **ids)
+        for f in facts:
+            emit(run_id, "fact_extracted", "Факт извлечён", {"fact_id": f["id"], "key": f["key"]}, **ids)
+        for c in conflicts:
+            emit(run_id, "conflict_detected", "Обнаружен конфликт", {"conflict_id": c["id"], "fact_key": c["fact_key"]}, **ids)
+        for a in artifacts:
+            emit(
+                run_id,
+                "artifact_created",
+                "Артефакт создан",
+                {"artifact_id": a["id"], "type": a["type"], "title": a["title"]},
+                **ids,
+            )
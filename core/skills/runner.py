@@ -56,50 +56,52 @@ class SkillRunner:
                     "preview": preview,
                 }
 
-            approval = store.create_approval(
-                run_id=run["id"],
-                task_id=task["id"],
-                step_id=step.get("id"),
-                scope=approval_payload.get("scope") or manifest.name,
-                approval_type=approval_payload.get("approval_type") or approval_type,
-                title=approval_payload.get("title") or "Требуется подтверждение",
-                description=approval_payload.get("description") or "",
-                proposed_actions=approval_payload.get("proposed_actions") or [],
-                preview=approval_payload.get("preview") or preview,
-            )
+            # Запрос подтверждения фиксируется одной транзакцией; ожидание — уже вне её
+            with store.transaction():
+                approval = store.create_approval(
+                    run_id=run["id"],
+                    task_id=task["id"],
+                    step_id=step.get("id"),
+                    scope=approval_payload.get("scope") or manifest.name,
+                    approval_type=approval_payload.get("approval_type") or approval_type,
+                    title=approval_payload.get("title") or "Требуется подтверждение",
+                    description=approval_payload.get("description") or "",
+                    proposed_actions=approval_payload.get("proposed_actions") or [],
+                    preview=approval_payload.get("preview") or preview,
+                )
 
-            emit(
-                run["id"],
-                "approval_requested",
-                "Запрошено подтверждение",
-                {
-                    "approval_id": approval["id"],
-                    "approval_type": approval.get("approval_type"),
-                    "step_id": step.get("id"),
-                    "preview_summary": preview_summary(approval_payload.get("preview") or preview),
-                    "scope": approval["scope"],
-                    "title": approval["title"],
-                    "description": approval["description"],
-                    "proposed_actions": approval["proposed_actions"],
-                },
-                task_id=task["id"],
-                step_id=step["id"],
-            )
+                emit(
+                    run["id"],
+                    "approval_requested",
+                    "Запрошено подтверждение",
+                    {
+                        "approval_id": approval["id"],
+                        "approval_type": approval.get("approval_type"),
+                        "step_id": step.get("id"),
+                        "preview_summary": preview_summary(approval_payload.get("preview") or preview),
+                        "scope": approval["scope"],
+                        "title": approval["title"],
+                        "description": approval["description"],
+                        "proposed_actions": approval["proposed_actions"],
+                    },
+                    task_id=task["id"],
+                    step_id=step["id"],
+                )
 
-            store.update_task_status(task["id"], "waiting_approval")
-            emit(
-                run["id"],
-                "task_progress",
-                "Ожидание подтверждения",
-                {
-                    "task_id": task["id"],
-                    "step_id": step["id"],
-                    "progress": {"current": 0, "total": 1, "unit": "подтверждение"},
-                    "last_message": "Запрошено подтверждение",
-                },
-                task_id=task["id"],
-                step_id=step["id"],
-            )
+                store.update_task_status(task["id"], "waiting_approval")
+                emit(
+                    run["id"],
+                    "task_progress",
+                    "Ожидание подтверждения",
+                    {
+                        "task_id": task["id"],
+                        "step_id": step["id"],
+                        "progress": {"current": 0, "total": 1, "unit": "подтверждение"},
+                        "last_message": "Запрошено подтверждение",
+                    },
+                    task_id=task["id"],
+                    step_id=step["id"],
+                )
 
             approval = self._wait_for_approval(run["id"], approval["id"])
             emit(
@@ -135,15 +137,16 @@ class SkillRunner:
                 )
                 raise RuntimeError("Подтверждение отклонено")
 
-            emit(
-                run["id"],
-                "approval_approved",
-                "Подтверждение принято",
-                {"approval_id": approval["id"]},
-                task_id=task["id"],
-                step_id=step["id"],
-            )
-            store.update_task_status(task["id"], "running")
+            with store.transaction():
+                emit(
+                    run["id"],
+                    "approval_approved",
+                    "Подтверждение принято",
+                    {"approval_id": approval["id"]},
+                    task_id=task["id"],
+                    step_id=step["id"],
+                )
+                store.update_task_status(task["id"], "running")
 
         if skill_obj and hasattr(skill_obj, "execute"):
             return skill_obj.execute(inputs, ctx)
@@ -158,7 +161,7 @@ class SkillRunner:
                 raise RuntimeError("Подтверждение не найдено")
             if approval["status"] in ("approved", "rejected", "expired"):
                 return approval
-            run = store.get_run(run_id)
+            run = store.get_run_snapshot(run_id)
             if run and run["status"] == "canceled":
                 approval = store.update_approval_status(approval_id, "expired", "system")
                 return approval
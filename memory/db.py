@@ -1,6 +1,15 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
+import os
+import re
 import sqlite3
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 
@@ -11,6 +20,36 @@ def now_iso() -> str:
     return datetime.utcnow().isoformat() + "Z"
 
 
+# JSONB (SQLite >= 3.45): payload событий и meta запусков пишутся в бинарном
+# формате, и json_extract в запросах и генерируемых колонках не разбирает текст
+# заново. Чтение идёт через json(...) и понимает оба формата, поэтому старые
+# текстовые строки и строки JSONB уживаются в одной таблице. На старых SQLite
+# (и при ASTRA_DB_JSONB=false) пишется текст, как раньше.
+JSONB_SUPPORTED = sqlite3.sqlite_version_info >= (3, 45, 0)
+
+
+def jsonb_writes_enabled() -> bool:
+    raw = os.getenv("ASTRA_DB_JSONB", "true")
+    return JSONB_SUPPORTED and raw.strip().lower() not in ("0", "false", "no", "off")
+
+
+def json_param_sql() -> str:
+    """Плейсхолдер для записи JSON-текста в колонку payload/meta."""
+    return "jsonb(?)" if jsonb_writes_enabled() else "?"
+
+
+def json_valid_sql(column: str) -> str:
+    # Флаг 5 = RFC-8259-текст или (поверхностно проверенный) JSONB-blob
+    return f"json_valid({column}, 5)" if JSONB_SUPPORTED else f"json_valid({column})"
+
+
+def json_text_sql(column: str) -> str:
+    """Выражение, отдающее колонку JSON текстом; битые значения возвращаются как есть."""
+    if not JSONB_SUPPORTED:
+        return column
+    return f"CASE WHEN {json_valid_sql(column)} THEN json({column}) ELSE {column} END"
+
+
 def get_db_path(base_dir: Path) -> Path:
     base_dir.mkdir(parents=True, exist_ok=True)
     return base_dir / DB_FILENAME
@@ -24,6 +63,93 @@ def connect(db_path: Path) -> sqlite3.Connection:
     return conn
 
 
+def connect_reader(db_path: Path) -> sqlite3.Connection:
+    # check_same_thread=False только ради закрытия из ReaderPool.close()
+    conn = sqlite3.connect(str(db_path), check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only=ON;")
+    return conn
+
+
+class _ReaderSlot:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+
+class ReaderPool:
+    """Потоко-локальные read-only соединения к БД.
+
+    В WAL читатели не блокируют писателя и друг друга, поэтому каждый поток
+    (воркеры FastAPI, RunEngine, планировщик) читает через своё соединение.
+    Соединение закрывается вместе с завершением потока.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._slots: weakref.WeakSet[_ReaderSlot] = weakref.WeakSet()
+        self._closed = False
+
+    def get(self) -> sqlite3.Connection:
+        slot = getattr(self._local, "slot", None)
+        if slot is not None:
+            return slot.conn
+        conn = connect_reader(self.db_path)
+        slot = _ReaderSlot(conn)
+        with self._lock:
+            if self._closed:
+                conn.close()
+                raise RuntimeError("База данных не инициализирована")
+            self._slots.add(slot)
+        self._local.slot = slot
+        return conn
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._slots)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            slots = list(self._slots)
+            self._slots.clear()
+        for slot in slots:
+            try:
+                slot.conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_LOG = logging.getLogger(__name__)
+
+# Номера, под которыми исторически лежат по две миграции (002_*, 003_*): внутри
+# номера порядок — по имени файла. Новые повторы номера запрещены.
+_LEGACY_DUPLICATE_PREFIXES = frozenset({2, 3})
+_MIGRATION_NAME_RE = re.compile(r"^(\d+)_")
+_STATE_KEY = "migrations"
+
+
+@dataclass
+class MigrationReport:
+    fast_path: bool
+    applied: list[str] = field(default_factory=list)
+    timings_ms: dict[str, float] = field(default_factory=dict)
+    total_ms: float = 0.0
+    fingerprint: str | None = None
+    # PRAGMA/VACUUM, которые не выполнились и будут повторены при следующем старте
+    pending: list[str] = field(default_factory=list)
+    # Миграции, чей VACUUM отложен до прохода обслуживания (входят и в pending)
+    postponed: list[str] = field(default_factory=list)
+
+
+_last_report: MigrationReport | None = None
+
+
+def last_migration_report() -> MigrationReport | None:
+    return _last_report
+
+
 def _ensure_migrations_table(conn: sqlite3.Connection) -> None:
     conn.execute(
         """
@@ -34,30 +160,223 @@ def _ensure_migrations_table(conn: sqlite3.Connection) -> None:
         )
         """
     )
-    conn.commit()
+    # Отпечаток набора миграций и штамп каталога, при котором он снят
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
 
 
 def _applied_migrations(conn: sqlite3.Connection) -> set[str]:
-    _ensure_migrations_table(conn)
     rows = conn.execute("SELECT name FROM schema_migrations").fetchall()
     return {row["name"] for row in rows}
 
 
-def apply_migrations(conn: sqlite3.Connection, migrations_dir: Path) -> None:
-    _ensure_migrations_table(conn)
-    applied = _applied_migrations(conn)
+def _dir_stamp(migrations_dir: Path) -> str:
+    # mtime каталога меняется при добавлении, удалении и переименовании файлов
+    st = migrations_dir.stat()
+    return f"{migrations_dir.resolve()}:{st.st_ino}:{st.st_mtime_ns}"
 
-    migration_files = sorted(p for p in migrations_dir.glob("*.sql"))
-    for path in migration_files:
-        if path.name in applied:
-            continue
-        sql = path.read_text(encoding="utf-8")
-        conn.executescript(sql)
-        conn.execute(
-            "INSERT INTO schema_migrations (name, applied_at) VALUES (?, ?)",
-            (path.name, now_iso()),
-        )
-        conn.commit()
+
+def _read_state(conn: sqlite3.Connection) -> dict | None:
+    try:
+        row = conn.execute("SELECT value FROM schema_state WHERE key = ?", (_STATE_KEY,)).fetchone()
+    except sqlite3.OperationalError:
+        # Новая БД или БД до появления schema_state
+        return None
+    return json.loads(row["value"]) if row else None
+
+
+def _migration_sort_key(path: Path) -> tuple[int, str]:
+    match = _MIGRATION_NAME_RE.match(path.name)
+    if not match:
+        raise RuntimeError(f"Имя миграции должно начинаться с номера: {path.name}")
+    return int(match.group(1)), path.name
+
+
+def _migration_files(migrations_dir: Path) -> list[Path]:
+    files = sorted(migrations_dir.glob("*.sql"), key=_migration_sort_key)
+    seen: dict[int, str] = {}
+    for path in files:
+        number = _migration_sort_key(path)[0]
+        if number in seen and number not in _LEGACY_DUPLICATE_PREFIXES:
+            raise RuntimeError(f"Номер миграции {number} повторяется: {seen[number]} и {path.name}")
+        seen.setdefault(number, path.name)
+    return files
+
+
+def _fingerprint(sources: list[tuple[str, str]]) -> str:
+    digest = hashlib.sha256()
+    for name, sql in sources:
+        digest.update(name.encode("utf-8") + b"\0" + hashlib.sha256(sql.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+def _split_statements(sql: str) -> list[str]:
+    """Делит скрипт на операторы; complete_statement учитывает BEGIN ... END триггеров."""
+    statements: list[str] = []
+    buffer = ""
+    for part in sql.split(";"):
+        buffer += part + ";"
+        if sqlite3.complete_statement(buffer):
+            statement = buffer.strip()
+            if statement.strip(";"):
+                statements.append(statement)
+            buffer = ""
+    if buffer.strip(" \n\t;"):
+        statements.append(buffer.strip())
+    return statements
+
+
+def _outside_transaction(statement: str) -> bool:
+    # PRAGMA (synchronous, auto_vacuum, ...) и VACUUM нельзя выполнять внутри транзакции
+    lines = [line for line in statement.splitlines() if line.strip() and not line.lstrip().startswith("--")]
+    head = lines[0].lstrip().upper() if lines else ""
+    return head.startswith("PRAGMA") or head.startswith("VACUUM")
+
+
+def _write_state(conn: sqlite3.Connection, state: dict) -> None:
+    conn.execute(
+        "INSERT INTO schema_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (_STATE_KEY, json.dumps(state, ensure_ascii=False)),
+    )
+
+
+def _is_vacuum(statement: str) -> bool:
+    lines = [line for line in statement.splitlines() if line.strip() and not line.lstrip().startswith("--")]
+    return bool(lines) and lines[0].lstrip().upper().startswith("VACUUM")
+
+
+def _vacuum_at_start() -> bool:
+    raw = os.getenv("ASTRA_MIGRATION_VACUUM_AT_START", "false")
+    return raw.strip().lower() not in ("0", "false", "no", "off")
+
+
+def _run_deferred(
+    conn: sqlite3.Connection,
+    pending: list[list[str]],
+    report: MigrationReport,
+    *,
+    allow_vacuum: bool = True,
+) -> list[list[str]]:
+    """Выполняет отложенные PRAGMA/VACUUM по порядку; возвращает невыполненный хвост.
+
+    Без allow_vacuum останавливается на первом VACUUM: он переписывает весь
+    файл БД и держит запись всё это время, поэтому на старте не выполняется.
+    """
+    for index, (name, statement) in enumerate(pending):
+        if not allow_vacuum and _is_vacuum(statement):
+            report.postponed = sorted({item[0] for item in pending[index:] if _is_vacuum(item[1])})
+            _LOG.warning("migrations %s: VACUUM postponed to the maintenance pass", report.postponed)
+            return pending[index:]
+        step_started = time.perf_counter()
+        try:
+            conn.execute(statement)
+        except sqlite3.Error as exc:
+            # Например, VACUUM при открытом читателе: повторим при следующем старте
+            _LOG.warning("migration %s: deferred statement failed, will retry: %s", name, exc)
+            return pending[index:]
+        report.timings_ms[name] = report.timings_ms.get(name, 0.0) + (time.perf_counter() - step_started) * 1000
+    return []
+
+
+def apply_migrations(conn: sqlite3.Connection, migrations_dir: Path) -> MigrationReport:
+    """Применяет новые миграции одной транзакцией.
+
+    Если штамп каталога (один stat) совпадает с сохранённым вместе с отпечатком,
+    файлы не читаются вовсе. Иначе файлы читаются и хэшируются; совпавший
+    отпечаток (каталог тронут, содержимое то же) только обновляет штамп.
+    Недостающие миграции выполняются в порядке (номер, имя) в одной транзакции
+    с откатом при ошибке. PRAGMA и VACUUM из них выполняются после коммита;
+    пока они не прошли, в schema_state лежит их список вместо штампа, и каждый
+    следующий старт повторяет их.
+
+    VACUUM на старте выполняется только для новой БД (пустой schema_migrations)
+    или при ASTRA_MIGRATION_VACUUM_AT_START=true; иначе он остаётся в списке
+    (report.postponed) до run_deferred_migrations() из прохода обслуживания.
+    """
+    global _last_report
+    started = time.perf_counter()
+    stamp = _dir_stamp(migrations_dir)
+    state = _read_state(conn) or {}
+    if state.get("stamp") == stamp and state.get("fingerprint"):
+        _last_report = MigrationReport(True, total_ms=(time.perf_counter() - started) * 1000, fingerprint=state["fingerprint"])
+        return _last_report
+
+    sources = [(path.name, path.read_text(encoding="utf-8")) for path in _migration_files(migrations_dir)]
+    fingerprint = _fingerprint(sources)
+    isolation_level = conn.isolation_level
+    # Транзакция управляется явно: BEGIN ... COMMIT вокруг всех файлов
+    conn.isolation_level = None
+    try:
+        if state.get("fingerprint") == fingerprint and not state.get("deferred"):
+            _write_state(conn, {"stamp": stamp, "fingerprint": fingerprint})
+            _last_report = MigrationReport(True, total_ms=(time.perf_counter() - started) * 1000, fingerprint=fingerprint)
+            return _last_report
+
+        report = MigrationReport(False, fingerprint=fingerprint)
+        pending: list[list[str]] = [list(item) for item in state.get("deferred") or []]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _ensure_migrations_table(conn)
+            applied = _applied_migrations(conn)
+            # VACUUM новой БД почти мгновенный — его не откладываем
+            allow_vacuum = not applied or _vacuum_at_start()
+            for name, sql in sources:
+                if name in applied:
+                    continue
+                file_started = time.perf_counter()
+                try:
+                    for statement in _split_statements(sql):
+                        if _outside_transaction(statement):
+                            pending.append([name, statement])
+                        else:
+                            conn.execute(statement)
+                except sqlite3.Error as exc:
+                    raise RuntimeError(f"Миграция {name} не применена: {exc}") from exc
+                conn.execute("INSERT INTO schema_migrations (name, applied_at) VALUES (?, ?)", (name, now_iso()))
+                report.applied.append(name)
+                report.timings_ms[name] = (time.perf_counter() - file_started) * 1000
+            # Штамп пишется только вместе с выполненными отложенными операторами
+            _write_state(conn, {"deferred": pending} if pending else {"stamp": stamp, "fingerprint": fingerprint})
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        if pending:
+            remaining = _run_deferred(conn, pending, report, allow_vacuum=allow_vacuum)
+            _write_state(conn, {"deferred": remaining} if remaining else {"stamp": stamp, "fingerprint": fingerprint})
+            report.pending = [name for name, _ in remaining]
+    finally:
+        conn.isolation_level = isolation_level
+    report.total_ms = (time.perf_counter() - started) * 1000
+    if report.applied:
+        _LOG.info("migrations applied=%s total_ms=%.1f", report.applied, report.total_ms)
+    _last_report = report
+    return report
+
+
+def run_deferred_migrations(conn: sqlite3.Connection) -> MigrationReport | None:
+    """Выполняет отложенные PRAGMA/VACUUM миграций, включая VACUUM; None — выполнять нечего.
+
+    Вызывается проходом обслуживания под замком писателя. После успеха штампа
+    в schema_state нет, и следующий старт один раз проверит каталог миграций.
+    """
+    state = _read_state(conn) or {}
+    pending = [list(item) for item in state.get("deferred") or []]
+    if not pending:
+        return None
+    started = time.perf_counter()
+    report = MigrationReport(False)
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        remaining = _run_deferred(conn, pending, report)
+        _write_state(conn, {"deferred": remaining} if remaining else {})
+    finally:
+        conn.isolation_level = isolation_level
+    report.pending = [name for name, _ in remaining]
+    report.total_ms = (time.perf_counter() - started) * 1000
+    _LOG.info("deferred migration statements done=%s pending=%s total_ms=%.1f", list(report.timings_ms), report.pending, report.total_ms)
+    return report
 
 
 def ensure_db(base_dir: Path, migrations_dir: Path) -> sqlite3.Connection:
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+_INSERT_SQL = (
+    "INSERT INTO events (rowid, id, run_id, ts, type, level, message, payload, task_id, step_id) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, {payload}, ?, ?)"
+)
+
+
+class EventWriter:
+    """Фоновая запись событий группами (group commit).
+
+    seq (rowid) выделяется сразу при постановке в очередь, поэтому вызывающий
+    получает его без ожидания коммита. Очередь строго упорядочена по seq, и
+    единственный поток-писатель коммитит её префиксами — порядок событий внутри
+    запуска сохраняется. on_committed вызывается этим же потоком после коммита
+    пачки, тоже по возрастанию seq: подписчики не видят событий, которых нет в
+    БД. Строки, которые не удалось записать, передаются в on_error (без
+    on_committed), и last_seq в stats() на них останавливается.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        lock: threading.Lock,
+        *,
+        next_seq: int,
+        max_batch: int = 256,
+        max_delay_s: float = 0.02,
+        on_error: Callable[[Exception, list[tuple]], None] | None = None,
+        payload_sql: str = "?",
+    ) -> None:
+        self._conn = conn
+        # payload_sql — "jsonb(?)", если payload хранится как JSONB
+        self._insert_sql = _INSERT_SQL.format(payload=payload_sql)
+        self._lock = lock
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay_s = max(0.0, float(max_delay_s))
+        self._on_error = on_error
+        self._cond = threading.Condition()
+        self._queue: deque[tuple] = deque()
+        self._callbacks: dict[int, Callable[[int], None]] = {}
+        self._next_seq = max(1, int(next_seq))
+        # _done_seq — последний обработанный seq (записан или нет), _written_seq —
+        # последний seq, до которого всё закоммичено; на упавшей строке он
+        # останавливается
+        self._done_seq = self._next_seq - 1
+        self._written_seq = self._done_seq
+        self._failed_seqs: deque[int] = deque(maxlen=4096)
+        self._failed_events = 0
+        self._flush_requested = False
+        self._stopped = False
+        self._batches = 0
+        self._events = 0
+        self._max_batch_seen = 0
+        self._thread = threading.Thread(target=self._loop, name="event-writer", daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        row: tuple[Any, ...],
+        *,
+        durable: bool = False,
+        on_committed: Callable[[int], None] | None = None,
+    ) -> int:
+        """Ставит строку события в очередь; возвращает выделенный seq.
+
+        row — значения (id, run_id, ts, type, level, message, payload, task_id, step_id).
+        on_committed(seq) вызывается потоком-писателем после коммита строки.
+        При durable=True ждёт, пока событие будет закоммичено (и on_committed
+        отработает).
+        """
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Запись событий остановлена")
+            seq = self._next_seq
+            self._next_seq += 1
+            self._queue.append((seq, *row))
+            if on_committed is not None:
+                self._callbacks[seq] = on_committed
+            if durable:
+                self._flush_requested = True
+            if durable or len(self._queue) == 1 or len(self._queue) >= self.max_batch:
+                self._cond.notify_all()
+        if durable:
+            self.flush()
+        return seq
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Дожидается обработки всех событий, поставленных до вызова.
+
+        Возвращает False по таймауту или если часть этих событий не записалась.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._next_seq - 1
+            start = self._done_seq
+            if start >= target:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._done_seq < target:
+                if not self._thread.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 0.5)
+            return not any(start < seq <= target for seq in self._failed_seqs)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        """Сбрасывает очередь и останавливает поток-писатель."""
+        with self._cond:
+            self._stopped = True
+            self._flush_requested = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "batches": self._batches,
+                "events": self._events,
+                "pending": len(self._queue),
+                "max_batch": self._max_batch_seen,
+                "last_seq": self._written_seq,
+                "failed": self._failed_events,
+            }
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if not self._queue and self._stopped:
+                    return
+                deadline = time.monotonic() + self.max_delay_s
+                while len(self._queue) < self.max_batch and not self._flush_requested and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+                if not self._queue:
+                    self._flush_requested = False
+                callbacks = [(row[0], self._callbacks.pop(row[0])) for row in batch if row[0] in self._callbacks]
+            failed = self._write(batch)
+            self._run_callbacks(callbacks, failed)
+            with self._cond:
+                if failed:
+                    failed_seqs = [row[0] for row in failed]
+                    self._failed_seqs.extend(failed_seqs)
+                    self._failed_events += len(failed_seqs)
+                    if self._written_seq == self._done_seq:
+                        self._written_seq = min(failed_seqs) - 1
+                elif self._written_seq == self._done_seq:
+                    self._written_seq = batch[-1][0]
+                self._done_seq = batch[-1][0]
+                self._batches += 1
+                self._events += len(batch)
+                self._max_batch_seen = max(self._max_batch_seen, len(batch))
+                self._cond.notify_all()
+
+    def _write(self, batch: list[tuple]) -> list[tuple]:
+        """Коммитит пачку; возвращает строки, которые записать не удалось."""
+        try:
+            with self._lock:
+                try:
+                    self._conn.executemany(self._insert_sql, batch)
+                    self._conn.commit()
+                    return []
+                except sqlite3.Error:
+                    self._conn.rollback()
+                # Пачка не записалась целиком — пишем построчно, чтобы одна
+                # битая строка не потеряла соседей
+                failed: list[tuple] = []
+                last_exc: Exception | None = None
+                for row in batch:
+                    try:
+                        self._conn.execute(self._insert_sql, row)
+                    except sqlite3.Error as exc:
+                        failed.append(row)
+                        last_exc = exc
+                self._conn.commit()
+            if failed and last_exc is not None:
+                self._report(last_exc, failed)
+            return failed
+        except Exception as exc:
+            # Поток-писатель не должен падать: иначе flush() зависнет
+            self._report(exc, batch)
+            return batch
+
+    def _run_callbacks(self, callbacks: list[tuple[int, Callable[[int], None]]], failed: list[tuple]) -> None:
+        failed_seqs = {row[0] for row in failed}
+        for seq, callback in callbacks:
+            if seq in failed_seqs:
+                continue
+            try:
+                callback(seq)
+            except Exception:  # noqa: BLE001
+                pass
+
+    def _report(self, exc: Exception, rows: list[tuple]) -> None:
+        if self._on_error is None:
+            return
+        try:
+            self._on_error(exc, rows)
+        except Exception:  # noqa: BLE001
+            pass
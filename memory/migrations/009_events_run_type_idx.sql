@@ -0,0 +1,4 @@
+-- Индекс для выборки последнего события типа по запуску (история чата).
+-- rowid неявно входит в каждый индекс, поэтому ORDER BY rowid / MAX(rowid)
+-- обслуживаются этим же индексом.
+CREATE INDEX IF NOT EXISTS idx_events_run_type ON events(run_id, type);
@@ -0,0 +1,67 @@
+-- Материализованная история чата: реплики хранятся по корню диалога
+-- (root_run_id) с монотонным turn_index, чтобы история читалась диапазоном
+-- по первичному ключу, без обхода цепочки parent_run_id и JSON событий.
+ALTER TABLE runs ADD COLUMN root_run_id TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_runs_parent ON runs(parent_run_id);
+
+CREATE TEMP TABLE run_roots (id TEXT PRIMARY KEY, root_id TEXT NOT NULL);
+
+-- Корень — запуск без родителя (или с родителем, которого нет в БД).
+-- Запуски в циклах parent_run_id недостижимы от корней и становятся корнями сами себе.
+INSERT INTO run_roots (id, root_id)
+WITH RECURSIVE tree(id, root_id) AS (
+  SELECT id, id FROM runs
+  WHERE parent_run_id IS NULL OR parent_run_id NOT IN (SELECT id FROM runs)
+  UNION ALL
+  SELECT r.id, tree.root_id FROM runs r JOIN tree ON r.parent_run_id = tree.id
+)
+SELECT id, root_id FROM tree;
+
+UPDATE runs SET root_run_id = COALESCE((SELECT root_id FROM run_roots WHERE run_roots.id = runs.id), id);
+
+DROP TABLE run_roots;
+
+CREATE TABLE IF NOT EXISTS chat_turns (
+  root_run_id TEXT NOT NULL,
+  turn_index INTEGER NOT NULL,
+  run_id TEXT NOT NULL,
+  role TEXT NOT NULL,
+  content TEXT NOT NULL,
+  -- без типа: у user-реплики ts — ISO-строка created_at запуска, у assistant — ts события в мс
+  ts,
+  created_at TEXT NOT NULL,
+  PRIMARY KEY (root_run_id, turn_index)
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_turns_run_role ON chat_turns(run_id, role);
+
+-- Перенос уже существующих диалогов: текст пользователя из runs и последний
+-- chat_response_generated каждого чат-запуска, в порядке создания запусков.
+INSERT INTO chat_turns (root_run_id, turn_index, run_id, role, content, ts, created_at)
+SELECT
+  root_run_id,
+  ROW_NUMBER() OVER (PARTITION BY root_run_id ORDER BY run_created_at, run_rowid, role_order),
+  run_id,
+  role,
+  content,
+  ts,
+  run_created_at
+FROM (
+  SELECT r.root_run_id, r.id AS run_id, 'user' AS role, 0 AS role_order, r.query_text AS content,
+         r.created_at AS ts, r.created_at AS run_created_at, r.rowid AS run_rowid
+  FROM runs r
+  WHERE (r.purpose = 'chat_only' OR (json_valid(r.meta) AND json_extract(r.meta, '$.intent') = 'CHAT'))
+    AND COALESCE(r.query_text, '') <> ''
+  UNION ALL
+  SELECT r.root_run_id, r.id, 'assistant', 1, json_extract(e.payload, '$.text'),
+         e.ts, r.created_at, r.rowid
+  FROM runs r
+  JOIN events e ON e.rowid = (
+    SELECT MAX(rowid) FROM events WHERE run_id = r.id AND type = 'chat_response_generated'
+  )
+  WHERE (r.purpose = 'chat_only' OR (json_valid(r.meta) AND json_extract(r.meta, '$.intent') = 'CHAT'))
+    AND json_valid(e.payload)
+    AND json_type(e.payload, '$.text') = 'text'
+    AND json_extract(e.payload, '$.text') <> ''
+);
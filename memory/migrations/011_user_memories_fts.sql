@@ -0,0 +1,61 @@
+-- Полнотекстовый индекс профильной памяти (external content над user_memories).
+-- Синхронизируется триггерами, поэтому код записи в user_memories не меняется.
+CREATE VIRTUAL TABLE IF NOT EXISTS user_memories_fts USING fts5(
+  title,
+  content,
+  content='user_memories',
+  content_rowid='rowid',
+  tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS user_memories_fts_ai AFTER INSERT ON user_memories BEGIN
+  INSERT INTO user_memories_fts (rowid, title, content) VALUES (NEW.rowid, NEW.title, NEW.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_memories_fts_ad AFTER DELETE ON user_memories BEGIN
+  INSERT INTO user_memories_fts (user_memories_fts, rowid, title, content) VALUES ('delete', OLD.rowid, OLD.title, OLD.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_memories_fts_au AFTER UPDATE OF title, content ON user_memories BEGIN
+  INSERT INTO user_memories_fts (user_memories_fts, rowid, title, content) VALUES ('delete', OLD.rowid, OLD.title, OLD.content);
+  INSERT INTO user_memories_fts (rowid, title, content) VALUES (NEW.rowid, NEW.title, NEW.content);
+END;
+
+INSERT INTO user_memories_fts (user_memories_fts) VALUES ('rebuild');
+
+-- Теги в нормализованном виде: фильтр по тегу идёт по индексу, а не LIKE по JSON.
+-- lower() в SQLite приводит к нижнему регистру только ASCII — так же сравнивает и запрос.
+CREATE TABLE IF NOT EXISTS user_memory_tags (
+  tag TEXT NOT NULL,
+  memory_id TEXT NOT NULL,
+  PRIMARY KEY (tag, memory_id)
+);
+CREATE INDEX IF NOT EXISTS user_memory_tags_memory_idx ON user_memory_tags(memory_id);
+
+CREATE TRIGGER IF NOT EXISTS user_memory_tags_ai AFTER INSERT ON user_memories BEGIN
+  INSERT OR IGNORE INTO user_memory_tags (tag, memory_id)
+  SELECT lower(trim(value)), NEW.id
+  FROM json_each(CASE WHEN json_valid(NEW.tags) AND json_type(NEW.tags) = 'array' THEN NEW.tags ELSE '[]' END)
+  WHERE type = 'text' AND trim(value) <> '';
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_memory_tags_ad AFTER DELETE ON user_memories BEGIN
+  DELETE FROM user_memory_tags WHERE memory_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_memory_tags_au AFTER UPDATE OF tags ON user_memories BEGIN
+  DELETE FROM user_memory_tags WHERE memory_id = OLD.id;
+  INSERT OR IGNORE INTO user_memory_tags (tag, memory_id)
+  SELECT lower(trim(value)), NEW.id
+  FROM json_each(CASE WHEN json_valid(NEW.tags) AND json_type(NEW.tags) = 'array' THEN NEW.tags ELSE '[]' END)
+  WHERE type = 'text' AND trim(value) <> '';
+END;
+
+INSERT OR IGNORE INTO user_memory_tags (tag, memory_id)
+SELECT lower(trim(j.value)), m.id
+FROM user_memories m,
+     json_each(CASE WHEN json_valid(m.tags) AND json_type(m.tags) = 'array' THEN m.tags ELSE '[]' END) j
+WHERE j.type = 'text' AND trim(j.value) <> '';
+
+-- Список без запроса: is_deleted = 0 ORDER BY pinned DESC, updated_at DESC — без сортировки
+CREATE INDEX IF NOT EXISTS user_memories_listing_idx ON user_memories(is_deleted, pinned, updated_at);
@@ -0,0 +1,16 @@
+-- Холодный архив событий завершённых запусков: события переносятся из events
+-- в сжатый сегмент (NDJSON + gzip) в data dir, здесь — только его индекс.
+-- События запуска с seq <= last_seq читаются из сегмента, более поздние — из events.
+CREATE TABLE IF NOT EXISTS event_archives (
+  run_id TEXT PRIMARY KEY,
+  path TEXT NOT NULL,
+  first_seq INTEGER NOT NULL,
+  last_seq INTEGER NOT NULL,
+  event_count INTEGER NOT NULL,
+  raw_bytes INTEGER NOT NULL,
+  stored_bytes INTEGER NOT NULL,
+  archived_at TEXT NOT NULL
+);
+
+-- MAX(last_seq) входит в верхнюю границу seq: архивированные seq не выдаются повторно
+CREATE INDEX IF NOT EXISTS idx_event_archives_last_seq ON event_archives(last_seq);
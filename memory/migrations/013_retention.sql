@@ -0,0 +1,12 @@
+-- Индексы по возрасту строк для фоновой очистки (retention): старые строки
+-- выбираются небольшими пачками по индексу, без полного прохода по таблице.
+CREATE INDEX IF NOT EXISTS idx_tasks_finished_at ON tasks(finished_at);
+CREATE INDEX IF NOT EXISTS idx_sources_retrieved_at ON sources(retrieved_at);
+CREATE INDEX IF NOT EXISTS idx_facts_created_at ON facts(created_at);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created_at ON artifacts(created_at);
+
+-- auto_vacuum=INCREMENTAL: освобождённые страницы возвращаются ОС через
+-- PRAGMA incremental_vacuum короткими шагами. Режим меняется только полным
+-- VACUUM — один раз при этой миграции.
+PRAGMA auto_vacuum=INCREMENTAL;
+VACUUM;
@@ -0,0 +1,13 @@
+-- Горячие поля из JSON — в SQL: runs.intent генерируется из meta.intent
+-- (текст или JSONB) и индексируется, поэтому отбор чат-запусков и фильтр
+-- списка запусков по intent не разбирают meta в Python.
+-- Битый текст meta даёт NULL, а не ошибку при построении индекса.
+ALTER TABLE runs ADD COLUMN intent TEXT GENERATED ALWAYS AS (
+  CASE WHEN typeof(meta) = 'blob' OR json_valid(meta) THEN json_extract(meta, '$.intent') END
+) VIRTUAL;
+
+CREATE INDEX IF NOT EXISTS idx_runs_project_intent ON runs(project_id, intent, created_at);
+
+-- События шага по типу (экспорт с step_id): частичный индекс — события без
+-- шага (большинство) в него не попадают.
+CREATE INDEX IF NOT EXISTS idx_events_step_type ON events(step_id, type) WHERE step_id IS NOT NULL;
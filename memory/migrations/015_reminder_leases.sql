@@ -0,0 +1,9 @@
+-- Аренда захваченного напоминания: claim_due_reminders ставит lease_until,
+-- и запись в статусе 'sending' с истёкшей арендой (процесс упал посреди
+-- доставки) снова берётся в работу. Зависшим до этой миграции 'sending'
+-- аренда ставится по последнему изменению — она уже истекла.
+ALTER TABLE reminders ADD COLUMN lease_until TEXT;
+
+UPDATE reminders SET lease_until = COALESCE(updated_at, created_at) WHERE status = 'sending';
+
+CREATE INDEX IF NOT EXISTS idx_reminders_status_lease ON reminders(status, lease_until);
@@ -0,0 +1,17 @@
+-- Постоянный кэш ответов LLM между запусками. Ключ — хэш маршрута, модели,
+-- параметров генерации и сообщений (BrainRouter._cache_key). Время — epoch
+-- секунды: expires_at задаёт TTL по purpose, last_used_at — порядок LRU-вытеснения.
+CREATE TABLE IF NOT EXISTS llm_cache (
+  key TEXT PRIMARY KEY,
+  purpose TEXT NOT NULL,
+  model_id TEXT,
+  response TEXT NOT NULL,
+  size_bytes INTEGER NOT NULL,
+  created_at REAL NOT NULL,
+  expires_at REAL NOT NULL,
+  last_used_at REAL NOT NULL,
+  hits INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used_at);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache(expires_at);
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, deque
+from types import MappingProxyType
+from typing import Any, Optional
+
+
+def freeze(value: Any) -> Any:
+    """Неизменяемая копия JSON-подобного значения: dict → MappingProxyType, list → tuple."""
+    kind = type(value)
+    if kind is dict:
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if kind is list:
+        return tuple([freeze(item) for item in value])
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Обратное к freeze: изменяемая копия снимка без повторного json.loads."""
+    # Точные проверки типа, а не isinstance(Mapping): ABC-проверка дороже самого копирования
+    kind = type(value)
+    if kind is MappingProxyType:
+        return {key: thaw(item) for key, item in value.items()}
+    if kind is tuple:
+        return [thaw(item) for item in value]
+    return value
+
+
+class RecordCache:
+    """LRU-кэш неизменяемых снимков записей (runs, projects) с версиями.
+
+    Функции записи store инвалидируют ключ после коммита. Чтобы читатель не
+    положил в кэш строку, прочитанную до чужого коммита, заполнение идёт по
+    токену: token() берётся до SELECT, а put() отбрасывает значение, если ключ
+    был инвалидирован после выдачи токена. Журнал инвалидаций ограничен —
+    слишком старый токен тоже отбрасывается. capacity=0 выключает кэш.
+    """
+
+    def __init__(self, capacity: int = 1024, *, log_size: int = 512) -> None:
+        self.capacity = max(0, int(capacity))
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, Any] = OrderedDict()
+        self._generation = 0
+        self._log: deque[tuple[int, str]] = deque(maxlen=max(1, int(log_size)))
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._stale_fills = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._items.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Значение без учёта в статистике и LRU."""
+        with self._lock:
+            return self._items.get(key)
+
+    def token(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, key: str, value: Any, token: int) -> bool:
+        if not self.capacity:
+            return False
+        with self._lock:
+            if token != self._generation and self._invalidated_since(key, token):
+                self._stale_fills += 1
+                return False
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+            return True
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+            self._generation += 1
+            self._log.append((self._generation, key))
+            self._invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._generation += 1
+            # Пустой журнал с новым поколением: все выданные токены устаревают
+            self._log.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "capacity": self.capacity,
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidations": self._invalidations,
+                "stale_fills": self._stale_fills,
+            }
+
+    def _invalidated_since(self, key: str, token: int) -> bool:
+        # Журнал покрывает поколения token+1..generation только если не был обрезан
+        if not self._log or self._log[0][0] > token + 1:
+            return True
+        return any(generation > token and logged == key for generation, logged in self._log)
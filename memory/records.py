@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Mapping
+from typing import Any, Callable, Iterator
+
+from .db import json_text_sql, json_valid_sql
+
+# Компактные записи строк store: __slots__ вместо dict на строку и JSON-колонки,
+# которые декодируются только при первом обращении. Записи ведут себя как
+# read-only Mapping, поэтому код, читающий event["type"] или step.get("inputs"),
+# не меняется; FastAPI сериализует их через dict(record).
+
+_UNSET: Any = object()
+
+# Колонки SELECT для EventRecord; payload — всегда текст, даже если хранится как JSONB
+EVENT_COLUMNS = (
+    "rowid, id, run_id, ts, type, level, message, task_id, step_id, "
+    f"{json_text_sql('payload')} AS payload, {json_valid_sql('payload')} AS payload_valid"
+)
+
+
+# C-кодировщик строк json (ensure_ascii=False): заметно дешевле json.dumps на каждое поле
+_encode_str = json.encoder.encode_basestring
+
+
+def _scalar(value: Any) -> str:
+    if value is None:
+        return "null"
+    if type(value) is str:
+        return _encode_str(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _decode(raw: str | None) -> Any:
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
+
+
+class _JsonField:
+    """Дескриптор лениво декодируемой JSON-колонки (как _json_load(raw) or default)."""
+
+    __slots__ = ("raw_slot", "value_slot", "default")
+
+    def __init__(self, raw_slot: str, value_slot: str, default: Callable[[], Any]) -> None:
+        self.raw_slot = raw_slot
+        self.value_slot = value_slot
+        self.default = default
+
+    def __get__(self, record: Any, owner: type | None = None) -> Any:
+        if record is None:
+            return self
+        value = getattr(record, self.value_slot)
+        if value is _UNSET:
+            value = _decode(getattr(record, self.raw_slot)) or self.default()
+            setattr(record, self.value_slot, value)
+        return value
+
+
+class _Record(Mapping):
+    __slots__ = ()
+    _keys: tuple[str, ...] = ()
+    _key_set: frozenset[str] = frozenset()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._key_set:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._key_set
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self._keys}
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class EventRecord(_Record):
+    """Строка events; payload декодируется лениво, to_json() отдаёт сохранённый текст как есть.
+
+    Строка выбирается через EVENT_COLUMNS: payload текстом и json_valid(payload) AS payload_valid.
+    """
+
+    __slots__ = ("seq", "id", "run_id", "ts", "type", "level", "message", "task_id", "step_id", "_payload_raw", "_payload")
+    _keys = ("seq", "id", "run_id", "ts", "type", "level", "message", "payload", "task_id", "step_id")
+    _key_set = frozenset(_keys)
+
+    payload = _JsonField("_payload_raw", "_payload", dict)
+
+    def __init__(self, row: Any) -> None:
+        self.seq = row["rowid"]
+        self.id = row["id"]
+        self.run_id = row["run_id"]
+        self.ts = row["ts"]
+        self.type = row["type"]
+        self.level = row["level"]
+        self.message = row["message"]
+        self.task_id = row["task_id"]
+        self.step_id = row["step_id"]
+        self._payload_raw = row["payload"]
+        # payload_valid — json_valid(payload) из того же SELECT: битый текст
+        # нельзя отдавать в SSE как есть, он нормализуется так же, как в _json_load
+        self._payload = _UNSET if row["payload_valid"] else {}
+
+    def payload_json(self) -> str:
+        """payload в виде JSON-текста без повторного кодирования, если он ещё не декодирован."""
+        raw = self._payload_raw
+        # Непустой объект/массив, записанный _json_dump, идёт как есть; пустые и
+        # скалярные значения проходят через ту же нормализацию, что и payload
+        if self._payload is _UNSET and raw and raw[0] in "{[" and raw not in ("{}", "[]"):
+            return raw
+        return json.dumps(self.payload, ensure_ascii=False)
+
+    def to_json(self) -> str:
+        """То же, что json.dumps(dict(record), ensure_ascii=False), без декодирования payload.
+
+        Payload из JSONB приходит из SQLite минифицированным — JSON тот же, пробелы другие.
+        """
+        return (
+            f'{{"seq": {_scalar(self.seq)}, "id": {_scalar(self.id)}, "run_id": {_scalar(self.run_id)}, '
+            f'"ts": {_scalar(self.ts)}, "type": {_scalar(self.type)}, "level": {_scalar(self.level)}, '
+            f'"message": {_scalar(self.message)}, "payload": {self.payload_json()}, '
+            f'"task_id": {_scalar(self.task_id)}, "step_id": {_scalar(self.step_id)}}}'
+        )
+
+    def to_archive_line(self) -> str:
+        """Строка сегмента архива: JSON-массив колонок, payload — текстом, как в БД."""
+        return json.dumps(
+            [self.seq, self.id, self.run_id, self.ts, self.type, self.level, self.message, self.payload_json(), self.task_id, self.step_id],
+            ensure_ascii=False,
+        )
+
+    @classmethod
+    def from_archive_line(cls, line: str) -> "EventRecord":
+        seq, event_id, run_id, ts, event_type, level, message, payload, task_id, step_id = json.loads(line)
+        return cls(
+            {
+                "rowid": seq,
+                "id": event_id,
+                "run_id": run_id,
+                "ts": ts,
+                "type": event_type,
+                "level": level,
+                "message": message,
+                "payload": payload,
+                "payload_valid": payload is not None,
+                "task_id": task_id,
+                "step_id": step_id,
+            }
+        )
+
+
+class PlanStepRecord(_Record):
+    """Строка plan_steps; JSON-колонки (inputs, depends_on, ...) декодируются лениво."""
+
+    __slots__ = (
+        "id",
+        "run_id",
+        "step_index",
+        "title",
+        "skill_name",
+        "status",
+        "kind",
+        "requires_approval",
+        "_inputs_raw",
+        "_inputs",
+        "_depends_on_raw",
+        "_depends_on",
+        "_success_criteria_raw",
+        "_success_criteria",
+        "_success_checks_raw",
+        "_success_checks",
+        "_danger_flags_raw",
+        "_danger_flags",
+        "_artifacts_expected_raw",
+        "_artifacts_expected",
+    )
+    _keys = (
+        "id",
+        "run_id",
+        "step_index",
+        "title",
+        "skill_name",
+        "inputs",
+        "depends_on",
+        "status",
+        "kind",
+        "success_criteria",
+        "success_checks",
+        "danger_flags",
+        "requires_approval",
+        "artifacts_expected",
+    )
+    _key_set = frozenset(_keys)
+
+    inputs = _JsonField("_inputs_raw", "_inputs", dict)
+    depends_on = _JsonField("_depends_on_raw", "_depends_on", list)
+    success_criteria = _JsonField("_success_criteria_raw", "_success_criteria", str)
+    success_checks = _JsonField("_success_checks_raw", "_success_checks", list)
+    danger_flags = _JsonField("_danger_flags_raw", "_danger_flags", list)
+    artifacts_expected = _JsonField("_artifacts_expected_raw", "_artifacts_expected", list)
+
+    def __init__(self, row: Any, kind: str) -> None:
+        self.id = row["id"]
+        self.run_id = row["run_id"]
+        self.step_index = row["step_index"]
+        self.title = row["title"]
+        self.skill_name = row["skill_name"]
+        self.status = row["status"]
+        self.kind = kind
+        self.requires_approval = bool(row["requires_approval"]) if row["requires_approval"] is not None else False
+        self._inputs_raw = row["inputs"]
+        self._inputs = _UNSET
+        self._depends_on_raw = row["depends_on"]
+        self._depends_on = _UNSET
+        self._success_criteria_raw = row["success_criteria"]
+        self._success_criteria = _UNSET
+        self._success_checks_raw = row["success_checks"]
+        self._success_checks = _UNSET
+        self._danger_flags_raw = row["danger_flags"]
+        self._danger_flags = _UNSET
+        self._artifacts_expected_raw = row["artifacts_expected"]
+        self._artifacts_expected = _UNSET
+
+
+def json_default(value: Any) -> Any:
+    """default= для json.dumps: записи сериализуются как обычные dict."""
+    if isinstance(value, _Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -1,36 +1,316 @@
 from __future__ import annotations
 
+import atexit
+import gzip
+import hashlib
 import json
+import logging
 import os
+import re
 import sqlite3
 import threading
 import uuid
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import islice
 from pathlib import Path
-from typing import Any, Optional
-
-from .db import ensure_db, now_iso
-
-_lock = threading.Lock()
+from typing import Any, Callable, Iterator, Mapping, Optional
+
+from .db import (
+    ReaderPool,
+    ensure_db,
+    get_db_path,
+    json_param_sql,
+    json_text_sql,
+    now_iso,
+    run_deferred_migrations,
+)
+from .event_writer import EventWriter
+from .record_cache import RecordCache, freeze, thaw
+from .records import EVENT_COLUMNS, EventRecord, PlanStepRecord
+
+_LOG = logging.getLogger(__name__)
+
+# Запись идёт через одно соединение-писатель под _lock, чтение — через
+# потоко-локальные read-only соединения из _readers (WAL).
+# _lock реентерабельный: внутри transaction() функции записи берут его повторно
+_lock = threading.RLock()
 _conn: Optional[sqlite3.Connection] = None
+_data_dir: Optional[Path] = None
+_readers: Optional[ReaderPool] = None
+_event_writer: Optional[EventWriter] = None
+# Следующий seq для записи событий без group commit; None — прочитать из БД
+_next_event_seq: Optional[int] = None
+_tx = threading.local()
+# Снимки runs/projects для горячих get_run/get_project; размер задаётся в init()
+_run_cache = RecordCache(0)
+_project_cache = RecordCache(0)
 
 # EN kept: статусы и ключи в БД — контракт между API и UI
 
+# События, которые коммитятся синхронно (не ждут окна group commit)
+DURABLE_EVENT_TYPES = {
+    "run_done",
+    "run_failed",
+    "run_canceled",
+    "approval_requested",
+    "approval_resolved",
+}
+
+# Не чаще раза в столько секунд попадание в кэш LLM обновляет last_used_at
+LLM_CACHE_TOUCH_INTERVAL_S = 60.0
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() not in ("0", "false", "no", "off")
+
+
+def _env_number(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def _max_event_seq(conn: sqlite3.Connection) -> int:
+    """Наибольший выданный seq, включая архивированные события.
+
+    Архивированные строки удалены из events, и без MAX(last_seq) их seq были
+    бы выданы повторно после перезапуска.
+    """
+    max_seq = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM events").fetchone()[0]
+    has_archives = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'event_archives'").fetchone()
+    if has_archives:
+        archived = conn.execute("SELECT COALESCE(MAX(last_seq), 0) FROM event_archives").fetchone()[0]
+        max_seq = max(max_seq, archived)
+    return int(max_seq)
+
+
+def _log_event_write_error(exc: Exception, rows: list[tuple]) -> None:
+    # seq этих событий уже выдан вызывающему (подписчикам они не ушли) — потеря должна быть видна
+    _LOG.error(
+        "event writer dropped %d event(s), seq %s..%s: %s",
+        len(rows),
+        rows[0][0] if rows else None,
+        rows[-1][0] if rows else None,
+        exc,
+    )
+
+
+def _start_event_writer(conn: sqlite3.Connection) -> Optional[EventWriter]:
+    if not _env_flag("ASTRA_EVENT_GROUP_COMMIT", True):
+        return None
+    return EventWriter(
+        conn,
+        _lock,
+        next_seq=_max_event_seq(conn) + 1,
+        max_batch=int(_env_number("ASTRA_EVENT_BATCH_MAX", 256)),
+        max_delay_s=_env_number("ASTRA_EVENT_BATCH_WINDOW_MS", 20) / 1000.0,
+        on_error=_log_event_write_error,
+        payload_sql=json_param_sql(),
+    )
+
 
 def init(base_dir: Path, migrations_dir: Path) -> None:
-    global _conn
+    global _conn, _data_dir, _readers, _event_writer, _run_cache, _project_cache
     with _lock:
         if _conn is None:
             _conn = ensure_db(base_dir, migrations_dir)
+            _data_dir = base_dir
+            if _env_flag("ASTRA_DB_READ_POOL", True):
+                _readers = ReaderPool(get_db_path(base_dir))
+            _event_writer = _start_event_writer(_conn)
+            capacity = int(_env_number("ASTRA_STORE_CACHE_SIZE", 1024))
+            _run_cache = RecordCache(capacity)
+            _project_cache = RecordCache(capacity)
+
+
+def flush_events(timeout: float | None = None) -> bool:
+    """Дожидается записи всех событий из очереди group commit."""
+    writer = _event_writer
+    if writer is None:
+        return True
+    if _in_transaction():
+        # Писатель событий ждёт _lock, который держит открытая транзакция этого
+        # потока, — сброс откладывается до её коммита
+        _tx.flush_pending = True
+        return False
+    return writer.flush(timeout)
+
+
+def cache_stats() -> dict:
+    """Счётчики попаданий/промахов кэша снимков runs и projects."""
+    return {"runs": _run_cache.stats(), "projects": _project_cache.stats()}
+
+
+def event_writer_stats() -> dict:
+    writer = _event_writer
+    if writer is None:
+        return {"batches": 0, "events": 0, "pending": 0, "max_batch": 0, "last_seq": None, "failed": 0}
+    return writer.stats()
+
+
+def shutdown() -> None:
+    """Сбрасывает очередь событий и останавливает фоновую запись."""
+    global _event_writer
+    writer = _event_writer
+    _event_writer = None
+    if writer is not None:
+        writer.stop()
+
+
+atexit.register(shutdown)
 
 
 def reset_for_tests() -> None:
     """Сбрасывает соединение БД для изоляции тестов."""
-    global _conn
+    global _conn, _data_dir, _readers, _next_event_seq
+    shutdown()
     with _lock:
+        if _readers is not None:
+            _readers.close()
+        _readers = None
         if _conn is not None:
             _conn.close()
         _conn = None
+        _data_dir = None
+        _next_event_seq = None
+        _run_cache.clear()
+        _project_cache.clear()
+        _reminder_listeners.clear()
+
+
+def _in_transaction() -> bool:
+    return getattr(_tx, "depth", 0) > 0
+
+
+def _commit(conn: sqlite3.Connection) -> None:
+    # Внутри transaction() коммитит только внешний блок
+    if not _in_transaction():
+        conn.commit()
+
+
+def _rollback(conn: sqlite3.Connection) -> None:
+    if not _in_transaction():
+        conn.rollback()
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """Unit of work: все записи store внутри блока уходят одним коммитом.
+
+    Блок держит _lock писателя, поэтому должен быть коротким — без ожидания
+    пользователя или сети внутри. Исключение откатывает всё; вложенные блоки
+    присоединяются к внешнему. Чтения в этом потоке идут через писателя и видят
+    незакоммиченные изменения. События блока копятся до коммита внешнего блока:
+    только после него они получают seq, уходят писателю и подписчикам, а
+    колбэки after_commit() вызываются уже вне _lock. Откат их отбрасывает.
+    """
+    conn = _conn_or_raise()
+    with _lock:
+        depth = getattr(_tx, "depth", 0)
+        if depth == 0:
+            _tx.invalidations = []
+            _tx.events = []
+            _tx.after_commit = []
+        _tx.depth = depth + 1
+        try:
+            yield conn
+            if depth == 0 and _event_writer is None:
+                # Без group commit строки событий входят в ту же транзакцию
+                for event, row, _, _ in _tx.events:
+                    event["seq"] = _insert_event_row(conn, row)
+        except BaseException:
+            _tx.depth = depth
+            if depth == 0:
+                conn.rollback()
+                _tx.events = []
+                _tx.after_commit = []
+                _apply_invalidations()
+            raise
+        _tx.depth = depth
+        if depth == 0:
+            conn.commit()
+            _apply_invalidations()
+            _dispatch_tx_events()
+    if depth == 0:
+        callbacks = _tx.after_commit
+        _tx.after_commit = []
+        if getattr(_tx, "flush_pending", False):
+            _tx.flush_pending = False
+            flush_events()
+        for callback in callbacks:
+            callback()
+
+
+def after_commit(callback: Callable[[], None]) -> None:
+    """Вызывает callback после коммита текущей транзакции (или сразу вне её).
+
+    При откате транзакции callback отбрасывается.
+    """
+    if _in_transaction():
+        _tx.after_commit.append(callback)
+    else:
+        callback()
+
+
+def _dispatch_tx_events() -> None:
+    # Вызывается под _lock сразу после коммита: порядок seq сохраняется и здесь
+    pending = _tx.events
+    _tx.events = []
+    writer = _event_writer
+    for event, row, durable, publish in pending:
+        if writer is None:
+            if publish is not None:
+                publish(event)
+            continue
+        if durable:
+            _tx.flush_pending = True
+        _submit_event(writer, event, row, False, publish)
+
+
+def _invalidate(cache: RecordCache, key: str) -> None:
+    # Инвалидация только после коммита: иначе параллельный читатель успеет
+    # положить в кэш ещё не изменённую строку
+    if _in_transaction():
+        _tx.invalidations.append((cache, key))
+    else:
+        cache.invalidate(key)
+
+
+def _apply_invalidations() -> None:
+    pending = getattr(_tx, "invalidations", None) or []
+    _tx.invalidations = []
+    for cache, key in pending:
+        cache.invalidate(key)
+
+
+def _cache_bypassed(cache: RecordCache) -> bool:
+    # Внутри транзакции видны незакоммиченные изменения — их не кэшируем
+    return not cache.capacity or _in_transaction()
+
+
+def _cached_snapshot(cache: RecordCache, key: str, load: Callable[[sqlite3.Connection], Optional[dict]]) -> Optional[Mapping[str, Any]]:
+    """Read-through: снимок из кэша или из БД с заполнением по токену версии."""
+    if _cache_bypassed(cache):
+        record = load(_read_conn())
+        return freeze(record) if record is not None else None
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+    token = cache.token()
+    record = load(_read_conn())
+    if record is None:
+        return None
+    snapshot = freeze(record)
+    cache.put(key, snapshot, token)
+    return snapshot
 
 
 def _conn_or_raise() -> sqlite3.Connection:
@@ -39,6 +319,19 @@ def _conn_or_raise() -> sqlite3.Connection:
     return _conn
 
 
+def _read_conn() -> sqlite3.Connection:
+    """Соединение для чтения текущего потока (или писатель, если пул выключен)."""
+    readers = _readers
+    if readers is None or _in_transaction():
+        return _conn_or_raise()
+    return readers.get()
+
+
+def reader_pool_size() -> int:
+    readers = _readers
+    return readers.size() if readers is not None else 0
+
+
 def _json_dump(value: Any) -> str:
     return json.dumps(value, ensure_ascii=False)
 
@@ -81,6 +374,7 @@ def _reminder_row(row: sqlite3.Row) -> dict:
         "sent_at": row["sent_at"],
         "updated_at": row["updated_at"],
         "attempts": row["attempts"],
+        "lease_until": row["lease_until"],
     }
 
 
@@ -100,15 +394,15 @@ def _infer_plan_step_kind(skill_name: str | None) -> str:
     return "COMPUTER_ACTIONS"
 
 
-def _insert_fts(project_id: str, run_id: str, item_type: str, item_id: str, content: str, created_at: str, tags: Optional[str] = None) -> None:
-    conn = _conn_or_raise()
+def _insert_fts_rows(conn: sqlite3.Connection, rows: list[tuple]) -> None:
+    """Пишет строки memory_fts в текущую транзакцию; вызывается под _lock."""
+    if not rows:
+        return
     try:
-        with _lock:
-            conn.execute(
-                "INSERT INTO memory_fts (project_id, run_id, type, item_id, content, created_at, tags) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (project_id, run_id, item_type, item_id, content, created_at, tags),
-            )
-            conn.commit()
+        conn.executemany(
+            "INSERT INTO memory_fts (project_id, run_id, type, item_id, content, created_at, tags) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
     except sqlite3.OperationalError:
         # FTS-таблица не доступна
         return
@@ -127,7 +421,7 @@ def create_project(name: str, tags: list[str] | None, settings: dict | None) ->
             "INSERT INTO projects (id, name, tags, settings, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
             (project_id, name, tags_json, settings_json, created_at, updated_at),
         )
-        conn.commit()
+        _commit(conn)
 
     return {
         "id": project_id,
@@ -140,26 +434,12 @@ def create_project(name: str, tags: list[str] | None, settings: dict | None) ->
 
 
 def list_projects() -> list[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     rows = conn.execute("SELECT * FROM projects ORDER BY updated_at DESC").fetchall()
-    return [
-        {
-            "id": r["id"],
-            "name": r["name"],
-            "tags": _json_load(r["tags"]) or [],
-            "settings": _json_load(r["settings"]) or {},
-            "created_at": r["created_at"],
-            "updated_at": r["updated_at"],
-        }
-        for r in rows
-    ]
+    return [_project_row(r) for r in rows]
 
 
-def get_project(project_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
-    row = conn.execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone()
-    if not row:
-        return None
+def _project_row(row: sqlite3.Row) -> dict:
     return {
         "id": row["id"],
         "name": row["name"],
@@ -170,6 +450,23 @@ def get_project(project_id: str) -> Optional[dict]:
     }
 
 
+def _load_project(conn: sqlite3.Connection, project_id: str) -> Optional[dict]:
+    row = conn.execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone()
+    return _project_row(row) if row else None
+
+
+def get_project_snapshot(project_id: str) -> Optional[Mapping[str, Any]]:
+    """Неизменяемый снимок проекта из кэша — для частых проверок без копирования."""
+    return _cached_snapshot(_project_cache, project_id, lambda conn: _load_project(conn, project_id))
+
+
+def get_project(project_id: str) -> Optional[dict]:
+    if _cache_bypassed(_project_cache):
+        return _load_project(_read_conn(), project_id)
+    snapshot = get_project_snapshot(project_id)
+    return thaw(snapshot) if snapshot is not None else None
+
+
 def update_project(project_id: str, name: str | None, tags: list[str] | None, settings: dict | None) -> Optional[dict]:
     project = get_project(project_id)
     if not project:
@@ -185,7 +482,8 @@ def update_project(project_id: str, name: str | None, tags: list[str] | None, se
             "UPDATE projects SET name = ?, tags = ?, settings = ?, updated_at = ? WHERE id = ?",
             (new_name, _json_dump(new_tags), _json_dump(new_settings), updated_at, project_id),
         )
-        conn.commit()
+        _commit(conn)
+    _invalidate(_project_cache, project_id)
 
     return {
         "id": project_id,
@@ -204,23 +502,29 @@ def create_run(
     parent_run_id: Optional[str] = None,
     purpose: Optional[str] = None,
     meta: Optional[dict] = None,
+    run_id: Optional[str] = None,
 ) -> dict:
-    run_id = _uuid()
+    run_id = run_id or _uuid()
     created_at = now_iso()
     meta_json = _json_dump(meta) if meta is not None else None
     conn = _conn_or_raise()
     with _lock:
+        root_run_id = _resolve_root_run_id(conn, run_id, parent_run_id)
         conn.execute(
-            "INSERT INTO runs (id, project_id, query_text, mode, status, created_at, parent_run_id, purpose, meta) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (run_id, project_id, query_text, mode, "created", created_at, parent_run_id, purpose, meta_json),
+            "INSERT INTO runs (id, project_id, query_text, mode, status, created_at, parent_run_id, purpose, meta, root_run_id) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, {json_param_sql()}, ?)",
+            (run_id, project_id, query_text, mode, "created", created_at, parent_run_id, purpose, meta_json, root_run_id),
         )
-        conn.commit()
+        if query_text and _is_chat_run({"purpose": purpose, "meta": meta}):
+            _upsert_chat_turn(conn, root_run_id, run_id, "user", query_text, created_at)
+        _commit(conn)
     return {
         "id": run_id,
         "project_id": project_id,
         "query_text": query_text,
         "mode": mode,
         "parent_run_id": parent_run_id,
+        "root_run_id": root_run_id,
         "purpose": purpose,
         "meta": meta or {},
         "status": "created",
@@ -230,17 +534,21 @@ def create_run(
     }
 
 
-def get_run(run_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
-    row = conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
-    if not row:
-        return None
+# Колонки runs для _run_row; meta отдаётся текстом, даже если хранится как JSONB
+_RUN_COLUMNS = (
+    "runs.id, runs.project_id, runs.query_text, runs.mode, runs.status, runs.created_at, runs.started_at, "
+    f"runs.finished_at, runs.parent_run_id, runs.root_run_id, runs.purpose, {json_text_sql('runs.meta')} AS meta"
+)
+
+
+def _run_row(row: sqlite3.Row) -> dict:
     return {
         "id": row["id"],
         "project_id": row["project_id"],
         "query_text": row["query_text"],
         "mode": row["mode"],
         "parent_run_id": row["parent_run_id"],
+        "root_run_id": row["root_run_id"],
         "purpose": row["purpose"],
         "meta": _json_load(row["meta"]) or {},
         "status": row["status"],
@@ -250,6 +558,23 @@ def get_run(run_id: str) -> Optional[dict]:
     }
 
 
+def _load_run(conn: sqlite3.Connection, run_id: str) -> Optional[dict]:
+    row = conn.execute(f"SELECT {_RUN_COLUMNS} FROM runs WHERE id = ?", (run_id,)).fetchone()
+    return _run_row(row) if row else None
+
+
+def get_run_snapshot(run_id: str) -> Optional[Mapping[str, Any]]:
+    """Неизменяемый снимок запуска из кэша — для циклов опроса статуса."""
+    return _cached_snapshot(_run_cache, run_id, lambda conn: _load_run(conn, run_id))
+
+
+def get_run(run_id: str) -> Optional[dict]:
+    if _cache_bypassed(_run_cache):
+        return _load_run(_read_conn(), run_id)
+    snapshot = get_run_snapshot(run_id)
+    return thaw(snapshot) if snapshot is not None else None
+
+
 def update_run_meta_and_mode(run_id: str, *, mode: str, purpose: str | None, meta: dict | None) -> Optional[dict]:
     run = get_run(run_id)
     if not run:
@@ -257,36 +582,37 @@ def update_run_meta_and_mode(run_id: str, *, mode: str, purpose: str | None, met
     conn = _conn_or_raise()
     with _lock:
         conn.execute(
-            "UPDATE runs SET mode = ?, purpose = ?, meta = ? WHERE id = ?",
+            f"UPDATE runs SET mode = ?, purpose = ?, meta = {json_param_sql()} WHERE id = ?",
             (mode, purpose, _json_dump(meta or {}), run_id),
         )
-        conn.commit()
+        # intent становится известен только после semantic decision — тогда же
+        # реплика пользователя попадает в chat_turns (или убирается оттуда)
+        root_run_id = run.get("root_run_id") or run_id
+        if _is_chat_run({"purpose": purpose, "meta": meta}):
+            if run.get("query_text"):
+                _upsert_chat_turn(conn, root_run_id, run_id, "user", run["query_text"], run["created_at"])
+        else:
+            conn.execute("DELETE FROM chat_turns WHERE run_id = ?", (run_id,))
+        _commit(conn)
+    _invalidate(_run_cache, run_id)
     return get_run(run_id)
 
 
-def list_runs(project_id: str, limit: int = 50) -> list[dict]:
-    conn = _conn_or_raise()
+def list_runs(project_id: str, limit: int = 50, intent: str | None = None) -> list[dict]:
+    conn = _read_conn()
     limit = max(1, min(limit, 200))
-    rows = conn.execute(
-        "SELECT * FROM runs WHERE project_id = ? ORDER BY created_at DESC LIMIT ?",
-        (project_id, limit),
-    ).fetchall()
-    return [
-        {
-            "id": row["id"],
-            "project_id": row["project_id"],
-            "query_text": row["query_text"],
-            "mode": row["mode"],
-            "parent_run_id": row["parent_run_id"],
-            "purpose": row["purpose"],
-            "meta": _json_load(row["meta"]) or {},
-            "status": row["status"],
-            "created_at": row["created_at"],
-            "started_at": row["started_at"],
-            "finished_at": row["finished_at"],
-        }
-        for row in rows
-    ]
+    if intent:
+        # runs.intent — генерируемая колонка из meta.intent под индексом idx_runs_project_intent
+        rows = conn.execute(
+            f"SELECT {_RUN_COLUMNS} FROM runs WHERE project_id = ? AND intent = ? ORDER BY created_at DESC LIMIT ?",
+            (project_id, intent, limit),
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            f"SELECT {_RUN_COLUMNS} FROM runs WHERE project_id = ? ORDER BY created_at DESC LIMIT ?",
+            (project_id, limit),
+        ).fetchall()
+    return [_run_row(row) for row in rows]
 
 
 def _is_chat_run(run: dict) -> bool:
@@ -296,82 +622,250 @@ def _is_chat_run(run: dict) -> bool:
     return run.get("purpose") == "chat_only"
 
 
+# То же условие, что _is_chat_run, для строк runs в SQL (runs.intent генерируется из meta)
+_CHAT_RUN_SQL = "(purpose = 'chat_only' OR intent = 'CHAT')"
+
+
+# Цепочка parent_run_id одним запросом: depth 0 — сам run_id, дальше предки
+_RUN_CHAIN_SQL = f"""
+WITH RECURSIVE chain(id, depth) AS (
+  SELECT id, 0 FROM runs WHERE id = ?
+  UNION ALL
+  SELECT r.parent_run_id, chain.depth + 1
+  FROM chain JOIN runs r ON r.id = chain.id
+  WHERE r.parent_run_id IS NOT NULL AND chain.depth + 1 < ?
+)
+SELECT {_RUN_COLUMNS} FROM chain JOIN runs ON runs.id = chain.id
+ORDER BY chain.depth ASC
+"""
+
+
+def _run_chain_rows(run_id: str, limit: int) -> list[sqlite3.Row]:
+    conn = _read_conn()
+    rows = conn.execute(_RUN_CHAIN_SQL, (run_id, limit)).fetchall()
+    # Защита от циклов parent_run_id: обрываем цепочку на первом повторе
+    seen: set[str] = set()
+    chain: list[sqlite3.Row] = []
+    for row in rows:
+        if row["id"] in seen:
+            break
+        seen.add(row["id"])
+        chain.append(row)
+    chain.reverse()
+    return chain
+
+
+def _cached_run_chain(run_id: str, limit: int) -> Optional[list[dict]]:
+    # Цепочка целиком из кэша снимков; None — хотя бы одного звена нет
+    if _cache_bypassed(_run_cache):
+        return None
+    seen: set[str] = set()
+    chain: list[Mapping[str, Any]] = []
+    current: Optional[str] = run_id
+    while current and current not in seen and len(chain) < limit:
+        snapshot = _run_cache.peek(current)
+        if snapshot is None:
+            return None
+        seen.add(current)
+        chain.append(snapshot)
+        current = snapshot["parent_run_id"]
+    chain.reverse()
+    return [thaw(snapshot) for snapshot in chain]
+
+
 def list_run_chain(run_id: str, limit: int = 200) -> list[dict]:
     """Возвращает цепочку запусков от корня до указанного run_id."""
     if not run_id:
         return []
     limit = max(1, min(limit, 500))
-    chain: list[dict] = []
-    seen: set[str] = set()
-    current_id: Optional[str] = run_id
-    while current_id and current_id not in seen and len(chain) < limit:
-        seen.add(current_id)
-        run = get_run(current_id)
-        if not run:
-            break
-        chain.append(run)
-        current_id = run.get("parent_run_id")
-    chain.reverse()
+    cached = _cached_run_chain(run_id, limit)
+    if cached is not None:
+        return cached
+    token = _run_cache.token()
+    chain = [_run_row(row) for row in _run_chain_rows(run_id, limit)]
+    if not _cache_bypassed(_run_cache):
+        for run in chain:
+            _run_cache.put(run["id"], freeze(run), token)
     return chain
 
 
 def get_latest_event_by_type(run_id: str, event_type: str) -> Optional[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute(
-        "SELECT rowid, * FROM events WHERE run_id = ? AND type = ? ORDER BY rowid DESC LIMIT 1",
+        f"SELECT {EVENT_COLUMNS} FROM events WHERE run_id = ? AND type = ? ORDER BY rowid DESC LIMIT 1",
         (run_id, event_type),
     ).fetchone()
     if not row:
-        return None
-    return {
-        "seq": row["rowid"],
-        "id": row["id"],
-        "run_id": row["run_id"],
-        "ts": row["ts"],
-        "type": row["type"],
-        "level": row["level"],
-        "message": row["message"],
-        "payload": _json_load(row["payload"]) or {},
-        "task_id": row["task_id"],
-        "step_id": row["step_id"],
-    }
+        archive = _event_archive(run_id)
+        if archive is None:
+            return None
+        latest = None
+        for event in _iter_archived_events(archive, types=[event_type]):
+            latest = event
+        return latest.to_dict() if latest is not None else None
+    return EventRecord(row).to_dict()
+
+
+def _resolve_root_run_id(conn: sqlite3.Connection, run_id: str, parent_run_id: str | None) -> str:
+    """Корень диалога наследуется от родителя; запуск без (известного) родителя — корень сам себе."""
+    if not parent_run_id:
+        return run_id
+    row = conn.execute("SELECT COALESCE(root_run_id, id) AS root_run_id FROM runs WHERE id = ?", (parent_run_id,)).fetchone()
+    return row["root_run_id"] if row else run_id
+
+
+def _upsert_chat_turn(
+    conn: sqlite3.Connection,
+    root_run_id: str,
+    run_id: str,
+    role: str,
+    content: str,
+    ts: Any,
+) -> None:
+    # Новая реплика получает следующий turn_index диалога (MAX по первичному ключу);
+    # повторная запись той же роли запуска обновляет текст, сохраняя позицию.
+    # Вызывается под _lock, коммит — на стороне вызывающего.
+    conn.execute(
+        """
+        INSERT INTO chat_turns (root_run_id, turn_index, run_id, role, content, ts, created_at)
+        SELECT ?, COALESCE(MAX(turn_index), 0) + 1, ?, ?, ?, ?, ? FROM chat_turns WHERE root_run_id = ?
+        ON CONFLICT(run_id, role) DO UPDATE SET content = excluded.content, ts = excluded.ts
+        """,
+        (root_run_id, run_id, role, content, ts, now_iso(), root_run_id),
+    )
+
+
+def _record_chat_response(event: dict) -> None:
+    text = (event.get("payload") or {}).get("text")
+    if not isinstance(text, str) or not text:
+        return
+    conn = _conn_or_raise()
+    with _lock:
+        row = conn.execute(
+            f"SELECT COALESCE(root_run_id, id) AS root_run_id FROM runs WHERE id = ? AND {_CHAT_RUN_SQL}",
+            (event["run_id"],),
+        ).fetchone()
+        if not row:
+            return
+        _upsert_chat_turn(conn, row["root_run_id"], event["run_id"], "assistant", text, event["ts"])
+        _commit(conn)
+
+
+# Реплики цепочки parent_run_id от anchor к корню: depth 0 — сам anchor. Ветки
+# того же корня в цепочку не входят; порядок — позиция запуска в цепочке, затем
+# роль (turn_index зависит от момента записи ответа и здесь не используется).
+# Поиск реплик запуска — по idx_chat_turns_run_role.
+_RECENT_CHAT_TURNS_SQL = """
+WITH RECURSIVE chain(id, depth) AS (
+  SELECT id, 0 FROM runs WHERE id = ?
+  UNION ALL
+  SELECT r.parent_run_id, chain.depth + 1
+  FROM chain JOIN runs r ON r.id = chain.id
+  WHERE r.parent_run_id IS NOT NULL AND chain.depth + 1 < ?
+)
+SELECT chain.depth, t.run_id, t.role, t.content, t.ts
+FROM chain JOIN chat_turns t ON t.run_id = chain.id
+ORDER BY chain.depth ASC, CASE t.role WHEN 'user' THEN 0 ELSE 1 END DESC
+LIMIT ?
+"""
 
 
 def list_recent_chat_turns(anchor_run_id: str | None, limit_turns: int = 20) -> list[dict]:
-    """Возвращает историю чата (user/assistant) для цепочки запусков до anchor_run_id включительно."""
+    """Возвращает историю чата (user/assistant) для цепочки запусков до anchor_run_id включительно.
+
+    limit_turns — число последних чат-запусков; каждый даёт до двух реплик.
+    """
     if not anchor_run_id:
         return []
     limit_turns = max(1, min(limit_turns, 100))
-    chain = list_run_chain(anchor_run_id, limit=limit_turns * 5)
-    chat_runs = [run for run in chain if _is_chat_run(run)]
-    if len(chat_runs) > limit_turns:
-        chat_runs = chat_runs[-limit_turns:]
-    history: list[dict] = []
-    for run in chat_runs:
-        user_text = run.get("query_text") or ""
-        if user_text:
-            history.append(
-                {
-                    "role": "user",
-                    "content": user_text,
-                    "ts": run.get("created_at"),
-                    "run_id": run.get("id"),
-                }
-            )
-        event = get_latest_event_by_type(run.get("id"), "chat_response_generated")
-        if event:
-            payload = event.get("payload") or {}
-            text = payload.get("text")
-            if text:
-                history.append(
-                    {
-                        "role": "assistant",
-                        "content": text,
-                        "ts": event.get("ts"),
-                        "run_id": run.get("id"),
-                    }
-                )
-    return history
+    conn = _read_conn()
+    rows = conn.execute(
+        _RECENT_CHAT_TURNS_SQL,
+        (anchor_run_id, min(limit_turns * 5, 500), limit_turns * 2),
+    ).fetchall()
+    # Защита от циклов parent_run_id: обрываем цепочку на первом повторе запуска
+    depth_by_run: dict[str, int] = {}
+    chain_rows: list[sqlite3.Row] = []
+    for row in rows:
+        seen_depth = depth_by_run.setdefault(row["run_id"], row["depth"])
+        if seen_depth != row["depth"]:
+            break
+        chain_rows.append(row)
+    chain_rows.reverse()
+    # 2*limit_turns реплик покрывают не меньше limit_turns запусков; самый старый
+    # из лишних может быть неполным — он и отбрасывается
+    run_ids = list(dict.fromkeys(row["run_id"] for row in chain_rows))[-limit_turns:]
+    keep = set(run_ids)
+    return [
+        {"role": row["role"], "content": row["content"], "ts": row["ts"], "run_id": row["run_id"]}
+        for row in chain_rows
+        if row["run_id"] in keep
+    ]
+
+
+def list_chat_turns(run_id: str, before_turn: int | None = None, limit: int = 50) -> Optional[dict]:
+    """Страница реплик диалога, которому принадлежит run_id, от новых к старым.
+
+    Возвращает реплики в хронологическом порядке и next_before — turn_index для
+    запроса следующей (более старой) страницы, либо None, если страниц больше нет.
+    """
+    conn = _read_conn()
+    run = conn.execute("SELECT COALESCE(root_run_id, id) AS root_run_id FROM runs WHERE id = ?", (run_id,)).fetchone()
+    if not run:
+        return None
+    limit = max(1, min(limit, 200))
+    root_run_id = run["root_run_id"]
+    if before_turn is None:
+        rows = conn.execute(
+            "SELECT * FROM chat_turns WHERE root_run_id = ? ORDER BY turn_index DESC LIMIT ?",
+            (root_run_id, limit + 1),
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT * FROM chat_turns WHERE root_run_id = ? AND turn_index < ? ORDER BY turn_index DESC LIMIT ?",
+            (root_run_id, before_turn, limit + 1),
+        ).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    turns = [
+        {
+            "turn_index": row["turn_index"],
+            "run_id": row["run_id"],
+            "role": row["role"],
+            "content": row["content"],
+            "ts": row["ts"],
+        }
+        for row in rows
+    ]
+    return {
+        "root_run_id": root_run_id,
+        "turns": turns,
+        "next_before": turns[0]["turn_index"] if has_more and turns else None,
+    }
+
+
+_reminder_listeners: list[Callable[[dict], None]] = []
+
+
+def add_reminder_listener(listener: Callable[[dict], None]) -> None:
+    """Подписка на создание/отмену напоминаний (планировщик просыпается без опроса БД)."""
+    if listener not in _reminder_listeners:
+        _reminder_listeners.append(listener)
+
+
+def remove_reminder_listener(listener: Callable[[dict], None]) -> None:
+    if listener in _reminder_listeners:
+        _reminder_listeners.remove(listener)
+
+
+def _notify_reminder_listeners(reminder: dict) -> None:
+    for listener in list(_reminder_listeners):
+        try:
+            listener(reminder)
+        except Exception:
+            # Сбой подписчика не должен ломать запись напоминания
+            pass
 
 
 def create_reminder(
@@ -395,8 +889,8 @@ def create_reminder(
             """,
             (reminder_id, created_at, due_at, text, status, delivery, None, run_id, source, None, updated_at, 0),
         )
-        conn.commit()
-    return {
+        _commit(conn)
+    reminder = {
         "id": reminder_id,
         "created_at": created_at,
         "due_at": due_at,
@@ -409,11 +903,14 @@ def create_reminder(
         "sent_at": None,
         "updated_at": updated_at,
         "attempts": 0,
+        "lease_until": None,
     }
+    _notify_reminder_listeners(reminder)
+    return reminder
 
 
 def list_reminders(status: str | None = None, limit: int = 200) -> list[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     limit = max(1, min(limit, 500))
     if status:
         rows = conn.execute(
@@ -426,7 +923,7 @@ def list_reminders(status: str | None = None, limit: int = 200) -> list[dict]:
 
 
 def get_reminder(reminder_id: str) -> dict | None:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute("SELECT * FROM reminders WHERE id = ?", (reminder_id,)).fetchone()
     if not row:
         return None
@@ -444,37 +941,99 @@ def cancel_reminder(reminder_id: str) -> dict | None:
             "UPDATE reminders SET status = ?, updated_at = ? WHERE id = ?",
             ("cancelled", updated_at, reminder_id),
         )
-        conn.commit()
+        _commit(conn)
     updated = dict(_reminder_row(row))
     updated["status"] = "cancelled"
     updated["updated_at"] = updated_at
+    _notify_reminder_listeners(updated)
     return updated
 
 
-def claim_due_reminders(now_ts: str, limit: int = 20) -> list[dict]:
+REMINDER_LEASE_S = 120.0
+
+# Один оператор: подзапрос выбирает по idx_reminders_status_due созревшие
+# pending и по idx_reminders_status_lease — 'sending' с истёкшей арендой,
+# UPDATE ... RETURNING захватывает их атомарно. Гонки между SELECT и UPDATE
+# нет, поэтому повторная проверка статуса в цикле не нужна. LIMIT стоит в
+# каждой ветке: pending читается в порядке индекса и останавливается на
+# limit строках, а не сортирует весь накопившийся бэклог.
+_CLAIM_REMINDERS_SQL = """
+UPDATE reminders
+SET status = 'sending', updated_at = ?, attempts = attempts + 1, lease_until = ?
+WHERE id IN (
+  SELECT id FROM (
+    SELECT * FROM (
+      SELECT id, due_at FROM reminders WHERE status = 'pending' AND due_at <= ? ORDER BY due_at ASC LIMIT ?
+    )
+    UNION ALL
+    SELECT * FROM (
+      SELECT id, due_at FROM reminders WHERE status = 'sending' AND lease_until <= ? LIMIT ?
+    )
+  )
+  ORDER BY due_at ASC
+  LIMIT ?
+)
+RETURNING *
+"""
+
+
+_REMINDER_WAKEUPS_SQL = """
+SELECT * FROM (SELECT due_at AS wake_at, id FROM reminders WHERE status = 'pending' ORDER BY due_at ASC LIMIT ?)
+UNION ALL
+SELECT * FROM (SELECT lease_until AS wake_at, id FROM reminders WHERE status = 'sending' ORDER BY lease_until ASC LIMIT ?)
+"""
+
+
+def list_reminder_wakeups(limit: int = 256) -> list[tuple[str, str]]:
+    """Ближайшие моменты (wake_at, id), когда claim_due_reminders что-то захватит:
+    due_at ожидающих и lease_until доставляемых напоминаний. Оба чтения идут по индексам."""
+    limit = max(1, min(limit, 10_000))
+    rows = _read_conn().execute(_REMINDER_WAKEUPS_SQL, (limit, limit)).fetchall()
+    return [(row["wake_at"], row["id"]) for row in rows if row["wake_at"]]
+
+
+def claim_due_reminders(now_ts: str, limit: int = 20, *, lease_s: float = REMINDER_LEASE_S) -> list[dict]:
+    """Захватить до limit созревших напоминаний одним UPDATE ... RETURNING и одним коммитом.
+
+    Захват — аренда на lease_s секунд: если доставка не закончилась mark_reminder_sent/failed
+    (процесс упал), после истечения аренды напоминание захватывается снова.
+    """
     conn = _conn_or_raise()
     limit = max(1, min(limit, 200))
-    claimed: list[dict] = []
+    updated_at = now_iso()
+    lease_until = (datetime.utcnow() + timedelta(seconds=max(0.0, lease_s))).isoformat() + "Z"
+    with _lock:
+        rows = conn.execute(_CLAIM_REMINDERS_SQL, (updated_at, lease_until, now_ts, limit, now_ts, limit, limit)).fetchall()
+        # UPDATE открывает транзакцию и без совпавших строк: коммитим всегда, иначе
+        # соединение записи держит блокировку до чужого коммита
+        _commit(conn)
+    # Порядок строк RETURNING не определён — восстанавливаем порядок по due_at
+    return sorted((_reminder_row(row) for row in rows), key=lambda item: (item["due_at"], item["id"]))
+
+
+def defer_reminder(reminder_id: str, delay_s: float, *, error: str | None = None, count_attempt: bool = True) -> dict | None:
+    """Отложить захваченное напоминание: аренда продлевается на delay_s, по её истечении
+    claim_due_reminders захватит его снова. count_attempt=False возвращает попытку
+    (отсрочка из-за лимита частоты канала, а не неудачная отправка)."""
+    conn = _conn_or_raise()
+    updated_at = now_iso()
+    lease_until = (datetime.utcnow() + timedelta(seconds=max(0.0, delay_s))).isoformat() + "Z"
     with _lock:
         rows = conn.execute(
-            "SELECT * FROM reminders WHERE status = 'pending' AND due_at <= ? ORDER BY due_at ASC LIMIT ?",
-            (now_ts, limit),
+            """
+            UPDATE reminders
+            SET lease_until = ?, last_error = COALESCE(?, last_error), updated_at = ?, attempts = attempts - ?
+            WHERE id = ? AND status = 'sending'
+            RETURNING *
+            """,
+            (lease_until, error, updated_at, 0 if count_attempt else 1, reminder_id),
         ).fetchall()
-        for row in rows:
-            updated_at = now_iso()
-            res = conn.execute(
-                "UPDATE reminders SET status = ?, updated_at = ?, attempts = attempts + 1 WHERE id = ? AND status = 'pending'",
-                ("sending", updated_at, row["id"]),
-            )
-            if res.rowcount == 0:
-                continue
-            conn.commit()
-            data = _reminder_row(row)
-            data["status"] = "sending"
-            data["updated_at"] = updated_at
-            data["attempts"] = (row["attempts"] or 0) + 1
-            claimed.append(data)
-    return claimed
+        _commit(conn)
+    if not rows:
+        return None
+    updated = _reminder_row(rows[0])
+    _notify_reminder_listeners(updated)
+    return updated
 
 
 def mark_reminder_sent(reminder_id: str, delivery: str) -> dict | None:
@@ -485,12 +1044,14 @@ def mark_reminder_sent(reminder_id: str, delivery: str) -> dict | None:
         if not row:
             return None
         conn.execute(
-            "UPDATE reminders SET status = ?, delivery = ?, sent_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            "UPDATE reminders SET status = ?, delivery = ?, sent_at = ?, last_error = ?, updated_at = ?, lease_until = NULL WHERE id = ?",
             ("sent", delivery, sent_at, None, sent_at, reminder_id),
         )
-        conn.commit()
+        _commit(conn)
     updated = dict(_reminder_row(row))
-    updated.update({"status": "sent", "delivery": delivery, "sent_at": sent_at, "last_error": None, "updated_at": sent_at})
+    updated.update(
+        {"status": "sent", "delivery": delivery, "sent_at": sent_at, "last_error": None, "updated_at": sent_at, "lease_until": None}
+    )
     return updated
 
 
@@ -502,15 +1063,78 @@ def mark_reminder_failed(reminder_id: str, error: str, delivery: str) -> dict |
         if not row:
             return None
         conn.execute(
-            "UPDATE reminders SET status = ?, delivery = ?, last_error = ?, updated_at = ? WHERE id = ?",
+            "UPDATE reminders SET status = ?, delivery = ?, last_error = ?, updated_at = ?, lease_until = NULL WHERE id = ?",
             ("failed", delivery, error, updated_at, reminder_id),
         )
-        conn.commit()
+        _commit(conn)
     updated = dict(_reminder_row(row))
-    updated.update({"status": "failed", "delivery": delivery, "last_error": error, "updated_at": updated_at})
+    updated.update({"status": "failed", "delivery": delivery, "last_error": error, "updated_at": updated_at, "lease_until": None})
     return updated
 
 
+def get_llm_cache_entry(
+    key: str, now_ts: float, *, touch_interval_s: float = LLM_CACHE_TOUCH_INTERVAL_S
+) -> dict | None:
+    """Непросроченный ответ из кэша LLM; попадание сдвигает запись в конец очереди LRU.
+
+    last_used_at (и счётчик hits) обновляется не чаще раза в touch_interval_s:
+    горячая запись не берёт _lock и не коммитит на каждом попадании, а для
+    LRU-вытеснения такой точности хватает.
+    """
+    row = _read_conn().execute(
+        "SELECT response, last_used_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now_ts)
+    ).fetchone()
+    if row is None:
+        return None
+    if now_ts - row["last_used_at"] >= touch_interval_s:
+        conn = _conn_or_raise()
+        with _lock:
+            conn.execute("UPDATE llm_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now_ts, key))
+            _commit(conn)
+    return _json_load(row["response"])
+
+
+def put_llm_cache_entry(
+    key: str,
+    response: dict,
+    *,
+    purpose: str,
+    model_id: str | None,
+    ttl_s: float,
+    max_entries: int,
+    now_ts: float,
+) -> int:
+    """Сохраняет ответ LLM и вытесняет просроченные записи, а затем давно не
+    использованные сверх max_entries (0 — без лимита). Возвращает число вытесненных."""
+    conn = _conn_or_raise()
+    text = json.dumps(response, ensure_ascii=False)
+    with _lock:
+        conn.execute(
+            """
+            INSERT INTO llm_cache (key, purpose, model_id, response, size_bytes, created_at, expires_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+              purpose = excluded.purpose, model_id = excluded.model_id, response = excluded.response,
+              size_bytes = excluded.size_bytes, created_at = excluded.created_at,
+              expires_at = excluded.expires_at, last_used_at = excluded.last_used_at, hits = 0
+            """,
+            (key, purpose, model_id, text, len(text.encode("utf-8")), now_ts, now_ts + ttl_s, now_ts),
+        )
+        evicted = conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now_ts,)).rowcount
+        if max_entries > 0:
+            evicted += conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            ).rowcount
+        _commit(conn)
+    return evicted
+
+
+def llm_cache_stats() -> dict:
+    row = _read_conn().execute("SELECT COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS bytes FROM llm_cache").fetchone()
+    return {"entries": row["entries"], "bytes": row["bytes"]}
+
+
 def update_run_status(run_id: str, status: str, started_at: Optional[str] = None, finished_at: Optional[str] = None) -> None:
     conn = _conn_or_raise()
     with _lock:
@@ -518,7 +1142,8 @@ def update_run_status(run_id: str, status: str, started_at: Optional[str] = None
             "UPDATE runs SET status = ?, started_at = COALESCE(?, started_at), finished_at = COALESCE(?, finished_at) WHERE id = ?",
             (status, started_at, finished_at, run_id),
         )
-        conn.commit()
+        _commit(conn)
+    _invalidate(_run_cache, run_id)
 
 
 def insert_plan_steps(run_id: str, steps: list[dict]) -> list[dict]:
@@ -546,58 +1171,29 @@ def insert_plan_steps(run_id: str, steps: list[dict]) -> list[dict]:
                     _json_dump(step.get("artifacts_expected") or []),
                 ),
             )
-        conn.commit()
+        _commit(conn)
     return steps
 
 
-def list_plan_steps(run_id: str) -> list[dict]:
-    conn = _conn_or_raise()
+def _plan_step_row(row: sqlite3.Row) -> PlanStepRecord:
+    return PlanStepRecord(row, row["kind"] or _infer_plan_step_kind(row["skill_name"]))
+
+
+def list_plan_steps(run_id: str) -> list[PlanStepRecord]:
+    conn = _read_conn()
     rows = conn.execute(
         "SELECT * FROM plan_steps WHERE run_id = ? ORDER BY step_index ASC",
         (run_id,),
     ).fetchall()
-    return [
-        {
-            "id": r["id"],
-            "run_id": r["run_id"],
-            "step_index": r["step_index"],
-            "title": r["title"],
-            "skill_name": r["skill_name"],
-            "inputs": _json_load(r["inputs"]) or {},
-            "depends_on": _json_load(r["depends_on"]) or [],
-            "status": r["status"],
-            "kind": r["kind"] or _infer_plan_step_kind(r["skill_name"]),
-            "success_criteria": _json_load(r["success_criteria"]) or "",
-            "success_checks": _json_load(r["success_checks"]) or [],
-            "danger_flags": _json_load(r["danger_flags"]) or [],
-            "requires_approval": bool(r["requires_approval"]) if r["requires_approval"] is not None else False,
-            "artifacts_expected": _json_load(r["artifacts_expected"]) or [],
-        }
-        for r in rows
-    ]
+    return [_plan_step_row(r) for r in rows]
 
 
-def get_plan_step(step_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
+def get_plan_step(step_id: str) -> Optional[PlanStepRecord]:
+    conn = _read_conn()
     row = conn.execute("SELECT * FROM plan_steps WHERE id = ?", (step_id,)).fetchone()
     if not row:
         return None
-    return {
-        "id": row["id"],
-        "run_id": row["run_id"],
-        "step_index": row["step_index"],
-        "title": row["title"],
-        "skill_name": row["skill_name"],
-        "inputs": _json_load(row["inputs"]) or {},
-        "depends_on": _json_load(row["depends_on"]) or [],
-        "status": row["status"],
-        "kind": row["kind"] or _infer_plan_step_kind(row["skill_name"]),
-        "success_criteria": _json_load(row["success_criteria"]) or "",
-        "success_checks": _json_load(row["success_checks"]) or [],
-        "danger_flags": _json_load(row["danger_flags"]) or [],
-        "requires_approval": bool(row["requires_approval"]) if row["requires_approval"] is not None else False,
-        "artifacts_expected": _json_load(row["artifacts_expected"]) or [],
-    }
+    return _plan_step_row(row)
 
 
 def update_plan_step_status(step_id: str, status: str) -> None:
@@ -607,7 +1203,7 @@ def update_plan_step_status(step_id: str, status: str) -> None:
             "UPDATE plan_steps SET status = ? WHERE id = ?",
             (status, step_id),
         )
-        conn.commit()
+        _commit(conn)
 
 
 def create_task(run_id: str, plan_step_id: str, attempt: int) -> dict:
@@ -618,7 +1214,7 @@ def create_task(run_id: str, plan_step_id: str, attempt: int) -> dict:
             "INSERT INTO tasks (id, run_id, plan_step_id, attempt, status) VALUES (?, ?, ?, ?, ?)",
             (task_id, run_id, plan_step_id, attempt, "queued"),
         )
-        conn.commit()
+        _commit(conn)
     return {
         "id": task_id,
         "run_id": run_id,
@@ -647,11 +1243,11 @@ def update_task_status(task_id: str, status: str, started_at: Optional[str] = No
             """,
             (status, started_at, finished_at, error, duration_ms, task_id),
         )
-        conn.commit()
+        _commit(conn)
 
 
 def list_tasks(run_id: str) -> list[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     rows = conn.execute(
         "SELECT * FROM tasks WHERE run_id = ? ORDER BY rowid ASC",
         (run_id,),
@@ -673,7 +1269,7 @@ def list_tasks(run_id: str) -> list[dict]:
 
 
 def get_task(task_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
     if not row:
         return None
@@ -691,7 +1287,7 @@ def get_task(task_id: str) -> Optional[dict]:
 
 
 def list_tasks_for_step(run_id: str, step_id: str) -> list[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     rows = conn.execute(
         "SELECT * FROM tasks WHERE run_id = ? AND plan_step_id = ? ORDER BY attempt ASC",
         (run_id, step_id),
@@ -713,7 +1309,7 @@ def list_tasks_for_step(run_id: str, step_id: str) -> list[dict]:
 
 
 def get_last_task_for_step(run_id: str, step_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute(
         "SELECT * FROM tasks WHERE run_id = ? AND plan_step_id = ? ORDER BY attempt DESC LIMIT 1",
         (run_id, step_id),
@@ -734,7 +1330,7 @@ def get_last_task_for_step(run_id: str, step_id: str) -> Optional[dict]:
 
 
 def next_task_attempt(run_id: str, step_id: str) -> int:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute(
         "SELECT MAX(attempt) AS max_attempt FROM tasks WHERE run_id = ? AND plan_step_id = ?",
         (run_id, step_id),
@@ -743,116 +1339,150 @@ def next_task_attempt(run_id: str, step_id: str) -> int:
     return int(max_attempt) + 1
 
 
-def insert_sources(run_id: str, sources: list[dict]) -> list[dict]:
-    conn = _conn_or_raise()
-    run = get_run(run_id)
-    project_id = run["project_id"] if run else ""
-    with _lock:
-        for s in sources:
-            conn.execute(
-                "INSERT INTO sources (id, run_id, url, title, domain, quality, retrieved_at, snippet, pinned) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                (
-                    s["id"],
-                    run_id,
-                    s["url"],
-                    s.get("title"),
-                    s.get("domain"),
-                    s.get("quality"),
-                    s.get("retrieved_at"),
-                    s.get("snippet"),
-                    1 if s.get("pinned") else 0,
-                ),
-            )
-        conn.commit()
-    for s in sources:
-        content = " ".join([str(s.get("title") or ""), str(s.get("url") or ""), str(s.get("snippet") or "")]).strip()
+def ingest_run_items(
+    run_id: str,
+    *,
+    sources: Optional[list[dict]] = None,
+    facts: Optional[list[dict]] = None,
+    conflicts: Optional[list[dict]] = None,
+    artifacts: Optional[list[dict]] = None,
+) -> dict[str, int]:
+    """Сохраняет результаты навыка одной транзакцией: executemany по каждой таблице
+    и строки полнотекстового индекса в том же коммите. Возвращает счётчики по типам."""
+    sources = sources or []
+    facts = facts or []
+    conflicts = conflicts or []
+    artifacts = artifacts or []
+    source_rows = [
+        (
+            s["id"],
+            run_id,
+            s["url"],
+            s.get("title"),
+            s.get("domain"),
+            s.get("quality"),
+            s.get("retrieved_at"),
+            s.get("snippet"),
+            1 if s.get("pinned") else 0,
+        )
+        for s in sources
+    ]
+    fact_rows = [
+        (
+            f["id"],
+            run_id,
+            f["key"],
+            _json_dump(f["value"]),
+            f.get("confidence", 0.0),
+            _json_dump(f.get("source_ids") or []),
+            f["created_at"],
+        )
+        for f in facts
+    ]
+    conflict_rows = [(c["id"], run_id, c["fact_key"], _json_dump(c["group"]), c["status"]) for c in conflicts]
+    artifact_rows = [
+        (a["id"], run_id, a["type"], a["title"], a["content_uri"], a["created_at"], _json_dump(a.get("meta") or {}))
+        for a in artifacts
+    ]
+    conn = _conn_or_raise()
+    with _lock:
+        run = conn.execute("SELECT project_id FROM runs WHERE id = ?", (run_id,)).fetchone()
+        project_id = run["project_id"] if run else ""
+        fts_rows: list[tuple] = []
         if project_id:
-            _insert_fts(project_id, run_id, "source", s["id"], content, s.get("retrieved_at") or now_iso())
+            for s in sources:
+                content = " ".join([str(s.get("title") or ""), str(s.get("url") or ""), str(s.get("snippet") or "")]).strip()
+                fts_rows.append((project_id, run_id, "source", s["id"], content, s.get("retrieved_at") or now_iso(), None))
+            for f in facts:
+                content = " ".join([str(f.get("key") or ""), _json_dump(f.get("value"))]).strip()
+                fts_rows.append((project_id, run_id, "fact", f["id"], content, f.get("created_at") or now_iso(), None))
+            for a in artifacts:
+                content = " ".join([str(a.get("title") or ""), str(a.get("content_uri") or ""), _json_dump(a.get("meta") or {})]).strip()
+                fts_rows.append((project_id, run_id, "artifact", a["id"], content, a.get("created_at") or now_iso(), None))
+        try:
+            if source_rows:
+                conn.executemany(
+                    "INSERT INTO sources (id, run_id, url, title, domain, quality, retrieved_at, snippet, pinned) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    source_rows,
+                )
+            if fact_rows:
+                conn.executemany(
+                    "INSERT INTO facts (id, run_id, key, value, confidence, source_ids, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    fact_rows,
+                )
+            if conflict_rows:
+                conn.executemany(
+                    "INSERT INTO conflicts (id, run_id, fact_key, group_json, status) VALUES (?, ?, ?, ?, ?)",
+                    conflict_rows,
+                )
+            if artifact_rows:
+                conn.executemany(
+                    "INSERT INTO artifacts (id, run_id, type, title, content_uri, created_at, meta) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    artifact_rows,
+                )
+            _insert_fts_rows(conn, fts_rows)
+            _commit(conn)
+        except sqlite3.Error:
+            _rollback(conn)
+            raise
+    return {"sources": len(sources), "facts": len(facts), "conflicts": len(conflicts), "artifacts": len(artifacts)}
+
+
+def insert_sources(run_id: str, sources: list[dict]) -> list[dict]:
+    ingest_run_items(run_id, sources=sources)
     return sources
 
 
+def _source_row(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "run_id": row["run_id"],
+        "url": row["url"],
+        "title": row["title"],
+        "domain": row["domain"],
+        "quality": row["quality"],
+        "retrieved_at": row["retrieved_at"],
+        "snippet": row["snippet"],
+        "pinned": bool(row["pinned"]),
+    }
+
+
 def list_sources(run_id: str) -> list[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     rows = conn.execute("SELECT * FROM sources WHERE run_id = ?", (run_id,)).fetchall()
-    return [
-        {
-            "id": r["id"],
-            "run_id": r["run_id"],
-            "url": r["url"],
-            "title": r["title"],
-            "domain": r["domain"],
-            "quality": r["quality"],
-            "retrieved_at": r["retrieved_at"],
-            "snippet": r["snippet"],
-            "pinned": bool(r["pinned"]),
-        }
-        for r in rows
-    ]
+    return [_source_row(r) for r in rows]
 
 
 def insert_facts(run_id: str, facts: list[dict]) -> list[dict]:
-    conn = _conn_or_raise()
-    run = get_run(run_id)
-    project_id = run["project_id"] if run else ""
-    with _lock:
-        for f in facts:
-            conn.execute(
-                "INSERT INTO facts (id, run_id, key, value, confidence, source_ids, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (
-                    f["id"],
-                    run_id,
-                    f["key"],
-                    _json_dump(f["value"]),
-                    f.get("confidence", 0.0),
-                    _json_dump(f.get("source_ids") or []),
-                    f["created_at"],
-                ),
-            )
-        conn.commit()
-    for f in facts:
-        content = " ".join([str(f.get("key") or ""), _json_dump(f.get("value"))]).strip()
-        if project_id:
-            _insert_fts(project_id, run_id, "fact", f["id"], content, f.get("created_at") or now_iso())
+    ingest_run_items(run_id, facts=facts)
     return facts
 
 
+def _fact_row(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "run_id": row["run_id"],
+        "key": row["key"],
+        "value": _json_load(row["value"]),
+        "confidence": row["confidence"],
+        "source_ids": _json_load(row["source_ids"]) or [],
+        "created_at": row["created_at"],
+    }
+
+
 def list_facts(run_id: str) -> list[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     rows = conn.execute("SELECT * FROM facts WHERE run_id = ?", (run_id,)).fetchall()
-    return [
-        {
-            "id": r["id"],
-            "run_id": r["run_id"],
-            "key": r["key"],
-            "value": _json_load(r["value"]),
-            "confidence": r["confidence"],
-            "source_ids": _json_load(r["source_ids"]) or [],
-            "created_at": r["created_at"],
-        }
-        for r in rows
-    ]
+    return [_fact_row(r) for r in rows]
 
 
 def insert_conflicts(run_id: str, conflicts: list[dict]) -> list[dict]:
-    conn = _conn_or_raise()
-    with _lock:
-        for c in conflicts:
-            conn.execute(
-                "INSERT INTO conflicts (id, run_id, fact_key, group_json, status) VALUES (?, ?, ?, ?, ?)",
-                (
-                    c["id"],
-                    run_id,
-                    c["fact_key"],
-                    _json_dump(c["group"]),
-                    c["status"],
-                ),
-            )
-        conn.commit()
+    ingest_run_items(run_id, conflicts=conflicts)
     return conflicts
 
 
 def list_conflicts(run_id: str) -> list[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     rows = conn.execute("SELECT * FROM conflicts WHERE run_id = ?", (run_id,)).fetchall()
     return [
         {
@@ -867,7 +1497,7 @@ def list_conflicts(run_id: str) -> list[dict]:
 
 
 def get_conflict(conflict_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute("SELECT * FROM conflicts WHERE id = ?", (conflict_id,)).fetchone()
     if not row:
         return None
@@ -881,53 +1511,11 @@ def get_conflict(conflict_id: str) -> Optional[dict]:
 
 
 def insert_artifacts(run_id: str, artifacts: list[dict]) -> list[dict]:
-    conn = _conn_or_raise()
-    run = get_run(run_id)
-    project_id = run["project_id"] if run else ""
-    with _lock:
-        for a in artifacts:
-            conn.execute(
-                "INSERT INTO artifacts (id, run_id, type, title, content_uri, created_at, meta) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (
-                    a["id"],
-                    run_id,
-                    a["type"],
-                    a["title"],
-                    a["content_uri"],
-                    a["created_at"],
-                    _json_dump(a.get("meta") or {}),
-                ),
-            )
-        conn.commit()
-    for a in artifacts:
-        content = " ".join([str(a.get("title") or ""), str(a.get("content_uri") or ""), _json_dump(a.get("meta") or {})]).strip()
-        if project_id:
-            _insert_fts(project_id, run_id, "artifact", a["id"], content, a.get("created_at") or now_iso())
+    ingest_run_items(run_id, artifacts=artifacts)
     return artifacts
 
 
-def list_artifacts(run_id: str) -> list[dict]:
-    conn = _conn_or_raise()
-    rows = conn.execute("SELECT * FROM artifacts WHERE run_id = ?", (run_id,)).fetchall()
-    return [
-        {
-            "id": r["id"],
-            "run_id": r["run_id"],
-            "type": r["type"],
-            "title": r["title"],
-            "content_uri": r["content_uri"],
-            "created_at": r["created_at"],
-            "meta": _json_load(r["meta"]) or {},
-        }
-        for r in rows
-    ]
-
-
-def get_artifact(artifact_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
-    row = conn.execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
-    if not row:
-        return None
+def _artifact_row(row: sqlite3.Row) -> dict:
     return {
         "id": row["id"],
         "run_id": row["run_id"],
@@ -939,38 +1527,34 @@ def get_artifact(artifact_id: str) -> Optional[dict]:
     }
 
 
+def list_artifacts(run_id: str) -> list[dict]:
+    conn = _read_conn()
+    rows = conn.execute("SELECT * FROM artifacts WHERE run_id = ?", (run_id,)).fetchall()
+    return [_artifact_row(r) for r in rows]
+
+
+def get_artifact(artifact_id: str) -> Optional[dict]:
+    conn = _read_conn()
+    row = conn.execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+    if not row:
+        return None
+    return _artifact_row(row)
+
+
 def get_source(source_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute("SELECT * FROM sources WHERE id = ?", (source_id,)).fetchone()
     if not row:
         return None
-    return {
-        "id": row["id"],
-        "run_id": row["run_id"],
-        "url": row["url"],
-        "title": row["title"],
-        "domain": row["domain"],
-        "quality": row["quality"],
-        "retrieved_at": row["retrieved_at"],
-        "snippet": row["snippet"],
-        "pinned": bool(row["pinned"]),
-    }
+    return _source_row(row)
 
 
 def get_fact(fact_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute("SELECT * FROM facts WHERE id = ?", (fact_id,)).fetchone()
     if not row:
         return None
-    return {
-        "id": row["id"],
-        "run_id": row["run_id"],
-        "key": row["key"],
-        "value": _json_load(row["value"]),
-        "confidence": row["confidence"],
-        "source_ids": _json_load(row["source_ids"]) or [],
-        "created_at": row["created_at"],
-    }
+    return _fact_row(row)
 
 
 def create_approval(
@@ -1022,7 +1606,7 @@ def create_approval(
                 preview_json,
             ),
         )
-        conn.commit()
+        _commit(conn)
     return {
         "id": approval_id,
         "run_id": run_id,
@@ -1044,7 +1628,7 @@ def create_approval(
 
 
 def list_approvals(run_id: str) -> list[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     rows = conn.execute("SELECT * FROM approvals WHERE run_id = ? ORDER BY created_at DESC", (run_id,)).fetchall()
     return [
         {
@@ -1070,7 +1654,7 @@ def list_approvals(run_id: str) -> list[dict]:
 
 
 def get_approval(approval_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute("SELECT * FROM approvals WHERE id = ?", (approval_id,)).fetchone()
     if not row:
         return None
@@ -1105,7 +1689,7 @@ def update_approval_status(approval_id: str, status: str, decided_by: str, decis
             "UPDATE approvals SET status = ?, decided_at = ?, decided_by = ?, decision_json = ? WHERE id = ?",
             (status, decided_at, decided_by, _json_dump(decision) if decision else None, approval_id),
         )
-        conn.commit()
+        _commit(conn)
     approval["status"] = status
     approval["decided_at"] = decided_at
     approval["resolved_at"] = decided_at
@@ -1121,77 +1705,186 @@ def set_session_token_hash(token_hash: str, salt: str) -> None:
             "INSERT OR REPLACE INTO session_tokens (id, token_hash, salt, created_at) VALUES (?, ?, ?, ?)",
             ("default", token_hash, salt, now_iso()),
         )
-        conn.commit()
+        _commit(conn)
 
 
 def get_session_token_hash() -> Optional[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute("SELECT * FROM session_tokens WHERE id = ?", ("default",)).fetchone()
     if not row:
         return None
     return {"token_hash": row["token_hash"], "salt": row["salt"], "created_at": row["created_at"]}
 
 
-def search_memory(project_id: str, query: str, item_type: Optional[str] = None, from_ts: Optional[str] = None, to_ts: Optional[str] = None, tags: Optional[str] = None, limit: int = 50) -> list[dict]:
-    conn = _conn_or_raise()
-    results: list[dict] = []
-    if not query:
-        return results
+# Типы элементов поиска: таблица, преобразование строки, колонка времени, колонки LIKE-поиска
+_SEARCH_ITEM_TYPES: dict[str, tuple[str, Callable[[sqlite3.Row], dict], str, tuple[str, ...]]] = {
+    "source": ("sources", _source_row, "retrieved_at", ("url", "title", "snippet")),
+    "fact": ("facts", _fact_row, "created_at", ("key", "value")),
+    "artifact": ("artifacts", _artifact_row, "created_at", ("title", "content_uri")),
+}
+_SEARCH_TYPE_ORDER = list(_SEARCH_ITEM_TYPES)
 
+
+def _hydrate_search_items(conn: sqlite3.Connection, item_type: str, item_ids: list[str]) -> dict[str, dict]:
+    """Загружает элементы одного типа пачками через IN (...) вместо запроса на каждый id."""
+    table, row_fn, _, _ = _SEARCH_ITEM_TYPES[item_type]
+    items: dict[str, dict] = {}
+    # SQLITE_MAX_VARIABLE_NUMBER на старых сборках — 999
+    for offset in range(0, len(item_ids), 500):
+        chunk = item_ids[offset : offset + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        for row in conn.execute(f"SELECT * FROM {table} WHERE id IN ({placeholders})", chunk).fetchall():
+            items[row["id"]] = row_fn(row)
+    return items
+
+
+def _parse_search_cursor(cursor: str) -> tuple[str, float, int]:
+    """Курсор: "fts:<bm25>:<rowid>" для полнотекстового поиска, "like:<тип>:<rowid>" для запасного."""
+    parts = cursor.split(":")
     try:
-        rows = conn.execute(
-            """
-            SELECT project_id, run_id, type, item_id, content, created_at, tags
-            FROM memory_fts
-            WHERE project_id = ? AND memory_fts MATCH ?
-            LIMIT ?
-            """,
-            (project_id, query, limit),
-        ).fetchall()
-        for r in rows:
-            if item_type and r["type"] != item_type:
-                continue
-            item = None
-            if r["type"] == "source":
-                item = get_source(r["item_id"])
-            elif r["type"] == "fact":
-                item = get_fact(r["item_id"])
-            elif r["type"] == "artifact":
-                item = get_artifact(r["item_id"])
-            if not item:
-                continue
-            results.append({"type": r["type"], "item": item})
-    except sqlite3.OperationalError:
-        # запасной вариант через LIKE
-        q = f"%{query}%"
-        if item_type in (None, "source"):
-            rows = conn.execute("SELECT * FROM sources WHERE run_id IN (SELECT id FROM runs WHERE project_id = ?) AND (url LIKE ? OR title LIKE ? OR snippet LIKE ?)", (project_id, q, q, q)).fetchall()
-            for r in rows:
-                results.append({"type": "source", "item": get_source(r["id"])})
-        if item_type in (None, "fact"):
-            rows = conn.execute("SELECT * FROM facts WHERE run_id IN (SELECT id FROM runs WHERE project_id = ?) AND (key LIKE ? OR value LIKE ?)", (project_id, q, q)).fetchall()
-            for r in rows:
-                results.append({"type": "fact", "item": get_fact(r["id"])})
-        if item_type in (None, "artifact"):
-            rows = conn.execute("SELECT * FROM artifacts WHERE run_id IN (SELECT id FROM runs WHERE project_id = ?) AND (title LIKE ? OR content_uri LIKE ?)", (project_id, q, q)).fetchall()
-            for r in rows:
-                results.append({"type": "artifact", "item": get_artifact(r["id"])})
-
-    # фильтры tags/from/to не индексируются — применяем после выборки
-    filtered: list[dict] = []
-    for result in results:
-        item = result["item"]
-        created_at = item.get("created_at") or item.get("retrieved_at")
-        if from_ts and created_at and created_at < from_ts:
+        if len(parts) == 3 and parts[0] == "fts":
+            return "fts", float(parts[1]), int(parts[2])
+        if len(parts) == 3 and parts[0] == "like":
+            return "like", float(_SEARCH_TYPE_ORDER.index(parts[1])), int(parts[2])
+    except ValueError:
+        pass
+    raise ValueError("Некорректный курсор поиска")
+
+
+def _search_memory_fts(
+    conn: sqlite3.Connection,
+    project_id: str,
+    query: str,
+    item_type: Optional[str],
+    from_ts: Optional[str],
+    to_ts: Optional[str],
+    tags: Optional[str],
+    limit: int,
+    after: Optional[tuple[float, int]],
+) -> list[dict]:
+    conditions = ["memory_fts MATCH ?", "project_id = ?"]
+    params: list[Any] = [query, project_id]
+    if item_type:
+        conditions.append("type = ?")
+        params.append(item_type)
+    if from_ts:
+        conditions.append("created_at >= ?")
+        params.append(from_ts)
+    if to_ts:
+        conditions.append("created_at <= ?")
+        params.append(to_ts)
+    if tags:
+        # tags сверяются с meta элемента, а meta есть только у артефактов
+        conditions.append(
+            "type = 'artifact' AND EXISTS (SELECT 1 FROM artifacts a WHERE a.id = memory_fts.item_id AND instr(a.meta, ?) > 0)"
+        )
+        params.append(tags)
+    if after is not None:
+        conditions.append("(bm25(memory_fts) > ? OR (bm25(memory_fts) = ? AND memory_fts.rowid > ?))")
+        params.extend([after[0], after[0], after[1]])
+    rows = conn.execute(
+        f"""
+        SELECT rowid, type, item_id, bm25(memory_fts) AS score
+        FROM memory_fts
+        WHERE {" AND ".join(conditions)}
+        ORDER BY score, rowid
+        LIMIT ?
+        """,
+        (*params, limit),
+    ).fetchall()
+    ids_by_type: dict[str, list[str]] = {}
+    for r in rows:
+        if r["type"] in _SEARCH_ITEM_TYPES:
+            ids_by_type.setdefault(r["type"], []).append(r["item_id"])
+    items = {item_type_: _hydrate_search_items(conn, item_type_, ids) for item_type_, ids in ids_by_type.items()}
+    results: list[dict] = []
+    for r in rows:
+        item = items.get(r["type"], {}).get(r["item_id"])
+        if not item:
+            continue
+        results.append({"type": r["type"], "item": item, "cursor": f"fts:{r['score']!r}:{r['rowid']}"})
+    return results
+
+
+def _search_memory_like(
+    conn: sqlite3.Connection,
+    project_id: str,
+    query: str,
+    item_type: Optional[str],
+    from_ts: Optional[str],
+    to_ts: Optional[str],
+    tags: Optional[str],
+    limit: int,
+    after: Optional[tuple[int, int]],
+) -> list[dict]:
+    q = f"%{query}%"
+    results: list[dict] = []
+    for type_idx, type_name in enumerate(_SEARCH_TYPE_ORDER):
+        if item_type and type_name != item_type:
+            continue
+        if after is not None and type_idx < after[0]:
             continue
-        if to_ts and created_at and created_at > to_ts:
+        if tags and type_name != "artifact":
             continue
+        table, row_fn, ts_column, like_columns = _SEARCH_ITEM_TYPES[type_name]
+        conditions = [
+            "run_id IN (SELECT id FROM runs WHERE project_id = ?)",
+            "(" + " OR ".join(f"{column} LIKE ?" for column in like_columns) + ")",
+        ]
+        params: list[Any] = [project_id, *([q] * len(like_columns))]
+        if from_ts:
+            conditions.append(f"({ts_column} IS NULL OR {ts_column} >= ?)")
+            params.append(from_ts)
+        if to_ts:
+            conditions.append(f"({ts_column} IS NULL OR {ts_column} <= ?)")
+            params.append(to_ts)
         if tags:
-            tag_text = _json_dump(item.get("meta") or {})
-            if tags not in tag_text:
-                continue
-        filtered.append(result)
-    return filtered[:limit]
+            conditions.append("instr(meta, ?) > 0")
+            params.append(tags)
+        if after is not None and type_idx == after[0]:
+            conditions.append("rowid > ?")
+            params.append(after[1])
+        rows = conn.execute(
+            f"SELECT rowid, * FROM {table} WHERE {' AND '.join(conditions)} ORDER BY rowid LIMIT ?",
+            (*params, limit - len(results)),
+        ).fetchall()
+        for r in rows:
+            results.append({"type": type_name, "item": row_fn(r), "cursor": f"like:{type_name}:{r['rowid']}"})
+        if len(results) >= limit:
+            break
+    return results
+
+
+def search_memory(
+    project_id: str,
+    query: str,
+    item_type: Optional[str] = None,
+    from_ts: Optional[str] = None,
+    to_ts: Optional[str] = None,
+    tags: Optional[str] = None,
+    limit: int = 50,
+    after: Optional[str] = None,
+) -> list[dict]:
+    """Поиск по источникам, фактам и артефактам проекта.
+
+    Результаты упорядочены по bm25 (лучшие первыми); у каждого есть cursor —
+    его передают в after, чтобы получить следующую страницу.
+    """
+    if not query:
+        return []
+    conn = _read_conn()
+    limit = max(1, min(limit, 200))
+    cursor = _parse_search_cursor(after) if after else None
+    if cursor is None or cursor[0] == "fts":
+        try:
+            fts_after = (cursor[1], cursor[2]) if cursor else None
+            return _search_memory_fts(conn, project_id, query, item_type, from_ts, to_ts, tags, limit, fts_after)
+        except sqlite3.OperationalError:
+            # FTS недоступен или запрос не разбирается синтаксисом MATCH — запасной вариант через LIKE
+            if cursor is not None:
+                raise ValueError("Некорректный курсор поиска") from None
+    like_after = (int(cursor[1]), cursor[2]) if cursor else None
+    return _search_memory_like(conn, project_id, query, item_type, from_ts, to_ts, tags, limit, like_after)
 
 
 def create_user_memory(
@@ -1239,7 +1932,7 @@ def create_user_memory(
                 _json_dump(meta or {}),
             ),
         )
-        conn.commit()
+        _commit(conn)
     return {
         "id": memory_id,
         "created_at": created_at,
@@ -1255,70 +1948,88 @@ def create_user_memory(
     }
 
 
+def _user_memory_row(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "title": row["title"],
+        "content": row["content"],
+        "tags": _json_load(row["tags"]) or [],
+        "source": row["source"],
+        "is_deleted": bool(row["is_deleted"]),
+        "pinned": bool(row["pinned"]),
+        "last_used_at": row["last_used_at"],
+        "meta": _json_load(row["meta"]) if "meta" in row.keys() else {},
+    }
+
+
+def _memory_match_expression(query: str) -> str:
+    # Каждое слово — префиксный терм FTS5 в кавычках: пользовательский текст
+    # не интерпретируется как синтаксис MATCH, а "кофе" находит и "кофейню"
+    terms = re.findall(r"\w+", query.lower())
+    return " ".join(f'"{term}"*' for term in terms)
+
+
 def list_user_memories(query: str | None = None, tag: str | None = None, limit: int = 50, include_deleted: bool = False) -> list[dict]:
-    conn = _conn_or_raise()
+    """Профильная память: закреплённые первыми, при query — по релевантности (bm25), затем по свежести.
+
+    Если FTS ничего не нашёл (подстрока внутри слова), работает прежний поиск LIKE.
+    """
+    conn = _read_conn()
     query = (query or "").strip()
     tag = (tag or "").strip()
+    limit = max(1, min(limit, 200))
     params: list[Any] = []
     clauses: list[str] = []
     if not include_deleted:
-        clauses.append("is_deleted = 0")
+        clauses.append("m.is_deleted = 0")
+    if tag:
+        # Как и прежний tags LIKE: подстрока тега без учёта регистра (ASCII)
+        clauses.append("EXISTS (SELECT 1 FROM user_memory_tags t WHERE t.memory_id = m.id AND t.tag LIKE ?)")
+        params.append(f"%{tag}%")
+
+    match = _memory_match_expression(query) if query else ""
+    if match:
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT m.* FROM user_memories_fts
+                JOIN user_memories m ON m.rowid = user_memories_fts.rowid
+                WHERE user_memories_fts MATCH ?{"".join(f" AND {clause}" for clause in clauses)}
+                ORDER BY m.pinned DESC, bm25(user_memories_fts), m.updated_at DESC
+                LIMIT ?
+                """,
+                (match, *params, limit),
+            ).fetchall()
+            if rows:
+                return [_user_memory_row(r) for r in rows]
+        except sqlite3.OperationalError:
+            # FTS5 недоступен — запасной вариант через LIKE ниже
+            pass
     if query:
-        clauses.append("(title LIKE ? OR content LIKE ?)")
+        clauses.append("(m.title LIKE ? OR m.content LIKE ?)")
         like = f"%{query}%"
         params.extend([like, like])
-    if tag:
-        clauses.append("tags LIKE ?")
-        params.append(f"%{tag}%")
     where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-    limit = max(1, min(limit, 200))
-
     rows = conn.execute(
         f"""
-        SELECT * FROM user_memories
+        SELECT m.* FROM user_memories m
         {where}
-        ORDER BY pinned DESC, updated_at DESC
+        ORDER BY m.pinned DESC, m.updated_at DESC
         LIMIT ?
         """,
         (*params, limit),
     ).fetchall()
-
-    return [
-        {
-            "id": r["id"],
-            "created_at": r["created_at"],
-            "updated_at": r["updated_at"],
-            "title": r["title"],
-            "content": r["content"],
-            "tags": _json_load(r["tags"]) or [],
-            "source": r["source"],
-            "is_deleted": bool(r["is_deleted"]),
-            "pinned": bool(r["pinned"]),
-            "last_used_at": r["last_used_at"],
-            "meta": _json_load(r["meta"]) if "meta" in r.keys() else {},
-        }
-        for r in rows
-    ]
+    return [_user_memory_row(r) for r in rows]
 
 
 def get_user_memory(memory_id: str) -> Optional[dict]:
-    conn = _conn_or_raise()
+    conn = _read_conn()
     row = conn.execute("SELECT * FROM user_memories WHERE id = ?", (memory_id,)).fetchone()
     if not row:
         return None
-    return {
-        "id": row["id"],
-        "created_at": row["created_at"],
-        "updated_at": row["updated_at"],
-        "title": row["title"],
-        "content": row["content"],
-        "tags": _json_load(row["tags"]) or [],
-        "source": row["source"],
-        "is_deleted": bool(row["is_deleted"]),
-        "pinned": bool(row["pinned"]),
-        "last_used_at": row["last_used_at"],
-        "meta": _json_load(row["meta"]) if "meta" in row.keys() else {},
-    }
+    return _user_memory_row(row)
 
 
 def delete_user_memory(memory_id: str) -> Optional[dict]:
@@ -1331,7 +2042,7 @@ def delete_user_memory(memory_id: str) -> Optional[dict]:
             "UPDATE user_memories SET is_deleted = 1, updated_at = ? WHERE id = ?",
             (now_iso(), memory_id),
         )
-        conn.commit()
+        _commit(conn)
     memory["is_deleted"] = True
     return memory
 
@@ -1346,79 +2057,538 @@ def set_user_memory_pinned(memory_id: str, pinned: bool) -> Optional[dict]:
             "UPDATE user_memories SET pinned = ?, updated_at = ? WHERE id = ?",
             (1 if pinned else 0, now_iso(), memory_id),
         )
-        conn.commit()
+        _commit(conn)
     memory["pinned"] = pinned
     return memory
 
 
-def insert_event(event: dict) -> dict:
-    conn = _conn_or_raise()
-    with _lock:
-        conn.execute(
-            "INSERT INTO events (id, run_id, ts, type, level, message, payload, task_id, step_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                event["id"],
-                event["run_id"],
-                event["ts"],
-                event["type"],
-                event["level"],
-                event["message"],
-                _json_dump(event.get("payload") or {}),
-                event.get("task_id"),
-                event.get("step_id"),
-            ),
+def _insert_event_row(conn: sqlite3.Connection, row: tuple) -> int:
+    # Без group commit seq выдаётся здесь же, под _lock; MAX по events и
+    # event_archives читается один раз, дальше seq берётся из счётчика
+    global _next_event_seq
+    if _next_event_seq is None:
+        _next_event_seq = _max_event_seq(conn) + 1
+    try:
+        cur = conn.execute(
+            "INSERT INTO events (rowid, id, run_id, ts, type, level, message, payload, task_id, step_id) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, {json_param_sql()}, ?, ?)",
+            (_next_event_seq, *row),
         )
-        conn.commit()
-    return event
+    except sqlite3.IntegrityError:
+        # Строку с этим rowid записали в обход счётчика — перечитать границу
+        _next_event_seq = None
+        raise
+    _next_event_seq += 1
+    return cur.lastrowid
+
+
+def _submit_event(
+    writer: EventWriter,
+    event: dict,
+    row: tuple,
+    durable: bool,
+    publish: Callable[[dict], Any] | None,
+) -> None:
+    def committed(seq: int) -> None:
+        event["seq"] = seq
+        publish(event)
+
+    event["seq"] = writer.submit(row, durable=durable, on_committed=committed if publish is not None else None)
+
+
+def insert_event(
+    event: dict,
+    *,
+    durable: bool = False,
+    publish: Callable[[dict], Any] | None = None,
+) -> dict:
+    """Пишет событие и выставляет event["seq"].
 
+    publish(event) вызывается только после коммита события и в порядке seq даже
+    при записи из нескольких потоков: с group commit — потоком-писателем, без
+    него — под _lock. Внутри transaction() событие откладывается до коммита:
+    seq и публикация появятся только после него, а при откате события не
+    будет вовсе.
 
-def list_events(run_id: str, limit: int = 500) -> list[dict]:
+    Чтения событий (list_events, iter_events, ...) не ждут group commit: кому
+    нужно прочитать только что записанное, вызывает flush_events().
+    """
     conn = _conn_or_raise()
+    row = (
+        event["id"],
+        event["run_id"],
+        event["ts"],
+        event["type"],
+        event["level"],
+        event["message"],
+        _json_dump(event.get("payload") or {}),
+        event.get("task_id"),
+        event.get("step_id"),
+    )
+    writer = _event_writer
+    if _in_transaction():
+        _tx.events.append((event, row, durable, publish))
+    elif writer is not None:
+        _submit_event(writer, event, row, durable, publish)
+    else:
+        with _lock:
+            event["seq"] = _insert_event_row(conn, row)
+            _commit(conn)
+            if publish is not None:
+                publish(event)
+    if event["type"] == "chat_response_generated":
+        _record_chat_response(event)
+    return event
+
+
+def list_events(run_id: str, limit: int = 500) -> list[EventRecord]:
+    conn = _read_conn()
+    if _event_archive(run_id) is not None:
+        return list(islice(iter_events(run_id), max(0, limit)))
     rows = conn.execute(
-        "SELECT rowid, * FROM events WHERE run_id = ? ORDER BY rowid ASC LIMIT ?",
+        f"SELECT {EVENT_COLUMNS} FROM events WHERE run_id = ? ORDER BY rowid ASC LIMIT ?",
         (run_id, limit),
     ).fetchall()
-    return [
-        {
-            "seq": r["rowid"],
-            "id": r["id"],
-            "run_id": r["run_id"],
-            "ts": r["ts"],
-            "type": r["type"],
-            "level": r["level"],
-            "message": r["message"],
-            "payload": _json_load(r["payload"]) or {},
-            "task_id": r["task_id"],
-            "step_id": r["step_id"],
-        }
-        for r in rows
-    ]
+    return [EventRecord(r) for r in rows]
 
 
-def list_events_since(run_id: str, last_seq: int) -> list[dict]:
-    conn = _conn_or_raise()
+def list_events_since(run_id: str, last_seq: int) -> list[EventRecord]:
+    conn = _read_conn()
+    archive = _event_archive(run_id)
+    if archive is not None and last_seq < archive["last_seq"]:
+        return list(iter_events(run_id, from_seq=last_seq + 1))
     rows = conn.execute(
-        "SELECT rowid, * FROM events WHERE run_id = ? AND rowid > ? ORDER BY rowid ASC",
+        f"SELECT {EVENT_COLUMNS} FROM events WHERE run_id = ? AND rowid > ? ORDER BY rowid ASC",
         (run_id, last_seq),
     ).fetchall()
-    return [
-        {
-            "seq": r["rowid"],
-            "id": r["id"],
-            "run_id": r["run_id"],
-            "ts": r["ts"],
-            "type": r["type"],
-            "level": r["level"],
-            "message": r["message"],
-            "payload": _json_load(r["payload"]) or {},
-            "task_id": r["task_id"],
-            "step_id": r["step_id"],
-        }
-        for r in rows
-    ]
+    return [EventRecord(r) for r in rows]
+
+
+def iter_events(
+    run_id: str,
+    *,
+    from_seq: int = 0,
+    to_seq: int | None = None,
+    types: Optional[list[str]] = None,
+    step_id: str | None = None,
+    chunk_size: int = 1000,
+) -> Iterator[EventRecord]:
+    """События запуска с seq в [from_seq, to_seq] порциями по chunk_size.
+
+    Каждая порция — отдельный запрос по ключу rowid, а не один курсор на весь
+    экспорт: долгая выгрузка не держит открытую read-транзакцию (она мешала бы
+    checkpoint WAL), а в памяти одновременно не больше одной порции. События
+    архивированного запуска сначала читаются из его сегмента.
+    """
+    after_seq = max(0, int(from_seq) - 1)
+    archive = _event_archive(run_id)
+    if archive is not None:
+        if after_seq < archive["last_seq"]:
+            for event in _iter_archived_events(archive, types=types):
+                if event.seq <= after_seq or (step_id is not None and event.step_id != step_id):
+                    continue
+                if to_seq is not None and event.seq > to_seq:
+                    return
+                yield event
+        after_seq = max(after_seq, archive["last_seq"])
+    yield from _iter_hot_events(run_id, after_seq, to_seq, types, chunk_size, step_id=step_id)
+
+
+def _iter_hot_events(
+    run_id: str,
+    after_seq: int,
+    to_seq: int | None,
+    types: Optional[list[str]],
+    chunk_size: int,
+    *,
+    step_id: str | None = None,
+) -> Iterator[EventRecord]:
+    chunk_size = max(1, min(int(chunk_size), 10_000))
+    clauses = ["run_id = ?", "rowid > ?"]
+    params: list[Any] = [run_id]
+    if to_seq is not None:
+        clauses.append("rowid <= ?")
+        params.append(int(to_seq))
+    if step_id is not None:
+        # Частичный индекс idx_events_step_type (step_id, type)
+        clauses.append("step_id = ?")
+        params.append(step_id)
+    if types:
+        clauses.append(f"type IN ({', '.join('?' for _ in types)})")
+        params.extend(types)
+    sql = f"SELECT {EVENT_COLUMNS} FROM events WHERE {' AND '.join(clauses)} ORDER BY rowid ASC LIMIT ?"
+    last_seq = after_seq
+    while True:
+        rows = _read_conn().execute(sql, (params[0], last_seq, *params[1:], chunk_size)).fetchall()
+        for row in rows:
+            yield EventRecord(row)
+        if len(rows) < chunk_size:
+            return
+        last_seq = rows[-1]["rowid"]
+
+
+# Статусы, после которых события запуска можно переносить в холодный архив
+ARCHIVABLE_RUN_STATUSES = ("done", "failed", "canceled")
+_ARCHIVE_DIR = Path("archive") / "events"
+
+
+def _event_archive(run_id: str) -> Optional[sqlite3.Row]:
+    return _read_conn().execute("SELECT * FROM event_archives WHERE run_id = ?", (run_id,)).fetchone()
+
+
+def _archive_path(relative: str) -> Path:
+    if _data_dir is None:
+        raise RuntimeError("База данных не инициализирована")
+    return _data_dir / relative
+
+
+def _iter_archived_events(archive: sqlite3.Row, *, types: Optional[list[str]] = None) -> Iterator[EventRecord]:
+    wanted = set(types) if types else None
+    try:
+        with gzip.open(_archive_path(archive["path"]), "rt", encoding="utf-8") as fh:
+            for line in fh:
+                event = EventRecord.from_archive_line(line)
+                if wanted is None or event.type in wanted:
+                    yield event
+    except FileNotFoundError:
+        # Сегмент удалён вручную — отдаём то, что осталось в events
+        return
+
+
+def _archive_file_name(run_id: str) -> str:
+    # run_id бывает вида "reminder:<id>": безопасное имя + хэш против коллизий
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", run_id)[:64]
+    digest = hashlib.sha1(run_id.encode("utf-8")).hexdigest()[:10]
+    return f"{safe}-{digest}.ndjson.gz"
+
+
+def archive_run_events(run_id: str) -> Optional[dict]:
+    """Переносит события запуска в сжатый сегмент и удаляет их из events.
+
+    Сегмент пишется во временный файл, fsync и rename; затем одной транзакцией
+    добавляется строка event_archives и удаляются строки events с seq <= last_seq.
+    События, пришедшие после чтения, остаются в events и читаются вместе с архивом.
+    """
+    if _event_archive(run_id) is not None:
+        return None
+    flush_events()
+    relative = str(_ARCHIVE_DIR / _archive_file_name(run_id))
+    path = _archive_path(relative)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    count = 0
+    raw_bytes = 0
+    first_seq = last_seq = 0
+    with open(tmp_path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as fh:
+            for event in _iter_hot_events(run_id, 0, None, None, 1000):
+                line = (event.to_archive_line() + "\n").encode("utf-8")
+                fh.write(line)
+                raw_bytes += len(line)
+                count += 1
+                first_seq = first_seq or event.seq
+                last_seq = event.seq
+        raw.flush()
+        os.fsync(raw.fileno())
+    if not count:
+        tmp_path.unlink(missing_ok=True)
+        return None
+    os.replace(tmp_path, path)
+    record = {
+        "run_id": run_id,
+        "path": relative,
+        "first_seq": first_seq,
+        "last_seq": last_seq,
+        "event_count": count,
+        "raw_bytes": raw_bytes,
+        "stored_bytes": path.stat().st_size,
+        "archived_at": now_iso(),
+    }
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT INTO event_archives (run_id, path, first_seq, last_seq, event_count, raw_bytes, stored_bytes, archived_at)
+            VALUES (:run_id, :path, :first_seq, :last_seq, :event_count, :raw_bytes, :stored_bytes, :archived_at)
+            """,
+            record,
+        )
+        conn.execute("DELETE FROM events WHERE run_id = ? AND rowid <= ?", (run_id, last_seq))
+    return record
+
+
+def archive_finished_runs(older_than_s: float, *, limit: int = 50) -> dict:
+    """Архивирует события запусков, завершённых (done/failed/canceled) раньше older_than_s секунд назад."""
+    cutoff = (datetime.utcnow() - timedelta(seconds=max(0.0, older_than_s))).isoformat() + "Z"
+    placeholders = ", ".join("?" for _ in ARCHIVABLE_RUN_STATUSES)
+    rows = _read_conn().execute(
+        f"""
+        SELECT r.id FROM runs r
+        WHERE r.status IN ({placeholders})
+          AND r.finished_at IS NOT NULL AND r.finished_at < ?
+          AND NOT EXISTS (SELECT 1 FROM event_archives a WHERE a.run_id = r.id)
+          AND EXISTS (SELECT 1 FROM events e WHERE e.run_id = r.id)
+        ORDER BY r.finished_at ASC
+        LIMIT ?
+        """,
+        (*ARCHIVABLE_RUN_STATUSES, cutoff, max(1, limit)),
+    ).fetchall()
+    archived = [record for record in (archive_run_events(row["id"]) for row in rows) if record]
+    return {
+        "runs": len(archived),
+        "events": sum(r["event_count"] for r in archived),
+        "raw_bytes": sum(r["raw_bytes"] for r in archived),
+        "stored_bytes": sum(r["stored_bytes"] for r in archived),
+    }
+
+
+# Таблицы с политикой хранения: колонка возраста, порядок «старые первыми» и
+# условие, без которого строку удалять нельзя. Последнее событие не удаляется
+# никогда: MAX(rowid) events — верхняя граница seq для EventWriter.
+_RETENTION_TABLES: dict[str, tuple[str, str, str]] = {
+    "events": ("ts", "rowid", "rowid < (SELECT MAX(rowid) FROM events)"),
+    "tasks": ("finished_at", "finished_at", "finished_at IS NOT NULL"),
+    "sources": ("retrieved_at", "retrieved_at", "pinned = 0 AND retrieved_at IS NOT NULL"),
+    "facts": ("created_at", "created_at", "1"),
+    "artifacts": ("created_at", "created_at", "1"),
+    "memory_fts": ("created_at", "rowid", "1"),
+}
+RETENTION_TABLES = tuple(_RETENTION_TABLES)
+# Строки memory_fts, ссылающиеся на удаляемые элементы, удаляются в той же транзакции
+_FTS_ITEM_TYPE_BY_TABLE = {table: item_type for item_type, (table, _, _, _) in _SEARCH_ITEM_TYPES.items()}
+
+
+def _retention_cutoff(table: str, older_than_s: float) -> Any:
+    cutoff = datetime.utcnow() - timedelta(seconds=max(0.0, older_than_s))
+    if table == "events":
+        # events.ts — миллисекунды, как в add_event
+        return int(cutoff.timestamp() * 1000)
+    return cutoff.isoformat() + "Z"
+
+
+def _purge_batch(table: str, where: str, params: tuple, order: str, limit: int) -> int:
+    item_type = _FTS_ITEM_TYPE_BY_TABLE.get(table)
+    with transaction() as conn:
+        id_column = "id" if item_type else "NULL"
+        rows = conn.execute(
+            f"SELECT rowid, {id_column} AS item_id FROM {table} WHERE {where} ORDER BY {order} ASC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        if not rows:
+            return 0
+        rowids = [row["rowid"] for row in rows]
+        conn.execute(f"DELETE FROM {table} WHERE rowid IN ({', '.join('?' for _ in rowids)})", rowids)
+        if item_type:
+            item_ids = [row["item_id"] for row in rows]
+            conn.execute(
+                f"DELETE FROM memory_fts WHERE type = ? AND item_id IN ({', '.join('?' for _ in item_ids)})",
+                (item_type, *item_ids),
+            )
+    return len(rows)
+
+
+def purge_table(
+    table: str,
+    *,
+    older_than_s: float | None = None,
+    max_rows: int | None = None,
+    batch_size: int = 500,
+    max_batches: int = 20,
+) -> int:
+    """Удаляет строки старше older_than_s и самые старые сверх max_rows.
+
+    Каждая пачка — отдельная короткая транзакция, за один вызов не больше
+    max_batches пачек: остаток дочищается следующим проходом обслуживания.
+    Возвращает число удалённых строк.
+    """
+    if table not in _RETENTION_TABLES:
+        raise ValueError(f"Нет политики хранения для таблицы: {table}")
+    age_column, order, guard = _RETENTION_TABLES[table]
+    batch_size = max(1, batch_size)
+    deleted = 0
+    batches = 0
+    if older_than_s is not None:
+        cutoff = _retention_cutoff(table, older_than_s)
+        while batches < max_batches:
+            removed = _purge_batch(table, f"{guard} AND {age_column} < ?", (cutoff,), order, batch_size)
+            deleted += removed
+            batches += 1
+            if removed < batch_size:
+                break
+    if max_rows is not None and batches < max_batches:
+        total = _read_conn().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        excess = total - max(0, max_rows)
+        while excess > 0 and batches < max_batches:
+            removed = _purge_batch(table, guard, (), order, min(batch_size, excess))
+            if not removed:
+                break
+            deleted += removed
+            excess -= removed
+            batches += 1
+    return deleted
+
+
+# Архив с наибольшим last_seq не удаляется: MAX(last_seq) event_archives — часть
+# верхней границы seq для EventWriter (см. _max_event_seq)
+_ARCHIVE_RETENTION_GUARD = "last_seq < (SELECT MAX(last_seq) FROM event_archives)"
+
+
+def _purge_archive_batch(where: str, params: tuple, limit: int, bytes_needed: int | None = None) -> dict:
+    removed = {"segments": 0, "events": 0, "bytes": 0}
+    with transaction() as conn:
+        rows = conn.execute(
+            f"SELECT run_id, path, event_count, stored_bytes FROM event_archives WHERE {where} "
+            "ORDER BY archived_at ASC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        if bytes_needed is not None:
+            picked: list[sqlite3.Row] = []
+            for row in rows:
+                if bytes_needed <= 0:
+                    break
+                picked.append(row)
+                bytes_needed -= row["stored_bytes"]
+            rows = picked
+        if not rows:
+            return removed
+        run_ids = [row["run_id"] for row in rows]
+        conn.execute(f"DELETE FROM event_archives WHERE run_id IN ({', '.join('?' for _ in run_ids)})", run_ids)
+        # Сегменты удаляются до коммита: при сбое остаётся строка без файла
+        # (чтение это переживает), а не файл, на который ничто не ссылается
+        for row in rows:
+            path = _archive_path(row["path"])
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                size = 0
+            removed["segments"] += 1
+            removed["events"] += row["event_count"]
+            removed["bytes"] += size
+    return removed
+
+
+def purge_event_archives(
+    *,
+    older_than_s: float | None = None,
+    max_bytes: int | None = None,
+    batch_size: int = 100,
+    max_batches: int = 20,
+) -> dict:
+    """Удаляет сегменты архива событий вместе с их строками event_archives.
+
+    Сначала — архивированные раньше older_than_s секунд назад, затем самые
+    старые сверх max_bytes (по stored_bytes). Пачки — как в purge_table.
+    Возвращает число сегментов, событий в них и освобождённых байт.
+    """
+    total = {"segments": 0, "events": 0, "bytes": 0}
+    batch_size = max(1, batch_size)
+    batches = 0
+
+    def add(batch: dict) -> None:
+        for key in total:
+            total[key] += batch[key]
+
+    if older_than_s is not None:
+        cutoff = (datetime.utcnow() - timedelta(seconds=max(0.0, older_than_s))).isoformat() + "Z"
+        while batches < max_batches:
+            batch = _purge_archive_batch(f"{_ARCHIVE_RETENTION_GUARD} AND archived_at < ?", (cutoff,), batch_size)
+            add(batch)
+            batches += 1
+            if batch["segments"] < batch_size:
+                break
+    while max_bytes is not None and batches < max_batches:
+        stored = _read_conn().execute("SELECT COALESCE(SUM(stored_bytes), 0) FROM event_archives").fetchone()[0]
+        excess = stored - max(0, max_bytes)
+        if excess <= 0:
+            break
+        batch = _purge_archive_batch(_ARCHIVE_RETENTION_GUARD, (), batch_size, bytes_needed=excess)
+        if not batch["segments"]:
+            break
+        add(batch)
+        batches += 1
+    return total
+
+
+def incremental_vacuum(*, max_pages: int = 4096, step_pages: int = 256) -> dict:
+    """Возвращает свободные страницы ОС шагами по step_pages, не дольше max_pages за вызов.
+
+    Между шагами _lock отпускается, поэтому запись событий и состояний не ждёт
+    всего прохода. Требует auto_vacuum=INCREMENTAL (миграция 013_retention).
+    """
+    if _in_transaction():
+        raise RuntimeError("incremental_vacuum нельзя вызывать внутри транзакции")
+    conn = _conn_or_raise()
+    with _lock:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    freed = 0
+    if mode == 2:
+        while freed < max_pages:
+            with _lock:
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free:
+                    break
+                step = min(step_pages, free, max_pages - freed)
+                # execute() делает один шаг (одна страница); executescript
+                # выполняет прагму до конца
+                conn.executescript(f"PRAGMA incremental_vacuum({step});")
+                released = free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if released <= 0:
+                break
+            freed += released
+    with _lock:
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {"pages": freed, "bytes": freed * page_size, "free_pages_left": remaining}
+
+
+def finish_deferred_migrations() -> Optional[dict]:
+    """Выполняет отложенные на старте PRAGMA/VACUUM миграций (см. db.apply_migrations).
+
+    VACUUM держит _lock всё время перезаписи файла, поэтому вызывается только
+    из прохода обслуживания. None — отложенного нет.
+    """
+    if _in_transaction():
+        raise RuntimeError("finish_deferred_migrations нельзя вызывать внутри транзакции")
+    with _lock:
+        report = run_deferred_migrations(_conn_or_raise())
+    if report is None:
+        return None
+    return {"done": list(report.timings_ms), "pending": report.pending, "total_ms": round(report.total_ms, 1)}
 
 
-def add_event(run_id: str, event_type: str, level: str, message: str, payload: dict | None = None, task_id: Optional[str] = None, step_id: Optional[str] = None) -> dict:
+def checkpoint_wal() -> dict:
+    """Переносит WAL в файл БД и обрезает его до нуля (wal_checkpoint(TRUNCATE)).
+
+    Выполняется отдельным соединением без _lock: запись событий и состояний
+    ждёт только сам checkpoint внутри SQLite, а не весь проход обслуживания.
+    При активных читателях WAL не обрезается (busy=1) — сожмётся в следующий раз.
+    Архивация и incremental_vacuum удаляют много страниц, и без checkpoint WAL
+    и файл БД не уменьшаются.
+    """
+    if _in_transaction():
+        raise RuntimeError("checkpoint_wal нельзя вызывать внутри транзакции")
+    if _data_dir is None:
+        raise RuntimeError("База данных не инициализирована")
+    conn = sqlite3.connect(str(get_db_path(_data_dir)))
+    try:
+        busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        conn.close()
+    return {"busy": busy, "log_frames": log_frames, "checkpointed": checkpointed}
+
+
+def add_event(
+    run_id: str,
+    event_type: str,
+    level: str,
+    message: str,
+    payload: dict | None = None,
+    task_id: Optional[str] = None,
+    step_id: Optional[str] = None,
+    *,
+    durable: bool | None = None,
+    publish: Callable[[dict], Any] | None = None,
+) -> dict:
     event = {
         "id": _uuid(),
         "run_id": run_id,
@@ -1430,4 +2600,6 @@ def add_event(run_id: str, event_type: str, level: str, message: str, payload: d
         "task_id": task_id,
         "step_id": step_id,
     }
-    return insert_event(event)
+    if durable is None:
+        durable = event_type in DURABLE_EVENT_TYPES
+    return insert_event(event, durable=durable, publish=publish)
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.brain import router as router_module
+from core.brain.router import BrainConfig, BrainRouter
+from core.brain.types import LLMRequest
+
+
+class _SlowOllama(ThreadingHTTPServer):
+    daemon_threads = True
+    delay_s = 0.1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.server.delay_s)  # type: ignore[attr-defined]
+        data = json.dumps({"message": {"role": "assistant", "content": "ok"}, "done": True}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+async def _scenario(router: BrainRouter, mode: str, requests: int, probes: int) -> dict:
+    """requests одновременных запросов чата и, параллельно, лёгкие задачи пула
+    потоков (как остальные sync-маршруты API): сколько они ждут свободный поток."""
+    probe_waits: list[float] = []
+
+    async def chat(n: int) -> None:
+        request = LLMRequest(purpose="chat_response", messages=[{"role": "user", "content": f"q{n}"}], run_id=f"run-{n}")
+        if mode == "acall":
+            await router.acall(request)
+        else:
+            await run_in_threadpool(router.call, request)
+
+    async def probe(n: int) -> None:
+        await asyncio.sleep(0.05 + n * 0.05)
+        start = time.perf_counter()
+        await run_in_threadpool(lambda: None)
+        probe_waits.append((time.perf_counter() - start) * 1000)
+
+    peak_threads = threading.active_count()
+
+    async def watch() -> None:
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.01)
+
+    watcher = asyncio.create_task(watch())
+    start = time.perf_counter()
+    await asyncio.gather(*(probe(n) for n in range(probes)), *(chat(n) for n in range(requests)))
+    elapsed = time.perf_counter() - start
+    watcher.cancel()
+    await router.aclose()
+    return {
+        "total_s": elapsed,
+        "probe_p50_ms": statistics.median(probe_waits),
+        "probe_max_ms": max(probe_waits),
+        "peak_threads": peak_threads,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark BrainRouter.call in the threadpool vs BrainRouter.acall under concurrent chat load.")
+    parser.add_argument("--requests", type=int, default=120, help="Concurrent chat requests")
+    parser.add_argument("--llm-ms", type=float, default=100.0, help="Simulated Ollama latency per request")
+    parser.add_argument("--concurrency", type=int, default=4, help="ASTRA_LLM_MAX_CONCURRENCY")
+    parser.add_argument("--probes", type=int, default=20, help="Light threadpool tasks issued during the load")
+    args = parser.parse_args()
+
+    router_module.emit = lambda *a, **kw: None
+    server = _SlowOllama(("127.0.0.1", 0), _Handler)
+    server.delay_s = args.llm_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        for mode in ("threadpool", "acall"):
+            cfg = BrainConfig.from_env()
+            cfg.local_base_url = f"http://127.0.0.1:{server.server_address[1]}"
+            cfg.max_concurrency = args.concurrency
+            cfg.chat_priority_extra_slots = 0
+            router = BrainRouter(cfg)
+            router._cache.enabled = False
+            stats = asyncio.run(_scenario(router, mode, args.requests, args.probes))
+            print(
+                f"{mode:10s} total_s={stats['total_s']:6.2f} probe_p50_ms={stats['probe_p50_ms']:8.1f} "
+                f"probe_max_ms={stats['probe_max_ms']:8.1f} peak_threads={stats['peak_threads']}"
+            )
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
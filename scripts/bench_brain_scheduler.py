@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.brain.router import BrainQueue
+
+
+def _request(queue: BrainQueue, duration_s: float, done: list[float], start: float, **kwargs) -> None:
+    token = queue.acquire(**kwargs)
+    try:
+        time.sleep(duration_s)
+    finally:
+        queue.release(token)
+    done.append(time.perf_counter() - start)
+
+
+def _mixed_models(queue: BrainQueue, code_s: float, chat_s: float, chats: int) -> float:
+    """Запрос к модели кода, за ним фоновые запросы к модели чата; медианная задержка чата, мс."""
+    start = time.perf_counter()
+    code_done: list[float] = []
+    chat_done: list[float] = []
+    threads = [threading.Thread(target=_request, args=(queue, code_s, code_done, start), kwargs={"model": "coder", "run_id": "run-code"})]
+    threads[0].start()
+    time.sleep(0.01)
+    for n in range(chats):
+        thread = threading.Thread(target=_request, args=(queue, chat_s, chat_done, time.perf_counter()), kwargs={"model": "chat", "run_id": f"run-{n}"})
+        thread.start()
+        threads.append(thread)
+        time.sleep(chat_s)
+    for thread in threads:
+        thread.join()
+    return statistics.median(chat_done) * 1000
+
+
+def _bulk_and_small(queue: BrainQueue, bulk: int, small: int, step_s: float, fair: bool) -> float:
+    """Запуск ставит bulk запросов, следом другой — small; когда закончится маленький запуск, с."""
+    start = time.perf_counter()
+    bulk_done: list[float] = []
+    small_done: list[float] = []
+    threads = []
+    for n in range(bulk + small):
+        is_bulk = n < bulk
+        run_id = ("run-bulk" if is_bulk else "run-small") if fair else None
+        thread = threading.Thread(
+            target=_request,
+            args=(queue, step_s, bulk_done if is_bulk else small_done, start),
+            kwargs={"model": "m", "run_id": run_id},
+        )
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.002)
+    for thread in threads:
+        thread.join()
+    return max(small_done)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark BrainQueue scheduling: per-model slot pools and fair sharing across runs vs one global FIFO.")
+    parser.add_argument("--code-ms", type=float, default=2000.0, help="Duration of the long code-model request")
+    parser.add_argument("--chat-ms", type=float, default=100.0, help="Duration of each chat-model request")
+    parser.add_argument("--chats", type=int, default=10, help="Chat-model requests issued behind the code request")
+    parser.add_argument("--bulk", type=int, default=20, help="Requests queued by the bulk run")
+    parser.add_argument("--small", type=int, default=2, help="Requests queued by the small run after it")
+    parser.add_argument("--step-ms", type=float, default=50.0, help="Duration of each request in the fairness scenario")
+    args = parser.parse_args()
+
+    # Прежняя очередь: один глобальный слот и FIFO без учёта запусков
+    legacy_chat = _mixed_models(BrainQueue(1, total_slots=1), args.code_ms / 1000, args.chat_ms / 1000, args.chats)
+    pooled_chat = _mixed_models(BrainQueue(1), args.code_ms / 1000, args.chat_ms / 1000, args.chats)
+    print(f"chat behind code request: global_slot p50_ms={legacy_chat:8.1f}  per_model_pools p50_ms={pooled_chat:8.1f}")
+
+    fifo_small = _bulk_and_small(BrainQueue(1), args.bulk, args.small, args.step_ms / 1000, fair=False)
+    fair_small = _bulk_and_small(BrainQueue(1), args.bulk, args.small, args.step_ms / 1000, fair=True)
+    print(f"small run behind bulk run: fifo done_s={fifo_small:6.2f}  fair done_s={fair_small:6.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.brain import router as router_module
+from core.brain.providers import ProviderResult
+from core.brain.router import BrainConfig, BrainRouter
+from core.brain.types import LLMRequest, LLMResponse
+
+
+def _raw(context_tokens: int) -> dict:
+    # Ответ /api/generate: массив токенов context в raw
+    return {"response": "ok", "done": True, "eval_count": 42, "context": list(range(context_tokens))}
+
+
+def _legacy(runs: int, steps: int, context_tokens: int) -> int:
+    """Прежний роутер: кэш ответов по run_id с полным raw и счётчики всех запусков без вытеснения."""
+    cache: dict[str, dict[str, LLMResponse]] = {}
+    run_counts: dict[str, int] = {}
+    step_counts: dict[tuple[str, str], int] = {}
+    failures: dict[tuple[str, str], int] = {}
+    tracemalloc.start()
+    for n in range(runs):
+        run_id = f"run-{n}"
+        for step in range(steps):
+            response = LLMResponse(text="ok", usage=None, provider="local", model_id="m", latency_ms=1, cache_hit=False, route_reason="local", raw=_raw(context_tokens))
+            cache.setdefault(run_id, {})[f"key-{step}"] = response
+            run_counts[run_id] = run_counts.get(run_id, 0) + 1
+            step_counts[(run_id, f"step-{step}")] = step_counts.get((run_id, f"step-{step}"), 0) + 1
+            failures[(run_id, "chat")] = 0
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current
+
+
+def _bounded(runs: int, steps: int, context_tokens: int, finished_share: float) -> tuple[int, dict]:
+    router = BrainRouter(BrainConfig.from_env())
+    router._cache.enabled = False
+    router._call_local = lambda messages, request, model_id: ProviderResult(text="ok", usage=None, raw=_raw(context_tokens))  # type: ignore[method-assign]
+    responses = []
+    tracemalloc.start()
+    for n in range(runs):
+        run_id = f"run-{n}"
+        for step in range(steps):
+            request = LLMRequest(purpose="bench", messages=[{"role": "user", "content": str(step)}], run_id=run_id, step_id=f"step-{step}")
+            # Ответы держит вызывающий код, пока запуск жив — как в RunEngine
+            responses.append(router.call(request))
+        responses.clear()
+        if n % 100 < finished_share * 100:
+            router.release_run(run_id)
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, router.state_stats()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark memory retained by BrainRouter per-run state: unbounded dicts vs bounded LRU with run-completion release.")
+    parser.add_argument("--runs", type=int, default=5000, help="Runs to simulate")
+    parser.add_argument("--steps", type=int, default=3, help="LLM calls per run")
+    parser.add_argument("--context-tokens", type=int, default=2048, help="Length of the context token array in /api/generate raw")
+    parser.add_argument("--finished-share", type=float, default=0.5, help="Share of runs that emit run_done/run_failed (chat runs do not)")
+    args = parser.parse_args()
+
+    router_module.emit = lambda *a, **kw: None
+    legacy = _legacy(args.runs, args.steps, args.context_tokens)
+    bounded, stats = _bounded(args.runs, args.steps, args.context_tokens, args.finished_share)
+    print(f"legacy   retained_mb={legacy / 2**20:8.2f}")
+    print(f"bounded  retained_mb={bounded / 2**20:8.2f} tracked_runs={stats['tracked_runs']} evicted_runs={stats['evicted_runs']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
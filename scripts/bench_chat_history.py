@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _legacy_recent_chat_turns(anchor_run_id: str, limit_turns: int) -> list[dict]:
+    """Прежняя реконструкция: get_run по цепочке + get_latest_event_by_type на каждый чат-запуск."""
+    limit_turns = max(1, min(limit_turns, 100))
+    limit = max(1, min(limit_turns * 5, 500))
+    chain: list[dict] = []
+    seen: set[str] = set()
+    current_id: str | None = anchor_run_id
+    while current_id and current_id not in seen and len(chain) < limit:
+        seen.add(current_id)
+        run = store.get_run(current_id)
+        if not run:
+            break
+        chain.append(run)
+        current_id = run.get("parent_run_id")
+    chain.reverse()
+    chat_runs = [run for run in chain if store._is_chat_run(run)][-limit_turns:]
+    history: list[dict] = []
+    for run in chat_runs:
+        if run.get("query_text"):
+            history.append({"role": "user", "content": run["query_text"], "ts": run["created_at"], "run_id": run["id"]})
+        event = store.get_latest_event_by_type(run["id"], "chat_response_generated")
+        text = ((event or {}).get("payload") or {}).get("text")
+        if text:
+            history.append({"role": "assistant", "content": text, "ts": event["ts"], "run_id": run["id"]})
+    return history
+
+
+def _seed_conversation(turns: int, noise_events: int) -> str:
+    project = store.create_project("bench-chat", [], {})
+    parent_id: str | None = None
+    for idx in range(turns):
+        run = store.create_run(
+            project["id"],
+            f"Вопрос номер {idx}",
+            "plan_only",
+            parent_run_id=parent_id,
+            purpose="chat_only",
+            meta={"intent": "CHAT"},
+        )
+        for n in range(noise_events):
+            store.add_event(run["id"], "llm_request_started", "info", "LLM request started", {"n": n})
+        store.add_event(run["id"], "chat_response_generated", "info", "Ответ сформирован", {"text": f"Ответ {idx}"})
+        parent_id = run["id"]
+    store.flush_events()
+    return parent_id or ""
+
+
+def _measure(fn, anchor: str, limit_turns: int, repeats: int) -> tuple[float, int, list[dict]]:
+    conn = store._read_conn()
+    statements = 0
+
+    def _trace(_sql: str) -> None:
+        nonlocal statements
+        statements += 1
+
+    conn.set_trace_callback(_trace)
+    samples: list[float] = []
+    result: list[dict] = []
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn(anchor, limit_turns)
+            samples.append((time.perf_counter() - start) * 1000)
+    finally:
+        conn.set_trace_callback(None)
+    return statistics.median(samples), statements // repeats, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark chat history reconstruction on long conversations.")
+    parser.add_argument("--turns", type=int, default=1000, help="Chat turns in the conversation")
+    parser.add_argument("--noise", type=int, default=5, help="Extra events per chat run")
+    parser.add_argument("--repeats", type=int, default=20, help="Measurements per variant")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.reset_for_tests()
+        store.init(Path(tmp), MIGRATIONS_DIR)
+        anchor = _seed_conversation(args.turns, args.noise)
+        print(f"turns={args.turns} events_per_turn={args.noise + 1}")
+        for limit_turns in (12, 20, 100):
+            legacy_ms, legacy_q, legacy = _measure(_legacy_recent_chat_turns, anchor, limit_turns, args.repeats)
+            new_ms, new_q, current = _measure(store.list_recent_chat_turns, anchor, limit_turns, args.repeats)
+            assert legacy == current, "history mismatch"
+            print(
+                f"limit_turns={limit_turns:3d} legacy_ms={legacy_ms:8.2f} legacy_queries={legacy_q:4d} "
+                f"chat_turns_ms={new_ms:8.2f} chat_turns_queries={new_q:4d}"
+            )
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
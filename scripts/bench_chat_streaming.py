@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.brain import router as router_module
+from core.brain.router import BrainConfig, BrainRouter
+from core.brain.types import LLMRequest
+
+
+class _FakeOllama(ThreadingHTTPServer):
+    """Ollama с задержкой prefill и фиксированной скоростью генерации токенов."""
+
+    daemon_threads = True
+
+    def __init__(self, tokens: int, prefill_s: float, token_s: float) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.tokens = tokens
+        self.prefill_s = prefill_s
+        self.token_s = token_s
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self) -> None:
+        server: _FakeOllama = self.server  # type: ignore[assignment]
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(server.prefill_s)
+        if not payload.get("stream"):
+            time.sleep(server.token_s * server.tokens)
+            data = json.dumps({"message": {"role": "assistant", "content": "слово " * server.tokens}, "done": True}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for n in range(server.tokens + 1):
+            if n:
+                time.sleep(server.token_s)
+            done = n == server.tokens
+            line = {"message": {"role": "assistant", "content": "" if done else "слово "}, "done": done}
+            data = (json.dumps(line) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _measure(router: BrainRouter, stream: bool, calls: int, events: list[tuple[str, float]]) -> tuple[list[float], list[float], int]:
+    ttft, total = [], []
+    deltas = 0
+    for n in range(calls):
+        events.clear()
+        request = LLMRequest(
+            purpose="chat_response",
+            task_kind="chat",
+            messages=[{"role": "user", "content": f"вопрос {n} {stream}"}],
+            run_id="bench",
+            stream=stream,
+        )
+        start = time.perf_counter()
+        router.call(request)
+        end = time.perf_counter()
+        first = next((ts for event_type, ts in events if event_type == "chat_response_delta"), end)
+        ttft.append((first - start) * 1000)
+        total.append((end - start) * 1000)
+        deltas += sum(1 for event_type, _ in events if event_type == "chat_response_delta")
+    return ttft, total, deltas
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark chat latency: time to first visible token, buffered vs streamed Ollama responses.")
+    parser.add_argument("--calls", type=int, default=10, help="Chat calls per mode")
+    parser.add_argument("--tokens", type=int, default=120, help="Tokens per answer")
+    parser.add_argument("--prefill-ms", type=float, default=300.0, help="Simulated prompt evaluation time")
+    parser.add_argument("--token-ms", type=float, default=25.0, help="Simulated time per generated token")
+    parser.add_argument("--flush-ms", type=int, default=50, help="ASTRA_LLM_STREAM_FLUSH_MS")
+    args = parser.parse_args()
+
+    server = _FakeOllama(args.tokens, args.prefill_ms / 1000, args.token_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    events: list[tuple[str, float]] = []
+    router_module.emit = lambda run_id, event_type, *a, **kw: events.append((event_type, time.perf_counter()))
+    router_module.publish_live = router_module.emit
+    cfg = BrainConfig.from_env()
+    cfg.local_base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    cfg.stream_enabled = True
+    cfg.stream_flush_ms = args.flush_ms
+    router = BrainRouter(cfg)
+    try:
+        for name, stream in (("buffered", False), ("streamed", True)):
+            ttft, total, deltas = _measure(router, stream, args.calls, events)
+            print(
+                f"{name:9s} ttft_p50_ms={statistics.median(ttft):8.1f} total_p50_ms={statistics.median(total):8.1f} "
+                f"delta_events_per_answer={deltas / args.calls:6.1f}"
+            )
+    finally:
+        router.close()
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
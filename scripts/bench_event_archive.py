@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _seed(runs: int, events_per_run: int) -> tuple[list[str], str]:
+    project = store.create_project("bench", [], {})
+    payload = json.dumps({"cycle": 1, "action": {"type": "click", "x": 100, "y": 200}, "reason": "кнопка найдена " * 10}, ensure_ascii=False)
+    # Активный запуск пишется первым через EventWriter: сырые INSERT ниже получают rowid после его seq
+    active = store.create_run(project["id"], "q", "plan_only")
+    for n in range(events_per_run):
+        store.add_event(active["id"], "task_progress", "info", "Прогресс", {"n": n})
+    store.flush_events()
+    finished = []
+    conn = store._conn_or_raise()
+    for _ in range(runs):
+        run = store.create_run(project["id"], "q", "plan_only")
+        store.update_run_status(run["id"], "done", finished_at="2020-01-01T00:00:00Z")
+        rows = [(f"{run['id']}-{n}", run["id"], n, "autopilot_action", "info", "Действие автопилота", payload) for n in range(events_per_run)]
+        with store._lock:
+            conn.executemany("INSERT INTO events (id, run_id, ts, type, level, message, payload) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.commit()
+        finished.append(run["id"])
+    return finished, active["id"]
+
+
+def _live_bytes() -> int:
+    conn = store._read_conn()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return (pages - free) * page_size
+
+
+def _index_rows() -> int:
+    return store._read_conn().execute("SELECT COUNT(*) FROM events INDEXED BY idx_events_run").fetchone()[0]
+
+
+def _timed(fn, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples)
+
+
+def _report(label: str, finished: list[str], active: str, repeats: int) -> None:
+    hot_ms = _timed(lambda: store.list_events_since(active, 0), repeats)
+    tail_ms = _timed(lambda: store.list_events(active, limit=50), repeats)
+    cold_ms = _timed(lambda: store.list_events(finished[0], limit=200), repeats)
+    print(
+        f"{label:8s} live_mib={_live_bytes() / 2**20:7.1f} idx_rows={_index_rows():8d} "
+        f"active_since_ms={hot_ms:7.2f} active_head_ms={tail_ms:6.2f} finished_head_ms={cold_ms:6.2f}"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark hot DB size and event query cost before/after cold archival of finished runs.")
+    parser.add_argument("--runs", type=int, default=200, help="Finished runs")
+    parser.add_argument("--events", type=int, default=1000, help="Events per run")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing repeats (best of)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.reset_for_tests()
+        store.init(Path(tmp), MIGRATIONS_DIR)
+        finished, active = _seed(args.runs, args.events)
+        _report("before", finished, active, args.repeats)
+
+        start = time.perf_counter()
+        result = store.archive_finished_runs(3600, limit=args.runs)
+        elapsed = time.perf_counter() - start
+        print(
+            f"archived runs={result['runs']} events={result['events']} s={elapsed:.2f} "
+            f"raw_mib={result['raw_bytes'] / 2**20:.1f} segments_mib={result['stored_bytes'] / 2**20:.1f}"
+        )
+        _report("after", finished, active, args.repeats)
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from apps.api.routes.run_events import _gzip_chunks, _ndjson_chunks
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _seed(run_id: str, count: int) -> None:
+    conn = store._conn_or_raise()
+    payload = json.dumps({"cycle": 1, "action": {"type": "click", "x": 100, "y": 200}, "reason": "кнопка найдена " * 10}, ensure_ascii=False)
+    rows = [(f"evt-{n}", run_id, n, "autopilot_action", "info", "Действие автопилота", payload) for n in range(count)]
+    with store._lock:
+        conn.executemany("INSERT INTO events (id, run_id, ts, type, level, message, payload) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+
+def _legacy_export(run_id: str, limit: int) -> int:
+    """Прежний download_events: всё в список, затем одна строка."""
+    events = store.list_events(run_id, limit=limit)
+    body = "\n".join([json.dumps(dict(e), ensure_ascii=False) for e in events]).encode("utf-8")
+    return len(body)
+
+
+def _streamed_export(run_id: str, compress: bool) -> int:
+    chunks = _ndjson_chunks(store.iter_events(run_id))
+    if compress:
+        chunks = _gzip_chunks(chunks)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def _measure(fn) -> tuple[float, int, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark NDJSON event export: in-memory join vs streaming (plain and gzip).")
+    parser.add_argument("--events", type=int, default=100_000, help="Events in the run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.reset_for_tests()
+        store.init(Path(tmp), MIGRATIONS_DIR)
+        _seed("bench-run", args.events)
+        cases = [
+            ("legacy_join", lambda: _legacy_export("bench-run", args.events)),
+            ("stream_plain", lambda: _streamed_export("bench-run", False)),
+            ("stream_gzip", lambda: _streamed_export("bench-run", True)),
+        ]
+        for name, fn in cases:
+            elapsed, peak, size = _measure(fn)
+            print(f"{name:13s} s={elapsed:6.2f} peak_mib={peak / 2**20:8.1f} body_mib={size / 2**20:8.1f}")
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
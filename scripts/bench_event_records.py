@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from apps.api.routes.run_events import _sse_frame
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _seed(run_id: str, count: int) -> None:
+    for n in range(count):
+        store.add_event(
+            run_id,
+            "task_progress",
+            "info",
+            "Прогресс",
+            {"n": n, "progress": {"current": n, "total": count, "unit": "шаг"}, "last_message": "страница загружена " * 8, "urls": [f"https://example.com/{n}/{k}" for k in range(5)]},
+            task_id="task-1",
+            step_id="step-1",
+        )
+    store.flush_events()
+
+
+def _legacy_list_events(run_id: str) -> list[dict]:
+    """Прежний list_events_since: dict на строку и json.loads payload сразу."""
+    rows = store._read_conn().execute("SELECT rowid, * FROM events WHERE run_id = ? AND rowid > 0 ORDER BY rowid ASC", (run_id,)).fetchall()
+    return [
+        {
+            "seq": r["rowid"],
+            "id": r["id"],
+            "run_id": r["run_id"],
+            "ts": r["ts"],
+            "type": r["type"],
+            "level": r["level"],
+            "message": r["message"],
+            "payload": store._json_load(r["payload"]) or {},
+            "task_id": r["task_id"],
+            "step_id": r["step_id"],
+        }
+        for r in rows
+    ]
+
+
+def _legacy_frame(event: dict) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+def _measure(fn) -> tuple[float, int, int]:
+    """(мс, пик аллокаций в байтах, удержанные байты после вызова)."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak, current
+
+
+def _timed(fn, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark event listing and SSE framing: dict rows vs lazy __slots__ records (tracemalloc).")
+    parser.add_argument("--events", type=int, default=5000, help="Events in the run")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing repeats (best of)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.reset_for_tests()
+        store.init(Path(tmp), MIGRATIONS_DIR)
+        run_id = "bench-run"
+        _seed(run_id, args.events)
+
+        cases = [
+            ("list_dicts", lambda: _legacy_list_events(run_id)),
+            ("list_records", lambda: store.list_events_since(run_id, 0)),
+            ("sse_dicts", lambda: [_legacy_frame(e) for e in _legacy_list_events(run_id)]),
+            ("sse_records", lambda: [_sse_frame(e) for e in store.list_events_since(run_id, 0)]),
+        ]
+        for name, fn in cases:
+            _, peak, retained = _measure(fn)
+            ms = _timed(fn, args.repeats)
+            print(f"{name:13s} ms={ms:8.2f} peak_kib={peak / 1024:9.1f} retained_kib={retained / 1024:9.1f}")
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
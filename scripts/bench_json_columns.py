@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+from memory.db import json_text_sql, jsonb_writes_enabled
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _seed(runs: int, events: int) -> tuple[str, str, str]:
+    project = store.create_project("bench", [], {})
+    for n in range(runs):
+        intent = "CHAT" if n % 10 == 0 else "ACT"
+        store.create_run(project["id"], f"запрос {n}", "plan_only", meta={"intent": intent, "qa_mode": False, "intent_path": "semantic", "note": "x" * 200})
+    run = store.create_run(project["id"], "q", "plan_only")
+    payload = {"progress": {"current": 1, "total": 10}, "last_message": "страница загружена " * 8}
+    for n in range(events):
+        store.add_event(run["id"], "task_progress" if n % 4 else "step_started", "info", "m", payload, step_id=f"step-{n % 50}")
+    store.flush_events()
+    return project["id"], run["id"], "step-7"
+
+
+def _legacy_chat_runs(project_id: str) -> list[str]:
+    """Прежний путь: все запуски проекта в Python и meta.intent через json.loads."""
+    rows = store._read_conn().execute(
+        f"SELECT id, purpose, {json_text_sql('meta')} AS meta FROM runs WHERE project_id = ?", (project_id,)
+    ).fetchall()
+    return [r["id"] for r in rows if store._is_chat_run({"purpose": r["purpose"], "meta": store._json_load(r["meta"])})]
+
+
+def _legacy_step_events(run_id: str, step_id: str) -> list:
+    return [e for e in store.list_events(run_id, limit=1_000_000) if e["step_id"] == step_id and e["type"] == "task_progress"]
+
+
+def _timed(fn, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return min(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark JSON-field lookups: Python loops vs generated/indexed columns (text or JSONB storage).")
+    parser.add_argument("--runs", type=int, default=20_000, help="Runs in the project")
+    parser.add_argument("--events", type=int, default=50_000, help="Events in the run")
+    parser.add_argument("--repeats", type=int, default=5, help="Timing repeats (best of)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.reset_for_tests()
+        store.init(Path(tmp), MIGRATIONS_DIR)
+        project_id, run_id, step_id = _seed(args.runs, args.events)
+        print(f"sqlite={sqlite3.sqlite_version} jsonb_writes={jsonb_writes_enabled()}")
+        cases = [
+            ("chat_runs_python", lambda: _legacy_chat_runs(project_id)),
+            ("chat_runs_sql", lambda: store.list_runs(project_id, limit=200, intent="CHAT")),
+            ("step_events_python", lambda: _legacy_step_events(run_id, step_id)),
+            ("step_events_sql", lambda: list(store.iter_events(run_id, types=["task_progress"], step_id=step_id))),
+            (
+                "extract_progress_sql",
+                lambda: store._read_conn().execute(
+                    "SELECT SUM(json_extract(payload, '$.progress.current')) FROM events WHERE run_id = ?", (run_id,)
+                ).fetchone(),
+            ),
+        ]
+        for name, fn in cases:
+            print(f"{name:21s} ms={_timed(fn, args.repeats):8.2f}")
+        sql_ids = {r["id"] for r in store.list_runs(project_id, limit=200, intent="CHAT")}
+        assert sql_ids <= set(_legacy_chat_runs(project_id))
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
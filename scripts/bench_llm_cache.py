@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.brain import router as router_module
+from core.brain.providers import ProviderResult
+from core.brain.router import BrainConfig, BrainRouter
+from core.brain.types import LLMRequest
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _replay(router: BrainRouter, prompts: list[str], llm_s: float) -> tuple[float, int]:
+    """Прогон вызовов semantic_decision; возвращает (секунды, вызовов LLM)."""
+    calls = 0
+
+    def fake_call(messages, request, model_id):
+        nonlocal calls
+        calls += 1
+        time.sleep(llm_s)
+        return ProviderResult(text='{"intent": "CHAT"}', usage=None, raw={"done": True})
+
+    router._call_local = fake_call  # type: ignore[method-assign]
+    start = time.perf_counter()
+    for n, prompt in enumerate(prompts):
+        router.call(LLMRequest(purpose="semantic_decision", messages=[{"role": "user", "content": prompt}], run_id=f"run-{n}", temperature=0))
+    return time.perf_counter() - start, calls
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the persistent LLM response cache: replayed helper calls and LRU write cost.")
+    parser.add_argument("--calls", type=int, default=400, help="Helper calls in the replay")
+    parser.add_argument("--distinct", type=int, default=80, help="Distinct prompts among them")
+    parser.add_argument("--llm-ms", type=float, default=20.0, help="Simulated LLM latency per call")
+    parser.add_argument("--max-entries", type=int, default=5000, help="ASTRA_LLM_CACHE_MAX_ENTRIES for the write benchmark")
+    args = parser.parse_args()
+
+    router_module.emit = lambda *a, **kw: None
+    rng = random.Random(7)
+    prompts = [f"запрос пользователя {rng.randrange(args.distinct)}" for _ in range(args.calls)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store.reset_for_tests()
+        store.init(Path(tmp), MIGRATIONS_DIR)
+        for name, enabled in (("no_cache", False), ("persistent", True)):
+            router = BrainRouter(BrainConfig.from_env())
+            router._cache.enabled = enabled
+            elapsed, calls = _replay(router, prompts, args.llm_ms / 1000)
+            print(f"{name:10s} total_s={elapsed:6.2f} llm_calls={calls:4d} hit_rate={router._cache.stats()['hit_rate']:.2f}")
+
+        # Стоимость записи с вытеснением при полном кэше и чтения попадания
+        payload = {"text": "x" * 400, "usage": None, "provider": "local", "model_id": "m", "route_reason": "local", "raw": None}
+        now = time.time()
+        for n in range(args.max_entries):
+            store.put_llm_cache_entry(f"seed-{n}", payload, purpose="p", model_id="m", ttl_s=3600, max_entries=args.max_entries, now_ts=now + n * 1e-6)
+        start = time.perf_counter()
+        for n in range(500):
+            store.put_llm_cache_entry(f"new-{n}", payload, purpose="p", model_id="m", ttl_s=3600, max_entries=args.max_entries, now_ts=now + 1 + n * 1e-6)
+        put_us = (time.perf_counter() - start) / 500 * 1e6
+        start = time.perf_counter()
+        for n in range(500):
+            store.get_llm_cache_entry(f"new-{n}", now + 2)
+        get_us = (time.perf_counter() - start) / 500 * 1e6
+        print(f"full cache ({store.llm_cache_stats()['entries']} entries): put_evict_us={put_us:7.1f} get_hit_us={get_us:7.1f}")
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.brain import providers
+from core.brain.providers import LocalLLMProvider, build_local_session
+
+
+class _FakeOllama(BaseHTTPRequestHandler):
+    """Ответ мгновенный: замеряется только накладной расход клиента (соединение, HTTP, JSON)."""
+
+    protocol_version = "HTTP/1.1"
+    connections: set[int] = set()
+    chat_status = 200
+
+    def setup(self) -> None:
+        super().setup()
+        # Как у Ollama (Go net/http): без Nagle, иначе keep-alive упирается в delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        _FakeOllama.connections.add(self.client_address[1])
+        if self.path == "/api/chat" and self.chat_status != 200:
+            status, payload = self.chat_status, {"error": "boom"}
+        elif self.path == "/api/generate":
+            status, payload = 200, {"response": "ok"}
+        else:
+            status, payload = 200, {"message": {"role": "assistant", "content": "ok"}}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class _OneShotSession:
+    """Прежнее поведение: голый requests.post — новое соединение на каждый запрос."""
+
+    def post(self, url, **kwargs):
+        return requests.post(url, **kwargs)
+
+    def close(self) -> None:
+        pass
+
+
+def _legacy_provider(base: str) -> LocalLLMProvider:
+    # BrainRouter._call_local создавал провайдер на каждый вызов
+    return LocalLLMProvider(base, "chat", "code", session=_OneShotSession())
+
+
+def _measure(call, calls: int) -> tuple[float, float, int]:
+    _FakeOllama.connections = set()
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1], len(_FakeOllama.connections)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark LocalLLMProvider per-call overhead: bare requests.post vs pooled session.")
+    parser.add_argument("--calls", type=int, default=500, help="Calls per case")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOllama)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    providers._ARTIFACT_DIR = Path(__import__("tempfile").mkdtemp())
+    messages = [{"role": "user", "content": "привет"}]
+    pooled = LocalLLMProvider(base, "chat", "code", session=build_local_session(pool_size=2))
+
+    for scenario, status, purpose in (("chat", 200, "chat_response"), ("fallback_chain", 500, "plan")):
+        _FakeOllama.chat_status = status
+        for name, call in (
+            ("legacy", lambda: _legacy_provider(base).chat(messages, purpose=purpose)),
+            ("pooled", lambda: pooled.chat(messages, purpose=purpose)),
+        ):
+            calls = args.calls if scenario == "chat" else max(1, args.calls // 5)
+            p50, p95, connections = _measure(call, calls)
+            print(f"{scenario:15s} {name:7s} p50_ms={p50:6.3f} p95_ms={p95:6.3f} connections={connections:5d} calls={calls}")
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import db
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _legacy_apply(conn, migrations_dir: Path) -> None:
+    """Прежний раннер: glob + чтение schema_migrations на каждом старте, коммит после каждого файла."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, applied_at TEXT NOT NULL)"
+    )
+    conn.commit()
+    applied = {row["name"] for row in conn.execute("SELECT name FROM schema_migrations").fetchall()}
+    for path in sorted(migrations_dir.glob("*.sql")):
+        if path.name in applied:
+            continue
+        conn.executescript(path.read_text(encoding="utf-8"))
+        conn.execute("INSERT INTO schema_migrations (name, applied_at) VALUES (?, ?)", (path.name, db.now_iso()))
+        conn.commit()
+
+
+def _measure(apply, db_path: Path, repeats: int) -> tuple[float, float]:
+    """(мс холодного применения на новой БД, лучшее мс повторного старта)."""
+    conn = db.connect(db_path)
+    start = time.perf_counter()
+    apply(conn, MIGRATIONS_DIR)
+    cold = (time.perf_counter() - start) * 1000
+    conn.close()
+    warm = []
+    for _ in range(repeats):
+        conn = db.connect(db_path)
+        start = time.perf_counter()
+        apply(conn, MIGRATIONS_DIR)
+        warm.append((time.perf_counter() - start) * 1000)
+        conn.close()
+    return cold, min(warm)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark migration runner: per-file commits vs fingerprinted single transaction.")
+    parser.add_argument("--repeats", type=int, default=50, help="Warm-start repeats (best of)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, apply in (("legacy", _legacy_apply), ("fingerprint", db.apply_migrations)):
+            cold, warm = _measure(apply, Path(tmp) / f"{name}.db", args.repeats)
+            print(f"{name:12s} cold_ms={cold:8.2f} warm_ms={warm:7.3f}")
+    report = db.last_migration_report()
+    if report is not None:
+        print(f"last report: fast_path={report.fast_path} total_ms={report.total_ms:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _iso(delta: timedelta) -> str:
+    return (datetime.now(timezone.utc) + delta).isoformat().replace("+00:00", "Z")
+
+
+def _legacy_claim(now_ts: str, limit: int) -> list[dict]:
+    """Прежний путь: SELECT, затем UPDATE и коммит на каждую строку."""
+    conn = store._conn_or_raise()
+    claimed = []
+    with store._lock:
+        rows = conn.execute(
+            "SELECT * FROM reminders WHERE status = 'pending' AND due_at <= ? ORDER BY due_at ASC LIMIT ?", (now_ts, limit)
+        ).fetchall()
+        for row in rows:
+            res = conn.execute(
+                "UPDATE reminders SET status = ?, updated_at = ?, attempts = attempts + 1 WHERE id = ? AND status = 'pending'",
+                ("sending", store.now_iso(), row["id"]),
+            )
+            if res.rowcount == 0:
+                continue
+            conn.commit()
+            claimed.append(store._reminder_row(row))
+    return claimed
+
+
+def _drain(claim, limit: int, in_flight: int) -> tuple[float, int]:
+    """(мс на захват всего бэклога, число батчей); доставленные сразу помечаются sent,
+    последние in_flight захваченных остаются в 'sending' с живой арендой."""
+    now_ts = _iso(timedelta(0))
+    batches = 0
+    claim_ms = 0.0
+    pending: list[str] = []
+    while True:
+        start = time.perf_counter()
+        claimed = claim(now_ts, limit)
+        claim_ms += (time.perf_counter() - start) * 1000
+        if not claimed:
+            break
+        batches += 1
+        pending.extend(r["id"] for r in claimed)
+        while len(pending) > in_flight:
+            store.mark_reminder_sent(pending.pop(0), "local")
+    elapsed = claim_ms
+    assert store._read_conn().execute("SELECT COUNT(*) FROM reminders WHERE status = 'pending' AND due_at <= ?", (now_ts,)).fetchone()[0] == 0
+    return elapsed, batches
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark reminder claiming: per-row UPDATE+commit vs one UPDATE ... RETURNING.")
+    parser.add_argument("--backlog", type=int, default=5_000, help="Due reminders to drain")
+    parser.add_argument("--future", type=int, default=20_000, help="Not-yet-due reminders in the table")
+    parser.add_argument("--limit", type=int, default=20, help="Claim batch size")
+    parser.add_argument("--in-flight", type=int, default=200, help="Claimed reminders still being delivered")
+    args = parser.parse_args()
+
+    for name, claim in (("legacy", _legacy_claim), ("returning", store.claim_due_reminders)):
+        with tempfile.TemporaryDirectory() as tmp:
+            store.reset_for_tests()
+            store.init(Path(tmp), MIGRATIONS_DIR)
+            for n in range(args.backlog):
+                store.create_reminder(_iso(timedelta(seconds=-n - 1)), f"due {n}", delivery="local")
+            for n in range(args.future):
+                store.create_reminder(_iso(timedelta(hours=1, seconds=n)), f"later {n}", delivery="local")
+            elapsed, batches = _drain(claim, args.limit, args.in_flight)
+            per_batch = elapsed / max(1, batches)
+            print(f"{name:10s} claim_ms={elapsed:9.2f} batches={batches:5d} per_batch_ms={per_batch:7.3f} per_row_us={elapsed * 1000 / args.backlog:8.2f}")
+            store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
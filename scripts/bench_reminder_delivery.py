@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.reminders import scheduler as scheduler_module
+from core.reminders.scheduler import ReminderScheduler, _wake_epoch
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_s = 0.2
+    fail_rate = 0.1
+    rng = random.Random(3)
+    lock = threading.Lock()
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.latency_s)
+        with self.lock:
+            failed = self.rng.random() < self.fail_rate
+        status, payload = (500, {"ok": False}) if failed else (200, {"ok": True})
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _legacy_deliver(reminder: dict, base: str) -> None:
+    """Прежняя доставка в потоке планировщика: urllib без keep-alive и time.sleep между попытками."""
+    if reminder["delivery"] != "telegram":
+        store.mark_reminder_sent(reminder["id"], "local")
+        return
+    payload = json.dumps({"chat_id": "chat", "text": reminder["text"]}).encode("utf-8")
+    for attempt in range(3):
+        req = urllib.request.Request(f"{base}/bottoken/sendMessage", data=payload, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=8) as resp:
+                if json.loads(resp.read()).get("ok") is True:
+                    store.mark_reminder_sent(reminder["id"], "telegram")
+                    return
+        except Exception:
+            pass
+        time.sleep(1.0 * (2**attempt))
+    store.mark_reminder_failed(reminder["id"], "telegram_send_failed", "telegram")
+
+
+class _LegacyScheduler(ReminderScheduler):
+    def __init__(self, base: str) -> None:
+        super().__init__(poll_interval=0.05)
+        self._base = base
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            for reminder in store.claim_due_reminders(datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"), limit=20):
+                _legacy_deliver(reminder, self._base)
+            self._stop.wait(self.poll_interval)
+
+
+def _pct(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def _run(scheduler: ReminderScheduler, telegram: int, local: int) -> dict:
+    due_at = (datetime.now(timezone.utc) - timedelta(milliseconds=1)).isoformat().replace("+00:00", "Z")
+    ids = [store.create_reminder(due_at, f"t{n}", delivery="telegram")["id"] for n in range(telegram)]
+    ids += [store.create_reminder(due_at, f"l{n}", delivery="local")["id"] for n in range(local)]
+    start = time.perf_counter()
+    scheduler.start()
+    while store.list_reminders(status="pending", limit=1) or store.list_reminders(status="sending", limit=1):
+        time.sleep(0.02)
+    total = time.perf_counter() - start
+    scheduler.stop()
+    lags: dict[str, list[float]] = {"telegram": [], "local": []}
+    for reminder_id in ids:
+        row = store.get_reminder(reminder_id)
+        if row["sent_at"]:
+            lags[row["delivery"]].append((_wake_epoch(row["sent_at"]) - _wake_epoch(row["due_at"])) * 1000)
+    return {"total_s": total, "lags": lags}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark reminder delivery: inline with sleeping retries vs worker pool with lease-based backoff.")
+    parser.add_argument("--telegram", type=int, default=30, help="Telegram reminders due at once")
+    parser.add_argument("--local", type=int, default=10, help="Local reminders due at once")
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake Telegram response latency, seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="Share of fake Telegram 500 responses")
+    parser.add_argument("--workers", type=int, default=4, help="Delivery workers")
+    args = parser.parse_args()
+
+    _Handler.latency_s = args.latency
+    _Handler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.update({"TELEGRAM_BOT_TOKEN": "token", "TELEGRAM_CHAT_ID": "chat", "ASTRA_TELEGRAM_API_BASE": base})
+    # Сравниваются конвейеры доставки, а не лимит Telegram (1 сообщение/с в чат)
+    os.environ.setdefault("ASTRA_TELEGRAM_RATE_PER_S", "0")
+
+    cases = (("inline", lambda: _LegacyScheduler(base)), ("pool", lambda: ReminderScheduler(workers=args.workers)))
+    for name, factory in cases:
+        _Handler.rng = random.Random(3)
+        scheduler_module._telegram_http = None
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            store.reset_for_tests()
+            store.init(Path(tmp), MIGRATIONS_DIR)
+            result = _run(factory(), args.telegram, args.local)
+            store.reset_for_tests()
+        tg, local = result["lags"]["telegram"], result["lags"]["local"]
+        print(
+            f"{name:7s} total_s={result['total_s']:6.2f} telegram_sent={len(tg):3d} "
+            f"telegram_p50_ms={_pct(tg, 0.5):8.0f} telegram_p95_ms={_pct(tg, 0.95):8.0f} "
+            f"local_p95_ms={_pct(local, 0.95):8.0f}"
+        )
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
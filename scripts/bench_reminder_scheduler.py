@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.reminders.scheduler import ReminderScheduler, _wake_epoch
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+class _PollingScheduler(ReminderScheduler):
+    """Прежний цикл: захват каждые poll_interval секунд, есть что доставлять или нет."""
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.poll_interval)
+
+
+def _run(scheduler: ReminderScheduler, count: int, window_s: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    scheduler.start()
+    start = datetime.now(timezone.utc)
+    ids = []
+    for n in range(count):
+        due = start + timedelta(seconds=rng.uniform(0.2, window_s))
+        ids.append(store.create_reminder(due.isoformat().replace("+00:00", "Z"), f"r{n}", delivery="local")["id"])
+    time.sleep(window_s + 0.3)
+    deadline = time.monotonic() + scheduler.poll_interval + 1
+    while time.monotonic() < deadline and store.list_reminders(status="pending", limit=1):
+        time.sleep(0.05)
+    scheduler.stop()
+    elapsed = (datetime.now(timezone.utc) - start).total_seconds()
+    lags = []
+    for reminder_id in ids:
+        row = store.get_reminder(reminder_id)
+        if row and row["sent_at"]:
+            lags.append((_wake_epoch(row["sent_at"]) - _wake_epoch(row["due_at"])) * 1000)
+    lags.sort()
+    return {
+        "delivered": len(lags),
+        "p50_ms": statistics.median(lags) if lags else 0.0,
+        "p95_ms": lags[int(len(lags) * 0.95) - 1] if lags else 0.0,
+        "max_ms": lags[-1] if lags else 0.0,
+        "claim_passes": scheduler.passes,
+        "wakeups": scheduler.wakeups,
+        "elapsed_s": elapsed,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark reminder scheduling: fixed-interval polling vs timer heap.")
+    parser.add_argument("--count", type=int, default=20, help="Reminders due inside the window")
+    parser.add_argument("--window", type=float, default=10.0, help="Window (seconds) the due times are spread over")
+    parser.add_argument("--poll", type=float, default=5.0, help="Polling interval of the legacy scheduler")
+    args = parser.parse_args()
+
+    cases = (("polling", lambda: _PollingScheduler(poll_interval=args.poll)), ("timer", lambda: ReminderScheduler()))
+    for name, factory in cases:
+        with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+            store.reset_for_tests()
+            store.init(Path(tmp), MIGRATIONS_DIR)
+            result = _run(factory(), args.count, args.window, seed=7)
+            store.reset_for_tests()
+        print(
+            f"{name:8s} delivered={result['delivered']:3d} lag_p50_ms={result['p50_ms']:8.1f} "
+            f"lag_p95_ms={result['p95_ms']:8.1f} lag_max_ms={result['max_ms']:8.1f} "
+            f"claim_passes={result['claim_passes']:4d} elapsed_s={result['elapsed_s']:5.1f}"
+        )
+    # Без созревших напоминаний опрос захватывает раз в --poll секунд, таймер — раз в poll_interval (страховка)
+    print(f"idle claim passes per hour: polling={3600 / args.poll:.0f} timer={3600 / ReminderScheduler().poll_interval:.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
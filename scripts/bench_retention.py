@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _seed(events: int) -> None:
+    payload = json.dumps({"text": "страница загружена " * 40}, ensure_ascii=False)
+    conn = store._conn_or_raise()
+    store.flush_events()
+    with store._lock:
+        for start in range(0, events, 10_000):
+            rows = [(f"evt-{n}", f"run-{n % 100}", 1, "task_progress", "info", "m", payload) for n in range(start, min(events, start + 10_000))]
+            conn.executemany("INSERT INTO events (id, run_id, ts, type, level, message, payload) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+
+def _file_mib(path: Path) -> float:
+    return path.stat().st_size / 2**20
+
+
+class _WriterProbe:
+    """Пишет события в фоне и меряет худшее ожидание записи (блокировку писателя)."""
+
+    def __init__(self) -> None:
+        self.worst_ms = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def __enter__(self) -> "_WriterProbe":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            store.add_event("probe-run", "task_progress", "info", "probe", {}, durable=True)
+            self.worst_ms = max(self.worst_ms, (time.perf_counter() - start) * 1000)
+            time.sleep(0.002)
+
+
+def _reclaim_incremental(db_path: Path, max_pages: int) -> None:
+    with _WriterProbe() as probe:
+        start = time.perf_counter()
+        rows = 0
+        while True:
+            removed = store.purge_table("events", older_than_s=3600, batch_size=500, max_batches=50)
+            rows += removed
+            if not removed:
+                break
+        purge_s = time.perf_counter() - start
+        start = time.perf_counter()
+        pages = 0
+        while True:
+            report = store.incremental_vacuum(max_pages=max_pages)
+            pages += report["pages"]
+            if not report["pages"]:
+                break
+        store.checkpoint_wal()
+        vacuum_s = time.perf_counter() - start
+    print(
+        f"incremental rows={rows} purge_s={purge_s:5.2f} vacuum_s={vacuum_s:5.2f} pages={pages} "
+        f"file_mib={_file_mib(db_path):7.1f} worst_write_wait_ms={probe.worst_ms:7.1f}"
+    )
+
+
+def _reclaim_full_vacuum(db_path: Path) -> None:
+    with _WriterProbe() as probe:
+        start = time.perf_counter()
+        with store._lock:
+            store._conn_or_raise().execute("DELETE FROM events WHERE ts < 1000 AND run_id != 'probe-run'")
+            store._conn_or_raise().commit()
+        purge_s = time.perf_counter() - start
+        start = time.perf_counter()
+        with store._lock:
+            store._conn_or_raise().execute("VACUUM")
+            store._conn_or_raise().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        vacuum_s = time.perf_counter() - start
+    print(
+        f"full_vacuum purge_s={purge_s:5.2f} vacuum_s={vacuum_s:5.2f} "
+        f"file_mib={_file_mib(db_path):7.1f} worst_write_wait_ms={probe.worst_ms:7.1f}"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark retention: batched purge + incremental vacuum vs one DELETE + full VACUUM.")
+    parser.add_argument("--events", type=int, default=200_000, help="Expired events to reclaim")
+    parser.add_argument("--max-pages", type=int, default=4096, help="Pages per incremental_vacuum call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = Path(tmp) / "seeded"
+        store.reset_for_tests()
+        store.init(seeded, MIGRATIONS_DIR)
+        _seed(args.events)
+        store.flush_events()
+        store.reset_for_tests()
+        print(f"seeded    file_mib={_file_mib(seeded / 'astra.db'):7.1f}")
+
+        for name, run in (("incremental", lambda p: _reclaim_incremental(p, args.max_pages)), ("full", _reclaim_full_vacuum)):
+            work = Path(tmp) / name
+            shutil.copytree(seeded, work)
+            store.init(work, MIGRATIONS_DIR)
+            run(work / "astra.db")
+            store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
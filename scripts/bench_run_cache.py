@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _open_store(data_dir: Path, cache_size: int) -> list[str]:
+    os.environ["ASTRA_STORE_CACHE_SIZE"] = str(cache_size)
+    store.reset_for_tests()
+    store.init(data_dir, MIGRATIONS_DIR)
+    project = store.create_project("bench", [], {"theme": "dark", "budget": {"daily": 10}})
+    meta = {"intent": "ACT", "plan_hint": ["a", "b", "c"], "decision": {"confidence": 0.9, "reasons": ["x"] * 20}}
+    run_ids: list[str] = []
+    parent_id = None
+    for idx in range(20):
+        parent_id = store.create_run(project["id"], f"query {idx}", "execute_confirm", parent_run_id=parent_id, meta=meta)["id"]
+        run_ids.append(parent_id)
+    return run_ids
+
+
+def _ops_per_s(fn, duration_s: float) -> float:
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration_s
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark hot get_run/get_project/list_run_chain lookups with and without the snapshot cache.")
+    parser.add_argument("--duration", type=float, default=1.0, help="Seconds per case")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, cache_size in (("no_cache", 0), ("cache", 1024)):
+            run_ids = _open_store(Path(tmp) / label, cache_size)
+            run_id = run_ids[-1]
+            project_id = store.get_run(run_id)["project_id"]
+            cases = [
+                ("get_run", lambda: store.get_run(run_id)),
+                ("get_run_snapshot", lambda: store.get_run_snapshot(run_id)),
+                ("get_project", lambda: store.get_project(project_id)),
+                ("list_run_chain_20", lambda: store.list_run_chain(run_id)),
+            ]
+            for name, fn in cases:
+                print(f"{label:8s} {name:18s} ops_per_s={_ops_per_s(fn, args.duration):10.0f}")
+            print(f"{label:8s} stats={store.cache_stats()['runs']}")
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
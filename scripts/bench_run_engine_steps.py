@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.run_engine import RunEngine
+from core.skills.registry import SkillManifest
+from core.skills.result_types import SkillResult
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+_MANIFEST = SkillManifest(
+    name="bench_noop",
+    version="0.0.0",
+    capabilities=[],
+    inputs_schema="",
+    outputs_schema="",
+    side_effects=[],
+    providers=[],
+    scopes="safe",
+)
+
+
+class _Registry:
+    def get_manifest(self, name: str) -> SkillManifest:
+        return _MANIFEST
+
+
+class _Runner:
+    def run_skill(self, run: dict, step: dict, task: dict) -> SkillResult:
+        return SkillResult(what_i_did="noop")
+
+
+def _engine() -> RunEngine:
+    # Без загрузки реестра навыков: bench меряет только переходы состояний в store
+    engine = RunEngine.__new__(RunEngine)
+    engine.base_dir = ROOT
+    engine.registry = _Registry()
+    engine.runner = _Runner()
+    engine.computer_executor = None
+    return engine
+
+
+def _run_plan(engine: RunEngine, project_id: str, steps: int) -> tuple[float, int]:
+    run = store.create_run(project_id, "bench", "execute_confirm")
+    store.insert_plan_steps(
+        run["id"],
+        [{"id": f"{run['id']}-{idx}", "step_index": idx, "title": f"step {idx}", "skill_name": "bench_noop", "inputs": {}} for idx in range(steps)],
+    )
+    conn = store._conn_or_raise()
+    caller = threading.current_thread()
+    commits = [0]
+
+    def _trace(sql: str) -> None:
+        if threading.current_thread() is caller and sql.strip().upper() == "COMMIT":
+            commits[0] += 1
+
+    conn.set_trace_callback(_trace)
+    try:
+        start = time.perf_counter()
+        engine.start_run(run["id"])
+        store.flush_events()
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.set_trace_callback(None)
+    if store.get_run(run["id"])["status"] != "done":
+        raise RuntimeError("Запуск не завершился")
+    return elapsed, commits[0]
+
+
+def _measure(label: str, project_id: str, steps: int, repeats: int) -> None:
+    engine = _engine()
+    samples = []
+    commits = 0
+    for _ in range(repeats):
+        elapsed, commits = _run_plan(engine, project_id, steps)
+        samples.append(elapsed)
+    median = statistics.median(samples)
+    print(f"{label:16s} steps_per_s={steps / median:9.1f} run_ms={median * 1000:8.2f} commits_per_step={commits / steps:5.2f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark RunEngine step throughput (per-write commits vs store.transaction()).")
+    parser.add_argument("--steps", type=int, default=100, help="Plan steps per run")
+    parser.add_argument("--repeats", type=int, default=10, help="Runs per mode")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.reset_for_tests()
+        store.init(Path(tmp), MIGRATIONS_DIR)
+        project = store.create_project("bench", [], {})
+        # Прежнее поведение: каждый вызов store коммитит сам
+        with mock.patch.object(store, "transaction", contextlib.nullcontext):
+            _measure("per_write_commit", project["id"], args.steps, args.repeats)
+        _measure("transaction", project["id"], args.steps, args.repeats)
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
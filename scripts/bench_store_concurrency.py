@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _open_store(data_dir: Path, *, read_pool: bool) -> None:
+    os.environ["ASTRA_DB_READ_POOL"] = "true" if read_pool else "false"
+    store.reset_for_tests()
+    store.init(data_dir, MIGRATIONS_DIR)
+
+
+def _seed(data_dir: Path, runs: int, events_per_run: int) -> list[str]:
+    _open_store(data_dir, read_pool=True)
+    project = store.create_project("bench", [], {})
+    run_ids: list[str] = []
+    for idx in range(runs):
+        run = store.create_run(project["id"], f"query {idx}", "execute_confirm", meta={"intent": "ACT"})
+        run_ids.append(run["id"])
+        for n in range(events_per_run):
+            store.add_event(run["id"], "task_progress", "info", "progress", {"n": n, "text": "x" * 200})
+    store.flush_events()
+    return run_ids
+
+
+def _read_throughput(run_ids: list[str], threads: int, duration_s: float) -> float:
+    stop = threading.Event()
+    counts = [0] * threads
+
+    def _worker(slot: int) -> None:
+        idx = slot
+        while not stop.is_set():
+            run_id = run_ids[idx % len(run_ids)]
+            store.get_run(run_id)
+            store.list_events(run_id, limit=200)
+            counts[slot] += 1
+            idx += threads
+
+    workers = [threading.Thread(target=_worker, args=(slot,)) for slot in range(threads)]
+    for worker in workers:
+        worker.start()
+    time.sleep(duration_s)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    return sum(counts) / duration_s
+
+
+def _emit_latency_under_long_read(run_ids: list[str], samples: int) -> list[float]:
+    stop = threading.Event()
+
+    def _long_reader() -> None:
+        while not stop.is_set():
+            for run_id in run_ids:
+                store.list_events(run_id, limit=100_000)
+
+    reader = threading.Thread(target=_long_reader)
+    reader.start()
+    latencies: list[float] = []
+    try:
+        for n in range(samples):
+            start = time.perf_counter()
+            store.add_event(run_ids[0], "task_progress", "info", "probe", {"n": n}, durable=True)
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        stop.set()
+        reader.join()
+    return latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark memory/store reads with and without the reader pool.")
+    parser.add_argument("--runs", type=int, default=20, help="Runs to seed")
+    parser.add_argument("--events", type=int, default=2000, help="Events per run")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent reader threads")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per throughput sample")
+    parser.add_argument("--probes", type=int, default=50, help="Durable emits measured under a long read")
+    args = parser.parse_args()
+    print(f"cpu_count={os.cpu_count()}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        run_ids = _seed(data_dir, args.runs, args.events)
+        print(f"seeded runs={args.runs} events_per_run={args.events}")
+
+        for read_pool in (False, True):
+            label = "reader_pool" if read_pool else "shared_conn"
+            _open_store(data_dir, read_pool=read_pool)
+            ops = _read_throughput(run_ids, args.threads, args.duration)
+            latencies = _emit_latency_under_long_read(run_ids, args.probes)
+            p50 = statistics.median(latencies)
+            p95 = sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)]
+            print(
+                f"{label:12s} read_ops_per_s={ops:10.1f} threads={args.threads} "
+                f"emit_under_long_read_ms p50={p50:.2f} p95={p95:.2f}"
+            )
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
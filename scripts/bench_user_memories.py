@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+from memory.db import now_iso
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+_TAGS = ["food", "work", "family", "sport", "travel", "health", "music", "books", "code", "home"]
+_SYLLABLES = ["ка", "ро", "ми", "то", "ле", "ну", "са", "ви", "до", "ре", "пу", "зо", "ша", "ки", "бе"]
+
+
+def _vocabulary(rnd: random.Random, size: int) -> list[str]:
+    words: set[str] = set()
+    while len(words) < size:
+        words.add("".join(rnd.choice(_SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+
+def _seed(count: int, seed: int, vocab_size: int) -> list[str]:
+    """Заполняет user_memories; слова распределены по Ципфу — возвращает словарь по убыванию частоты."""
+    rnd = random.Random(seed)
+    vocab = _vocabulary(rnd, vocab_size)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    conn = store._conn_or_raise()
+    rows = []
+    for idx in range(count):
+        content = " ".join(rnd.choices(vocab, weights=weights, k=rnd.randint(8, 30)))
+        tags = rnd.sample(_TAGS, rnd.randint(0, 3))
+        ts = now_iso()
+        rows.append((f"mem-{idx}", ts, ts, f"Заметка {idx}", content, json.dumps(tags), "imported", 0, 1 if idx % 500 == 0 else 0, None, "{}"))
+    with store._lock:
+        conn.executemany(
+            """
+            INSERT INTO user_memories (id, created_at, updated_at, title, content, tags, source, is_deleted, pinned, last_used_at, meta)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        conn.commit()
+    return vocab
+
+
+def _legacy_list(query: str, tag: str, limit: int) -> list[str]:
+    """Прежний вариант list_user_memories: LIKE по title/content и по JSON tags."""
+    clauses = ["is_deleted = 0"]
+    params: list = []
+    if query:
+        clauses.append("(title LIKE ? OR content LIKE ?)")
+        params.extend([f"%{query}%", f"%{query}%"])
+    if tag:
+        clauses.append("tags LIKE ?")
+        params.append(f"%{tag}%")
+    rows = store._read_conn().execute(
+        f"SELECT * FROM user_memories WHERE {' AND '.join(clauses)} ORDER BY pinned DESC, updated_at DESC LIMIT ?",
+        (*params, limit),
+    ).fetchall()
+    return [store._user_memory_row(row)["id"] for row in rows]
+
+
+def _current_list(query: str, tag: str, limit: int) -> list[str]:
+    return [item["id"] for item in store.list_user_memories(query=query, tag=tag, limit=limit)]
+
+
+def _median_ms(fn, repeats: int, *args) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark user memory search (LIKE scan vs FTS5 + tag index).")
+    parser.add_argument("--count", type=int, default=50_000, help="Memories to seed")
+    parser.add_argument("--repeats", type=int, default=20, help="Measurements per case")
+    parser.add_argument("--vocab", type=int, default=5000, help="Distinct words in the synthetic corpus")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.reset_for_tests()
+        store.init(Path(tmp), MIGRATIONS_DIR)
+        start = time.perf_counter()
+        vocab = _seed(args.count, args.seed, args.vocab)
+        print(f"memories={args.count} vocab={args.vocab} seed_s={time.perf_counter() - start:.2f}")
+        cases = [
+            ("list", "", ""),
+            ("query_rare", vocab[-1], ""),
+            ("query_mid", vocab[len(vocab) // 20], ""),
+            ("query_top", vocab[0], ""),
+            ("query_two", f"{vocab[50]} {vocab[200]}", ""),
+            ("tag", "", "health"),
+            ("query_and_tag", vocab[len(vocab) // 20], "travel"),
+        ]
+        for name, query, tag in cases:
+            legacy_ms = _median_ms(_legacy_list, args.repeats, query, tag, 50)
+            current_ms = _median_ms(_current_list, args.repeats, query, tag, 50)
+            print(f"{name:14s} legacy_like_ms={legacy_ms:8.2f} fts_ms={current_ms:8.2f}")
+        store.reset_for_tests()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -110,7 +110,7 @@ class AutopilotComputerSkill:
         done = False
 
         for cycle in range(1, max_cycles + 1):
-            run = store.get_run(ctx.run["id"])
+            run = store.get_run_snapshot(ctx.run["id"])
             if not run:
                 break
             if run.get("status") == "canceled":
@@ -418,7 +418,7 @@ class AutopilotComputerSkill:
                 return None
             if approval["status"] in ("approved", "rejected", "expired"):
                 return approval
-            run = store.get_run(run_id)
+            run = store.get_run_snapshot(run_id)
             if run and run["status"] == "canceled":
                 approval = store.update_approval_status(approval_id, "expired", "system")
                 return approval
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+import asyncio
 import threading
 import time
+from dataclasses import replace
 from types import SimpleNamespace
 
+import pytest
+
+from core import event_bus
 from core.brain.providers import ProviderError, ProviderResult
-from core.brain.router import BrainConfig, BrainRouter
+from core.brain.router import BrainConfig, BrainQueue, BrainQueueTimeout, BrainRouter
 from core.brain.types import LLMRequest
 from core.llm_routing import ROUTE_LOCAL
 from core.llm_routing import ContextItem, PolicyFlags, sanitize_context_items
@@ -278,3 +283,168 @@ def test_local_tier_model_falls_back_to_base_on_connection_error(monkeypatch):
     assert response.text == "ok"
     assert response.model_id == "llama2-uncensored:7b"
     assert calls == ["llama2-uncensored:7b-fast", "llama2-uncensored:7b"]
+
+
+def test_run_state_is_capped_and_released_when_the_run_finishes(monkeypatch):
+    monkeypatch.setattr("core.brain.router.emit", lambda *args, **kwargs: None)
+    monkeypatch.setattr("core.event_bus.store.add_event", lambda **kwargs: dict(kwargs))
+    cfg = BrainConfig.from_env()
+    cfg.tracked_runs = 3
+    cfg.budget_per_run = 1
+    router = BrainRouter(cfg)
+    router._cache.enabled = False
+    raw = {"done": True, "context": list(range(4096)), "eval_count": 3}
+    monkeypatch.setattr(router, "_call_local", lambda messages, request, model_id: ProviderResult(text="ok", usage=None, raw=raw))
+
+    def call(run_id: str):
+        return router.call(LLMRequest(purpose="test", messages=[{"role": "user", "content": "hi"}], run_id=run_id, step_id="s1"))
+
+    responses = [call(f"run-{n}") for n in range(5)]
+    # Массив токенов context не попадает в LLMResponse.raw
+    assert responses[0].raw == {"done": True, "eval_count": 3}
+    assert router.state_stats() == {"tracked_runs": 3, "evicted_runs": 2}
+    assert call("run-4").status == "budget_exceeded"
+
+    event_bus.add_run_finished_listener(router.release_run)
+    try:
+        event_bus.emit("run-4", "run_done", "done", {"status": "done"})
+    finally:
+        event_bus.remove_run_finished_listener(router.release_run)
+    assert router.state_stats()["tracked_runs"] == 2
+    assert call("run-4").status == "ok"
+
+
+def test_async_queue_shares_slots_and_chat_priority_with_threads():
+    queue = BrainQueue(1)
+    order: list[str] = []
+
+    async def scenario() -> None:
+        held = queue.acquire()
+
+        async def waiter(name: str, prioritize_chat: bool) -> None:
+            token = await queue.acquire_async(prioritize_chat=prioritize_chat)
+            order.append(name)
+            await asyncio.sleep(0.01)
+            queue.release(token)
+
+        background = asyncio.create_task(waiter("async-background", False))
+        await asyncio.sleep(0)
+        # Поток встаёт в ту же очередь после корутины
+        thread = threading.Thread(target=lambda: (queue.release(queue.acquire()), order.append("thread")))
+        thread.start()
+        time.sleep(0.05)
+        chat = asyncio.create_task(waiter("async-chat", True))
+        await asyncio.sleep(0)
+        queue.release(held)
+        await asyncio.gather(background, chat)
+        await asyncio.to_thread(thread.join, 1)
+
+    asyncio.run(scenario())
+    assert order == ["async-chat", "async-background", "thread"]
+    assert queue.stats()["inflight"] == {}
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    queue = BrainQueue(1)
+
+    async def scenario() -> None:
+        held = queue.acquire()
+        waiting = asyncio.create_task(queue.acquire_async())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        queue.release(held)
+        # Отменённый не держит ни место в очереди, ни слот
+        token = await asyncio.wait_for(queue.acquire_async(), timeout=1)
+        queue.release(token)
+
+    asyncio.run(scenario())
+    stats = queue.stats()
+    assert stats["inflight"] == {} and stats["waiting"] == 0
+
+
+def test_model_pools_are_independent_and_waits_have_deadlines():
+    queue = BrainQueue(1, model_slots={"coder": 1, "chat-fast": 2})
+    code = queue.acquire(model="coder")
+    # Долгий запрос к модели кода не держит модель чата
+    chat = [queue.acquire(model="chat-fast", timeout_s=0.1) for _ in range(2)]
+    with pytest.raises(BrainQueueTimeout):
+        queue.acquire(model="coder", timeout_s=0.05)
+
+    async def timed_out_async() -> None:
+        with pytest.raises(BrainQueueTimeout):
+            await queue.acquire_async(model="chat-fast", timeout_s=0.05)
+
+    asyncio.run(timed_out_async())
+    for token in [code, *chat]:
+        queue.release(token)
+    stats = queue.stats()
+    assert stats["timed_out"] == 2 and stats["waiting"] == 0 and stats["inflight"] == {}
+
+    # Общий лимит на все модели
+    capped = BrainQueue(1, total_slots=1)
+    held = capped.acquire(model="coder")
+    with pytest.raises(BrainQueueTimeout):
+        capped.acquire(model="chat-fast", timeout_s=0.05)
+    capped.release(held)
+
+
+def test_total_slots_default_to_max_concurrency_until_pools_are_configured(monkeypatch):
+    monkeypatch.delenv("ASTRA_LLM_TOTAL_SLOTS", raising=False)
+    monkeypatch.delenv("ASTRA_LLM_MODEL_SLOTS", raising=False)
+    monkeypatch.setenv("ASTRA_LLM_MAX_CONCURRENCY", "2")
+    assert BrainConfig.from_env().total_slots == 2
+
+    monkeypatch.setenv("ASTRA_LLM_MODEL_SLOTS", "coder=1,chat-fast=2")
+    assert BrainConfig.from_env().total_slots == 0
+
+    monkeypatch.setenv("ASTRA_LLM_TOTAL_SLOTS", "3")
+    assert BrainConfig.from_env().total_slots == 3
+
+
+def test_background_runs_share_a_model_fairly():
+    queue = BrainQueue(1)
+    order: list[str] = []
+
+    async def scenario() -> None:
+        held = queue.acquire(model="m", run_id="held")
+
+        async def waiter(run_id: str) -> None:
+            token = await queue.acquire_async(model="m", run_id=run_id)
+            order.append(run_id)
+            await asyncio.sleep(0)
+            queue.release(token)
+
+        tasks = []
+        for run_id in ["run-a"] * 4 + ["run-b", "run-c"]:
+            tasks.append(asyncio.create_task(waiter(run_id)))
+            await asyncio.sleep(0)
+        queue.release(held)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    # run-a поставил четыре запроса первым, но run-b и run-c не ждут их все
+    assert order == ["run-a", "run-b", "run-c", "run-a", "run-a", "run-a"]
+
+
+def test_router_degrades_on_queue_deadline_and_reports_queue_wait(monkeypatch):
+    events: list[tuple[str, dict]] = []
+    monkeypatch.setattr("core.brain.router.emit", lambda run_id, event_type, message, payload, **_: events.append((event_type, payload)))
+    cfg = BrainConfig.from_env()
+    cfg.total_slots = 1
+    cfg.chat_priority_extra_slots = 0
+    router = BrainRouter(cfg)
+    router._cache.enabled = False
+    monkeypatch.setattr(router, "_call_local", lambda messages, request, model_id: ProviderResult(text="ok", usage=None, raw={}))
+    request = LLMRequest(purpose="test", messages=[{"role": "user", "content": "hi"}], run_id="run-1", queue_timeout_s=0.05)
+
+    held = router.queue.acquire(model="other-model")
+    response = router.call(request)
+    assert response.status == "queue_timeout" and response.error_type == "queue_timeout"
+    failed = [payload for event_type, payload in events if event_type == "llm_request_failed"]
+    assert failed[-1]["error_type"] == "queue_timeout"
+
+    threading.Timer(0.05, router.queue.release, args=(held,)).start()
+    assert router.call(replace(request, queue_timeout_s=1)).status == "ok"
+    started = [payload for event_type, payload in events if event_type == "llm_request_started"]
+    assert started[-1]["queue_wait_ms"] >= 30 and started[-1]["queue_depth"] == 0
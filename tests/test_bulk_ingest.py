@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core import run_engine
+from core.run_engine import RunEngine
+from core.skills.result_types import ArtifactCandidate, FactCandidate, SkillResult, SourceCandidate
+from memory import store
+
+
+def _init_db(tmp_path: Path) -> None:
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+
+def _skill_result(sources: int) -> SkillResult:
+    return SkillResult(
+        what_i_did="research",
+        sources=[SourceCandidate(url=f"https://example.com/{idx}", title=f"python {idx}", retrieved_at="2024-01-01T00:00:00Z") for idx in range(sources)],
+        facts=[FactCandidate(key="language", value="python", confidence=0.9)],
+        artifacts=[ArtifactCandidate(type="report_md", title="python report", content_uri="file://report.md")],
+        events=[{"type": "conflict", "fact_key": "language", "group": {"a": 1}}],
+    )
+
+
+def _count_commits(fn) -> int:
+    conn = store._conn_or_raise()
+    statements: list[str] = []
+    conn.set_trace_callback(statements.append)
+    try:
+        fn()
+    finally:
+        conn.set_trace_callback(None)
+    return len([sql for sql in statements if sql.strip().upper() == "COMMIT"])
+
+
+def test_ingest_run_items_writes_rows_and_fts_in_one_commit(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("ingest", [], {})
+    run = store.create_run(project["id"], "research", "research")
+    sources = [{"id": f"src-{idx}", "url": f"https://example.com/{idx}", "title": f"python {idx}"} for idx in range(50)]
+    facts = [{"id": "fact-1", "key": "language", "value": "python", "created_at": "2024-01-01T00:00:00Z"}]
+
+    commits = _count_commits(lambda: store.ingest_run_items(run["id"], sources=sources, facts=facts))
+
+    assert commits == 1
+    assert len(store.list_sources(run["id"])) == 50
+    assert len(store.search_memory(project["id"], "python", limit=100)) == 51
+
+
+def test_ingest_run_items_is_atomic(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("ingest", [], {})
+    run = store.create_run(project["id"], "research", "research")
+    artifact = {"id": "dup", "type": "report_md", "title": "r", "content_uri": "file://a", "created_at": "2024-01-01T00:00:00Z"}
+    store.insert_artifacts(run["id"], [artifact])
+    # Артефакт пишется последним: его ошибка должна откатить уже вставленные источники и факты
+    with pytest.raises(sqlite3.IntegrityError):
+        store.ingest_run_items(
+            run["id"],
+            sources=[{"id": "src-1", "url": "https://example.com"}],
+            facts=[{"id": "fact-1", "key": "k", "value": 1, "created_at": "2024-01-01T00:00:00Z"}],
+            artifacts=[artifact],
+        )
+    assert store.list_sources(run["id"]) == []
+    assert store.list_facts(run["id"]) == []
+    assert len(store.search_memory(project["id"], "example", limit=10)) == 0
+
+
+def test_persist_skill_result_emits_aggregated_event(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path)
+    project = store.create_project("ingest", [], {})
+    run = store.create_run(project["id"], "research", "research")
+    engine = RunEngine(ROOT)
+    step = {"id": "step-1"}
+    task = {"id": "task-1"}
+
+    monkeypatch.setenv("ASTRA_EVENTS_PER_ITEM", "false")
+    engine._persist_skill_result(run["id"], step, task, _skill_result(50))
+    store.flush_events()
+    events = store.list_events(run["id"])
+    assert [e["type"] for e in events] == ["items_ingested"]
+    assert events[0]["payload"] == {"sources": 50, "facts": 1, "conflicts": 1, "artifacts": 1}
+    assert len(store.list_conflicts(run["id"])) == 1
+
+    monkeypatch.setattr(run_engine, "_per_item_events_enabled", lambda: True)
+    engine._persist_skill_result(run["id"], step, task, _skill_result(2))
+    store.flush_events()
+    types = [e["type"] for e in store.list_events(run["id"])][1:]
+    assert types == [
+        "source_found",
+        "source_found",
+        "source_fetched",
+        "fact_extracted",
+        "conflict_detected",
+        "artifact_created",
+        "items_ingested",
+    ]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 import sys
 from pathlib import Path
 
@@ -54,6 +55,144 @@ def test_list_recent_chat_turns_order(tmp_path: Path):
     assert roles == ["user", "assistant", "user", "assistant"]
 
 
+def test_list_recent_chat_turns_skips_non_chat_runs_and_uses_latest_response(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("chat", [], {})
+    run1 = _create_chat_run(project["id"], "Привет")
+    act_run = store.create_run(project["id"], "Открой браузер", "execute_confirm", parent_run_id=run1["id"], meta={"intent": "ACT"})
+    run2 = store.create_run(
+        project["id"],
+        "Без ответа",
+        "plan_only",
+        parent_run_id=act_run["id"],
+        purpose="chat_only",
+        meta={"intent": "CHAT"},
+    )
+    run3 = _create_chat_run(project["id"], "Ещё", parent_run_id=run2["id"])
+    store.add_event(run3["id"], "chat_response_generated", "info", "Ответ сформирован", payload={"text": "Второй ответ"})
+
+    history = store.list_recent_chat_turns(run3["id"], limit_turns=10)
+
+    assert [item["content"] for item in history] == [
+        "Привет",
+        "Ответ на: Привет",
+        "Без ответа",
+        "Ещё",
+        "Второй ответ",
+    ]
+    assert [run["id"] for run in store.list_run_chain(run3["id"])] == [run1["id"], act_run["id"], run2["id"], run3["id"]]
+
+
+
+def test_chat_turns_follow_semantic_decision_and_anchor(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("chat", [], {})
+    run1 = _create_chat_run(project["id"], "Привет")
+    # Как в POST /runs: intent известен только после semantic decision
+    run2 = store.create_run(project["id"], "Что нового?", "plan_only", parent_run_id=run1["id"], meta={"intent": "ASK"})
+    assert [item["content"] for item in store.list_recent_chat_turns(run2["id"])] == ["Привет", "Ответ на: Привет"]
+
+    store.update_run_meta_and_mode(run2["id"], mode="plan_only", purpose="chat_only", meta={"intent": "CHAT"})
+    store.add_event(run2["id"], "chat_response_generated", "info", "Ответ сформирован", payload={"text": "Ничего"})
+    run3 = store.create_run(project["id"], "Открой сайт", "plan_only", parent_run_id=run2["id"], meta={"intent": "ASK"})
+    store.update_run_meta_and_mode(run3["id"], mode="execute_confirm", purpose=None, meta={"intent": "ACT"})
+    _create_chat_run(project["id"], "Спасибо", parent_run_id=run3["id"])
+
+    assert run3["root_run_id"] == run1["id"]
+    assert [item["content"] for item in store.list_recent_chat_turns(run2["id"])] == [
+        "Привет",
+        "Ответ на: Привет",
+        "Что нового?",
+        "Ничего",
+    ]
+    # Не чат-запуск как anchor: всё, что было до его создания
+    assert len(store.list_recent_chat_turns(run3["id"])) == 4
+
+
+def test_recent_chat_turns_ignore_sibling_branches_and_late_replies(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("chat", [], {})
+    root = _create_chat_run(project["id"], "Привет")
+    sibling = _create_chat_run(project["id"], "Ветка A", parent_run_id=root["id"])
+    # Ответ на run2 записан уже после вопроса run3
+    run2 = store.create_run(
+        project["id"], "Ветка B", "plan_only", parent_run_id=root["id"], purpose="chat_only", meta={"intent": "CHAT"}
+    )
+    run3 = store.create_run(
+        project["id"], "Дальше", "plan_only", parent_run_id=run2["id"], purpose="chat_only", meta={"intent": "CHAT"}
+    )
+    store.add_event(run2["id"], "chat_response_generated", "info", "Ответ сформирован", payload={"text": "Ответ B"})
+
+    assert sibling["root_run_id"] == run3["root_run_id"]
+    assert [item["content"] for item in store.list_recent_chat_turns(run3["id"])] == [
+        "Привет",
+        "Ответ на: Привет",
+        "Ветка B",
+        "Ответ B",
+        "Дальше",
+    ]
+
+
+def test_list_chat_turns_pages_long_conversation(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("chat", [], {})
+    parent_id = None
+    for idx in range(30):
+        parent_id = _create_chat_run(project["id"], f"Вопрос {idx}", parent_run_id=parent_id)["id"]
+
+    first = store.list_chat_turns(parent_id, limit=25)
+    assert [turn["turn_index"] for turn in first["turns"]] == list(range(36, 61))
+    assert first["turns"][-1]["content"] == "Ответ на: Вопрос 29"
+    second = store.list_chat_turns(parent_id, before_turn=first["next_before"], limit=25)
+    assert [turn["turn_index"] for turn in second["turns"]] == list(range(11, 36))
+    third = store.list_chat_turns(parent_id, before_turn=second["next_before"], limit=25)
+    assert [turn["turn_index"] for turn in third["turns"]] == list(range(1, 11))
+    assert third["next_before"] is None
+    assert store.list_chat_turns("missing") is None
+
+
+def test_chat_turns_migration_backfills_existing_conversations(tmp_path: Path):
+    migrations = ROOT / "memory" / "migrations"
+    legacy_dir = tmp_path / "legacy_migrations"
+    legacy_dir.mkdir()
+    for path in migrations.glob("*.sql"):
+        if path.name < "010":
+            (legacy_dir / path.name).write_text(path.read_text(encoding="utf-8"), encoding="utf-8")
+    store.reset_for_tests()
+    store.init(tmp_path, legacy_dir)
+    conn = store._conn_or_raise()
+    conn.execute("INSERT INTO projects (id, name, tags, settings, created_at, updated_at) VALUES ('p', 'p', '[]', '{}', 't', 't')")
+    rows = [
+        ("r1", "Привет", None, "2024-01-01T00:00:01Z"),
+        ("r2", "Открой сайт", "r1", "2024-01-01T00:00:02Z"),
+        ("r3", "Как дела?", "r2", "2024-01-01T00:00:03Z"),
+    ]
+    for run_id, text, parent, created_at in rows:
+        meta = '{"intent": "ACT"}' if run_id == "r2" else '{"intent": "CHAT"}'
+        conn.execute(
+            "INSERT INTO runs (id, project_id, query_text, mode, status, created_at, parent_run_id, meta) VALUES (?, 'p', ?, 'plan_only', 'done', ?, ?, ?)",
+            (run_id, text, created_at, parent, meta),
+        )
+    for event_id, run_id, text in (("e1", "r1", "Здравствуй"), ("e3", "r3", "Хорошо")):
+        conn.execute(
+            "INSERT INTO events (id, run_id, ts, type, level, message, payload) VALUES (?, ?, 1700000000000, 'chat_response_generated', 'info', 'm', ?)",
+            (event_id, run_id, json.dumps({"text": text}, ensure_ascii=False)),
+        )
+    conn.commit()
+    store.reset_for_tests()
+
+    store.init(tmp_path, migrations)
+    assert store.get_run("r3")["root_run_id"] == "r1"
+    history = store.list_recent_chat_turns("r3")
+    assert [(item["role"], item["content"]) for item in history] == [
+        ("user", "Привет"),
+        ("assistant", "Здравствуй"),
+        ("user", "Как дела?"),
+        ("assistant", "Хорошо"),
+    ]
+    assert history[0]["ts"] == "2024-01-01T00:00:01Z"
+    assert history[1]["ts"] == 1700000000000
+
 def test_build_chat_messages_injection():
     system_text = "system"
     history = [
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from apps.api.main import create_app
+from memory import store
+from memory.db import JSONB_SUPPORTED
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _finished_run(status: str = "done", finished_at: str = "2020-01-01T00:00:00Z") -> dict:
+    project = store.create_project("archive", [], {})
+    run = store.create_run(project["id"], "q", "plan_only")
+    store.update_run_status(run["id"], status, finished_at=finished_at)
+    return run
+
+
+def _seed(run_id: str, count: int) -> list[dict]:
+    events = []
+    for n in range(count):
+        event_type = "task_progress" if n % 3 else "task_started"
+        events.append(store.add_event(run_id, event_type, "info", f"событие {n}", {"n": n, "text": "привет"}))
+    store.flush_events()
+    return events
+
+
+def _hot_count(run_id: str) -> int:
+    return store._read_conn().execute("SELECT COUNT(*) FROM events WHERE run_id = ?", (run_id,)).fetchone()[0]
+
+
+def test_archive_moves_finished_runs_to_segments_and_reads_stay_transparent(tmp_path: Path):
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+    done = _finished_run()
+    recent = _finished_run(finished_at=store.now_iso())
+    running = store.create_run(done["project_id"], "q", "plan_only")
+    events = _seed(done["id"], 12)
+    for run in (recent, running):
+        _seed(run["id"], 2)
+    before = [e.to_dict() for e in store.list_events(done["id"])]
+
+    result = store.archive_finished_runs(3600)
+    assert result["runs"] == 1 and result["events"] == 12
+    assert _hot_count(done["id"]) == 0
+    assert _hot_count(recent["id"]) == 2 and _hot_count(running["id"]) == 2
+    archive = store._event_archive(done["id"])
+    segment = tmp_path / archive["path"]
+    assert segment.exists() and archive["stored_bytes"] < archive["raw_bytes"]
+    assert len(gzip.decompress(segment.read_bytes()).splitlines()) == 12
+    assert store.archive_finished_runs(3600)["runs"] == 0
+
+    assert [e.to_dict() for e in store.list_events(done["id"])] == before
+    lines = [e.to_json() for e in store.list_events(done["id"])]
+    expected = [json.dumps(e, ensure_ascii=False) for e in before]
+    if JSONB_SUPPORTED:
+        # JSONB payload приходит из SQLite минифицированным
+        assert [json.loads(line) for line in lines] == before
+    else:
+        assert lines == expected
+    seqs = [e["seq"] for e in events]
+    assert [e["seq"] for e in store.list_events(done["id"], limit=3)] == seqs[:3]
+    assert [e["seq"] for e in store.list_events_since(done["id"], seqs[9])] == seqs[10:]
+    ranged = store.iter_events(done["id"], from_seq=seqs[2], to_seq=seqs[8], types=["task_started"])
+    assert [e["payload"]["n"] for e in ranged] == [3, 6]
+    assert store.get_latest_event_by_type(done["id"], "task_started")["payload"]["n"] == 9
+
+    # Событие, пришедшее после архивации, читается вслед за сегментом
+    late = store.add_event(done["id"], "run_done", "info", "поздно", {})
+    store.flush_events()
+    assert [e["seq"] for e in store.list_events(done["id"])] == seqs + [late["seq"]]
+
+
+def test_seq_is_not_reused_after_archiving_the_newest_events(tmp_path: Path):
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+    run = _finished_run("failed")
+    events = _seed(run["id"], 3)
+    store.archive_finished_runs(0)
+    assert store._read_conn().execute("SELECT COUNT(*) FROM events").fetchone()[0] == 0
+
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+    fresh = store.add_event("other-run", "task_started", "info", "после перезапуска", {})
+    assert fresh["seq"] > events[-1]["seq"]
+
+    store.reset_for_tests()
+    os.environ["ASTRA_EVENT_GROUP_COMMIT"] = "false"
+    try:
+        store.init(tmp_path, MIGRATIONS_DIR)
+        direct = store.add_event("other-run", "task_started", "info", "без group commit", {})
+    finally:
+        os.environ.pop("ASTRA_EVENT_GROUP_COMMIT")
+    assert direct["seq"] > fresh["seq"]
+
+
+def test_download_and_snapshot_include_archived_events():
+    temp_dir = Path(tempfile.mkdtemp())
+    os.environ["ASTRA_DATA_DIR"] = str(temp_dir)
+    store.reset_for_tests()
+    store.init(temp_dir, MIGRATIONS_DIR)
+    client = TestClient(create_app())
+    token_path = temp_dir / "auth.token"
+    token = token_path.read_text(encoding="utf-8").strip() if token_path.exists() else "test-token"
+    client.post("/api/v1/auth/bootstrap", json={"token": token})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    run = _finished_run()
+    events = _seed(run["id"], 5)
+    assert store.archive_finished_runs(3600)["runs"] == 1
+
+    resp = client.get(f"/api/v1/runs/{run['id']}/events/download", headers={**headers, "Accept-Encoding": "identity"})
+    assert resp.status_code == 200
+    assert [json.loads(line)["seq"] for line in resp.text.splitlines()] == [e["seq"] for e in events]
+
+    snapshot = client.get(f"/api/v1/runs/{run['id']}/snapshot", headers=headers)
+    assert snapshot.status_code == 200
+    assert [e["seq"] for e in snapshot.json()["last_events"]] == [e["seq"] for e in events]
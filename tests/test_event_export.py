@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from apps.api.main import create_app
+from apps.api.routes.run_events import _accepts_gzip, _gzip_chunks, _ndjson_chunks
+from memory import store
+
+
+def _make_client() -> TestClient:
+    temp_dir = Path(tempfile.mkdtemp())
+    os.environ["ASTRA_DATA_DIR"] = str(temp_dir)
+    store.reset_for_tests()
+    store.init(temp_dir, ROOT / "memory" / "migrations")
+    return TestClient(create_app())
+
+
+def _bootstrap(client: TestClient, token: str = "test-token") -> dict:
+    token_path = Path(os.environ["ASTRA_DATA_DIR"]) / "auth.token"
+    if token_path.exists():
+        token = token_path.read_text(encoding="utf-8").strip() or token
+    client.post("/api/v1/auth/bootstrap", json={"token": token})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _seed(run_id: str, count: int) -> list[dict]:
+    events = []
+    for n in range(count):
+        event_type = "task_progress" if n % 3 else "task_started"
+        events.append(store.add_event(run_id, event_type, "info", f"событие {n}", {"n": n}))
+    store.flush_events()
+    return events
+
+
+def test_iter_events_pages_by_seq_with_filters(tmp_path: Path):
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+    events = _seed("run-export", 10)
+    _seed("other-run", 3)
+
+    conn = store._read_conn()
+    statements: list[str] = []
+    conn.set_trace_callback(statements.append)
+    try:
+        exported = list(store.iter_events("run-export", chunk_size=3))
+    finally:
+        conn.set_trace_callback(None)
+    assert [e["seq"] for e in exported] == [e["seq"] for e in events]
+    assert len([sql for sql in statements if "FROM events" in sql]) == 4
+
+    seqs = [e["seq"] for e in events]
+    ranged = store.iter_events("run-export", from_seq=seqs[2], to_seq=seqs[5], types=["task_progress"], chunk_size=2)
+    assert [e["payload"]["n"] for e in ranged] == [2, 4, 5]
+
+
+def test_download_events_streams_ndjson_and_gzip():
+    client = _make_client()
+    headers = _bootstrap(client)
+    events = _seed("run-export", 25)
+
+    plain = client.get("/api/v1/runs/run-export/events/download", headers={**headers, "Accept-Encoding": "identity"})
+    assert plain.status_code == 200
+    assert "content-encoding" not in plain.headers
+    lines = [json.loads(line) for line in plain.text.splitlines()]
+    assert [e["seq"] for e in lines] == [e["seq"] for e in events]
+
+    seqs = [e["seq"] for e in events]
+    filtered = client.get(
+        f"/api/v1/runs/run-export/events/download?from_seq={seqs[3]}&to_seq={seqs[9]}&type=task_started",
+        headers={**headers, "Accept-Encoding": "gzip"},
+    )
+    assert filtered.headers["content-encoding"] == "gzip"
+    assert [json.loads(line)["payload"]["n"] for line in filtered.text.splitlines()] == [3, 6, 9]
+
+    missing = client.get("/api/v1/runs/no-such-run/events/download", headers=headers)
+    assert missing.status_code == 404
+
+
+def test_export_helpers_chunk_and_compress():
+    events = [{"seq": n, "type": "task_progress", "payload": {"text": "x" * 1000}} for n in range(200)]
+    chunks = list(_ndjson_chunks(events))
+    assert len(chunks) > 1
+    assert gzip.decompress(b"".join(_gzip_chunks(chunks))) == b"".join(chunks)
+
+    assert _accepts_gzip("gzip, deflate, br")
+    assert _accepts_gzip("br;q=1.0, gzip;q=0.5")
+    assert not _accepts_gzip("gzip;q=0")
+    assert not _accepts_gzip("identity")
+    assert not _accepts_gzip("")
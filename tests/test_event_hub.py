@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core import event_hub
+from core.event_bus import emit, publish_live
+from core.event_hub import EventHub
+from memory import store
+
+
+def _init_db(tmp_path: Path) -> None:
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+
+def test_subscriber_wakes_on_publish_from_other_thread():
+    hub = EventHub()
+
+    async def scenario():
+        subscription = hub.subscribe("run-1")
+        assert hub.subscriber_count("run-1") == 1
+
+        thread = threading.Thread(target=lambda: hub.publish({"run_id": "run-1", "seq": 5, "type": "task_progress"}))
+        thread.start()
+        assert await subscription.wait(1.0)
+        thread.join(1)
+
+        events, overflowed = subscription.drain()
+        assert not overflowed
+        assert [e["seq"] for e in events] == [5]
+        subscription.mark_delivered(5)
+        subscription.close()
+        assert hub.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_hub_metrics_report_lag_and_overflow():
+    hub = EventHub(max_pending=2)
+
+    async def scenario():
+        subscription = hub.subscribe("run-1", last_seq=1)
+        hub.publish({"run_id": "run-1", "seq": 2})
+        hub.publish({"run_id": "run-1", "seq": 3})
+        hub.publish({"run_id": "run-other", "seq": 4})
+
+        metrics = hub.metrics()
+        assert metrics["subscribers"] == 1
+        assert metrics["runs"] == {"run-1": 1}
+        assert metrics["subscriptions"][0]["lag"] == 2
+        assert metrics["subscriptions"][0]["pending"] == 2
+
+        hub.publish({"run_id": "run-1", "seq": 4})
+        events, overflowed = subscription.drain()
+        assert overflowed
+        assert events == []
+        assert hub.metrics()["subscriptions"][0]["overflows"] == 1
+        subscription.close()
+
+    asyncio.run(scenario())
+
+
+def test_emit_publishes_persisted_event_with_seq(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path)
+    hub = EventHub()
+    monkeypatch.setattr(event_hub, "_HUB_SINGLETON", hub)
+    project = store.create_project("hub", [], {})
+    run = store.create_run(project["id"], "q", "plan_only")
+
+    async def scenario():
+        subscription = hub.subscribe(run["id"])
+        event = emit(run["id"], "run_started", "Запуск начат", {"mode": "plan_only"})
+        assert await subscription.wait(1.0)
+        events, _ = subscription.drain()
+        subscription.close()
+        return event, events
+
+    event, events = asyncio.run(scenario())
+    store.flush_events()
+    stored = store.list_events(run["id"])
+    assert event["seq"] == stored[-1]["seq"]
+    assert [e["seq"] for e in events] == [event["seq"]]
+
+
+def test_concurrent_emits_reach_subscriber_in_seq_order(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path)
+    hub = EventHub()
+    monkeypatch.setattr(event_hub, "_HUB_SINGLETON", hub)
+    project = store.create_project("hub", [], {})
+    run = store.create_run(project["id"], "q", "plan_only")
+
+    async def scenario():
+        subscription = hub.subscribe(run["id"])
+
+        def worker():
+            for n in range(200):
+                emit(run["id"], "task_progress", "Прогресс", {"n": n})
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        # Публикация идёт после коммита пачки — дожидаемся писателя
+        store.flush_events()
+        events, overflowed = subscription.drain()
+        subscription.close()
+        return events, overflowed
+
+    events, overflowed = asyncio.run(scenario())
+    assert not overflowed
+    seqs = [e["seq"] for e in events]
+    # Без упорядоченной публикации drain отбросил бы отставшие seq
+    assert seqs == sorted(seqs)
+    assert len(seqs) == 800
+
+
+def test_live_delta_reaches_subscriber_but_is_not_stored(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path)
+    hub = EventHub()
+    monkeypatch.setattr(event_hub, "_HUB_SINGLETON", hub)
+    project = store.create_project("hub", [], {})
+    run = store.create_run(project["id"], "q", "plan_only")
+
+    async def scenario():
+        subscription = hub.subscribe(run["id"])
+        stored = emit(run["id"], "run_started", "Запуск начат", {})
+        subscription.mark_delivered(stored["seq"])
+        publish_live(run["id"], "chat_response_delta", "LLM response delta", {"offset": 0, "delta": "При"})
+        assert await subscription.wait(1.0)
+        events, _ = subscription.drain()
+        subscription.close()
+        return events
+
+    events = asyncio.run(scenario())
+    # seq=None не отбрасывается фильтром last_seq
+    assert [(e["type"], e["seq"]) for e in events] == [("chat_response_delta", None)]
+    store.flush_events()
+    assert [e["type"] for e in store.list_events(run["id"])] == ["run_started"]
+    with pytest.raises(ValueError):
+        publish_live(run["id"], "run_done", "Готово", {})
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import sys
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+
+
+def _init_db(tmp_path: Path, monkeypatch, window_ms: str = "50") -> None:
+    monkeypatch.setenv("ASTRA_EVENT_GROUP_COMMIT", "true")
+    monkeypatch.setenv("ASTRA_EVENT_BATCH_WINDOW_MS", window_ms)
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+
+def test_burst_of_events_is_committed_in_batches(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path, monkeypatch)
+    seqs = [store.add_event("run-1", "task_progress", "info", f"step {i}", {"i": i})["seq"] for i in range(100)]
+
+    assert seqs == list(range(seqs[0], seqs[0] + 100))
+    store.flush_events()
+    events = store.list_events("run-1", limit=500)
+    assert [e["seq"] for e in events] == seqs
+    assert [e["payload"]["i"] for e in events] == list(range(100))
+
+    stats = store.event_writer_stats()
+    assert stats["events"] == 100
+    assert stats["batches"] < 100
+    assert stats["pending"] == 0
+
+
+def test_per_run_order_is_kept_across_threads(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path, monkeypatch, window_ms="5")
+
+    def _worker(run_id: str) -> None:
+        for i in range(50):
+            store.add_event(run_id, "task_progress", "info", "m", {"i": i})
+
+    threads = [threading.Thread(target=_worker, args=(f"run-{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    store.flush_events()
+    for n in range(4):
+        events = store.list_events(f"run-{n}", limit=100)
+        assert [e["payload"]["i"] for e in events] == list(range(50))
+        seqs = [e["seq"] for e in events]
+        assert seqs == sorted(seqs)
+
+
+def test_durable_event_types_are_committed_synchronously(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path, monkeypatch, window_ms="10000")
+    store.add_event("run-1", "task_progress", "info", "m", {})
+    done = store.add_event("run-1", "run_done", "info", "m", {"status": "done"})
+
+    # Окно в 10 секунд не дождалось бы — run_done сам сбрасывает очередь
+    assert store.event_writer_stats()["pending"] == 0
+    assert store.event_writer_stats()["last_seq"] == done["seq"]
+
+
+def test_reset_flushes_pending_events(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path, monkeypatch, window_ms="10000")
+    event = store.add_event("run-1", "task_progress", "info", "m", {})
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+    events = store.list_events("run-1")
+    assert [e["seq"] for e in events] == [event["seq"]]
+    next_event = store.add_event("run-1", "task_progress", "info", "m", {})
+    assert next_event["seq"] == event["seq"] + 1
+
+
+def test_failed_rows_are_reported_and_stop_last_seq(tmp_path: Path, monkeypatch, caplog):
+    _init_db(tmp_path, monkeypatch, window_ms="0")
+    ok = store.add_event("run-1", "task_progress", "info", "m", {})
+    assert store.flush_events(5.0)
+    # Занятый rowid: строка с этим seq не запишется
+    writer = store._event_writer
+    conn = store._conn_or_raise()
+    with store._lock:
+        conn.execute(
+            "INSERT INTO events (rowid, id, run_id, ts, type, level, message, payload, task_id, step_id) "
+            "VALUES (?, 'squatter', 'run-x', 0, 'task_progress', 'info', 'm', '{}', NULL, NULL)",
+            (writer._next_seq,),
+        )
+        conn.commit()
+
+    with caplog.at_level("ERROR", logger="memory.store"):
+        lost = store.add_event("run-1", "task_progress", "info", "m", {})
+        assert not store.flush_events(5.0)
+    assert "dropped 1 event" in caplog.text
+
+    stats = store.event_writer_stats()
+    assert stats["failed"] == 1
+    assert stats["last_seq"] == ok["seq"] == lost["seq"] - 1
+
+    # Следующие события пишутся, а flush снова сообщает успех
+    store.add_event("run-1", "task_progress", "info", "m", {})
+    assert store.flush_events(5.0)
+
+
+def test_publish_runs_after_commit_and_skips_failed_rows(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path, monkeypatch, window_ms="0")
+    published: list[tuple[int, int]] = []
+
+    def publish(event: dict) -> None:
+        # Опубликованное событие уже читается другим соединением
+        visible = store._read_conn().execute("SELECT COUNT(*) FROM events WHERE rowid = ?", (event["seq"],)).fetchone()[0]
+        published.append((event["seq"], visible))
+
+    ok = store.add_event("run-1", "task_progress", "info", "m", {}, publish=publish)
+    assert store.flush_events(5.0)
+    assert published == [(ok["seq"], 1)]
+
+    writer = store._event_writer
+    conn = store._conn_or_raise()
+    with store._lock:
+        conn.execute(
+            "INSERT INTO events (rowid, id, run_id, ts, type, level, message, payload, task_id, step_id) "
+            "VALUES (?, 'squatter', 'run-x', 0, 'task_progress', 'info', 'm', '{}', NULL, NULL)",
+            (writer._next_seq,),
+        )
+        conn.commit()
+
+    store.add_event("run-1", "task_progress", "info", "m", {}, publish=publish)
+    assert not store.flush_events(5.0)
+    assert published == [(ok["seq"], 1)]
+
+
+def test_seq_without_group_commit_continues_after_restart(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("ASTRA_EVENT_GROUP_COMMIT", "false")
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+    seqs = [store.add_event("run-1", "task_progress", "info", "m", {})["seq"] for _ in range(3)]
+    assert seqs == list(range(seqs[0], seqs[0] + 3))
+
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+    assert store.add_event("run-1", "task_progress", "info", "m", {})["seq"] == seqs[-1] + 1
@@ -115,6 +115,7 @@ def test_executor_executes_single_action(tmp_path):
     assert result.status == "done"
     assert len(bridge.actions) == 1
 
+    store.flush_events()
     events = store.list_events(run["id"], limit=200)
     event_types = {e["type"] for e in events}
     assert "step_execution_started" in event_types
@@ -142,6 +143,7 @@ def test_executor_stops_on_no_progress(tmp_path):
     result = executor.execute_step(run, step, task)
 
     assert result.status == "failed"
+    store.flush_events()
     events = store.list_events(run["id"], limit=200)
     event_types = {e["type"] for e in events}
     assert "verification_result" in event_types
@@ -190,6 +192,7 @@ def test_executor_requires_approval(tmp_path):
     assert result is not None
     assert getattr(result, "status") == "done"
 
+    store.flush_events()
     events = store.list_events(run["id"], limit=200)
     event_types = {e["type"] for e in events}
     assert "approval_requested" in event_types
@@ -235,6 +238,7 @@ def test_executor_reject_stops(tmp_path):
     assert getattr(result, "status") == "failed"
     assert bridge.actions == []
 
+    store.flush_events()
     events = store.list_events(run["id"], limit=200)
     event_types = {e["type"] for e in events}
     assert "step_cancelled_by_user" in event_types
@@ -276,6 +280,7 @@ def test_password_flag_requires_user_action(tmp_path):
     assert getattr(result, "status") == "done"
     assert bridge.actions == []
 
+    store.flush_events()
     events = store.list_events(run["id"], limit=200)
     event_types = {e["type"] for e in events}
     assert "user_action_required" in event_types
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+from memory.db import JSONB_SUPPORTED, json_param_sql
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _init_db(tmp_path: Path) -> None:
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+
+
+def _plan(sql: str, params: tuple) -> str:
+    rows = store._read_conn().execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return " ".join(row["detail"] for row in rows)
+
+
+def test_runs_intent_is_generated_from_meta_and_indexed(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("intent", [], {})
+    chat = store.create_run(project["id"], "привет", "plan_only", meta={"intent": "CHAT"})
+    act = store.create_run(project["id"], "сделай", "plan_only", meta={"intent": "ACT"})
+    store.create_run(project["id"], "без meta", "plan_only")
+    conn = store._conn_or_raise()
+    with store._lock:
+        conn.execute(
+            "INSERT INTO runs (id, project_id, query_text, mode, status, created_at, meta) VALUES ('broken', ?, 'q', 'plan_only', 'created', ?, '{oops')",
+            (project["id"], store.now_iso()),
+        )
+        conn.commit()
+
+    assert [r["id"] for r in store.list_runs(project["id"], intent="CHAT")] == [chat["id"]]
+    assert store.get_run("broken")["meta"] == {}
+    assert "idx_runs_project_intent" in _plan("SELECT id FROM runs WHERE project_id = ? AND intent = ? ORDER BY created_at DESC", ("p", "CHAT"))
+
+    store.update_run_meta_and_mode(act["id"], mode="plan_only", purpose=None, meta={"intent": "CHAT"})
+    assert {r["id"] for r in store.list_runs(project["id"], intent="CHAT")} == {chat["id"], act["id"]}
+    assert len(store.list_runs(project["id"])) == 4
+
+    # Ответ ассистента попадает в историю только у чат-запусков — проверка в SQL по runs.intent
+    store.add_event(chat["id"], "chat_response_generated", "info", "ответ", {"text": "ответ"})
+    store.add_event("broken", "chat_response_generated", "info", "ответ", {"text": "ответ"})
+    store.flush_events()
+    roles = store._read_conn().execute("SELECT run_id, role FROM chat_turns ORDER BY run_id, role").fetchall()
+    assert sorted((r["run_id"], r["role"]) for r in roles) == sorted(
+        [(chat["id"], "user"), (chat["id"], "assistant"), (act["id"], "user")]
+    )
+
+
+def test_iter_events_filters_by_step_in_hot_and_archived_events(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("steps", [], {})
+    run = store.create_run(project["id"], "q", "plan_only")
+    for n in range(6):
+        store.add_event(run["id"], "task_progress" if n % 2 else "step_started", "info", "m", {"n": n}, step_id=f"step-{n % 3}")
+    store.flush_events()
+
+    def step_events() -> list[int]:
+        return [e["payload"]["n"] for e in store.iter_events(run["id"], types=["task_progress"], step_id="step-1")]
+
+    assert step_events() == [1]
+    assert "idx_events_step_type" in _plan("SELECT rowid FROM events WHERE step_id = ? AND type = ?", ("step-1", "task_progress"))
+
+    store.update_run_status(run["id"], "done", finished_at="2020-01-01T00:00:00Z")
+    assert store.archive_finished_runs(3600)["runs"] == 1
+    assert step_events() == [1]
+    assert store.get_latest_event_by_type(run["id"], "step_started")["payload"] == {"n": 4}
+
+
+@pytest.mark.skipif(not JSONB_SUPPORTED, reason="SQLite < 3.45 не поддерживает JSONB")
+def test_jsonb_storage_round_trips_and_can_be_disabled(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path)
+    project = store.create_project("jsonb", [], {})
+    run = store.create_run(project["id"], "q", "plan_only", meta={"intent": "CHAT", "qa_mode": True})
+    store.add_event(run["id"], "task_progress", "info", "m", {"text": "привет", "items": [1, 2]})
+    store.flush_events()
+    conn = store._read_conn()
+    assert conn.execute("SELECT typeof(payload) FROM events").fetchone()[0] == "blob"
+    assert conn.execute("SELECT typeof(meta), intent FROM runs").fetchone()[:] == ("blob", "CHAT")
+
+    event = store.list_events(run["id"])[0]
+    assert event["payload"] == {"text": "привет", "items": [1, 2]}
+    assert json.loads(event.to_json())["payload"] == event["payload"]
+    assert store.get_run(run["id"])["meta"] == {"intent": "CHAT", "qa_mode": True}
+
+    monkeypatch.setenv("ASTRA_DB_JSONB", "false")
+    assert json_param_sql() == "?"
+    _init_db(tmp_path)
+    store.add_event(run["id"], "task_progress", "info", "m", {"text": "текст"})
+    store.flush_events()
+    assert [e["payload"]["text"] for e in store.list_events(run["id"])] == ["привет", "текст"]
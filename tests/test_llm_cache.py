@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.brain.cache import LLMResponseCache
+from core.brain.providers import ProviderResult
+from core.brain.router import BrainConfig, BrainRouter
+from core.brain.types import LLMRequest
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _router(monkeypatch, calls: list[str], events: list[tuple[str, dict]]) -> BrainRouter:
+    monkeypatch.setattr("core.brain.router.emit", lambda run_id, event_type, message, payload, **_: events.append((event_type, payload)))
+    router = BrainRouter(BrainConfig.from_env())
+
+    def fake_call(messages, request, model_id):
+        calls.append(request.purpose)
+        return ProviderResult(text=f"ответ {len(calls)}", usage={"eval_count": 1}, raw={"context": [1, 2, 3], "done": True})
+
+    monkeypatch.setattr(router, "_call_local", fake_call)
+    return router
+
+
+def _request(purpose: str, run_id: str, *, temperature: float = 0.2, text: str = "вопрос") -> LLMRequest:
+    return LLMRequest(purpose=purpose, messages=[{"role": "user", "content": text}], run_id=run_id, temperature=temperature)
+
+
+def test_cache_is_shared_across_runs_and_router_instances(tmp_path: Path, monkeypatch):
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+    calls: list[str] = []
+    events: list[tuple[str, dict]] = []
+
+    first = _router(monkeypatch, calls, events).call(_request("semantic_decision", "run-1"))
+    assert not first.cache_hit
+    # Новый экземпляр роутера (как после перезапуска) и другой запуск
+    second = _router(monkeypatch, calls, events).call(_request("semantic_decision", "run-2"))
+    assert second.cache_hit and second.text == first.text and second.latency_ms == 0
+    assert "context" not in second.raw
+    assert calls == ["semantic_decision"]
+
+    succeeded = [payload for event_type, payload in events if event_type == "llm_request_succeeded"]
+    assert succeeded[-1]["cache_hit"] is True
+    assert succeeded[-1]["cache_stats"] == {"hits": 1, "misses": 0, "hit_rate": 1.0, "evicted": 0}
+    assert store.llm_cache_stats()["entries"] == 1
+
+
+def test_sampled_chat_and_disabled_purposes_bypass_the_cache(tmp_path: Path, monkeypatch):
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+    monkeypatch.setenv("ASTRA_LLM_CACHE_TTL_PLANNER_V1_S", "0")
+    calls: list[str] = []
+    router = _router(monkeypatch, calls, [])
+    for _ in range(2):
+        router.call(_request("chat_response", "run-1"))
+        router.call(_request("planner_v1", "run-1"))
+        router.call(_request("computer_micro_plan", "run-1"))
+    assert len(calls) == 6
+    assert store.llm_cache_stats()["entries"] == 0
+
+    # Детерминированный чат (temperature=0) кэшируется
+    router.call(_request("chat_response", "run-1", temperature=0))
+    assert router.call(_request("chat_response", "run-2", temperature=0)).cache_hit
+    assert len(calls) == 7
+
+
+def test_entries_expire_and_least_recently_used_are_evicted(tmp_path: Path):
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+
+    def put(key: str, now: float, ttl: float = 100.0) -> int:
+        return store.put_llm_cache_entry(key, {"text": key}, purpose="p", model_id="m", ttl_s=ttl, max_entries=3, now_ts=now)
+
+    put("a", 1.0)
+    put("b", 2.0)
+    put("c", 3.0)
+    assert store.get_llm_cache_entry("a", 4.0, touch_interval_s=0) == {"text": "a"}
+    assert put("d", 5.0) == 1
+    assert store.get_llm_cache_entry("b", 6.0) is None
+    assert {k: store.get_llm_cache_entry(k, 6.0) is not None for k in "acd"} == {"a": True, "c": True, "d": True}
+
+    put("short", 7.0, ttl=1.0)
+    assert store.get_llm_cache_entry("short", 7.5) == {"text": "short"}
+    assert store.get_llm_cache_entry("short", 8.0) is None
+    # Просроченные записи вытесняются при следующей записи
+    put("e", 9.0)
+    assert store.llm_cache_stats()["entries"] == 3
+
+
+def test_cache_hit_touches_last_used_at_at_most_once_per_interval(tmp_path: Path, monkeypatch):
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+    store.put_llm_cache_entry("k", {"text": "k"}, purpose="p", model_id="m", ttl_s=1000.0, max_entries=0, now_ts=100.0)
+
+    def last_used() -> tuple:
+        row = store._read_conn().execute("SELECT last_used_at, hits FROM llm_cache WHERE key = 'k'").fetchone()
+        return row["last_used_at"], row["hits"]
+
+    commits = []
+    real_commit = store._commit
+    monkeypatch.setattr(store, "_commit", lambda conn: (commits.append(1), real_commit(conn)))
+    for now in (110.0, 130.0, 159.0):
+        assert store.get_llm_cache_entry("k", now, touch_interval_s=60.0) == {"text": "k"}
+    assert last_used() == (100.0, 0) and not commits
+
+    assert store.get_llm_cache_entry("k", 160.0, touch_interval_s=60.0) == {"text": "k"}
+    assert last_used() == (160.0, 1) and len(commits) == 1
+
+
+def test_cache_without_database_is_a_no_op(monkeypatch):
+    store.reset_for_tests()
+    cache = LLMResponseCache(max_entries=10)
+    request = _request("semantic_decision", "run-1")
+    assert cache.get("key", request) is None
+    calls: list[str] = []
+    assert _router(monkeypatch, calls, []).call(request).text == "ответ 1"
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 0
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.brain.providers import LocalLLMProvider, ProviderError, build_local_session
+from core.brain.router import BrainConfig, BrainRouter
+from core.brain.types import LLMRequest
+
+
+class _StreamingOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.tokens = ["При", "вет", ", ", "мир", "!"]
+        self.token_delay_s = 0.0
+        self.tail: list[dict] = [{"done": True, "eval_count": 5, "prompt_eval_count": 7}]
+        self.chat_status = 200
+        self.payloads: list[dict] = []
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        server: _StreamingOllama = self.server  # type: ignore[assignment]
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.payloads.append(payload)
+        if server.chat_status != 200 and payload.get("stream"):
+            self._send_json(server.chat_status, {"error": "boom"})
+            return
+        if not payload.get("stream"):
+            self._send_json(200, {"message": {"role": "assistant", "content": "целиком"}, "done": True})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        lines = [{"message": {"role": "assistant", "content": token}, "done": False} for token in server.tokens]
+        for n, line in enumerate(lines + server.tail):
+            if n and server.token_delay_s:
+                time.sleep(server.token_delay_s)
+            data = (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture()
+def ollama():
+    server = _StreamingOllama()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _provider(base: str) -> LocalLLMProvider:
+    return LocalLLMProvider(base, "chat-model", "code-model", session=build_local_session(pool_size=2))
+
+
+def _router(base: str, monkeypatch, *, flush_ms: int) -> tuple[BrainRouter, list[tuple[str, dict]]]:
+    events: list[tuple[str, dict]] = []
+
+    def record(run_id, event_type, message, payload, **_):
+        events.append((event_type, payload))
+
+    monkeypatch.setattr("core.brain.router.emit", record)
+    monkeypatch.setattr("core.brain.router.publish_live", record)
+    cfg = BrainConfig.from_env()
+    cfg.local_base_url = base
+    cfg.stream_enabled = True
+    cfg.stream_flush_ms = flush_ms
+    return BrainRouter(cfg), events
+
+
+def test_provider_reads_ndjson_stream_and_returns_the_full_result(ollama):
+    pieces: list[str] = []
+    result = _provider(ollama.base).chat([{"role": "user", "content": "привет"}], purpose="chat_response", on_delta=pieces.append)
+    assert pieces == ollama.tokens
+    assert result.text == "Привет, мир!"
+    assert result.raw["message"]["content"] == result.text
+    assert result.usage == {"prompt_eval_count": 7, "eval_count": 5, "total_duration": None}
+    assert ollama.payloads[0]["stream"] is True
+
+    # Без on_delta — прежний непотоковый запрос
+    assert _provider(ollama.base).chat([{"role": "user", "content": "привет"}]).text == "целиком"
+    assert ollama.payloads[1]["stream"] is False
+
+
+def test_stream_errors_become_provider_errors(ollama):
+    ollama.tail = [{"error": "model crashed"}]
+    with pytest.raises(ProviderError) as excinfo:
+        _provider(ollama.base).chat([{"role": "user", "content": "q"}], purpose="chat_response", on_delta=lambda _piece: None)
+    assert excinfo.value.error_type == "http_error"
+
+    ollama.tail = []
+    with pytest.raises(ProviderError) as excinfo:
+        _provider(ollama.base).chat([{"role": "user", "content": "q"}], purpose="chat_response", on_delta=lambda _piece: None)
+    assert excinfo.value.error_type == "connection_error"
+
+
+def test_non_streamed_fallback_is_delivered_as_one_delta(ollama, tmp_path, monkeypatch):
+    monkeypatch.setattr("core.brain.providers._ARTIFACT_DIR", tmp_path)
+    ollama.chat_status = 500
+    pieces: list[str] = []
+    result = _provider(ollama.base).chat([{"role": "user", "content": "q"}], purpose="plan", on_delta=pieces.append)
+    assert result.text == "целиком" and pieces == ["целиком"]
+    assert [p["stream"] for p in ollama.payloads] == [True, False]
+
+
+def test_router_coalesces_deltas_and_reports_ttft(ollama, monkeypatch):
+    ollama.token_delay_s = 0.02
+    router, events = _router(ollama.base, monkeypatch, flush_ms=10_000)
+    request = LLMRequest(
+        purpose="chat_response",
+        task_kind="chat",
+        messages=[{"role": "user", "content": "привет"}],
+        run_id="run-1",
+        stream=True,
+    )
+    response = router.call(request)
+    assert response.text == "Привет, мир!"
+
+    deltas = [payload for event_type, payload in events if event_type == "chat_response_delta"]
+    # Первый токен сразу, остальное склеено до конца ответа
+    assert [d["delta"] for d in deltas] == ["При", "вет, мир!"]
+    assert [d["offset"] for d in deltas] == [0, 3]
+    assert len({d["stream_id"] for d in deltas}) == 1
+    assert response.ttft_ms is not None and response.ttft_ms < response.latency_ms
+    succeeded = [payload for event_type, payload in events if event_type == "llm_request_succeeded"]
+    assert succeeded[-1]["ttft_ms"] == response.ttft_ms
+
+    # Ответы чата с temperature > 0 не кэшируются: повтор — новый поток
+    events.clear()
+    assert router.call(request).text == response.text
+    repeat = [payload for event_type, payload in events if event_type == "chat_response_delta"]
+    assert repeat and repeat[0]["stream_id"] != deltas[0]["stream_id"]
+    router.close()
+
+
+def test_router_streams_every_token_without_coalescing_and_skips_non_stream_requests(ollama, monkeypatch):
+    router, events = _router(ollama.base, monkeypatch, flush_ms=0)
+    router.call(LLMRequest(purpose="chat_response", messages=[{"role": "user", "content": "a"}], run_id="run-1", stream=True))
+    assert "".join(p["delta"] for t, p in events if t == "chat_response_delta") == "Привет, мир!"
+    assert len([t for t, _ in events if t == "chat_response_delta"]) == len(ollama.tokens)
+
+    events.clear()
+    router.call(LLMRequest(purpose="chat_response", messages=[{"role": "user", "content": "b"}], run_id="run-1"))
+    assert not [t for t, _ in events if t == "chat_response_delta"]
+    assert ollama.payloads[-1]["stream"] is False
+    router.close()
+
+
+def test_async_provider_streams_over_httpx_with_the_same_fallbacks(ollama, tmp_path, monkeypatch):
+    monkeypatch.setattr("core.brain.providers._ARTIFACT_DIR", tmp_path)
+    provider = _provider(ollama.base)
+
+    async def scenario() -> tuple[list[str], str, str]:
+        pieces: list[str] = []
+        streamed = await provider.achat([{"role": "user", "content": "q"}], purpose="chat_response", on_delta=pieces.append)
+        ollama.chat_status = 500
+        fallback = await provider.achat([{"role": "user", "content": "q"}], purpose="plan", on_delta=lambda _piece: None)
+        await provider.aclose()
+        return pieces, streamed.text, fallback.text
+
+    pieces, streamed_text, fallback_text = asyncio.run(scenario())
+    assert pieces == ollama.tokens and streamed_text == "Привет, мир!"
+    assert fallback_text == "целиком"
+    assert [p["stream"] for p in ollama.payloads] == [True, True, False]
+
+
+def test_router_acall_streams_deltas_like_call(ollama, monkeypatch):
+    router, events = _router(ollama.base, monkeypatch, flush_ms=0)
+    request = LLMRequest(purpose="chat_response", task_kind="chat", messages=[{"role": "user", "content": "a"}], run_id="run-1", stream=True)
+
+    async def scenario():
+        # Несколько корутин в одном потоке: очередь пропускает их по слотам
+        responses = await asyncio.gather(*(router.acall(request) for _ in range(3)))
+        await router.aclose()
+        return responses
+
+    responses = asyncio.run(scenario())
+    assert [r.text for r in responses] == ["Привет, мир!"] * 3
+    assert all(r.ttft_ms is not None for r in responses)
+    deltas = [p for t, p in events if t == "chat_response_delta"]
+    assert len({d["stream_id"] for d in deltas}) == 3
+    assert [t for t, _ in events].count("llm_request_succeeded") == 3
+    assert router.queue.stats()["inflight"] == {}
+
+
+def test_router_acall_keeps_sqlite_work_off_the_event_loop(ollama, monkeypatch):
+    router, _events = _router(ollama.base, monkeypatch, flush_ms=0)
+    threads: list[int] = []
+    monkeypatch.setattr("core.brain.router.emit", lambda *args, **kwargs: threads.append(threading.get_ident()))
+    request = LLMRequest(purpose="chat_response", task_kind="chat", messages=[{"role": "user", "content": "a"}], run_id="run-1", stream=True)
+
+    async def scenario() -> int:
+        await router.acall(request)
+        await router.aclose()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    # route/started/succeeded (а с ними кэш, бюджет и chat_turns) — не в потоке event loop
+    assert len(threads) >= 3
+    assert loop_thread not in threads
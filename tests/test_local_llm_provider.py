@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.brain.providers import LocalLLMProvider, ProviderError, build_local_session
+from core.brain.router import BrainConfig, BrainRouter
+from core.brain.types import LLMRequest
+
+
+class _FakeOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.chat_status = 200
+        self.paths: list[str] = []
+        self.connections: set[int] = set()
+        self.lock = threading.Lock()
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        server: _FakeOllama = self.server  # type: ignore[assignment]
+        json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.paths.append(self.path)
+            server.connections.add(self.client_address[1])
+        if self.path == "/api/chat" and server.chat_status != 200:
+            status, payload = server.chat_status, {"error": "boom"}
+        elif self.path == "/api/generate":
+            status, payload = 200, {"response": "из generate", "eval_count": 3}
+        else:
+            status, payload = 200, {"message": {"role": "assistant", "content": "привет"}, "eval_count": 2}
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture()
+def ollama():
+    server = _FakeOllama()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _provider(base: str) -> LocalLLMProvider:
+    return LocalLLMProvider(base, "chat-model", "code-model", session=build_local_session(pool_size=2))
+
+
+def test_calls_reuse_one_keep_alive_connection(ollama):
+    provider = _provider(ollama.base)
+    texts = [provider.chat([{"role": "user", "content": f"вопрос {n}"}]).text for n in range(5)]
+    assert texts == ["привет"] * 5
+    assert len(ollama.connections) == 1
+
+
+def test_fallback_chain_stays_on_the_pooled_connection(ollama, tmp_path, monkeypatch):
+    monkeypatch.setattr("core.brain.providers._ARTIFACT_DIR", tmp_path)
+    ollama.chat_status = 500
+    provider = _provider(ollama.base)
+    result = provider.chat([{"role": "user", "content": "вопрос"}], purpose="plan")
+    assert result.text == "из generate"
+    assert ollama.paths == ["/api/chat", "/api/chat", "/api/generate"]
+    assert len(ollama.connections) == 1
+
+
+def test_connection_errors_surface_as_provider_errors():
+    provider = LocalLLMProvider("http://127.0.0.1:9", "chat-model", "code-model", session=build_local_session(connect_retries=0))
+    with pytest.raises(ProviderError) as excinfo:
+        provider.chat([{"role": "user", "content": "вопрос"}], purpose="chat_response")
+    assert excinfo.value.error_type == "connection_error"
+
+
+def test_router_owns_a_single_provider_sized_to_the_queue(ollama, monkeypatch):
+    monkeypatch.setattr("core.brain.router.emit", lambda *args, **kwargs: None)
+    cfg = BrainConfig.from_env()
+    cfg.local_base_url = ollama.base
+    cfg.max_concurrency = 2
+    cfg.chat_priority_extra_slots = 1
+    cfg.local_pool_size = 0
+    router = BrainRouter(cfg)
+    provider = router.local_provider()
+    assert router.local_provider() is provider
+    assert provider._session.get_adapter(ollama.base)._pool_maxsize == 4
+
+    request = LLMRequest(purpose="plan", task_kind="plan", messages=[{"role": "user", "content": "вопрос"}])
+    for _ in range(3):
+        router._call_local(request.messages, request, "chat-model")
+    assert len(ollama.connections) == 1
+    router.close()
+    assert router._local_provider is None
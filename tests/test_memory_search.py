@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+
+
+def _init_db(tmp_path: Path) -> None:
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+
+def _seed(project_id: str) -> str:
+    run = store.create_run(project_id, "research", "research")
+    store.insert_sources(
+        run["id"],
+        [
+            {
+                "id": f"src-{idx}",
+                "url": f"https://example.com/{idx}",
+                "title": "python " * (idx % 3 + 1) + "guide",
+                "retrieved_at": f"2024-01-{idx + 1:02d}T00:00:00Z",
+                "snippet": "about python",
+            }
+            for idx in range(12)
+        ],
+    )
+    store.insert_facts(
+        run["id"],
+        [{"id": "fact-1", "key": "language", "value": "python", "confidence": 0.9, "created_at": "2024-02-01T00:00:00Z"}],
+    )
+    store.insert_artifacts(
+        run["id"],
+        [
+            {
+                "id": "art-1",
+                "type": "report_md",
+                "title": "python report",
+                "content_uri": "file://report.md",
+                "created_at": "2024-03-01T00:00:00Z",
+                "meta": {"tag": "weekly"},
+            }
+        ],
+    )
+    return run["id"]
+
+
+def test_search_hydrates_in_batches_and_filters_in_sql(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("search", [], {})
+    _seed(project["id"])
+    conn = store._read_conn()
+    statements: list[str] = []
+    conn.set_trace_callback(statements.append)
+    try:
+        results = store.search_memory(project["id"], "python", limit=50)
+    finally:
+        conn.set_trace_callback(None)
+
+    assert len(results) == 14
+    # Один FTS-запрос и по одному IN (...) на тип элемента (служебные запросы FTS5 не считаем)
+    assert len([sql for sql in statements if "MATCH" in sql]) == 1
+    assert len([sql for sql in statements if "WHERE id IN" in sql]) == 3
+    assert not [sql for sql in statements if "WHERE id = ?" in sql]
+    assert {r["type"] for r in results} == {"source", "fact", "artifact"}
+
+    # Фильтр по времени применяется до LIMIT, а не после
+    late = store.search_memory(project["id"], "python", from_ts="2024-01-11T00:00:00Z", limit=3)
+    assert len(late) == 3
+    assert all((r["item"].get("retrieved_at") or r["item"]["created_at"]) >= "2024-01-11T00:00:00Z" for r in late)
+
+    tagged = store.search_memory(project["id"], "python", tags="weekly")
+    assert [r["item"]["id"] for r in tagged] == ["art-1"]
+    assert [r["type"] for r in store.search_memory(project["id"], "python", item_type="fact")] == ["fact"]
+
+
+def test_search_keyset_pagination_covers_all_results(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("search", [], {})
+    _seed(project["id"])
+    full = store.search_memory(project["id"], "python", limit=50)
+
+    seen: list[str] = []
+    after = None
+    while True:
+        page = store.search_memory(project["id"], "python", limit=5, after=after)
+        if not page:
+            break
+        seen.extend(r["item"]["id"] for r in page)
+        after = page[-1]["cursor"]
+    assert seen == [r["item"]["id"] for r in full]
+
+
+def test_search_like_fallback_pages_with_cursor(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("search", [], {})
+    _seed(project["id"])
+    # Точка вне кавычек — синтаксическая ошибка MATCH, срабатывает LIKE
+    page = store.search_memory(project["id"], "example.com", limit=50)
+    assert [r["item"]["id"] for r in page] == [f"src-{idx}" for idx in range(12)]
+    assert all(r["cursor"].startswith("like:source:") for r in page)
+    rest = store.search_memory(project["id"], "example.com", limit=50, after=page[4]["cursor"])
+    assert [r["item"]["id"] for r in rest] == [r["item"]["id"] for r in page[5:]]
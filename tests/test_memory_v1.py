@@ -62,6 +62,34 @@ def test_user_memory_store_crud(tmp_path: Path):
     assert store.list_user_memories() == []
 
 
+def test_user_memory_fts_search_ranks_pinned_first(tmp_path: Path):
+    _init_store(tmp_path)
+    store.create_user_memory("Кофе", "Пьёт кофе без сахара", ["Food"], source="user_command")
+    store.create_user_memory("Кофейня", "Любимая кофейня у дома, кофе по утрам", ["places"], source="user_command")
+    pinned = store.create_user_memory("Чай", "Иногда пьёт кофе вечером", ["food"], source="user_command")
+    store.create_user_memory("Спорт", "Бегает по утрам", ["sport"], source="user_command")
+    store.set_user_memory_pinned(pinned["id"], True)
+
+    items = store.list_user_memories(query="кофе")
+    assert items[0]["id"] == pinned["id"]
+    assert {item["title"] for item in items} == {"Кофе", "Кофейня", "Чай"}
+    assert {item["title"] for item in store.list_user_memories(query="утрам")} == {"Кофейня", "Спорт"}
+
+    # Подстрока внутри слова не находится префиксным MATCH — срабатывает LIKE
+    assert {item["title"] for item in store.list_user_memories(query="офейн")} == {"Кофейня"}
+
+    # Тег, как и раньше, — подстрока без учёта регистра (ASCII)
+    assert {item["title"] for item in store.list_user_memories(tag="food")} == {"Кофе", "Чай"}
+    assert {item["title"] for item in store.list_user_memories(tag="FOO")} == {"Кофе", "Чай"}
+    assert {item["title"] for item in store.list_user_memories(query="кофе", tag="plac")} == {"Кофейня"}
+
+    deleted = store.delete_user_memory(pinned["id"])
+    assert deleted
+    assert pinned["id"] not in {item["id"] for item in store.list_user_memories(query="кофе")}
+    # Запрос без слов (одни знаки) не ломает MATCH — работает подстрочный поиск
+    assert store.list_user_memories(query="???") == []
+
+
 def test_user_memory_limit(tmp_path: Path, monkeypatch):
     _init_store(tmp_path)
     monkeypatch.setenv("ASTRA_MEMORY_MAX_CHARS", "10")
@@ -142,6 +170,7 @@ def test_memory_save_skill_creates_entry(tmp_path: Path):
 
     items = store.list_user_memories()
     assert len(items) == 1
+    store.flush_events()
     events = store.list_events(run["id"], limit=50)
     assert any(e.get("type") == "memory_saved" for e in events)
 
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import db
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+def _tables(conn) -> set[str]:
+    return {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+
+
+def test_fresh_db_applies_everything_once_then_takes_the_fast_path(tmp_path: Path, monkeypatch):
+    migrations = tmp_path / "migrations"
+    shutil.copytree(MIGRATIONS_DIR, migrations)
+    conn = db.connect(tmp_path / "astra.db")
+    report = db.apply_migrations(conn, migrations)
+    names = [p.name for p in db._migration_files(migrations)]
+    assert not report.fast_path and report.applied == names
+    assert set(report.timings_ms) == set(names)
+    # PRAGMA/VACUUM из 013_retention выполнены после коммита
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert {"runs", "events", "chat_turns", "event_archives"} <= _tables(conn)
+    conn.close()
+
+    # Повторный старт: один stat каталога, файлы не перечисляются и не читаются
+    monkeypatch.setattr(db, "_migration_files", lambda _dir: pytest.fail("migration files listed on warm start"))
+    conn = db.connect(tmp_path / "astra.db")
+    report = db.apply_migrations(conn, migrations)
+    assert report.fast_path and report.applied == []
+    monkeypatch.undo()
+
+    # Новый файл меняет штамп каталога: применяется только он
+    (migrations / "099_extra.sql").write_text("CREATE TABLE extra (id TEXT);\n", encoding="utf-8")
+    report = db.apply_migrations(conn, migrations)
+    assert report.applied == ["099_extra.sql"] and "extra" in _tables(conn)
+    assert db.last_migration_report() is report
+
+
+def test_failed_migration_rolls_back_the_whole_batch(tmp_path: Path):
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "001_ok.sql").write_text("CREATE TABLE ok (id TEXT);\nINSERT INTO ok VALUES ('a');\n", encoding="utf-8")
+    (migrations / "002_broken.sql").write_text("CREATE TABLE half (id TEXT);\nINSERT INTO missing VALUES (1);\n", encoding="utf-8")
+    conn = db.connect(tmp_path / "astra.db")
+
+    with pytest.raises(RuntimeError, match="002_broken.sql"):
+        db.apply_migrations(conn, migrations)
+    assert not conn.in_transaction
+    assert not {"ok", "half", "schema_migrations"} & _tables(conn)
+
+    (migrations / "002_broken.sql").write_text("CREATE TABLE half (id TEXT);\n", encoding="utf-8")
+    report = db.apply_migrations(conn, migrations)
+    assert report.applied == ["001_ok.sql", "002_broken.sql"]
+    assert conn.execute("SELECT COUNT(*) FROM ok").fetchone()[0] == 1
+
+
+def test_migration_order_and_duplicate_prefixes(tmp_path: Path):
+    names = [p.name for p in db._migration_files(MIGRATIONS_DIR)]
+    assert names.index("002_add_run_meta.sql") < names.index("002_approvals_fts.sql") < names.index("003_add_plan_step_fields.sql")
+    assert names.index("009_events_run_type_idx.sql") < names.index("010_chat_turns.sql")
+
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "7_a.sql").write_text("SELECT 1;", encoding="utf-8")
+    (migrations / "007_b.sql").write_text("SELECT 1;", encoding="utf-8")
+    with pytest.raises(RuntimeError, match="повторяется"):
+        db._migration_files(migrations)
+
+    trigger = "CREATE TRIGGER t AFTER INSERT ON x BEGIN\n  INSERT INTO y VALUES (1);\n  DELETE FROM z;\nEND;\n-- хвост\nPRAGMA optimize;"
+    statements = db._split_statements(trigger)
+    assert len(statements) == 2 and statements[0].endswith("END;")
+    assert db._outside_transaction(statements[1]) and not db._outside_transaction(statements[0])
+
+
+def test_failed_deferred_statement_is_retried_before_the_stamp_is_written(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("ASTRA_MIGRATION_VACUUM_AT_START", "true")
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "001_a.sql").write_text("CREATE TABLE t (x);\nINSERT INTO t VALUES (1), (2);\n", encoding="utf-8")
+    conn = db.connect(tmp_path / "astra.db")
+    db.apply_migrations(conn, migrations)
+
+    (migrations / "002_b.sql").write_text("CREATE TABLE u (x);\nVACUUM;\n", encoding="utf-8")
+    # Незавершённый курсор на том же соединении: VACUUM не выполнится
+    cursor = conn.execute("SELECT x FROM t")
+    cursor.fetchone()
+    report = db.apply_migrations(conn, migrations)
+    assert report.applied == ["002_b.sql"] and report.pending == ["002_b.sql"]
+    assert db._read_state(conn) == {"deferred": [["002_b.sql", "VACUUM;"]]}
+    cursor.fetchall()
+
+    # Штампа нет — следующий старт идёт медленным путём и повторяет VACUUM
+    report = db.apply_migrations(conn, migrations)
+    assert not report.fast_path and report.applied == [] and report.pending == []
+    assert db.apply_migrations(conn, migrations).fast_path
+
+
+def test_vacuum_of_an_existing_db_is_postponed_to_maintenance(tmp_path: Path, caplog):
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "001_a.sql").write_text("CREATE TABLE t (x);\n", encoding="utf-8")
+    conn = db.connect(tmp_path / "astra.db")
+    db.apply_migrations(conn, migrations)
+
+    (migrations / "002_b.sql").write_text("PRAGMA auto_vacuum=INCREMENTAL;\nVACUUM;\n", encoding="utf-8")
+    with caplog.at_level("WARNING", logger="memory.db"):
+        report = db.apply_migrations(conn, migrations)
+    assert report.applied == ["002_b.sql"]
+    assert report.pending == report.postponed == ["002_b.sql"]
+    assert "VACUUM postponed" in caplog.text
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    # Повторный старт VACUUM тоже не выполняет
+    assert db.apply_migrations(conn, migrations).postponed == ["002_b.sql"]
+
+    report = db.run_deferred_migrations(conn)
+    assert report.pending == [] and list(report.timings_ms) == ["002_b.sql"]
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert db.run_deferred_migrations(conn) is None
+    assert not db.apply_migrations(conn, migrations).fast_path
+    assert db.apply_migrations(conn, migrations).fast_path
+
+
+def test_matching_fingerprint_only_refreshes_the_stamp(tmp_path: Path, monkeypatch):
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "001_a.sql").write_text("CREATE TABLE t (x);\n", encoding="utf-8")
+    conn = db.connect(tmp_path / "astra.db")
+    first = db.apply_migrations(conn, migrations)
+
+    # Файл создан и удалён: штамп каталога другой, содержимое то же
+    (migrations / "tmp.txt").write_text("", encoding="utf-8")
+    (migrations / "tmp.txt").unlink()
+    monkeypatch.setattr(db, "_applied_migrations", lambda _conn: pytest.fail("schema_migrations read on fingerprint match"))
+    report = db.apply_migrations(conn, migrations)
+    assert report.fast_path and report.fingerprint == first.fingerprint
+    assert db._read_state(conn)["stamp"] == db._dir_stamp(migrations)
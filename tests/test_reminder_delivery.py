@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.reminders import scheduler as scheduler_module
+from core.reminders.scheduler import ReminderScheduler
+from memory import store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+
+
+class _FakeTelegram(ThreadingHTTPServer):
+    """Подмена api.telegram.org: задержка ответа, сценарий статусов, учёт соединений."""
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.delay_s = 0.0
+        self.script: list[tuple[int, dict]] = []
+        self.received: list[tuple[float, str]] = []
+        self.connections: set[int] = set()
+        self.lock = threading.Lock()
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        server: _FakeTelegram = self.server  # type: ignore[assignment]
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.connections.add(self.client_address[1])
+            server.received.append((time.monotonic(), body["text"]))
+            status, payload = server.script.pop(0) if server.script else (200, {"ok": True, "result": {}})
+        time.sleep(server.delay_s)
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture()
+def telegram(tmp_path: Path, monkeypatch):
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+    server = _FakeTelegram()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "token")
+    monkeypatch.setenv("TELEGRAM_CHAT_ID", "chat")
+    monkeypatch.setenv("ASTRA_TELEGRAM_API_BASE", server.base)
+    monkeypatch.setattr(scheduler_module, "_telegram_http", None)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _due(delivery: str, text: str) -> dict:
+    due_at = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat().replace("+00:00", "Z")
+    return store.create_reminder(due_at, text, delivery=delivery)
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def _status(reminder: dict) -> str:
+    return store.get_reminder(reminder["id"])["status"]
+
+
+def test_slow_channel_does_not_hold_back_other_reminders(telegram, capsys):
+    telegram.delay_s = 0.6
+    slow = _due("telegram", "медленный")
+    local = [_due("local", f"локальное {n}") for n in range(3)]
+    scheduler = ReminderScheduler(poll_interval=30, workers=4)
+    scheduler.start()
+    try:
+        assert _wait_for(lambda: all(_status(r) == "sent" for r in local), 0.4)
+        assert _status(slow) == "sending"
+        assert _wait_for(lambda: _status(slow) == "sent")
+    finally:
+        scheduler.stop()
+    metrics = scheduler.metrics()
+    assert metrics["channels"]["local"]["sent"] == 3
+    assert metrics["channels"]["telegram"]["send"]["p50_ms"] >= 500
+    assert metrics["channels"]["telegram"]["due_to_sent"]["count"] == 1
+
+
+def test_failed_send_is_retried_via_lease_without_sleeping_in_worker(telegram):
+    telegram.script = [(500, {"ok": False}), (429, {"ok": False, "parameters": {"retry_after": 0.2}})]
+    reminder = _due("telegram", "повтор")
+    scheduler = ReminderScheduler(poll_interval=30, workers=1)
+
+    start = time.monotonic()
+    assert scheduler.run_once() == 1
+    # Неудача не держит воркер: попытка отложена арендой, а не time.sleep
+    assert time.monotonic() - start < 0.5
+    deferred = store.get_reminder(reminder["id"])
+    assert deferred["status"] == "sending" and deferred["last_error"] == "telegram_http_500"
+
+    scheduler.start()
+    try:
+        assert _wait_for(lambda: _status(reminder) == "sent")
+    finally:
+        scheduler.stop()
+    assert store.get_reminder(reminder["id"])["attempts"] == 3
+    assert len(telegram.received) == 3
+    # Пауза перед третьей попыткой взята из retry_after ответа 429
+    assert 0.15 <= telegram.received[2][0] - telegram.received[1][0] < 0.9
+    assert scheduler.metrics()["channels"]["telegram"]["retried"] == 2
+
+
+def test_last_failed_attempt_marks_reminder_failed(telegram):
+    telegram.script = [(500, {"ok": False})] * 3
+    reminder = _due("telegram", "не дойдёт")
+    scheduler = ReminderScheduler(poll_interval=30)
+    scheduler.run_once()
+    conn = store._conn_or_raise()
+    for _ in range(2):
+        with store._lock:
+            conn.execute("UPDATE reminders SET lease_until = '2000-01-01T00:00:00Z' WHERE id = ?", (reminder["id"],))
+            conn.commit()
+        scheduler.run_once()
+    row = store.get_reminder(reminder["id"])
+    assert row["status"] == "failed" and row["attempts"] == 3 and row["last_error"] == "telegram_http_500"
+
+
+def test_channel_rate_limit_defers_without_spending_attempts(telegram, monkeypatch):
+    monkeypatch.setenv("ASTRA_TELEGRAM_RATE_PER_S", "5")
+    monkeypatch.setenv("ASTRA_TELEGRAM_RATE_BURST", "1")
+    reminders = [_due("telegram", f"сообщение {n}") for n in range(3)]
+    scheduler = ReminderScheduler(poll_interval=30, workers=4)
+    scheduler.start()
+    try:
+        assert _wait_for(lambda: all(_status(r) == "sent" for r in reminders))
+    finally:
+        scheduler.stop()
+    stamps = sorted(ts for ts, _ in telegram.received)
+    assert len(stamps) == 3
+    assert all(later - earlier >= 0.15 for earlier, later in zip(stamps, stamps[1:]))
+    assert {store.get_reminder(r["id"])["attempts"] for r in reminders} == {1}
+    assert scheduler.metrics()["channels"]["telegram"]["throttled"] >= 2
+    # Сессия с keep-alive: все сообщения ушли по одному соединению
+    assert len(telegram.connections) == 1
+
+
+def test_claims_capped_by_busy_workers_are_not_dropped_from_the_heap(telegram):
+    telegram.delay_s = 0.1
+    reminders = [_due("telegram", f"очередь {n}") for n in range(3)] + [_due("local", "локальное")]
+    scheduler = ReminderScheduler(poll_interval=30, workers=1)
+    scheduler.start()
+    try:
+        assert _wait_for(lambda: all(_status(r) == "sent" for r in reminders), 3.0)
+    finally:
+        scheduler.stop()
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 import tempfile
+import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
@@ -82,6 +83,7 @@ def test_reminder_store_and_scheduler_local(tmp_path: Path, monkeypatch):
     assert updated is not None
     assert updated["status"] == "sent"
 
+    store.flush_events()
     events = store.list_events(run["id"], limit=50)
     assert any(evt.get("type") == "reminder_sent" for evt in events)
 
@@ -119,6 +121,7 @@ def test_reminder_scheduler_without_run_id_keeps_lifecycle_events(tmp_path: Path
     assert updated["status"] == "sent"
 
     event_run_id = f"reminder:{reminder['id']}"
+    store.flush_events()
     events = store.list_events(event_run_id, limit=50)
     event_types = [evt.get("type") for evt in events]
     assert "reminder_due" in event_types
@@ -157,6 +160,100 @@ def test_reminder_scheduler_telegram_delivery_marks_sent(tmp_path: Path, monkeyp
     assert "Напоминание:" in sent_payload["text"]
 
 
+def _iso(delta: timedelta) -> str:
+    return (datetime.now(timezone.utc) + delta).isoformat().replace("+00:00", "Z")
+
+
+def test_claim_due_reminders_is_one_statement_and_one_commit(tmp_path: Path, monkeypatch):
+    _init_store(tmp_path)
+    due = [store.create_reminder(_iso(timedelta(minutes=-m)), f"r{m}", delivery="local") for m in (1, 3, 2)]
+    store.create_reminder(_iso(timedelta(minutes=5)), "later", delivery="local")
+
+    commits = []
+    real_commit = store._commit
+    monkeypatch.setattr(store, "_commit", lambda conn: (commits.append(1), real_commit(conn)))
+    claimed = store.claim_due_reminders(_iso(timedelta(0)), limit=10)
+    assert [r["text"] for r in claimed] == ["r3", "r2", "r1"]
+    assert all(r["status"] == "sending" and r["attempts"] == 1 and r["lease_until"] for r in claimed)
+    assert len(commits) == 1
+
+    # Захваченные не выдаются повторно, пока аренда не истекла; пустой захват
+    # тоже закрывает транзакцию, иначе соединение записи держит блокировку
+    assert store.claim_due_reminders(_iso(timedelta(0)), limit=10) == []
+    assert not store._conn.in_transaction
+    assert store.defer_reminder("missing", 1.0) is None
+    assert not store._conn.in_transaction
+    assert {store.get_reminder(r["id"])["status"] for r in due} == {"sending"}
+
+
+def test_claim_due_reminders_reclaims_expired_leases(tmp_path: Path):
+    _init_store(tmp_path)
+    crashed = store.create_reminder(_iso(timedelta(minutes=-1)), "упал посреди доставки", delivery="local")
+    delivered = store.create_reminder(_iso(timedelta(minutes=-1)), "доставлено", delivery="local")
+    assert len(store.claim_due_reminders(_iso(timedelta(0)), lease_s=60)) == 2
+    store.mark_reminder_sent(delivered["id"], "local")
+    assert store.get_reminder(delivered["id"])["lease_until"] is None
+
+    assert store.claim_due_reminders(_iso(timedelta(seconds=30))) == []
+    reclaimed = store.claim_due_reminders(_iso(timedelta(seconds=61)))
+    assert [r["id"] for r in reclaimed] == [crashed["id"]]
+    assert reclaimed[0]["attempts"] == 2
+
+    plan = " ".join(
+        row["detail"]
+        for row in store._read_conn().execute(
+            "EXPLAIN QUERY PLAN " + store._CLAIM_REMINDERS_SQL, ("u", "l", "n", 20, "n", 20, 20)
+        ).fetchall()
+    )
+    assert "idx_reminders_status_due" in plan and "idx_reminders_status_lease" in plan
+
+
+def _wait_for(predicate, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_scheduler_sleeps_until_next_due_and_wakes_on_create(tmp_path: Path):
+    _init_store(tmp_path)
+    later = store.create_reminder(_iso(timedelta(hours=1)), "через час", delivery="local")
+    scheduler = ReminderScheduler(poll_interval=30)
+    # Куча восстанавливается из БД при старте
+    assert abs(scheduler.next_wakeup() - datetime.fromisoformat(later["due_at"].replace("Z", "+00:00")).timestamp()) < 1e-3
+
+    scheduler.start()
+    try:
+        soon = store.create_reminder(_iso(timedelta(milliseconds=300)), "скоро", delivery="local")
+        assert _wait_for(lambda: store.get_reminder(soon["id"])["status"] == "sent")
+        assert store.get_reminder(later["id"])["status"] == "pending"
+        # Ни одного опроса вхолостую: пробуждение на создание и на срок
+        assert scheduler.wakeups <= 4 and scheduler.passes <= 3
+
+        store.cancel_reminder(later["id"])
+        assert _wait_for(lambda: scheduler.next_wakeup() is None)
+    finally:
+        scheduler.stop()
+
+
+def test_scheduler_does_not_spin_on_due_at_sql_cannot_claim(tmp_path: Path):
+    _init_store(tmp_path)
+    # Смещение +03:00: по часам срок наступил, но строковое сравнение в SQL — нет
+    odd = (datetime.now(timezone.utc) - timedelta(minutes=30)).astimezone(timezone(timedelta(hours=3))).isoformat()
+    store.create_reminder(odd, "смещение", delivery="local")
+    store.create_reminder(_iso(timedelta(minutes=-1)), "просрочено", delivery="local")
+    scheduler = ReminderScheduler(poll_interval=30)
+    scheduler.start()
+    try:
+        time.sleep(0.5)
+        assert scheduler.passes <= 2
+        assert [r["text"] for r in store.list_reminders(status="sent")] == ["просрочено"]
+    finally:
+        scheduler.stop()
+
+
 def test_reminders_api_create_list_cancel():
     client = _make_client()
     headers = _bootstrap(client)
@@ -167,6 +264,7 @@ def test_reminders_api_create_list_cancel():
     reminder_payload = created.json()
     reminder_id = reminder_payload.get("id")
     assert reminder_id
+    store.flush_events()
     events = store.list_events(f"reminder:{reminder_id}", limit=10)
     assert any(evt.get("type") == "reminder_created" for evt in events)
     sse = client.get(f"/api/v1/runs/reminder:{reminder_id}/events?once=1", headers=headers)
@@ -179,5 +277,14 @@ def test_reminders_api_create_list_cancel():
     cancelled = client.delete(f"/api/v1/reminders/{reminder_id}", headers=headers)
     assert cancelled.status_code == 200
     assert cancelled.json().get("status") == "cancelled"
+    store.flush_events()
     events = store.list_events(f"reminder:{reminder_id}", limit=20)
     assert any(evt.get("type") == "reminder_cancelled" for evt in events)
+
+
+def test_reminders_metrics_endpoint():
+    client = _make_client()
+    headers = _bootstrap(client)
+    resp = client.get("/api/v1/reminders/metrics", headers=headers)
+    assert resp.status_code == 200
+    assert {"workers", "in_flight", "channels"} <= set(resp.json())
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core.maintenance import MaintenanceScheduler, prune_files
+from memory import db, store
+
+MIGRATIONS_DIR = ROOT / "memory" / "migrations"
+OLD_ISO = "2020-01-01T00:00:00Z"
+
+
+def _init_db(tmp_path: Path) -> None:
+    store.reset_for_tests()
+    store.init(tmp_path, MIGRATIONS_DIR)
+
+
+def _count(table: str, where: str = "1") -> int:
+    return store._read_conn().execute(f"SELECT COUNT(*) FROM {table} WHERE {where}").fetchone()[0]
+
+
+def _seed_old_events(run_id: str, count: int, payload: str = "{}") -> None:
+    conn = store._conn_or_raise()
+    store.flush_events()
+    with store._lock:
+        conn.executemany(
+            "INSERT INTO events (id, run_id, ts, type, level, message, payload) VALUES (?, ?, 1, 'task_progress', 'info', 'm', ?)",
+            [(f"{run_id}-{n}", run_id, payload) for n in range(count)],
+        )
+        conn.commit()
+
+
+def test_purge_table_applies_ttl_and_row_caps_in_batches(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("retention", [], {})
+    run = store.create_run(project["id"], "q", "plan_only")
+    _seed_old_events(run["id"], 25)
+    max_seq = store._read_conn().execute("SELECT MAX(rowid) FROM events").fetchone()[0]
+
+    # Последнее событие остаётся как верхняя граница seq
+    assert store.purge_table("events", older_than_s=3600, batch_size=10) == 24
+    assert store._read_conn().execute("SELECT rowid FROM events").fetchall()[0][0] == max_seq
+
+    store.insert_sources(
+        run["id"],
+        [{"id": f"s{n}", "url": f"https://example.com/{n}", "retrieved_at": OLD_ISO, "pinned": n == 0} for n in range(4)],
+    )
+    facts = store.insert_facts(
+        run["id"], [{"id": f"f{n}", "key": f"k{n}", "value": "v", "created_at": f"2020-01-0{n + 1}T00:00:00Z"} for n in range(6)]
+    )
+    assert _count("memory_fts", "type = 'fact'") == 6
+
+    assert store.purge_table("sources", older_than_s=3600) == 3
+    assert _count("sources") == 1
+    assert store.purge_table("facts", max_rows=2, batch_size=3) == 4
+    remaining = {row[0] for row in store._read_conn().execute("SELECT id FROM facts").fetchall()}
+    assert remaining == {f["id"] for f in facts[-2:]}
+    assert _count("memory_fts", "type = 'fact'") == 2
+
+
+def test_incremental_vacuum_returns_freed_pages_to_the_os(tmp_path: Path):
+    _init_db(tmp_path)
+    conn = store._read_conn()
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    _seed_old_events("big-run", 2000, '{"text": "' + "x" * 2000 + '"}')
+    db_path = tmp_path / "astra.db"
+    store.incremental_vacuum()
+    pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+
+    store.purge_table("events", older_than_s=0, batch_size=500, max_batches=10)
+    report = store.incremental_vacuum(max_pages=100_000, step_pages=128)
+    assert report["pages"] > 1000 and report["free_pages_left"] == 0
+    assert conn.execute("PRAGMA page_count").fetchone()[0] <= pages_before - report["pages"]
+    # Файл БД в WAL укорачивается при checkpoint, который не ждёт _lock
+    results: list[dict] = []
+    with store._lock:
+        worker = threading.Thread(target=lambda: results.append(store.checkpoint_wal()))
+        worker.start()
+        worker.join(5.0)
+    assert results and results[0]["busy"] == 0
+    assert db_path.stat().st_size < 1_000_000
+
+
+def test_prune_files_by_age_then_size_and_scheduler_report(tmp_path: Path):
+    _init_db(tmp_path / "data")
+    failures = tmp_path / "artifacts" / "local_llm_failures"
+    cache = tmp_path / "artifacts" / "run-1" / "sources"
+    failures.mkdir(parents=True)
+    cache.mkdir(parents=True)
+    now = time.time()
+    for n in range(5):
+        path = failures / f"fail-{n}.json"
+        path.write_bytes(b"x" * 1000)
+        os.utime(path, (now - n * 86400, now - n * 86400))
+    old = cache / "page.json"
+    old.write_text("{}", encoding="utf-8")
+    os.utime(old, (now - 90 * 86400, now - 90 * 86400))
+
+    result = prune_files(sorted(failures.iterdir()), older_than_s=2.5 * 86400, max_bytes=1500, limit=100)
+    assert result == {"files": 4, "bytes": 4000}
+    assert [p.name for p in failures.iterdir()] == ["fail-0.json"]
+
+    report = MaintenanceScheduler(tmp_path).run_once()
+    assert report["retention"]["files"]["source_cache"] == {"files": 1, "bytes": 2}
+    assert not (tmp_path / "artifacts" / "run-1").exists()
+    assert (failures / "fail-0.json").exists()
+    assert report["retention"]["freed_bytes"] >= 2
+    assert report["checkpoint"]["busy"] == 0
+
+
+def test_event_archive_retention_removes_segments_with_their_rows(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path)
+    project = store.create_project("retention", [], {})
+    runs = []
+    for n in range(4):
+        run = store.create_run(project["id"], "q", "plan_only")
+        store.update_run_status(run["id"], "done", finished_at=OLD_ISO)
+        for _ in range(3):
+            store.add_event(run["id"], "task_progress", "info", "m", {"n": n})
+        store.flush_events()
+        store.archive_run_events(run["id"])
+        runs.append(run)
+    conn = store._conn_or_raise()
+    with store._lock:
+        conn.execute("UPDATE event_archives SET archived_at = ?", (OLD_ISO,))
+        conn.commit()
+    segments = [tmp_path / store._event_archive(run["id"])["path"] for run in runs]
+    sizes = [path.stat().st_size for path in segments]
+    newest_seq = store._max_event_seq(conn)
+
+    result = store.purge_event_archives(older_than_s=3600, batch_size=2)
+    # Архив с наибольшим last_seq держит верхнюю границу seq
+    assert result["segments"] == 3 and result["events"] == 9
+    assert result["bytes"] == sum(sizes[:3])
+    assert [path.exists() for path in segments] == [False, False, False, True]
+    assert _count("event_archives") == 1
+    assert store._max_event_seq(conn) == newest_seq
+    assert store.list_events(runs[0]["id"]) == []
+
+    # Размерный лимит: свежие сегменты сверх max_bytes уходят, начиная со старых
+    extra = store.create_run(project["id"], "q", "plan_only")
+    store.update_run_status(extra["id"], "done", finished_at=OLD_ISO)
+    store.add_event(extra["id"], "task_progress", "info", "m", {})
+    store.flush_events()
+    store.archive_run_events(extra["id"])
+    assert store.purge_event_archives(max_bytes=0)["segments"] == 1
+    assert not segments[3].exists()
+    assert store._event_archive(extra["id"]) is not None
+
+    monkeypatch.setenv("ASTRA_RETENTION_EVENT_ARCHIVES_DAYS", "0")
+    monkeypatch.setenv("ASTRA_RETENTION_EVENT_ARCHIVES_MAX_MB", "0")
+    report = MaintenanceScheduler(tmp_path).run_once()
+    assert report["retention"]["archives"] == {"segments": 0, "events": 0, "bytes": 0}
+
+
+def test_scheduler_keeps_unarchived_events_by_default_and_reports_failures(tmp_path: Path, monkeypatch, caplog):
+    _init_db(tmp_path)
+    project = store.create_project("chat", [], {})
+    # Чат не доходит до конечного статуса и не архивируется: его события не должны истекать
+    chat = store.create_run(project["id"], "привет", "research", purpose="chat")
+    _seed_old_events(chat["id"], 5)
+    report = MaintenanceScheduler(tmp_path).run_once()
+    assert "events" not in report["retention"]["tables"]
+    assert len(store.list_events(chat["id"])) == 5
+
+    scheduler = MaintenanceScheduler(tmp_path, poll_interval=0)
+
+    def failing_pass() -> dict:
+        scheduler.stop()
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(scheduler, "run_once", failing_pass)
+    with caplog.at_level(logging.ERROR, logger="core.maintenance"):
+        scheduler._loop()
+    assert scheduler.failures == 1 and scheduler.last_error == "RuntimeError: disk full"
+    assert "maintenance pass failed" in caplog.text
+
+
+def test_scheduler_runs_the_vacuum_postponed_by_migrations(tmp_path: Path):
+    _init_db(tmp_path)
+    assert MaintenanceScheduler(tmp_path).run_once().get("migrations") is None
+
+    # Так выглядит schema_state после старта, отложившего VACUUM миграции
+    conn = store._conn_or_raise()
+    with store._lock:
+        db._write_state(conn, {"deferred": [["013_retention.sql", "VACUUM;"]]})
+        conn.commit()
+    report = MaintenanceScheduler(tmp_path).run_once()
+    assert report["migrations"]["done"] == ["013_retention.sql"] and report["migrations"]["pending"] == []
+    assert report["checkpoint"]["busy"] == 0
+    assert db._read_state(conn) == {}
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import os
 import sys
 import time
@@ -327,6 +328,7 @@ def test_semantic_failure_degrades_to_chat_instead_of_502(monkeypatch, tmp_path:
     assert payload["run"]["meta"]["intent_path"] == "semantic_resilience"
     assert payload["run"]["meta"]["semantic_error_code"] == "semantic_decision_llm_failed"
 
+    store.flush_events()
     events = store.list_events(payload["run"]["id"], limit=50)
     event_types = [item.get("type") for item in events]
     assert "llm_request_failed" in event_types
@@ -346,6 +348,19 @@ def test_chat_llm_timeout_degrades_to_fallback_chat(monkeypatch, tmp_path: Path)
         "decide_semantic",
         lambda *args, **kwargs: _semantic(intent="CHAT"),
     )
+    # emit пишет в SQLite (events, chat_turns): из async-маршрута — только через пул потоков
+    emitted_on_loop: list[str] = []
+    real_emit = runs_route.emit
+
+    def recording_emit(run_id, event_type, *args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            emitted_on_loop.append(event_type)
+        except RuntimeError:
+            pass
+        return real_emit(run_id, event_type, *args, **kwargs)
+
+    monkeypatch.setattr(runs_route, "emit", recording_emit)
 
     client = TestClient(create_app())
     headers = _bootstrap(client)
@@ -361,10 +376,12 @@ def test_chat_llm_timeout_degrades_to_fallback_chat(monkeypatch, tmp_path: Path)
     assert payload["kind"] == "chat"
     assert "Локальная модель сейчас недоступна" in payload["chat_response"]
 
+    store.flush_events()
     events = store.list_events(payload["run"]["id"], limit=50)
     event_types = [item.get("type") for item in events]
     assert "chat_response_generated" in event_types
     assert "run_failed" not in event_types
+    assert emitted_on_loop == []
 
 
 def test_chat_uncertain_response_uses_auto_web_research(monkeypatch, tmp_path: Path):
@@ -426,6 +443,7 @@ def test_chat_uncertain_response_uses_auto_web_research(monkeypatch, tmp_path: P
     assert "Кен Канеки" in payload["chat_response"]
     assert "https://example.org/tokyo-ghoul" in payload["chat_response"]
 
+    store.flush_events()
     events = store.list_events(payload["run"]["id"], limit=80)
     chat_events = [item for item in events if item.get("type") == "chat_response_generated"]
     assert chat_events
@@ -515,6 +533,7 @@ def test_memory_save_failure_is_non_blocking(monkeypatch, tmp_path: Path):
 
     events = []
     for _ in range(60):
+        store.flush_events()
         events = store.list_events(payload["run"]["id"], limit=80)
         if any(
             item.get("type") == "llm_request_failed"
@@ -6,6 +6,7 @@ import sys
 import tempfile
 import threading
 import time
+import uuid
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from pathlib import Path
 
@@ -258,3 +259,22 @@ def test_approval_flow_shell_skill_with_retry():
     assert len(attempts) >= 2
 
     server.shutdown()
+
+
+def test_client_run_id_allows_subscribing_before_create():
+    client = make_client()
+    headers = bootstrap(client)
+    token = _auth_token_from_headers(headers)
+    project = client.post("/api/v1/projects", json={"name": "Свой run_id", "tags": [], "settings": {}}, headers=headers).json()
+    run_id = str(uuid.uuid4())
+
+    # До POST /runs запуска нет: без pending=1 — 404, с pending=1 поток открывается
+    assert client.get(f"/api/v1/runs/{run_id}/events?token={token}&once=1").status_code == 404
+    assert client.get(f"/api/v1/runs/{run_id}/events?token={token}&once=1&pending=1").status_code == 200
+
+    payload = {"query_text": "Проверь сайт https://example.com в браузере", "mode": "plan_only", "run_id": run_id}
+    run = unwrap_run(client.post(f"/api/v1/projects/{project['id']}/runs", json=payload, headers=headers).json())
+    assert run["id"] == run_id
+    assert client.post(f"/api/v1/projects/{project['id']}/runs", json=payload, headers=headers).status_code == 409
+    bad = {**payload, "run_id": "../x"}
+    assert client.post(f"/api/v1/projects/{project['id']}/runs", json=bad, headers=headers).status_code == 422
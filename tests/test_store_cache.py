@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+from memory.record_cache import RecordCache
+
+
+def _init_db(tmp_path: Path) -> None:
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+
+def _count_selects(fn) -> int:
+    conn = store._read_conn()
+    statements: list[str] = []
+    conn.set_trace_callback(statements.append)
+    try:
+        fn()
+    finally:
+        conn.set_trace_callback(None)
+    return len([sql for sql in statements if sql.lstrip().upper().startswith(("SELECT", "WITH"))])
+
+
+def test_get_run_is_served_from_cache_and_invalidated_by_writes(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("cache", [], {"a": 1})
+    run = store.create_run(project["id"], "q", "execute_confirm", meta={"intent": "ACT"})
+
+    assert store.get_run(run["id"])["status"] == "created"
+    assert _count_selects(lambda: [store.get_run(run["id"]) for _ in range(10)]) == 0
+    stats = store.cache_stats()["runs"]
+    assert stats["misses"] == 1
+    assert stats["hits"] == 10
+
+    store.update_run_status(run["id"], "running")
+    assert store.get_run(run["id"])["status"] == "running"
+    store.update_run_meta_and_mode(run["id"], mode="plan_only", purpose=None, meta={"intent": "CHAT"})
+    assert store.get_run(run["id"])["meta"] == {"intent": "CHAT"}
+
+    store.get_project(project["id"])
+    store.update_project(project["id"], "renamed", None, None)
+    assert store.get_project(project["id"])["name"] == "renamed"
+    assert store.cache_stats()["projects"]["invalidations"] == 1
+
+
+def test_snapshots_are_immutable_and_get_run_returns_copies(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("cache", [], {})
+    run = store.create_run(project["id"], "q", "execute_confirm", meta={"intent": "ACT", "tags": ["x"]})
+
+    snapshot = store.get_run_snapshot(run["id"])
+    with pytest.raises(TypeError):
+        snapshot["status"] = "done"  # type: ignore[index]
+    assert snapshot["meta"]["tags"] == ("x",)
+
+    copy = store.get_run(run["id"])
+    copy["meta"]["intent"] = "CHAT"
+    copy["meta"]["tags"].append("y")
+    assert store.get_run(run["id"])["meta"] == {"intent": "ACT", "tags": ["x"]}
+
+
+def test_transaction_defers_invalidation_and_bypasses_cache(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("cache", [], {})
+    run = store.create_run(project["id"], "q", "execute_confirm")
+    store.get_run(run["id"])
+
+    with store.transaction():
+        store.update_run_status(run["id"], "running")
+        assert store.get_run(run["id"])["status"] == "running"
+        assert store._run_cache.peek(run["id"])["status"] == "created"
+    assert store._run_cache.peek(run["id"]) is None
+    assert store.get_run(run["id"])["status"] == "running"
+
+
+def test_list_run_chain_uses_cached_snapshots(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("cache", [], {})
+    parent_id = None
+    for idx in range(5):
+        parent_id = store.create_run(project["id"], f"q{idx}", "plan_only", parent_run_id=parent_id)["id"]
+
+    first = store.list_run_chain(parent_id)
+    assert len(first) == 5
+    assert _count_selects(lambda: store.list_run_chain(parent_id)) == 0
+    assert store.list_run_chain(parent_id) == first
+
+
+def test_record_cache_rejects_stale_fill():
+    cache = RecordCache(2, log_size=2)
+    token = cache.token()
+    cache.invalidate("a")
+    assert not cache.put("a", "old", token)
+    assert cache.put("b", "fresh", token)
+
+    old_token = cache.token()
+    cache.invalidate("x")
+    cache.invalidate("y")
+    cache.invalidate("z")
+    # Журнал обрезан — токен старше журнала не принимается
+    assert not cache.put("b", "value", old_token)
+
+    cache.put("c", 1, cache.token())
+    cache.put("d", 2, cache.token())
+    cache.put("e", 3, cache.token())
+    assert cache.stats()["size"] == 2
+    assert cache.peek("c") is None
+    assert cache.stats()["stale_fills"] == 2
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from memory import store
+
+
+def _init_db(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setenv("ASTRA_DB_READ_POOL", "true")
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+
+def test_reads_use_thread_local_connections(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path, monkeypatch)
+    project = store.create_project("pool", [], {})
+
+    seen: dict[str, object] = {}
+
+    def _reader(name: str) -> None:
+        conn = store._read_conn()
+        assert store.get_project(project["id"])["name"] == "pool"
+        seen[name] = conn
+
+    threads = [threading.Thread(target=_reader, args=(f"t{i}",)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    conns = list(seen.values())
+    assert len({id(conn) for conn in conns}) == 3
+    assert all(conn is not store._conn_or_raise() for conn in conns)
+
+
+def test_reader_sees_committed_writes_and_is_read_only(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path, monkeypatch)
+    project = store.create_project("pool", [], {})
+    assert store.get_project(project["id"]) is not None
+
+    store.update_project(project["id"], "renamed", None, None)
+    assert store.get_project(project["id"])["name"] == "renamed"
+
+    try:
+        store._read_conn().execute("DELETE FROM projects")
+        assert False, "reader connection must be read-only"
+    except sqlite3.OperationalError:
+        pass
+
+
+def test_reset_closes_reader_connections(tmp_path: Path, monkeypatch):
+    _init_db(tmp_path, monkeypatch)
+    store.list_projects()
+    assert store.reader_pool_size() == 1
+    store.reset_for_tests()
+    assert store.reader_pool_size() == 0
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from apps.api.routes.run_events import _sse_frame
+from memory import store
+from memory.db import JSONB_SUPPORTED
+from memory.records import _UNSET, EventRecord, PlanStepRecord, json_default
+
+
+def _init_db(tmp_path: Path) -> None:
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+
+def test_event_records_decode_payload_lazily_and_pass_raw_json_through(tmp_path: Path):
+    _init_db(tmp_path)
+    run_id = "run-records"
+    payloads = [{"text": "привет", "n": 1.5, "nested": {"a": [1, None, True]}}, {}, [], None, ["x"]]
+    for payload in payloads:
+        store.add_event(run_id, "task_progress", "info", "шаг \"1\"", payload)
+    store.flush_events()
+    conn = store._conn_or_raise()
+    with store._lock:
+        conn.execute(
+            "INSERT INTO events (id, run_id, ts, type, level, message, payload) VALUES ('broken', ?, 1, 'task_progress', 'info', 'm', '{oops')",
+            (run_id,),
+        )
+        conn.commit()
+
+    events = store.list_events(run_id)
+    assert all(isinstance(e, EventRecord) for e in events)
+    assert not hasattr(events[0], "__dict__")
+    # Пока payload не запрошен, он не декодирован — to_json отдаёт текст из БД
+    assert events[0].to_json().count("привет") == 1
+    assert events[0]._payload is _UNSET
+    for event in events:
+        expected = json.dumps(dict(event), ensure_ascii=False)
+        if JSONB_SUPPORTED:
+            # JSONB payload приходит из SQLite минифицированным
+            assert json.loads(event.to_json()) == json.loads(expected)
+        else:
+            assert event.to_json() == expected
+    assert [e["payload"] for e in events] == [payloads[0], {}, {}, {}, ["x"], {}]
+    assert events[0] == {**events[0].to_dict()}
+
+    frame = _sse_frame(events[0])
+    assert frame.startswith(f"id: {events[0]['seq']}\nevent: task_progress\ndata: ")
+    assert json.loads(frame.split("data: ", 1)[1]) == events[0].to_dict()
+
+
+def test_plan_step_records_behave_like_read_only_dicts(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("records", [], {})
+    run = store.create_run(project["id"], "q", "plan_only")
+    store.insert_plan_steps(
+        run["id"],
+        [{"id": "s1", "step_index": 0, "title": "t", "skill_name": "memory_save", "inputs": {"k": "v"}, "danger_flags": ["send"]}],
+    )
+
+    step = store.list_plan_steps(run["id"])[0]
+    assert isinstance(step, PlanStepRecord)
+    assert step["inputs"] == {"k": "v"}
+    assert step.get("depends_on") == []
+    assert step.get("missing") is None
+    assert "danger_flags" in step and "missing" not in step
+    assert dict(step) == dict(store.get_plan_step("s1"))
+    with pytest.raises(TypeError):
+        step["status"] = "done"  # type: ignore[index]
+    assert json.loads(json.dumps({"plan": [step]}, default=json_default))["plan"][0]["inputs"] == {"k": "v"}
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from core import event_bus, event_hub
+from core.event_hub import EventHub
+from core.run_engine import RunEngine
+from memory import store
+
+
+def _init_db(tmp_path: Path) -> None:
+    store.reset_for_tests()
+    store.init(tmp_path, ROOT / "memory" / "migrations")
+
+
+def _count_commits(fn) -> int:
+    # Коммиты фонового писателя событий (group commit) не считаем
+    conn = store._conn_or_raise()
+    caller = threading.current_thread()
+    statements: list[str] = []
+    conn.set_trace_callback(lambda sql: statements.append(sql) if threading.current_thread() is caller else None)
+    try:
+        fn()
+    finally:
+        conn.set_trace_callback(None)
+    return len([sql for sql in statements if sql.strip().upper() == "COMMIT"])
+
+
+def test_transaction_commits_once_and_reads_own_writes(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("tx", [], {})
+    run = store.create_run(project["id"], "tx", "execute_confirm")
+    step = store.insert_plan_steps(run["id"], [{"id": "step-1", "step_index": 0, "title": "s", "skill_name": "memory_save", "inputs": {}}])[0]
+
+    def transition():
+        with store.transaction():
+            store.update_plan_step_status(step["id"], "running")
+            task = store.create_task(run["id"], step["id"], attempt=store.next_task_attempt(run["id"], step["id"]))
+            store.update_task_status(task["id"], "running")
+            # Чтение внутри блока видит незакоммиченные изменения
+            assert store.get_task(task["id"])["status"] == "running"
+            assert store.get_plan_step(step["id"])["status"] == "running"
+
+    assert _count_commits(transition) == 1
+    assert store.get_plan_step(step["id"])["status"] == "running"
+
+
+def test_transaction_rolls_back_on_error(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("tx", [], {})
+    run = store.create_run(project["id"], "tx", "execute_confirm")
+    step = store.insert_plan_steps(run["id"], [{"id": "step-1", "step_index": 0, "title": "s", "skill_name": "memory_save", "inputs": {}}])[0]
+
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.update_plan_step_status(step["id"], "running")
+            with store.transaction():
+                store.create_task(run["id"], step["id"], attempt=1)
+            raise RuntimeError("boom")
+
+    assert store.get_plan_step(step["id"])["status"] == "created"
+    assert store.get_last_task_for_step(run["id"], step["id"]) is None
+
+
+def test_durable_event_inside_transaction_does_not_deadlock(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("tx", [], {})
+    run = store.create_run(project["id"], "tx", "execute_confirm")
+    done = threading.Event()
+
+    def worker():
+        with store.transaction():
+            store.update_run_status(run["id"], "done")
+            store.add_event(run["id"], "run_done", "info", "done", {"status": "done"})
+            store.list_events(run["id"])
+        done.set()
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    assert done.wait(5.0)
+    # После выхода из блока durable-событие уже закоммичено
+    assert [e["type"] for e in store.list_events(run["id"])][-1] == "run_done"
+
+
+def test_run_engine_step_transitions_commit_once(tmp_path: Path):
+    _init_db(tmp_path)
+    project = store.create_project("tx", [], {})
+    run = store.create_run(project["id"], "tx", "execute_confirm")
+    step = store.insert_plan_steps(run["id"], [{"id": "step-1", "step_index": 0, "title": "s", "skill_name": "memory_save", "inputs": {}}])[0]
+    engine = RunEngine(ROOT)
+    engine.registry.get_manifest = lambda name: None
+
+    # Переход в running — один коммит; затем навык не найден
+    commits = _count_commits(lambda: pytest.raises(RuntimeError, engine._execute_step, run, step))
+    assert commits == 1
+    task = store.get_last_task_for_step(run["id"], step["id"])
+    assert task["status"] == "running"
+    assert store.get_plan_step(step["id"])["status"] == "running"
+
+
+@pytest.mark.parametrize("group_commit", ["true", "false"])
+def test_transaction_events_publish_after_commit_and_vanish_on_rollback(tmp_path: Path, monkeypatch, group_commit: str):
+    monkeypatch.setenv("ASTRA_EVENT_GROUP_COMMIT", group_commit)
+    _init_db(tmp_path)
+    project = store.create_project("tx", [], {})
+    run = store.create_run(project["id"], "tx", "execute_confirm")
+    published: list[dict] = []
+    finished: list[tuple[str, str]] = []
+
+    def on_finished(run_id: str) -> None:
+        # Слушатель видит уже закоммиченный статус
+        finished.append((run_id, store.get_run(run_id)["status"]))
+
+    event_bus.add_run_finished_listener(on_finished)
+    hub = EventHub()
+    monkeypatch.setattr(hub, "publish", published.append)
+    monkeypatch.setattr(event_hub, "_HUB_SINGLETON", hub)
+    try:
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                store.update_run_status(run["id"], "done")
+                event_bus.emit(run["id"], "run_done", "done", {"status": "done"})
+                raise RuntimeError("boom")
+        assert published == [] and finished == []
+        assert store.list_events(run["id"]) == []
+
+        with store.transaction():
+            store.update_run_status(run["id"], "done")
+            event = event_bus.emit(run["id"], "run_done", "done", {"status": "done"})
+            assert published == [] and "seq" not in event
+        assert [e["seq"] for e in published] == [event["seq"]]
+        assert finished == [(run["id"], "done")]
+        assert [e["seq"] for e in store.list_events(run["id"])] == [event["seq"]]
+
+        # seq отменённого события не выдаётся повторно опубликованному
+        later = event_bus.emit(run["id"], "task_progress", "later", {})
+        assert later["seq"] > event["seq"]
+    finally:
+        event_bus.remove_run_finished_listener(on_finished)